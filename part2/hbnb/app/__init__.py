@@ -1,13 +1,28 @@
 #!/usr/bin/python3
+import sqlite3
 from flask import Flask
 from flask_restx import Api
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from app.extensions import jwt, bcrypt
 from config import config
 from flask_cors import CORS
+from app.routing import RoutingSession
+from app import routing
 
 # Initialize SQLAlchemy instance globally
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite enforces foreign keys (and ON DELETE CASCADE) only when asked to
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 
 def create_app(config_name="config.DevelopmentConfig"):
     app = Flask(__name__)
@@ -16,8 +31,16 @@ def create_app(config_name="config.DevelopmentConfig"):
     # 1. Load Configuration
     app.config.from_object(config_name)
 
+    # Without a database the session still backs units of work; give it
+    # something to bind to
+    if not app.config['USE_DATABASE']:
+        app.config['SQLALCHEMY_DATABASE_URI'] = app.config.get('SQLALCHEMY_DATABASE_URI') or 'sqlite://'
+
     # 2. Initialize Extensions
+    from app.persistence import instrument_engine_options
+    instrument_engine_options(app)
     db.init_app(app)
+    routing.init_app(app, db)
     jwt.init_app(app)
     bcrypt.init_app(app)
 
@@ -45,15 +68,37 @@ def create_app(config_name="config.DevelopmentConfig"):
     from app.api.v1.users import api as users_ns
     from app.api.v1.amenities import api as amenities_ns
     from app.api.v1.places import api as places_ns
+    from app.api.v1.cities import api as cities_ns
     from app.api.v1.reviews import api as reviews_ns
     from app.api.v1.auth import api as auth_ns
+    from app.api.v1.metrics import api as metrics_ns
     from app.api.v1 import blueprint as api_v1
 
     api.add_namespace(users_ns, path='/api/v1/users')
     api.add_namespace(amenities_ns, path='/api/v1/amenities')
     api.add_namespace(places_ns, path='/api/v1/places')
+    api.add_namespace(cities_ns, path='/api/v1/cities')
     api.add_namespace(reviews_ns, path='/api/v1/reviews')
     api.add_namespace(auth_ns, path='/api/v1/auth')
+    api.add_namespace(metrics_ns, path='/api/v1/metrics')
     app.register_blueprint(api_v1)
 
+    from app.persistence import repositories
+    if app.config['USE_DATABASE']:
+        # 5. Configure the repository cache
+        from app.persistence import configure_repository_cache
+        configure_repository_cache(app, repositories)
+
+        # 6. Create the asyncio engine used by coroutine routes
+        from app.persistence import configure_async_engine
+        configure_async_engine(app)
+
+        # 7. Serve place searches from the columnar snapshot
+        from app.persistence import configure_place_columns, place_repository
+        configure_place_columns(app, place_repository)
+    else:
+        # 5. Load (and save at exit) the in-memory snapshot
+        from app.persistence import configure_memory_snapshot
+        configure_memory_snapshot(app, repositories)
+
     return app
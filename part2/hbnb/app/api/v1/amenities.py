@@ -3,6 +3,8 @@ from flask_restx import Namespace, Resource, fields, abort
 from flask import request
 from flask_jwt_extended import jwt_required, get_jwt
 from app.services import facade
+from app.api.v1.pagination import pagination_parser, page_model
+from app.api.v1.batch import MAX_BATCH_SIZE, batch_result_model, validate_rows
 
 api = Namespace('amenities', description='Amenity operations')
 
@@ -14,11 +16,27 @@ amenity_model = api.model('Amenity', {
     'updated_at': fields.DateTime(readonly=True, description='The date and time the amenity was last updated'),
 })
 
+amenity_page_model = page_model(api, 'AmenityPage', amenity_model)
+
 # Model for creating a new amenity
 amenity_create_model = api.model('AmenityCreate', {
     'name': fields.String(required=True, description='Name of the amenity', min_length=1)
 })
 
+amenity_upsert_model = api.model('AmenityUpsert', {
+    'id': fields.String(description='ID of the amenity to rename (upsert only)'),
+    'name': fields.String(required=True, description='Name of the amenity', min_length=1)
+})
+
+amenity_batch_model = api.model('AmenityBatch', {
+    'amenities': fields.List(fields.Nested(amenity_upsert_model), required=True,
+                             description=f'Amenities to create (at most {MAX_BATCH_SIZE})'),
+    'upsert': fields.Boolean(default=False,
+                             description='Insert new amenities and rename existing ones by ID')
+})
+
+amenity_batch_result_model = batch_result_model(api, 'AmenityBatchResult')
+
 
 @api.route('/')
 class AmenityList(Resource):
@@ -50,12 +68,54 @@ class AmenityList(Resource):
         except ValueError as e:
             api.abort(400, str(e))
 
-    @api.marshal_list_with(amenity_model)
+    @api.expect(pagination_parser)
+    @api.marshal_with(amenity_page_model)
     @api.response(200, 'List of amenities retrieved successfully')
+    @api.response(400, 'Invalid pagination parameters')
     def get(self):
-        """Retrieve a list of all amenities"""
-        amenities = facade.get_all_amenities()
-        return amenities, 200
+        """Retrieve a page of amenities"""
+        args = pagination_parser.parse_args()
+        try:
+            amenities = facade.get_amenities_page(args['limit'], args['cursor'], args['include_total'])
+            return amenities, 200
+        except ValueError as e:
+            api.abort(400, str(e))
+
+@api.route('/batch')
+class AmenityBatch(Resource):
+    @api.doc('create_amenities_batch', security='Bearer Auth')
+    @api.expect(amenity_batch_model)
+    @api.marshal_with(amenity_batch_result_model, code=201)
+    @api.response(201, 'Amenities created')
+    @api.response(400, 'Invalid input data or no amenity could be created')
+    @api.response(401, 'Unauthorized')
+    @api.response(403, 'Forbidden - Admin privileges required')
+    @jwt_required()
+    def post(self):
+        """Create or upsert many amenities (Admin only)"""
+        # ADMIN CHECK
+        claims = get_jwt()
+        if not claims.get('is_admin'):
+            api.abort(403, "Admin privileges required to create amenities.")
+
+        data = api.payload or {}
+        rows = data.get('amenities')
+        if not isinstance(rows, list) or len(rows) == 0:
+            api.abort(400, "'amenities' must be a non-empty list.")
+        if len(rows) > MAX_BATCH_SIZE:
+            api.abort(400, f"A batch may contain at most {MAX_BATCH_SIZE} amenities.")
+
+        errors = validate_rows(amenity_upsert_model, rows)
+        invalid = {error['index'] for error in errors}
+        valid = [index for index in range(len(rows)) if index not in invalid]
+
+        result = facade.create_amenities([rows[index] for index in valid], upsert=bool(data.get('upsert')))
+
+        created = [{'index': valid[item['index']], 'id': item['id']} for item in result.created]
+        errors += [{'index': valid[item['index']], 'error': item['error']} for item in result.errors]
+        errors.sort(key=lambda item: item['index'])
+
+        return {'created': created, 'errors': errors}, 201 if created else 400
 
 @api.route('/<amenity_id>')
 @api.param('amenity_id', 'The unique identifier of the amenity')
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+"""
+ASGI application serving the coroutine read routes.
+
+flask-restx calls handlers synchronously, so a coroutine behind a
+Resource still holds a thread until it returns. AsyncRoutes is the app an
+ASGI server runs instead (see asgi.py): a GET request to a coroutine
+route is awaited on the server's event loop, where the database waits of
+every request in flight interleave, and the asyncio engine's pooled
+connections, which belong to that loop, are reused across requests.
+Every other request goes to the Flask app, on a thread of a pool.
+
+A coroutine route takes the variables of its URL rule and returns what a
+Flask view may return; it runs in an app and request context of its own,
+so request, g and current_app work, and api.abort() answers as it does in
+Flask. It must not use db.session, which belongs to threads. Without an
+asyncio engine (see app.persistence.async_repository) Flask serves the
+coroutine routes' URLs too.
+"""
+import re
+from io import BytesIO
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from werkzeug.exceptions import HTTPException
+from app.persistence.async_repository import async_engine, async_engines
+
+# A variable of a Flask URL rule, e.g. <place_id>
+_RULE_VARIABLE = re.compile(r'<(\w+)>')
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs every WSGI call on one shared thread; use a pool instead
+    run_wsgi_app = sync_to_async(vars(WsgiToAsgiInstance)['run_wsgi_app'].func, thread_sensitive=False)
+
+
+class AsyncRoutes:
+    """
+    ASGI app answering the GET requests of coroutine routes itself and
+    passing the others to a Flask app.
+    """
+    def __init__(self, flask_app, routes):
+        """
+        routes maps URL prefixes to {rule: coroutine function}, e.g.
+        {'/api/v1/places': {'/<place_id>': get_place}}.
+        """
+        self.flask_app = flask_app
+        self.routes = []
+        for prefix, rules in routes.items():
+            for rule, handler in rules.items():
+                pattern = _RULE_VARIABLE.sub(r'(?P<\1>[^/]+)', prefix + rule)
+                self.routes.append((re.compile(pattern + '$'), handler))
+        with flask_app.app_context():
+            self.native = async_engine() is not None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET' and self.native:
+            for pattern, handler in self.routes:
+                match = pattern.match(scope['path'])
+                if match:
+                    return await self._serve(scope, receive, send, handler, match.groupdict())
+        await _ThreadedWsgiInstance(self.flask_app)(scope, receive, send)
+
+    async def _serve(self, scope, receive, send, handler, variables):
+        """Awaits a coroutine route and sends its response, as Flask would make it"""
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        adapter = WsgiToAsgiInstance(self.flask_app)
+        adapter.scope = scope
+        environ = adapter.build_environ(scope, BytesIO(body))
+
+        app = self.flask_app
+        with app.app_context(), app.request_context(environ):
+            try:
+                response = app.make_response(await handler(**variables))
+            except HTTPException as e:
+                # api.abort() keeps its message in e.data, as flask-restx answers it
+                response = app.make_response((getattr(e, 'data', None) or {'message': e.description}, e.code))
+            except Exception as e:
+                response = app.handle_exception(e)
+            response = app.process_response(response)
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                        for name, value in response.headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # The pooled connections belong to this loop: close them on it
+                with self.flask_app.app_context():
+                    for engine in async_engines().values():
+                        await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""
+Shared helpers for batch (bulk create and delete) endpoints.
+"""
+from flask_restx import fields
+from jsonschema import Draft4Validator, FormatChecker
+
+MAX_BATCH_SIZE = 5000
+
+
+def batch_result_model(api, name):
+    """
+    Builds the {created, errors} response model of a batch endpoint.
+    Both lists are keyed by the index of the row in the request.
+    """
+    created = api.model(f'{name}Created', {
+        'index': fields.Integer(description='Position of the row in the request'),
+        'id': fields.String(description='ID of the stored object'),
+    })
+    error = api.model(f'{name}Error', {
+        'index': fields.Integer(description='Position of the row in the request'),
+        'error': fields.String(description='Why the row was rejected'),
+    })
+    return api.model(name, {
+        'created': fields.List(fields.Nested(created)),
+        'errors': fields.List(fields.Nested(error)),
+    })
+
+
+def delete_batch_models(api, name):
+    """
+    Builds the {ids} request and {deleted} response models of a batch
+    delete endpoint.
+    """
+    request = api.model(f'{name}Request', {
+        'ids': fields.List(fields.String, required=True, description='IDs of the objects to delete'),
+    })
+    result = api.model(f'{name}Result', {
+        'deleted': fields.Integer(description='Objects deleted; unknown IDs are ignored'),
+    })
+    return request, result
+
+
+def requested_ids(api, payload):
+    """
+    The 'ids' list of a batch delete request, without duplicates.
+    Aborts with 400 unless it is a non-empty list of at most
+    MAX_BATCH_SIZE strings.
+    """
+    ids = (payload or {}).get('ids')
+    if not isinstance(ids, list) or len(ids) == 0 or not all(isinstance(obj_id, str) for obj_id in ids):
+        api.abort(400, "'ids' must be a non-empty list of IDs.")
+    if len(ids) > MAX_BATCH_SIZE:
+        api.abort(400, f"A batch may contain at most {MAX_BATCH_SIZE} IDs.")
+    return list(dict.fromkeys(ids))
+
+
+def validate_rows(model, rows):
+    """
+    Validates every row against a namespace model.
+    Returns a list of {'index', 'error'} for the rows that do not match,
+    so one malformed row does not reject the whole batch.
+    """
+    validator = Draft4Validator(model.__schema__, format_checker=FormatChecker())
+    errors = []
+    for index, row in enumerate(rows):
+        error = next(iter(validator.iter_errors(row)), None)
+        if error is not None:
+            errors.append({'index': index, 'error': error.message})
+    return errors
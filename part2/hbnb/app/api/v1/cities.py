@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+from flask_restx import Namespace, Resource, fields, reqparse, inputs
+from app.services import facade
+from app.api.v1.pagination import pagination_parser, page_model
+from app.persistence.repository import MAX_PAGE_SIZE
+
+api = Namespace('cities', description='City operations')
+
+AUTOCOMPLETE_SIZE = 10
+
+city_model = api.model('City', {
+    'id': fields.String(readonly=True, description='The unique identifier of a city'),
+    'name': fields.String(readonly=True, description='Name of the city'),
+    'place_count': fields.Integer(readonly=True, description='Number of places in the city'),
+    'created_at': fields.DateTime(readonly=True, description='The date and time the city was created'),
+    'updated_at': fields.DateTime(readonly=True, description='The date and time the city was last updated'),
+})
+
+city_page_model = page_model(api, 'CityPage', city_model)
+
+city_suggestion_model = api.model('CitySuggestion', {
+    'id': fields.String(readonly=True, description='The unique identifier of a city'),
+    'name': fields.String(readonly=True, description='Name of the city'),
+    'place_count': fields.Integer(readonly=True, description='Number of places in the city'),
+})
+
+autocomplete_parser = reqparse.RequestParser()
+autocomplete_parser.add_argument('prefix', type=str, required=True, help='Start of the city name, in any case')
+autocomplete_parser.add_argument('limit', type=inputs.int_range(1, MAX_PAGE_SIZE), default=AUTOCOMPLETE_SIZE,
+                                 help=f'Number of suggestions (1-{MAX_PAGE_SIZE})')
+
+
+@api.route('/')
+class CityList(Resource):
+    @api.expect(pagination_parser)
+    @api.marshal_with(city_page_model)
+    @api.response(200, 'List of cities retrieved successfully')
+    @api.response(400, 'Invalid pagination parameters')
+    def get(self):
+        """Retrieve a page of cities"""
+        args = pagination_parser.parse_args()
+        try:
+            return facade.get_cities_page(args['limit'], args['cursor'], args['include_total']), 200
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
+@api.route('/autocomplete')
+class CityAutocomplete(Resource):
+    @api.doc('autocomplete_cities')
+    @api.expect(autocomplete_parser)
+    @api.marshal_list_with(city_suggestion_model)
+    @api.response(200, 'Matching cities, by name')
+    @api.response(400, 'Missing or empty prefix')
+    def get(self):
+        """
+        Suggest the cities whose name starts with a prefix, ignoring case
+        Served from an in-memory index of the city names.
+        """
+        args = autocomplete_parser.parse_args()
+        try:
+            return facade.autocomplete_cities(args['prefix'], args['limit']), 200
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
+@api.route('/<city_id>')
+@api.param('city_id', 'The unique identifier of the city')
+class CityResource(Resource):
+    @api.marshal_with(city_model)
+    @api.response(200, 'City details retrieved successfully')
+    @api.response(404, 'City not found')
+    def get(self, city_id):
+        """Get city details by ID"""
+        city = facade.get_city(city_id)
+        if not city:
+            api.abort(404, f"City with ID '{city_id}' not found")
+        return city
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+from flask_restx import Namespace, Resource, fields
+from flask_jwt_extended import jwt_required, get_jwt
+from app.services import facade
+
+api = Namespace('metrics', description='Runtime metrics (Admin only)')
+
+cache_stats_model = api.model('CacheStats', {
+    'size': fields.Integer(description='Entries currently cached'),
+    'max_size': fields.Integer(description='Maximum number of entries'),
+    'hits': fields.Integer(description='Lookups served from the cache'),
+    'negative_hits': fields.Integer(description='Lookups answered by a cached "not found"'),
+    'misses': fields.Integer(description='Lookups that went to the database'),
+    'hit_ratio': fields.Float(description='(hits + negative_hits) / lookups'),
+    'evictions': fields.Integer(description='Entries dropped to stay under max_size'),
+    'invalidations': fields.Integer(description='Entries dropped because they changed'),
+})
+
+
+@api.route('/cache')
+class CacheMetrics(Resource):
+    @api.doc('get_cache_metrics', security='Bearer Auth')
+    @api.response(200, 'Cache counters per table', fields.Raw)
+    @api.response(401, 'Unauthorized')
+    @api.response(403, 'Forbidden - Admin privileges required')
+    @jwt_required()
+    def get(self):
+        """Repository cache counters, by table (Admin only)"""
+        claims = get_jwt()
+        if not claims.get('is_admin'):
+            api.abort(403, "Admin privileges required.")
+
+        stats = facade.get_cache_stats()
+        return {entity: api.marshal(values, cache_stats_model) for entity, values in stats.items()}, 200
+
+
+wait_bucket_model = api.model('WaitBucket', {
+    'le_ms': fields.Float(description='Upper bound in milliseconds (null: +Inf)'),
+    'count': fields.Integer(description='Checkouts that waited at most le_ms'),
+})
+
+checkout_wait_model = api.model('CheckoutWait', {
+    'count': fields.Integer(description='Timed checkouts, timeouts included'),
+    'sum_ms': fields.Float(description='Total time spent waiting'),
+    'max_ms': fields.Float(description='Longest wait'),
+    'buckets': fields.List(fields.Nested(wait_bucket_model), description='Cumulative histogram'),
+})
+
+pool_stats_model = api.model('PoolStats', {
+    'pool_class': fields.String(description='Pool implementation'),
+    'pool_size': fields.Integer(description='Connections kept open'),
+    'max_overflow': fields.Integer(description='Extra connections allowed under load'),
+    'checked_out': fields.Integer(description='Connections currently in use'),
+    'checked_in': fields.Integer(description='Idle connections in the pool'),
+    'overflow': fields.Integer(description='Extra connections currently open'),
+    'peak_overflow': fields.Integer(description='Most extra connections open at once'),
+    'checkouts': fields.Integer(description='Connections handed out'),
+    'timeouts': fields.Integer(description='Checkouts that gave up after pool_timeout'),
+    'connects': fields.Integer(description='New DBAPI connections opened'),
+    'invalidations': fields.Integer(description='Connections discarded after an error'),
+    'soft_invalidations': fields.Integer(description='Connections marked for recycling'),
+    'checkout_wait': fields.Nested(checkout_wait_model, allow_null=True),
+})
+
+
+@api.route('/pool')
+class PoolMetrics(Resource):
+    @api.doc('get_pool_metrics', security='Bearer Auth')
+    @api.response(200, 'Pool state and counters per bind', fields.Raw)
+    @api.response(401, 'Unauthorized')
+    @api.response(403, 'Forbidden - Admin privileges required')
+    @jwt_required()
+    def get(self):
+        """Database connection pool metrics, by bind (Admin only)"""
+        claims = get_jwt()
+        if not claims.get('is_admin'):
+            api.abort(403, "Admin privileges required.")
+
+        stats = facade.get_pool_stats()
+        return {bind: api.marshal(values, pool_stats_model) for bind, values in stats.items()}, 200
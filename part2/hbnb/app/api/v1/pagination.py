@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+"""
+Shared query parameters and response envelope for paginated list endpoints.
+"""
+from flask_restx import fields, reqparse, inputs
+from app.persistence.repository import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+pagination_parser = reqparse.RequestParser()
+pagination_parser.add_argument('limit', type=inputs.int_range(1, MAX_PAGE_SIZE), default=DEFAULT_PAGE_SIZE,
+                               help=f'Number of items per page (1-{MAX_PAGE_SIZE})')
+pagination_parser.add_argument('cursor', type=str, help='Opaque cursor returned as next_cursor by the previous page')
+pagination_parser.add_argument('include_total', type=inputs.boolean, default=False,
+                               help='Also return the total number of items')
+
+
+class AttributeList(fields.Raw):
+    """A list of integers read from several attributes, in order"""
+    __schema_type__ = 'array'
+
+    def __init__(self, attributes, **kwargs):
+        super().__init__(**kwargs)
+        self.attributes = tuple(attributes)
+
+    def output(self, key, obj, ordered=False, **kwargs):
+        return [fields.get_value(attribute, obj) for attribute in self.attributes]
+
+    def schema(self):
+        return dict(super().schema(), items={'type': 'integer'})
+
+
+def projection(model):
+    """
+    The attributes a response model reads, in the form repositories'
+    get_page_projection expects: {attribute: None} for plain fields and
+    {attribute: {...}} for nested models.
+    """
+    result = {}
+    for name, field in model.resolved.items():
+        if isinstance(field, AttributeList):
+            result.update(dict.fromkeys(field.attributes))
+            continue
+        if isinstance(field, fields.List):
+            field_nested = field.container
+        else:
+            field_nested = field
+        key = field.attribute if isinstance(field.attribute, str) else name
+        if isinstance(field_nested, fields.Nested):
+            result[key] = projection(field_nested.nested)
+        else:
+            result[key] = None
+    return result
+
+
+def page_model(api, name, item_model):
+    """
+    Builds the {items, next_cursor, total} envelope model for a namespace.
+    """
+    return api.model(name, {
+        'items': fields.List(fields.Nested(item_model), description='Items on this page'),
+        'next_cursor': fields.String(description='Cursor for the next page, null on the last page'),
+        'total': fields.Integer(description='Total number of items (only when include_total=true)'),
+    })
@@ -2,15 +2,23 @@
 import sys
 import os
 import re
-from flask_restx import Namespace, Resource, fields, abort
+from flask_restx import Namespace, Resource, fields, abort, inputs, marshal, reqparse
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.api.v1.users import user_details_model
 from app.api.v1.amenities import amenity_model
 from app.api.v1.reviews import review_model
+from app.api.v1.pagination import AttributeList, pagination_parser, page_model, projection
+from app.api.v1.batch import (MAX_BATCH_SIZE, batch_result_model, delete_batch_models, requested_ids,
+                              validate_rows)
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.insert(0, project_root)
-from app.services import facade
+from app.services import facade, async_facade
+from app.persistence.unit_of_work import unit_of_work
+from app.persistence.repository import MAX_PAGE_SIZE
+from app.persistence.similarity import DEFAULT_LIMIT as DEFAULT_SIMILAR
+from app.persistence.clusters import MAX_ZOOM
+from app.models.place import STAR_COLUMNS
 
 api = Namespace('places', description='Place operations')
 
@@ -23,6 +31,7 @@ place_input_model = api.model('PlaceInput', {
     'description': fields.String(required=True, description='Description of the place', min_length=1),
     'address': fields.String(required=True, description='Address of the place', min_length=1),
     'city_name': fields.String(required=True, description='Name of the city'), 
+    'city_id': fields.String(description='The City ID; when given, city_name is taken from the city'),
     'latitude': fields.Float(required=True, description='Latitude of the place', min=-90.0, max=90.0),
     'longitude': fields.Float(required=True, description='Longitude of the place', min=-180.0, max=180.0),
     'number_of_rooms': fields.Integer(required=True, attribute='number_rooms', description='Number of rooms', min=1),
@@ -35,20 +44,177 @@ place_input_model = api.model('PlaceInput', {
 place_details_model = api.inherit('PlaceDetails', place_input_model, {
     'id': fields.String(readonly=True, description='The place unique identifier'),
     'owner_id': fields.String(readonly=True, attribute='user_id', description='The Owner ID'),
-    'city_id': fields.String(readonly=True, description='The City ID'), # <--- ADDED THIS
     'owner': fields.Nested(user_details_model, attribute='user', description='Owner details'),
-    'amenities': fields.List(fields.Nested(amenity_model), description='List of amenities')
+    'amenities': fields.List(fields.Nested(amenity_model), description='List of amenities'),
+    'review_count': fields.Integer(readonly=True, description='Number of reviews of the place'),
+    'rating_sum': fields.Integer(readonly=True, description='Sum of the ratings of the reviews'),
+    'average_rating': fields.Float(readonly=True, description='Mean rating of the reviews; null without reviews'),
+    'rating_histogram': AttributeList(STAR_COLUMNS, readonly=True,
+                                      description='Number of reviews giving 1, 2, 3, 4 and 5 stars')
 })
 
+place_page_model = page_model(api, 'PlacePage', place_details_model)
+# Columns the list endpoint selects, with the owner and amenities nested
+place_list_fields = projection(place_details_model)
+
+place_geo_model = api.inherit('PlaceGeo', place_details_model, {
+    'distance_km': fields.Float(readonly=True, description='Great-circle distance from the search origin, in km')
+})
+place_geo_page_model = page_model(api, 'PlaceGeoPage', place_geo_model)
+place_geo_fields = projection(place_geo_model)
+
+place_similar_model = api.inherit('PlaceSimilar', place_details_model, {
+    'similarity': fields.Float(readonly=True, description='Similarity to the place, from 0 to 1'),
+    'distance_km': fields.Float(readonly=True, description='Great-circle distance from the place, in km; '
+                                                           'null without coordinates')
+})
+place_similar_fields = projection(place_similar_model)
+
+place_cluster_model = api.model('PlaceCluster', {
+    'count': fields.Integer(description='Number of places in the cell'),
+    'latitude': fields.Float(description='Mean latitude of the places'),
+    'longitude': fields.Float(description='Mean longitude of the places'),
+    'min_price': fields.Float(description='Lowest price per night of the places'),
+    'south': fields.Float(description='Lowest latitude of the cell'),
+    'west': fields.Float(description='Westmost longitude of the cell'),
+    'north': fields.Float(description='Highest latitude of the cell'),
+    'east': fields.Float(description='Eastmost longitude of the cell'),
+})
+
+place_clusters_model = api.model('PlaceClusters', {
+    'total': fields.Integer(description='Number of places in the clusters'),
+    'clusters': fields.List(fields.Nested(place_cluster_model), description='Non-empty grid cells of the box'),
+})
+
+place_batch_model = api.model('PlaceBatch', {
+    'places': fields.List(fields.Nested(place_input_model), required=True,
+                          description=f'Places to create (at most {MAX_BATCH_SIZE})')
+})
+
+place_batch_result_model = batch_result_model(api, 'PlaceBatchResult')
+place_delete_batch_model, place_delete_batch_result_model = delete_batch_models(api, 'PlaceDeleteBatch')
+
+search_parser = pagination_parser.copy()
+search_parser.add_argument('min_price', type=float, help='Lowest price per night')
+search_parser.add_argument('max_price', type=float, help='Highest price per night')
+search_parser.add_argument('city_name', type=str, help='Exact city name')
+search_parser.add_argument('city_id', type=str, help='ID of the city (see /cities/autocomplete)')
+search_parser.add_argument('min_guests', type=inputs.natural, help='Guests the place must host')
+search_parser.add_argument('min_rooms', type=inputs.natural, help='Rooms the place must have')
+search_parser.add_argument('amenity_ids', type=str, action='append',
+                           help='Amenities the place must all have (repeat, or separate with commas)')
+search_parser.add_argument('q', type=str,
+                           help='Words the name, description, city or reviews must all contain')
+search_parser.add_argument('sort', type=str,
+                           choices=('created_at', '-created_at', 'price', '-price', 'relevance'),
+                           help='Sort order; a leading - sorts descending. '
+                                'Defaults to relevance with q, created_at otherwise')
+
+# The search filters alone: facets count every matching place
+facets_parser = search_parser.copy()
+for argument in ('limit', 'cursor', 'include_total', 'sort'):
+    facets_parser.remove_argument(argument)
+
+facet_item_model = api.model('FacetItem', {
+    'id': fields.String(description='ID of the amenity or city'),
+    'name': fields.String(description='Name of the amenity or city'),
+    'count': fields.Integer(description='Number of matching places'),
+})
+
+place_facets_model = api.model('PlaceFacets', {
+    'total': fields.Integer(description='Number of matching places'),
+    'amenities': fields.List(fields.Nested(facet_item_model), description='Places per amenity, most first'),
+    'cities': fields.List(fields.Nested(facet_item_model), description='Places per city, most first'),
+    'prices': fields.List(fields.Nested(api.model('PriceFacet', {
+        'max_price': fields.Float(description='Highest price of the bucket; null for the last one'),
+        'count': fields.Integer(description="Places priced above the previous bucket's max_price, up to this one"),
+    })), description='Places per price bucket'),
+    'guests': fields.List(fields.Nested(api.model('GuestFacet', {
+        'min_guests': fields.Integer(description='Fewest guests of the band'),
+        'count': fields.Integer(description="Places hosting from min_guests to the next band's"),
+    })), description='Places per guest capacity band'),
+})
+
+
+nearby_parser = pagination_parser.copy()
+nearby_parser.add_argument('lat', type=float, required=True, help='Latitude of the center')
+nearby_parser.add_argument('lon', type=float, required=True, help='Longitude of the center')
+nearby_parser.add_argument('radius_km', type=float, required=True, help='Search radius in km')
+
+bbox_parser = pagination_parser.copy()
+bbox_parser.add_argument('south', type=float, required=True, help='Lowest latitude')
+bbox_parser.add_argument('west', type=float, required=True,
+                         help='Westmost longitude (greater than east when crossing the antimeridian)')
+bbox_parser.add_argument('north', type=float, required=True, help='Highest latitude')
+bbox_parser.add_argument('east', type=float, required=True, help='Eastmost longitude')
+
+similar_parser = pagination_parser.copy()
+for argument in ('cursor', 'include_total'):
+    similar_parser.remove_argument(argument)
+similar_parser.replace_argument('limit', type=inputs.int_range(1, MAX_PAGE_SIZE), default=DEFAULT_SIMILAR,
+                                help=f'Number of places (1-{MAX_PAGE_SIZE})')
+
+clusters_parser = reqparse.RequestParser()
+clusters_parser.add_argument('bbox', type=str, required=True,
+                             help='south,west,north,east (west greater than east when crossing the antimeridian)')
+clusters_parser.add_argument('zoom', type=inputs.int_range(0, MAX_ZOOM), required=True,
+                             help=f'Map zoom level (0-{MAX_ZOOM})')
+
+
+def search_filters(args):
+    """
+    Maps the parsed filters of search_parser or facets_parser onto the
+    arguments of PlaceSearch, sort aside.
+    """
+    amenity_ids = [amenity_id.strip() for value in args['amenity_ids'] or []
+                   for amenity_id in value.split(',') if amenity_id.strip()]
+    return {
+        'min_price': args['min_price'],
+        'max_price': args['max_price'],
+        'city_name': args['city_name'],
+        'city_id': args['city_id'],
+        'min_guests': args['min_guests'],
+        'min_rooms': args['min_rooms'],
+        'amenity_ids': amenity_ids,
+        'q': args['q'],
+    }
+
+
+def place_creation_data(place_data, user_id):
+    """
+    Maps a PlaceInput payload onto Place attributes for the facade.
+    """
+    return {
+        'name': place_data['name'],
+        'description': place_data['description'],
+        'address': place_data.get('address'),
+        'city_name': place_data.get('city_name'),
+        'city_id': place_data.get('city_id'),
+        'price_by_night': place_data['price'],
+        'number_rooms': place_data['number_of_rooms'],
+        'number_bathrooms': place_data['bathrooms'],
+        'max_guest': place_data['max_guests'],
+        'latitude': place_data['latitude'],
+        'longitude': place_data['longitude'],
+        'amenity_ids': place_data.get('amenity_ids') or [],
+        'user_id': user_id
+    }
+
 
 @api.route('/')
 class PlaceList(Resource):
     
     @api.doc('list_places')
-    @api.marshal_list_with(place_details_model)
+    @api.expect(pagination_parser)
+    @api.marshal_with(place_page_model)
+    @api.response(400, 'Invalid pagination parameters')
     def get(self):
-        """List all places"""
-        return facade.get_all_places()
+        """List places, one page at a time"""
+        args = pagination_parser.parse_args()
+        try:
+            return facade.get_places_page(args['limit'], args['cursor'], args['include_total'], place_list_fields)
+        except ValueError as e:
+            api.abort(400, str(e))
 
     @api.doc('create_place', security='Bearer Auth')
     @api.expect(place_input_model, validate=True)
@@ -68,19 +234,7 @@ class PlaceList(Resource):
             if hasattr(facade, 'get_city') and not facade.get_city(place_data['city_id']):
                 api.abort(404, f"City with ID '{place_data['city_id']}' not found.")
 
-        creation_data = {
-            'name': place_data['name'],
-            'description': place_data['description'],
-            'address': place_data.get('address'),
-            'city_id': place_data.get('city_id'),
-            'price_by_night': place_data['price'],
-            'number_rooms': place_data['number_of_rooms'],
-            'number_bathrooms': place_data['bathrooms'],
-            'max_guest': place_data['max_guests'],
-            'latitude': place_data['latitude'],
-            'longitude': place_data['longitude'],
-            'user_id': current_user_id
-        }
+        creation_data = place_creation_data(place_data, current_user_id)
 
         if place_data.get('amenity_ids'):
             for amenity_id in place_data['amenity_ids']:
@@ -89,18 +243,183 @@ class PlaceList(Resource):
         
         try:
             new_place = facade.create_place(creation_data)
-            
-            if place_data.get('amenity_ids'):
-                for amenity_id in place_data['amenity_ids']:
-                    amenity = facade.get_amenity(amenity_id)
-                    if amenity:
-                        new_place.add_amenity(amenity)
-
             return new_place, 201
         except ValueError as e:
             api.abort(400, str(e))
 
 
+@api.route('/batch')
+class PlaceBatch(Resource):
+
+    @api.doc('create_places_batch', security='Bearer Auth')
+    @api.expect(place_batch_model)
+    @api.marshal_with(place_batch_result_model, code=201)
+    @api.response(400, 'Invalid input data or no place could be created')
+    @api.response(401, 'Unauthorized')
+    @jwt_required()
+    def post(self):
+        """
+        Create many places owned by the current user (Authenticated)
+        Invalid rows are reported in errors; the valid ones are created.
+        """
+        current_user_id = get_jwt_identity()
+        rows = (api.payload or {}).get('places')
+
+        if not isinstance(rows, list) or len(rows) == 0:
+            api.abort(400, "'places' must be a non-empty list.")
+        if len(rows) > MAX_BATCH_SIZE:
+            api.abort(400, f"A batch may contain at most {MAX_BATCH_SIZE} places.")
+
+        errors = validate_rows(place_input_model, rows)
+        invalid = {error['index'] for error in errors}
+        valid = [index for index in range(len(rows)) if index not in invalid]
+
+        try:
+            result = facade.create_places(
+                [place_creation_data(rows[index], current_user_id) for index in valid],
+                current_user_id
+            )
+        except ValueError as e:
+            api.abort(400, str(e))
+
+        created = [{'index': valid[item['index']], 'id': item['id']} for item in result.created]
+        errors += [{'index': valid[item['index']], 'error': item['error']} for item in result.errors]
+        errors.sort(key=lambda item: item['index'])
+
+        return {'created': created, 'errors': errors}, 201 if created else 400
+
+
+@api.route('/search')
+class PlaceSearchList(Resource):
+
+    @api.doc('search_places')
+    @api.expect(search_parser)
+    @api.marshal_with(place_page_model)
+    @api.response(400, 'Invalid filters or pagination parameters')
+    def get(self):
+        """
+        Search places by text, price, city, capacity and amenities, one page at a time
+        Filters run in the database; the cursor of a page only works with the same sort.
+        """
+        args = search_parser.parse_args()
+        try:
+            return facade.search_places(dict(search_filters(args), sort=args['sort']), args['limit'],
+                                        args['cursor'], args['include_total'], place_list_fields)
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
+@api.route('/facets')
+class PlaceFacetList(Resource):
+
+    @api.doc('place_facets')
+    @api.expect(facets_parser)
+    @api.marshal_with(place_facets_model)
+    @api.response(400, 'Invalid filters')
+    def get(self):
+        """
+        Count the places matching the search filters per amenity, city, price bucket and guest band
+        Takes the filters of /search. Without any, the counts cover every place and are served
+        from a cache kept up to date as places change.
+        """
+        args = facets_parser.parse_args()
+        try:
+            return facade.get_place_facets(search_filters(args))
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
+@api.route('/nearby')
+class PlaceNearbyList(Resource):
+
+    @api.doc('places_nearby')
+    @api.expect(nearby_parser)
+    @api.marshal_with(place_geo_page_model)
+    @api.response(400, 'Invalid coordinates, radius or pagination parameters')
+    def get(self):
+        """
+        List the places within radius_km of a point, nearest first
+        Distances are great-circle distances; each place carries its distance_km.
+        """
+        args = nearby_parser.parse_args()
+        try:
+            return facade.get_places_nearby(args['lat'], args['lon'], args['radius_km'], args['limit'],
+                                            args['cursor'], args['include_total'], place_geo_fields)
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
+@api.route('/bbox')
+class PlaceBoundingBoxList(Resource):
+
+    @api.doc('places_in_bbox')
+    @api.expect(bbox_parser)
+    @api.marshal_with(place_geo_page_model)
+    @api.response(400, 'Invalid bounding box or pagination parameters')
+    def get(self):
+        """
+        List the places inside a bounding box, nearest to its center first
+        Each place carries its distance_km from the center of the box.
+        """
+        args = bbox_parser.parse_args()
+        try:
+            return facade.get_places_in_bbox(args['south'], args['west'], args['north'], args['east'],
+                                             args['limit'], args['cursor'], args['include_total'],
+                                             place_geo_fields)
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
+@api.route('/clusters')
+class PlaceClusterList(Resource):
+
+    @api.doc('place_clusters')
+    @api.expect(clusters_parser)
+    @api.marshal_with(place_clusters_model)
+    @api.response(400, 'Invalid bounding box or zoom')
+    def get(self):
+        """
+        Cluster the places inside a bounding box for a map at a zoom level
+        Each cluster is a non-empty grid cell with its place count, centroid and lowest price.
+        The grid is finer as the zoom grows, and coarser when the box would hold too many cells.
+        """
+        args = clusters_parser.parse_args()
+        try:
+            south, west, north, east = (float(value) for value in args['bbox'].split(','))
+        except ValueError:
+            api.abort(400, "bbox must be four numbers: south,west,north,east.")
+        try:
+            return facade.get_place_clusters(south, west, north, east, args['zoom'])
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
+@api.route('/batch/delete')
+class PlaceBatchDelete(Resource):
+
+    @api.doc('delete_places_batch', security='Bearer Auth')
+    @api.expect(place_delete_batch_model)
+    @api.marshal_with(place_delete_batch_result_model)
+    @api.response(200, 'Places deleted')
+    @api.response(400, 'Invalid input data')
+    @api.response(401, 'Unauthorized')
+    @api.response(403, 'Forbidden - Admin privileges required')
+    @jwt_required()
+    def post(self):
+        """
+        Delete many places, and their reviews, in one statement (Admin only)
+        """
+        claims = get_jwt()
+        if not claims.get('is_admin'):
+            api.abort(403, "Admin privileges required to delete places in bulk.")
+
+        place_ids = requested_ids(api, api.payload)
+        try:
+            return {'deleted': facade.delete_places(place_ids)}, 200
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
 @api.route('/<place_id>')
 @api.param('place_id', 'The place identifier')
 class PlaceResource(Resource):
@@ -153,8 +472,10 @@ class PlaceResource(Resource):
         if 'user_id' in update_data:
             del update_data['user_id']
 
+        # Commits here, so a constraint violation is a 400 like the others
         try:
-            updated_place = facade.update_place(place_id, update_data)
+            with unit_of_work():
+                updated_place = facade.update_place(place_id, update_data)
             return updated_place
         except ValueError as e:
             api.abort(400, str(e))
@@ -185,12 +506,16 @@ class PlaceResource(Resource):
         if str(place_owner_id) != str(current_user_id) and not is_admin:
             api.abort(403, "You are not authorized to delete this place.")
 
-        if hasattr(facade, 'delete_place'):
-             facade.delete_place(place_id)
-        elif hasattr(facade, 'place_repo'):
-             facade.place_repo.delete(place_id)
-        else:
-             api.abort(500, "Server configuration error: cannot delete place.")
+        try:
+            with unit_of_work():
+                if hasattr(facade, 'delete_place'):
+                    facade.delete_place(place_id)
+                elif hasattr(facade, 'place_repo'):
+                    facade.place_repo.delete(place_id)
+                else:
+                    api.abort(500, "Server configuration error: cannot delete place.")
+        except ValueError as e:
+            api.abort(400, str(e))
 
         return '', 204
 
@@ -219,8 +544,70 @@ class PlaceReviews(Resource):
         place = facade.get_place(place_id)
         if not place:
             api.abort(404, "Place not found")
-            
-        all_reviews = facade.get_all_reviews()
-        place_reviews = [r for r in all_reviews if r.place_id == place_id]
-        
-        return place_reviews
+
+        return facade.get_reviews_by_place(place_id)
+
+
+@api.route('/<place_id>/similar')
+@api.param('place_id', 'The place identifier')
+class PlaceSimilarList(Resource):
+
+    @api.doc('get_similar_places')
+    @api.expect(similar_parser)
+    @api.marshal_list_with(place_similar_model)
+    @api.response(400, 'Invalid place ID format or limit')
+    @api.response(404, 'Place not found')
+    def get(self, place_id):
+        """
+        List the places most like a place, best first
+        Places of the same city or nearby are scored on price, capacity,
+        amenities, distance and rating; each carries its similarity and distance_km.
+        """
+        if not UUID_REGEX.match(place_id):
+            api.abort(400, "Invalid place ID format. Must be a UUID.")
+        args = similar_parser.parse_args()
+        places = facade.get_similar_places(place_id, args['limit'], place_similar_fields)
+        if places is None:
+            api.abort(404, f"Place with ID '{place_id}' not found")
+        return places
+
+
+# --- COROUTINE ROUTES ---
+# The ASGI app (asgi.py) serves these GETs on its event loop, in place of
+# the Resource methods above, which WSGI servers and the docs use.
+
+async def list_places():
+    """List places, one page at a time"""
+    args = pagination_parser.parse_args()
+    try:
+        page = await async_facade.get_places_page(args['limit'], args['cursor'], args['include_total'],
+                                                  place_list_fields)
+    except ValueError as e:
+        api.abort(400, str(e))
+    return marshal(page, place_page_model)
+
+
+async def get_place(place_id):
+    """Get place details by ID"""
+    if not UUID_REGEX.match(place_id):
+        api.abort(400, "Invalid place ID format. Must be a UUID.")
+
+    place = await async_facade.get_place(place_id)
+    if not place:
+        api.abort(404, f"Place with ID '{place_id}' not found")
+    return marshal(place, place_details_model)
+
+
+async def get_place_reviews(place_id):
+    """Get all reviews for a specific place"""
+    place, reviews = await async_facade.get_place_with_reviews(place_id)
+    if not place:
+        api.abort(404, "Place not found")
+    return marshal(reviews, review_model)
+
+
+async_routes = {
+    '/': list_places,
+    '/<place_id>': get_place,
+    '/<place_id>/reviews': get_place_reviews,
+}
@@ -2,6 +2,9 @@
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.services import facade
+from app.persistence.unit_of_work import unit_of_work
+from app.api.v1.pagination import pagination_parser, page_model, projection
+from app.api.v1.batch import delete_batch_models, requested_ids
 
 api = Namespace('reviews', description='Review operations')
 
@@ -16,6 +19,12 @@ review_model = api.model('Review', {
     'updated_at': fields.DateTime(readonly=True)
 })
 
+review_page_model = page_model(api, 'ReviewPage', review_model)
+# Columns the list endpoint selects
+review_list_fields = projection(review_model)
+
+review_delete_batch_model, review_delete_batch_result_model = delete_batch_models(api, 'ReviewDeleteBatch')
+
 review_input_model = api.model('ReviewInput', {
     'text': fields.String(required=True, description='The review text'),
     'rating': fields.Integer(required=True, description='The rating (1-5)', min=1, max=5),
@@ -65,10 +74,40 @@ class ReviewList(Resource):
             api.abort(400, str(e))
 
     @api.doc('list_reviews')
-    @api.marshal_list_with(review_model)
+    @api.expect(pagination_parser)
+    @api.marshal_with(review_page_model)
+    @api.response(400, 'Invalid pagination parameters')
     def get(self):
-        """List all reviews"""
-        return facade.get_all_reviews()
+        """List reviews, one page at a time"""
+        args = pagination_parser.parse_args()
+        try:
+            return facade.get_reviews_page(args['limit'], args['cursor'], args['include_total'], review_list_fields)
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
+@api.route('/batch/delete')
+class ReviewBatchDelete(Resource):
+
+    @api.doc('delete_reviews_batch', security='Bearer Auth')
+    @api.expect(review_delete_batch_model)
+    @api.marshal_with(review_delete_batch_result_model)
+    @api.response(200, 'Reviews deleted')
+    @api.response(400, 'Invalid input data')
+    @api.response(401, 'Unauthorized')
+    @api.response(403, 'Forbidden - Admin privileges required')
+    @jwt_required()
+    def post(self):
+        """Delete many reviews in one statement (Admin only)"""
+        claims = get_jwt()
+        if not claims.get('is_admin'):
+            api.abort(403, "Admin privileges required to delete reviews in bulk.")
+
+        review_ids = requested_ids(api, api.payload)
+        try:
+            return {'deleted': facade.delete_reviews(review_ids)}, 200
+        except ValueError as e:
+            api.abort(400, str(e))
 
 
 @api.route('/<review_id>')
@@ -105,8 +144,10 @@ class ReviewResource(Resource):
         if review.user_id != current_user_id and not is_admin:
             api.abort(403, "You are not authorized to update this review")
 
+        # Commits here, so a constraint violation is a 400 like the others
         try:
-            updated_review = facade.update_review(review_id, api.payload)
+            with unit_of_work():
+                updated_review = facade.update_review(review_id, api.payload)
             return updated_review
         except ValueError as e:
             api.abort(400, str(e))
@@ -130,5 +171,9 @@ class ReviewResource(Resource):
         if review.user_id != current_user_id and not is_admin:
              api.abort(403, "You are not authorized to delete this review")
 
-        facade.delete_review(review_id)
+        try:
+            with unit_of_work():
+                facade.delete_review(review_id)
+        except ValueError as e:
+            api.abort(400, str(e))
         return '', 204
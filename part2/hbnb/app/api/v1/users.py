@@ -2,12 +2,13 @@
 import sys
 import os
 import re
-from flask_restx import Namespace, Resource, fields, reqparse, abort
+from flask_restx import Namespace, Resource, fields, inputs, reqparse, abort
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 sys.path.insert(0, project_root)
 from app.services import facade
+from app.api.v1.pagination import pagination_parser, page_model, projection
 
 api = Namespace('users', description='User operations')
 
@@ -32,26 +33,39 @@ user_details_model = api.inherit('UserResponse', user_base_model, {
     'updated_at': fields.String(readonly=True, description='Update timestamp'),
 })
 
-parser = reqparse.RequestParser()
-parser.add_argument('first_name', type=str, help='Filter users by first name')
+user_page_model = page_model(api, 'UserPage', user_details_model)
+# Columns the list endpoint selects (never the password hash)
+user_list_fields = projection(user_details_model)
+
+parser = pagination_parser.copy()
+parser.add_argument('first_name', type=str, help='Filter users by first name, ignoring case')
+parser.add_argument('last_name', type=str, help='Filter users by last name, ignoring case')
+parser.add_argument('prefix', type=inputs.boolean, default=False,
+                    help='Match names starting with first_name/last_name instead of whole names')
 
 @api.route('/')
 class UserList(Resource):
     @api.doc('list_users', security='Bearer Auth')
-    @api.marshal_list_with(user_details_model)
+    @api.expect(parser)
+    @api.marshal_with(user_page_model)
+    @api.response(400, 'Invalid filter or pagination parameters')
     # @jwt_required()
     def get(self):
-        """List all users"""
+        """
+        List users, one page at a time
+        With first_name and/or last_name, only the users with those names,
+        sorted by name; the cursor of a page only works with the same filters.
+        """
         args = parser.parse_args()
-        first_name_filter = args.get('first_name')
-
-        if first_name_filter:
-            if not isinstance(first_name_filter, str) or len(first_name_filter.strip()) == 0:
-                api.abort(400, "Invalid first name filter provided.")
 
-            return facade.find_users_by_name(first_name_filter)
-        else:
-            return facade.get_all_users()
+        try:
+            if args['first_name'] or args['last_name']:
+                filters = {key: args[key] for key in ('first_name', 'last_name', 'prefix')}
+                return facade.search_users(filters, args['limit'], args['cursor'], args['include_total'],
+                                           user_list_fields)
+            return facade.get_users_page(args['limit'], args['cursor'], args['include_total'], user_list_fields)
+        except ValueError as e:
+            api.abort(400, str(e))
 
     @api.doc('create_user') 
     @api.expect(user_create_model)
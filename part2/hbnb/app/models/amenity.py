@@ -5,14 +5,25 @@ Module for the Amenity class
 from app import db
 from app.models.base_model import BaseModel
 
+# Amenities that can own a bit of Place.amenity_bits (a signed 64-bit integer)
+AMENITY_BITS = 63
+
+
 class Amenity(BaseModel):
     """
     Represents an amenity that can be associated with a place.
     """
     __tablename__ = 'amenities'
+    __table_args__ = (
+        db.Index('ix_amenities_name', 'name'),
+        db.Index('ix_amenities_created_at_id', 'created_at', 'id'),
+        db.Index('ix_amenities_bit', 'bit', unique=True),
+    )
 
     # Columns
     name = db.Column(db.String(128), nullable=False, unique=False)
+    # Position of the amenity in Place.amenity_bits; None once all bits are taken
+    bit = db.Column(db.SmallInteger, nullable=True)
     
 
     def __init__(self, *args, **kwargs):
@@ -2,17 +2,26 @@
 """
 Base models
 """
-import uuid
 from datetime import datetime
+from sqlalchemy.orm import declared_attr
 from app import db
+from app.models.identifiers import new_id
+from app.models.types import BinaryUUID
 
 class BaseModel(db.Model):
     """
     Base class for all models using SQLAlchemy.
+    New IDs come from id_generator (see app.models.identifiers), which a
+    model can override, e.g. id_generator = 'uuid4' for random IDs.
     """
     __abstract__ = True
 
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id_generator = 'uuid7'
+
+    @declared_attr
+    def id(cls):
+        return db.Column(BinaryUUID, primary_key=True, default=cls.new_id)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -23,20 +32,31 @@ class BaseModel(db.Model):
         super().__init__(*args, **kwargs)
         
         if not self.id:
-            self.id = str(uuid.uuid4())
+            self.id = self.new_id()
         
         if not self.created_at:
             self.created_at = datetime.utcnow()
         if not self.updated_at:
             self.updated_at = datetime.utcnow()
 
+    @classmethod
+    def new_id(cls):
+        """
+        A new ID for this model.
+        """
+        return new_id(cls.id_generator)
+
     def save(self):
         """
         Update the updated_at timestamp and commit changes to the database.
+        Inside a unit of work the commit is left to the unit of work.
         """
+        from app.persistence.unit_of_work import in_unit_of_work
+
         self.updated_at = datetime.utcnow()
         db.session.add(self)
-        db.session.commit()
+        if not in_unit_of_work():
+            db.session.commit()
 
     def update(self, data):
         """
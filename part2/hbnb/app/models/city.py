@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+"""
+Module for the City class
+"""
+from sqlalchemy import event
+from app import db
+from app.models.base_model import BaseModel
+from app.models.names import name_key
+
+
+class City(BaseModel):
+    """
+    A city places are located in.
+    Names are unique ignoring case: name_key is the case-folded name.
+    place_count is kept up to date by the repositories (see
+    app.persistence.cities).
+    """
+    __tablename__ = 'cities'
+    __table_args__ = (
+        db.Index('ix_cities_name_key', 'name_key', unique=True),
+        db.Index('ix_cities_created_at_id', 'created_at', 'id'),
+    )
+
+    name = db.Column(db.String(128), nullable=False)
+    # Case folding can lengthen a name, hence the wider column
+    name_key = db.Column(db.String(384), nullable=False)
+    place_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initializes a new City
+        """
+        super().__init__(*args, **kwargs)
+        if self.place_count is None:
+            self.place_count = 0
+
+    def to_dict(self):
+        """
+        Returns a dictionary representation of the City instance
+        """
+        obj_dict = super().to_dict()
+        obj_dict.update({
+            "name": self.name,
+            "place_count": self.place_count,
+        })
+        return obj_dict
+
+
+@event.listens_for(City.name, 'set')
+def _set_name_key(city, value, oldvalue, initiator):
+    city.name_key = name_key(value)
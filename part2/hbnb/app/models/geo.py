@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+"""
+Geographic helpers: geohashes, great-circle distances and bounding boxes.
+
+A geohash interleaves longitude and latitude bits into a base32 string;
+places sharing a prefix lie in the same cell, so a B-tree index on the
+geohash column answers "which places are in this cell" with a range scan.
+"""
+import math
+from typing import List, Tuple
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Cells of about 4.8 m x 4.8 m
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """The geohash of a point, precision characters long"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def next_prefix(prefix: str):
+    """
+    The smallest geohash greater than every geohash starting with prefix,
+    or None when there is none ('zz...').
+    """
+    while prefix and prefix[-1] == BASE32[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[BASE32.index(prefix[-1]) + 1]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points, in kilometers"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class BoundingBox:
+    """
+    A latitude/longitude rectangle. west > east means the box crosses the
+    antimeridian (e.g. west=170, east=-170).
+    Raises ValueError on coordinates out of range.
+    """
+    def __init__(self, south: float, west: float, north: float, east: float):
+        if not (-90 <= south <= north <= 90):
+            raise ValueError("Latitudes must satisfy -90 <= south <= north <= 90.")
+        if not (-180 <= west <= 180 and -180 <= east <= 180):
+            raise ValueError("Longitudes must be between -180 and 180.")
+        self.south, self.west, self.north, self.east = south, west, north, east
+
+    @classmethod
+    def around(cls, latitude: float, longitude: float, radius_km: float) -> 'BoundingBox':
+        """The smallest box holding every point within radius_km of a point"""
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError("latitude must be between -90 and 90, longitude between -180 and 180.")
+        d_lat = radius_km / KM_PER_DEGREE
+        south, north = max(-90.0, latitude - d_lat), min(90.0, latitude + d_lat)
+        if south == -90.0 or north == 90.0:
+            # The circle covers a pole: every longitude
+            return cls(south, -180.0, north, 180.0)
+        d_lon = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM)
+                                           / math.cos(math.radians(latitude)))))
+        if d_lon >= 180 or radius_km / EARTH_RADIUS_KM >= math.pi / 2:
+            return cls(south, -180.0, north, 180.0)
+        west, east = longitude - d_lon, longitude + d_lon
+        if west < -180:
+            west += 360
+        if east > 180:
+            east -= 360
+        return cls(south, west, north, east)
+
+    @property
+    def width(self) -> float:
+        """Degrees of longitude the box spans"""
+        return self.east - self.west if self.west <= self.east else self.east - self.west + 360
+
+    @property
+    def height(self) -> float:
+        """Degrees of latitude the box spans"""
+        return self.north - self.south
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        longitude = self.west + self.width / 2
+        if longitude > 180:
+            longitude -= 360
+        return (self.south + self.north) / 2, longitude
+
+    def spans(self) -> List[Tuple[float, float]]:
+        """The longitude ranges of the box: two when it crosses the antimeridian"""
+        if self.west <= self.east:
+            return [(self.west, self.east)]
+        return [(self.west, 180.0), (-180.0, self.east)]
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        if latitude is None or longitude is None or not (self.south <= latitude <= self.north):
+            return False
+        return any(west <= longitude <= east for west, east in self.spans())
+
+    def geohash_cells(self, max_cells: int = 16) -> List[str]:
+        """
+        Geohash prefixes whose cells cover the box: the longest prefixes
+        for which at most max_cells cells are needed.
+        """
+        for precision in range(GEOHASH_PRECISION, 0, -1):
+            lon_bits, lat_bits = (5 * precision + 1) // 2, 5 * precision // 2
+            width, height = 360 / 2 ** lon_bits, 180 / 2 ** lat_bits
+            rows = range(min(int((self.south + 90) // height), 2 ** lat_bits - 1),
+                         min(int((self.north + 90) // height), 2 ** lat_bits - 1) + 1)
+            # Ranges, not lists: a wide box spans millions of fine columns
+            columns = [range(min(int((west + 180) // width), 2 ** lon_bits - 1),
+                             min(int((east + 180) // width), 2 ** lon_bits - 1) + 1)
+                       for west, east in self.spans()]
+            if len(rows) * sum(len(span) for span in columns) <= max_cells or precision == 1:
+                return sorted({encode_geohash(-90 + (row + 0.5) * height, -180 + (column + 0.5) * width, precision)
+                               for row in rows for span in columns for column in span})
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+"""
+ID generators
+
+uuid7() returns time-ordered UUIDs (RFC 9562, version 7): 48 bits of Unix
+time in milliseconds, then a 12-bit counter and 62 random bits. Their bytes
+(and canonical strings) sort by creation time, so new rows are appended at
+the end of the primary key index instead of at a random page.
+"""
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """
+    A version 7 UUID. IDs generated by this process are strictly increasing:
+    within one millisecond the counter is incremented, and when it overflows
+    the timestamp is borrowed from the next millisecond.
+    """
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            # Random start, leaving room to count up within the millisecond
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            ms = _last_ms
+            _counter += 1
+            if _counter > 0xFFF:
+                ms += 1
+                _counter = 0
+        _last_ms = ms
+        counter = _counter
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    value = (ms & ((1 << 48) - 1)) << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | rand_b
+    return uuid.UUID(int=value)
+
+
+ID_GENERATORS = {
+    'uuid4': uuid.uuid4,
+    'uuid7': uuid7,
+}
+
+
+def new_id(generator='uuid7'):
+    """
+    A new ID as a canonical string, from one of ID_GENERATORS.
+    """
+    try:
+        return str(ID_GENERATORS[generator]())
+    except KeyError:
+        raise ValueError(f"Unknown ID generator: {generator}") from None
@@ -0,0 +1,10 @@
+#!/usr/bin/python3
+"""
+Normalized forms of names, compared by case-insensitive searches.
+"""
+from typing import Optional
+
+
+def name_key(name: Optional[str]) -> Optional[str]:
+    """The form of a name that searches compare: trimmed and case-folded"""
+    return name.strip().casefold() if name is not None else None
@@ -2,24 +2,44 @@
 """
 Module for the Place class
 """
+from sqlalchemy import case, event
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import object_session
 from app import db
+from app.models.types import BinaryUUID
+from app.models.geo import encode_geohash
 from app.models.base_model import BaseModel
 
 # Table for the Many-to-Many relationship between Place and Amenity
 place_amenity = db.Table('place_amenity',
-    db.Column('place_id', db.String(36), db.ForeignKey('places.id'), primary_key=True),
-    db.Column('amenity_id', db.String(36), db.ForeignKey('amenities.id'), primary_key=True)
+    db.Column('place_id', BinaryUUID, db.ForeignKey('places.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('amenity_id', BinaryUUID, db.ForeignKey('amenities.id', ondelete='CASCADE'), primary_key=True),
+    # Places having an amenity (the primary key serves amenities of a place)
+    db.Index('ix_place_amenity_amenity_id_place_id', 'amenity_id', 'place_id')
 )
 
+# Columns counting the reviews of each number of stars, then every rating aggregate
+STAR_COLUMNS = ('rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+RATING_COLUMNS = ('review_count', 'rating_sum') + STAR_COLUMNS
+
 class Place(BaseModel):
     """
     Represents a place available for booking.
     """
     __tablename__ = 'places'
+    __table_args__ = (
+        db.Index('ix_places_user_id', 'user_id'),
+        db.Index('ix_places_city_name_price_by_night', 'city_name', 'price_by_night'),
+        db.Index('ix_places_city_id_price_by_night', 'city_id', 'price_by_night'),
+        db.Index('ix_places_created_at_id', 'created_at', 'id'),
+        db.Index('ix_places_price_by_night_id', 'price_by_night', 'id'),
+        db.Index('ix_places_geohash', 'geohash'),
+    )
 
     # Foreign Keys
-    # city_id = db.Column(db.String(36), db.ForeignKey('cities.id'), nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    # The city of city_name; deleting a city leaves its places without one
+    city_id = db.Column(BinaryUUID, db.ForeignKey('cities.id', ondelete='SET NULL'), nullable=True)
+    user_id = db.Column(BinaryUUID, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
 
     # Place Attributes
     name = db.Column(db.String(128), nullable=False)
@@ -32,20 +52,52 @@ class Place(BaseModel):
     price_by_night = db.Column(db.Integer, default=0, nullable=False)
     latitude = db.Column(db.Float, nullable=True)
     longitude = db.Column(db.Float, nullable=True)
-    user = db.relationship('User', backref='places')
-    
+    # Geohash of (latitude, longitude), kept up to date on flush
+    geohash = db.Column(db.String(12), nullable=True)
+    # Bitset of the amenities' bits (see Amenity.bit), kept up to date by
+    # the amenities collection
+    amenity_bits = db.Column(db.BigInteger, default=0, server_default='0', nullable=False)
+    # The database deletes the places of a deleted user (ON DELETE CASCADE)
+    user = db.relationship('User', backref=db.backref('places', passive_deletes='all'))
+
+    # Cascade delete, done by the database: deleting a place does not load its reviews
+    reviews = db.relationship('Review', backref='place', cascade='all, delete-orphan',
+                              passive_deletes=True, lazy=True)
 
-    # Cascade delete
-    reviews = db.relationship('Review', backref='place', cascade='all, delete-orphan', lazy=True)
-    
     # Many-to-Many relationship with Amenity
-    amenities = db.relationship('Amenity', secondary=place_amenity, viewonly=False, backref='places')
+    amenities = db.relationship('Amenity', secondary=place_amenity, viewonly=False,
+                                passive_deletes=True, backref=db.backref('places', passive_deletes=True))
+
+    # Rating aggregates of the reviews, kept in step by
+    # app.persistence.ratings: their number, the sum of their ratings and
+    # how many gave each number of stars
+    review_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_1 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_2 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_3 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_4 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_5 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
 
     def __init__(self, *args, **kwargs):
         """
         Initializes a new Place
         """
         super().__init__(*args, **kwargs)
+        if self.amenity_bits is None:
+            self.amenity_bits = 0
+        for name in RATING_COLUMNS:
+            if getattr(self, name) is None:
+                setattr(self, name, 0)
+
+    @hybrid_property
+    def average_rating(self):
+        """Mean rating of the reviews, None without reviews"""
+        return self.rating_sum / self.review_count if self.review_count else None
+
+    @average_rating.expression
+    def average_rating(cls):
+        return case((cls.review_count > 0, cls.rating_sum * 1.0 / cls.review_count), else_=None)
 
     def to_dict(self):
         """
@@ -53,6 +105,7 @@ class Place(BaseModel):
         """
         obj_dict = super().to_dict()
         obj_dict.update({
+            "city_id": self.city_id,
             "city_name": self.city_name,
             "user_id": self.user_id,
             "name": self.name,
@@ -82,4 +135,37 @@ class Place(BaseModel):
         Add an amenity to the place.
         """
         if amenity not in self.amenities:
-            self.amenities.append(amenity)
\ No newline at end of file
+            self.amenities.append(amenity)
+
+@event.listens_for(Place, 'before_insert')
+@event.listens_for(Place, 'before_update')
+def _update_geohash(mapper, connection, place):
+    """Derives the geohash column from the coordinates being written"""
+    if place.latitude is None or place.longitude is None:
+        place.geohash = None
+    else:
+        place.geohash = encode_geohash(place.latitude, place.longitude)
+
+
+def _bit_of(amenity):
+    """Amenity.bit, loaded if need be without flushing a place still being linked"""
+    session = object_session(amenity)
+    if session is None:
+        return amenity.bit
+    with session.no_autoflush:
+        return amenity.bit
+
+
+@event.listens_for(Place.amenities, 'append')
+def _set_amenity_bit(place, amenity, initiator):
+    """Sets the bit of an amenity linked to a place, whichever side linked them"""
+    bit = _bit_of(amenity)
+    if bit is not None:
+        place.amenity_bits = (place.amenity_bits or 0) | (1 << bit)
+
+
+@event.listens_for(Place.amenities, 'remove')
+def _clear_amenity_bit(place, amenity, initiator):
+    bit = _bit_of(amenity)
+    if bit is not None:
+        place.amenity_bits = (place.amenity_bits or 0) & ~(1 << bit)
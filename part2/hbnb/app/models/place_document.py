@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+"""
+Full-text documents of places.
+
+place_documents holds one row per place: its name, description, city and
+the text of all its reviews, kept up to date by the repositories (see
+app.persistence.text_search). The inverted index over it depends on the
+database and is created along with the table:
+- SQLite: the FTS5 table place_documents_fts, reading its content from
+  place_documents and kept in sync by triggers;
+- MySQL: a FULLTEXT index;
+- PostgreSQL: a GIN index on the documents' tsvector.
+"""
+from sqlalchemy import DDL, event
+from app import db
+from app.models.types import BinaryUUID
+
+TEXT_COLUMNS = ('name', 'description', 'city_name', 'reviews')
+
+place_documents = db.Table('place_documents',
+    db.Column('id', db.Integer, primary_key=True, autoincrement=True),
+    db.Column('place_id', BinaryUUID, db.ForeignKey('places.id', ondelete='CASCADE'),
+              nullable=False, unique=True),
+    db.Column('name', db.String(128), nullable=True),
+    db.Column('description', db.Text, nullable=True),
+    db.Column('city_name', db.String(128), nullable=True),
+    db.Column('reviews', db.Text, nullable=True),
+)
+
+_columns = ', '.join(TEXT_COLUMNS)
+_new_values = ', '.join(f"new.{column}" for column in TEXT_COLUMNS)
+_old_values = ', '.join(f"old.{column}" for column in TEXT_COLUMNS)
+
+# The tsvector PostgreSQL indexes; queries must use the same expression
+PG_DOCUMENT_VECTOR = "to_tsvector('simple', " + " || ' ' || ".join(
+    f"coalesce({column}, '')" for column in TEXT_COLUMNS) + ")"
+
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE place_documents_fts USING fts5({_columns}, "
+    f"content='place_documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER place_documents_ai AFTER INSERT ON place_documents BEGIN "
+    f"INSERT INTO place_documents_fts(rowid, {_columns}) VALUES (new.id, {_new_values}); END",
+    f"CREATE TRIGGER place_documents_ad AFTER DELETE ON place_documents BEGIN "
+    f"INSERT INTO place_documents_fts(place_documents_fts, rowid, {_columns}) "
+    f"VALUES ('delete', old.id, {_old_values}); END",
+    f"CREATE TRIGGER place_documents_au AFTER UPDATE ON place_documents BEGIN "
+    f"INSERT INTO place_documents_fts(place_documents_fts, rowid, {_columns}) "
+    f"VALUES ('delete', old.id, {_old_values}); "
+    f"INSERT INTO place_documents_fts(rowid, {_columns}) VALUES (new.id, {_new_values}); END",
+]
+
+for _statement in _SQLITE_DDL:
+    event.listen(place_documents, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(place_documents, 'after_create', DDL(
+    f"CREATE FULLTEXT INDEX ix_place_documents_fulltext ON place_documents ({_columns})"
+).execute_if(dialect='mysql'))
+event.listen(place_documents, 'after_create', DDL(
+    f"CREATE INDEX ix_place_documents_tsvector ON place_documents USING gin ({PG_DOCUMENT_VECTOR})"
+).execute_if(dialect='postgresql'))
+event.listen(place_documents, 'before_drop', DDL(
+    "DROP TABLE IF EXISTS place_documents_fts"
+).execute_if(dialect='sqlite'))
@@ -3,6 +3,7 @@
 Module for the Review class
 """
 from app import db
+from app.models.types import BinaryUUID
 from app.models.base_model import BaseModel
 
 class Review(BaseModel):
@@ -10,18 +11,23 @@ class Review(BaseModel):
     Represents a review of a place
     """
     __tablename__ = 'reviews'
+    __table_args__ = (
+        db.Index('ix_reviews_place_id_created_at', 'place_id', 'created_at'),
+        db.Index('ix_reviews_user_id', 'user_id'),
+        db.Index('ix_reviews_created_at_id', 'created_at', 'id'),
+    )
 
     # Content
     text = db.Column(db.String(1024), nullable=False)
     rating = db.Column(db.Integer, default=0, nullable=False)
 
     # Foreign Keys
-    place_id = db.Column(db.String(36), db.ForeignKey('places.id'), nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    place_id = db.Column(BinaryUUID, db.ForeignKey('places.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(BinaryUUID, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
 
     # Relationships
     
-    user = db.relationship('User', backref='reviews', lazy=True)
+    user = db.relationship('User', backref=db.backref('reviews', passive_deletes='all'), lazy=True)
 
     def __init__(self, *args, **kwargs):
         """
@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+"""
+Custom column types
+"""
+import uuid
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+
+class BinaryUUID(TypeDecorator):
+    """
+    A UUID stored in 16 bytes: the native UUID type on PostgreSQL,
+    BINARY(16) on MySQL and a 16-byte BLOB elsewhere.
+    Python code only ever sees canonical strings
+    ('xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx').
+
+    Bytes sort like the canonical strings, so ordering by (created_at, id)
+    is unchanged. A value that is not a UUID binds as NULL: looking it up
+    finds nothing, inserting it violates NOT NULL.
+    """
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        if dialect.name in ('mysql', 'mariadb'):
+            return dialect.type_descriptor(mysql.BINARY(16))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            value = value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+        except ValueError:
+            return None
+        if dialect.name == 'postgresql':
+            return str(value)
+        return value.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return str(uuid.UUID(bytes=bytes(value)))
+        return str(value)
@@ -2,21 +2,33 @@
 """
 Module for the User class
 """
+from sqlalchemy import event
 from app import db
 from app.extensions import bcrypt
 from app.models.base_model import BaseModel
+from app.models.names import name_key
 
 class User(BaseModel):
     """
     User class that inherits from BaseModel
     """
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+        db.Index('ix_users_first_name_key_id', 'first_name_key', 'id'),
+        db.Index('ix_users_last_name_key_id', 'last_name_key', 'id'),
+    )
 
     email = db.Column(db.String(120), nullable=False, unique=True)
     password = db.Column(db.String(128), nullable=False)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
+    # Case-insensitive forms of the names (see name_key), kept up to date
+    # whenever a name is set; name searches read their indexes. Case
+    # folding can lengthen a name (ß -> ss), hence the wider columns
+    first_name_key = db.Column(db.String(150), nullable=True)
+    last_name_key = db.Column(db.String(150), nullable=True)
 
     def __init__(self, *args, **kwargs):
         """
@@ -59,3 +71,13 @@ class User(BaseModel):
             del obj_dict["password"]
 
         return obj_dict
+
+
+@event.listens_for(User.first_name, 'set')
+def _set_first_name_key(user, value, oldvalue, initiator):
+    user.first_name_key = name_key(value)
+
+
+@event.listens_for(User.last_name, 'set')
+def _set_last_name_key(user, value, oldvalue, initiator):
+    user.last_name_key = name_key(value)
@@ -2,12 +2,41 @@
 """
 Initializes the persistence package.
 """
-from app.persistence.repository import SQLAlchemyRepository, UserRepository, PlaceRepository, ReviewRepository, AmenityRepository
+from app.persistence.repository import SQLAlchemyRepository, UserRepository, PlaceRepository, ReviewRepository, AmenityRepository, CityRepository
+from app.persistence.unit_of_work import unit_of_work, in_unit_of_work
+from app.persistence.cache import configure_repository_cache, cache_stats
+from app.persistence.pool import instrument_engine_options, pool_stats
+from app.persistence.columnar import configure_place_columns
+from app.persistence.async_repository import (
+    AsyncUserRepository, AsyncPlaceRepository, AsyncReviewRepository, AsyncAmenityRepository,
+    configure_async_engine, async_engines
+)
+from app.persistence.memory_repository import (
+    InMemoryUserRepository, InMemoryPlaceRepository, InMemoryReviewRepository, InMemoryAmenityRepository,
+    InMemoryCityRepository, configure_memory_snapshot
+)
 from app.models.place import Place
 from app.models.review import Review
 from app.models.amenity import Amenity
+from config import Config
 
-user_repository = UserRepository()
-place_repository = PlaceRepository()
-review_repository = ReviewRepository()
-amenity_repository = AmenityRepository()
+if Config.USE_DATABASE:
+    user_repository = UserRepository()
+    place_repository = PlaceRepository(user_repository)
+    review_repository = ReviewRepository()
+    amenity_repository = AmenityRepository()
+    city_repository = CityRepository()
+else:
+    user_repository = InMemoryUserRepository()
+    review_repository = InMemoryReviewRepository()
+    amenity_repository = InMemoryAmenityRepository()
+    city_repository = InMemoryCityRepository()
+    place_repository = InMemoryPlaceRepository(user_repository, review_repository, amenity_repository,
+                                               city_repository)
+
+repositories = [user_repository, place_repository, review_repository, amenity_repository, city_repository]
+
+async_user_repository = AsyncUserRepository(user_repository)
+async_place_repository = AsyncPlaceRepository(place_repository, async_user_repository)
+async_review_repository = AsyncReviewRepository(review_repository)
+async_amenity_repository = AsyncAmenityRepository(amenity_repository)
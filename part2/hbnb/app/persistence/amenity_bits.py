@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+"""
+Amenity bitsets.
+
+Each amenity owns one bit (Amenity.bit, the first AMENITY_BITS amenities
+only) and every place stores the bits of its amenities in
+Place.amenity_bits, maintained by the amenities collection events (see
+app.models.place). "Has all of these amenities" is then one bitwise AND per
+place instead of a join per amenity.
+
+New amenities, whether flushed or bulk upserted (see schedule()), get
+their bits from assign() just before the transaction commits, in a
+savepoint: when a concurrent transaction took the same bit first, the
+unique constraint on Amenity.bit rejects it and assign() runs again on
+the bits now in use, up to ASSIGN_ATTEMPTS times. An amenity left
+without a bit still filters correctly, through place_amenity. Deleting an
+amenity clears its bit from every place with clear() and frees it.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.amenity import AMENITY_BITS, Amenity
+from app.models.place import Place, place_amenity
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = 'amenity_bits_pending'
+
+ASSIGN_ATTEMPTS = 3
+
+
+def mask(bits: Iterable[int]) -> int:
+    """The bitset with the given bits set"""
+    result = 0
+    for bit in bits:
+        result |= 1 << bit
+    return result
+
+
+def split(amenity_ids: List[str], bits: Dict[str, Optional[int]]) -> Optional[Tuple[int, List[str]]]:
+    """
+    The mask of the requested amenities that own a bit, and the IDs of
+    those that do not; None when one of them does not exist. bits maps
+    amenity IDs to their bit.
+    """
+    if any(amenity_id not in bits for amenity_id in amenity_ids):
+        return None
+    return (mask(bits[amenity_id] for amenity_id in amenity_ids if bits[amenity_id] is not None),
+            [amenity_id for amenity_id in amenity_ids if bits[amenity_id] is None])
+
+
+def free_bits(used: Iterable[int]) -> List[int]:
+    used = set(used)
+    return [bit for bit in range(AMENITY_BITS) if bit not in used]
+
+
+def schedule(amenity_ids: Iterable[str], session: Session):
+    """Gives bits to those of these amenities that have none when the current transaction commits"""
+    session.info.setdefault(_PENDING_KEY, set()).update(amenity_ids)
+
+
+@event.listens_for(Session, 'before_flush')
+def _schedule_new_amenities(session, flush_context, instances):
+    schedule((obj.id for obj in session.new if isinstance(obj, Amenity) and obj.bit is None), session)
+
+
+# Before any other hook reads the places' bits
+@event.listens_for(Session, 'before_commit', insert=True)
+def _assign_pending(session):
+    if not session.info.get(_PENDING_KEY) and not any(isinstance(obj, Amenity) for obj in session.new):
+        return
+    session.flush()
+    amenity_ids = session.info.pop(_PENDING_KEY, None)
+    if not amenity_ids:
+        return
+    # A savepoint of the connection: the session's own would fire its
+    # after_commit hooks before the transaction commits
+    connection = session.connection()
+    for attempt in range(ASSIGN_ATTEMPTS):
+        try:
+            with connection.begin_nested():
+                assign(connection, amenity_ids)
+            break
+        except IntegrityError:
+            # A concurrent transaction took one of the bits
+            logger.info("Amenity bit taken concurrently, assigning again (attempt %d)", attempt + 1)
+    else:
+        logger.warning("Left %d amenities without a bit after %d attempts", len(amenity_ids), ASSIGN_ATTEMPTS)
+    # Written behind the session's back
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Amenity) and obj.id in amenity_ids:
+            session.expire(obj, ['bit'])
+        elif isinstance(obj, Place):
+            session.expire(obj, ['amenity_bits'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def assign(conn, amenity_ids: Iterable[str]):
+    """
+    Gives free bits to those of the amenities that have none (written
+    without the ORM), and sets them on the places already linked to them.
+    conn is a connection or a session.
+    """
+    amenity_ids = list(amenity_ids)
+    pending = conn.execute(
+        select(Amenity.id).where(Amenity.id.in_(amenity_ids), Amenity.bit.is_(None))
+        .order_by(Amenity.created_at, Amenity.id)
+    ).scalars().all()
+    if not pending:
+        return
+    # Locking read: the latest bits, even under REPEATABLE READ
+    used = conn.execute(select(Amenity.bit).where(Amenity.bit.is_not(None)).with_for_update()).scalars().all()
+    for amenity_id, bit in zip(pending, free_bits(used)):
+        conn.execute(update(Amenity).where(Amenity.id == amenity_id).values(bit=bit))
+        conn.execute(
+            update(Place)
+            .where(Place.id.in_(select(place_amenity.c.place_id).where(place_amenity.c.amenity_id == amenity_id)))
+            .values(amenity_bits=Place.amenity_bits.op('|')(1 << bit))
+        )
+
+
+def clear(conn, bits: Iterable[int]):
+    """Clears bits from every place, before their amenities are deleted"""
+    cleared = mask(bits)
+    if cleared:
+        conn.execute(
+            update(Place)
+            .where(Place.amenity_bits.op('&')(cleared) != 0)
+            .values(amenity_bits=Place.amenity_bits.op('&')(~cleared))
+        )
@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+"""
+Asyncio variant of the SQLAlchemy repositories, for read-heavy routes.
+
+Reads run on SQLAlchemy's asyncio engine, so a coroutine awaiting a slow
+query leaves the event loop free to serve others. Writes stay on the
+synchronous repositories, which own the unit of work and the cache
+invalidations.
+
+The engine uses the async driver of SQLALCHEMY_DATABASE_URI (or
+ASYNC_DATABASE_URI when set), with the pool profile of the synchronous
+engine (InstrumentedAsyncQueuePool, reported by pool_stats()). Its
+connections belong to the event loop of the ASGI server (see
+app/api/v1/asynchronous.py). Each replica bind gets an asyncio engine
+too; as with app/routing.py, the reads of a request all go to one
+replica. get() shares the cache of the synchronous repository, whose
+entries are plain column values, and never touches db.session.
+
+An in-memory SQLite database cannot be shared with another engine, so
+there (as when the async driver is missing) async_engine() is None and
+callers use the synchronous repositories instead.
+"""
+import asyncio
+import logging
+import random
+from typing import Any, Dict, List, Optional
+from flask import current_app, g
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm.attributes import set_committed_value
+from app.persistence import cache as repository_cache
+from app.persistence.pool import InstrumentedAsyncQueuePool
+from app.persistence.repository import (
+    DEFAULT_PAGE_SIZE, Page, PlaceRepository, after_cursor, canonical_id, clamp_page_size
+)
+from app.routing import REPLICA_BIND_PREFIX
+from app.persistence.projection import Projection
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.models.amenity import Amenity
+
+logger = logging.getLogger(__name__)
+
+# Async driver of each backend
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+_EXTENSION_KEY = 'async_sessionmaker'
+_REPLICAS_KEY = 'async_replica_sessionmakers'
+
+
+def async_database_uri(uri):
+    """
+    URI of the same database through its async driver, or None if the
+    database cannot be reached from a second engine.
+    """
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        return None
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        return None
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def _engine_options(options):
+    """Asyncio engine options of a synchronous engine's, pool profile included"""
+    options = {key: value for key, value in (options or {}).items() if key not in ('url', 'poolclass')}
+    if 'max_overflow' in options:
+        options['poolclass'] = InstrumentedAsyncQueuePool
+    return options
+
+
+def _sessionmaker(uri, options):
+    engine = create_async_engine(uri, **_engine_options(options))
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def configure_async_engine(app):
+    """
+    Creates the app's asyncio engines, if its database supports them.
+    """
+    app.extensions[_EXTENSION_KEY] = None
+    app.extensions[_REPLICAS_KEY] = []
+    uri = app.config.get('ASYNC_DATABASE_URI') or async_database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    if uri is None:
+        return
+    try:
+        primary = _sessionmaker(uri, app.config.get('SQLALCHEMY_ENGINE_OPTIONS'))
+        replicas = []
+        for key, bind in (app.config.get('SQLALCHEMY_BINDS') or {}).items():
+            if not key.startswith(REPLICA_BIND_PREFIX):
+                continue
+            options = bind if isinstance(bind, dict) else {'url': bind}
+            replica_uri = async_database_uri(options['url'])
+            if replica_uri is not None:
+                replicas.append(_sessionmaker(replica_uri, options))
+    except ImportError as e:
+        logger.warning("Async database driver unavailable, async routes read synchronously: %s", e)
+        return
+    app.extensions[_EXTENSION_KEY] = primary
+    app.extensions[_REPLICAS_KEY] = replicas
+
+
+def async_engine() -> Optional[AsyncEngine]:
+    """The current app's asyncio engine, or None"""
+    sessionmaker = current_app.extensions.get(_EXTENSION_KEY)
+    return sessionmaker.kw['bind'] if sessionmaker is not None else None
+
+
+def async_engines() -> Dict[str, AsyncEngine]:
+    """The current app's asyncio engines, primary and replicas, by name"""
+    primary = current_app.extensions.get(_EXTENSION_KEY)
+    if primary is None:
+        return {}
+    engines = {'async_primary': primary.kw['bind']}
+    for index, sessionmaker in enumerate(current_app.extensions.get(_REPLICAS_KEY, [])):
+        engines[f'async_{REPLICA_BIND_PREFIX}{index}'] = sessionmaker.kw['bind']
+    return engines
+
+
+class AsyncSQLAlchemyRepository:
+    """
+    Read-only asyncio counterpart of SQLAlchemyRepository.
+    Every call runs in its own session; the objects it returns are
+    detached, with everything the API marshals already loaded, those
+    get() rebuilds from the cache of the synchronous repository included.
+    """
+    def __init__(self, model, synchronous=None):
+        self.model = model
+        self.synchronous = synchronous
+
+    @staticmethod
+    def _session() -> AsyncSession:
+        """A session on the replica of the current request if there are replicas, else on the primary"""
+        replicas = current_app.extensions.get(_REPLICAS_KEY)
+        if replicas:
+            if 'async_replica' not in g:
+                g.async_replica = random.choice(replicas)
+            return g.async_replica()
+        return current_app.extensions[_EXTENSION_KEY]()
+
+    def _loader_options(self):
+        """Loader options applied to every read"""
+        return []
+
+    async def get(self, obj_id: Any) -> Optional[Any]:
+        cache = getattr(self.synchronous, 'cache', None)
+        key = canonical_id(obj_id) if cache is not None else None
+        if key is not None:
+            if repository_cache.sync_due():
+                # The poll is a blocking query on a connection of its own
+                await asyncio.to_thread(repository_cache.sync_caches)
+            found, values = cache.get(key)
+            if found:
+                if values is None:
+                    return None
+                obj = repository_cache.detached(self.model, values)
+                await self._on_cache_hit(obj)
+                return obj
+        async with self._session() as session:
+            obj = await session.get(self.model, obj_id, options=self._loader_options())
+        if key is not None:
+            if obj is None:
+                cache.set_missing(key)
+            else:
+                values = repository_cache.snapshot(obj)
+                if values is not None:
+                    cache.set(key, values)
+        return obj
+
+    async def _on_cache_hit(self, obj):
+        """Hook to load the relationships of an object rebuilt from the cache"""
+        pass
+
+    async def get_all(self) -> List[Any]:
+        async with self._session() as session:
+            return (await session.scalars(select(self.model).options(*self._loader_options()))).all()
+
+    async def get_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False) -> Page:
+        return await self._paginate(select(self.model), limit, cursor, include_total)
+
+    async def get_page_projection(self, fields, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False) -> Page:
+        """As SQLAlchemyRepository.get_page_projection"""
+        projection = Projection(self.model, fields, self._projected_expressions())
+        limit = clamp_page_size(limit)
+        async with self._session() as session:
+            total = None
+            if include_total:
+                total = await session.scalar(select(func.count()).select_from(self.model))
+            stmt = projection.statement()
+            if cursor:
+                stmt = stmt.where(after_cursor(self.model, cursor))
+            rows = (await session.execute(
+                stmt.order_by(self.model.created_at, self.model.id).limit(limit + 1))).all()
+            page = Page.from_rows(rows, limit, total)
+
+            collections = {}
+            if page.items:
+                for key, collection_stmt in projection.collection_statements([row.id for row in page.items]):
+                    collections[key] = (await session.execute(collection_stmt)).all()
+        page.items = projection.to_dicts(page.items, collections)
+        return page
+
+    def _projected_expressions(self):
+        """SQL expressions projections can select besides columns, by attribute"""
+        return {}
+
+    async def get_by_attribute(self, attr_name: str, attr_value: Any) -> Optional[Any]:
+        stmt = select(self.model).filter_by(**{attr_name: attr_value}).options(*self._loader_options())
+        async with self._session() as session:
+            return (await session.scalars(stmt.limit(1))).first()
+
+    async def _paginate(self, stmt, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False) -> Page:
+        """Keyset pagination ordered by (created_at, id), as SQLAlchemyRepository._paginate"""
+        limit = clamp_page_size(limit)
+        async with self._session() as session:
+            total = None
+            if include_total:
+                total = await session.scalar(select(func.count()).select_from(stmt.subquery()))
+            if cursor:
+                stmt = stmt.where(after_cursor(self.model, cursor))
+            stmt = (stmt.options(*self._loader_options())
+                    .order_by(self.model.created_at, self.model.id)
+                    .limit(limit + 1))
+            rows = (await session.scalars(stmt)).all()
+        return Page.from_rows(rows, limit, total)
+
+
+class AsyncUserRepository(AsyncSQLAlchemyRepository):
+    def __init__(self, synchronous=None):
+        super().__init__(User, synchronous)
+
+
+class AsyncPlaceRepository(AsyncSQLAlchemyRepository):
+    """
+    Places come with their owner and amenities, loaded with the same
+    options as PlaceRepository.
+    """
+    def __init__(self, synchronous=None, user_repository=None):
+        super().__init__(Place, synchronous)
+        self.user_repository = user_repository or AsyncUserRepository()
+
+    def _loader_options(self):
+        return PlaceRepository._loader_options()
+
+    def _projected_expressions(self):
+        return {'average_rating': Place.average_rating}
+
+    async def _on_cache_hit(self, place):
+        # Resolve the owner through the (cached) user repository
+        set_committed_value(place, 'user', await self.user_repository.get(place.user_id))
+        stmt = select(Amenity).select_from(Place).join(Place.amenities).where(Place.id == place.id)
+        async with self._session() as session:
+            set_committed_value(place, 'amenities', (await session.scalars(stmt)).all())
+
+
+class AsyncReviewRepository(AsyncSQLAlchemyRepository):
+    def __init__(self, synchronous=None):
+        super().__init__(Review, synchronous)
+
+    async def get_by_place(self, place_id: str) -> List[Review]:
+        """Get all reviews for a specific place"""
+        async with self._session() as session:
+            return (await session.scalars(select(Review).filter_by(place_id=place_id))).all()
+
+
+class AsyncAmenityRepository(AsyncSQLAlchemyRepository):
+    def __init__(self, synchronous=None):
+        super().__init__(Amenity, synchronous)
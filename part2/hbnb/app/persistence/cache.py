@@ -0,0 +1,316 @@
+#!/usr/bin/python3
+"""
+Read-through cache for SQLAlchemyRepository.get
+
+Each repository can own an LRU cache of column snapshots keyed by ID.
+Entries expire after a TTL; lookups that found nothing are cached too, for
+a shorter TTL. On a hit the snapshot is turned back into a persistent
+instance of the current session without touching the database.
+
+Writes going through the repositories invalidate the local entry once the
+transaction commits, and record the invalidation in the
+cache_invalidations table in the same transaction. Every worker polls that
+table (at most once per REPOSITORY_CACHE_SYNC_INTERVAL seconds) and drops
+the entries other workers wrote to, so no worker keeps serving an object
+for longer than the sync interval after it changed. Other in-process
+copies of the data (see app.persistence.columnar) subscribe() to the
+invalidations of an entity the same way.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect, select, delete, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = 'cache_pending_invalidations'
+_MISSING = object()
+
+# More invalidations than this in one poll: drop everything instead
+MAX_SYNC_ROWS = 1000
+
+
+class CacheInvalidation(db.Model):
+    """
+    Log of writes, read by every worker to invalidate its own caches.
+    obj_id is NULL when the whole entity must be dropped (bulk writes).
+    """
+    __tablename__ = 'cache_invalidations'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity = db.Column(db.String(64), nullable=False)
+    obj_id = db.Column(db.String(36), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a time-to-live per entry.
+    """
+    def __init__(self, max_size=1024, ttl=30.0, negative_ttl=5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        Returns (found, value). A cached negative lookup is (True, None).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            if entry[0] is _MISSING:
+                self.negative_hits += 1
+                return True, None
+            self.hits += 1
+            return True, entry[0]
+
+    def set(self, key, value):
+        self._store(key, value, self.ttl)
+
+    def set_missing(self, key):
+        self._store(key, _MISSING, self.negative_ttl)
+
+    def _store(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class _CacheSync:
+    """
+    Polls cache_invalidations and applies other workers' writes.
+    """
+    def __init__(self):
+        self.caches = {}
+        # Callbacks of subscribe(), by entity
+        self.listeners = {}
+        self.interval = 1.0
+        self.retention = timedelta(hours=1)
+        self._last_id = None
+        self._next_sync = 0.0
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._last_id = None
+            self._next_sync = 0.0
+            self._next_prune = 0.0
+
+    def due(self):
+        return bool(self.caches or self.listeners) and time.monotonic() >= self._next_sync
+
+    def sync(self):
+        now = time.monotonic()
+        if not (self.caches or self.listeners) or now < self._next_sync or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sync = now + self.interval
+            # A separate connection, so the poll never reads through (or holds
+            # open) the snapshot of the request's own transaction.
+            with db.engine.connect() as conn:
+                if self._last_id is None:
+                    self._last_id = conn.execute(select(func.max(CacheInvalidation.id))).scalar() or 0
+                    return
+                rows = conn.execute(
+                    select(CacheInvalidation.id, CacheInvalidation.entity, CacheInvalidation.obj_id)
+                    .where(CacheInvalidation.id > self._last_id)
+                    .order_by(CacheInvalidation.id)
+                    .limit(MAX_SYNC_ROWS + 1)
+                ).all()
+                if len(rows) > MAX_SYNC_ROWS:
+                    self._last_id = conn.execute(select(func.max(CacheInvalidation.id))).scalar()
+                    self.drop_all()
+                else:
+                    for row in rows:
+                        _invalidate_local(row.entity, row.obj_id)
+                        _notify(row.entity, row.obj_id)
+                    if rows:
+                        self._last_id = rows[-1].id
+
+                if now >= self._next_prune:
+                    self._next_prune = now + self.retention.total_seconds() / 4
+                    conn.execute(delete(CacheInvalidation).where(
+                        CacheInvalidation.created_at < datetime.utcnow() - self.retention))
+                    conn.commit()
+        except SQLAlchemyError as e:
+            # Without the log we cannot tell what changed: play safe
+            logger.warning("Repository cache sync failed, clearing caches: %s", e)
+            self.drop_all()
+        finally:
+            self._lock.release()
+
+    def drop_all(self):
+        for cache in self.caches.values():
+            cache.clear()
+        for listener in self.listeners.values():
+            listener(None)
+
+
+_sync = _CacheSync()
+
+
+def configure_repository_cache(app, repositories):
+    """
+    Attaches a cache to every repository when REPOSITORY_CACHE_SIZE > 0.
+    """
+    size = app.config.get('REPOSITORY_CACHE_SIZE', 0)
+    _sync.caches.clear()
+    _sync.listeners.clear()
+    _sync.reset()
+    for repository in repositories:
+        repository.cache = None
+        if size > 0:
+            repository.cache = LRUCache(
+                max_size=size,
+                ttl=app.config.get('REPOSITORY_CACHE_TTL', 30.0),
+                negative_ttl=app.config.get('REPOSITORY_CACHE_NEGATIVE_TTL', 5.0),
+            )
+            _sync.caches[repository.model.__tablename__] = repository.cache
+    _sync.interval = app.config.get('REPOSITORY_CACHE_SYNC_INTERVAL', 1.0)
+
+
+def sync_caches():
+    """
+    Applies invalidations written by other workers (throttled).
+    """
+    _sync.sync()
+
+
+def subscribe(entity, listener):
+    """
+    Calls listener(obj_id) with every invalidation of entity the poll
+    reads, the ones this worker wrote included; obj_id is None when all
+    of them must be dropped. invalidate() logs the entity from then on.
+    """
+    _sync.listeners[entity] = listener
+
+
+def sync_due():
+    """
+    Whether sync_caches() would poll the invalidation log now.
+    """
+    return _sync.due()
+
+
+def cache_stats():
+    """
+    Hit/miss counters of every repository cache, by table name.
+    """
+    return {entity: cache.stats() for entity, cache in _sync.caches.items()}
+
+
+def invalidate(entity, obj_id=None):
+    """
+    Schedules the invalidation of one cached object (or of the whole entity
+    when obj_id is None) for when the current transaction commits.
+    """
+    if entity not in _sync.caches and entity not in _sync.listeners:
+        return
+    db.session.info.setdefault(_PENDING_KEY, set()).add((entity, obj_id))
+    db.session.add(CacheInvalidation(entity=entity, obj_id=obj_id))
+
+
+def _invalidate_local(entity, obj_id):
+    cache = _sync.caches.get(entity)
+    if cache is None:
+        return
+    if obj_id is None:
+        cache.clear()
+    else:
+        cache.invalidate(obj_id)
+
+
+def _notify(entity, obj_id):
+    listener = _sync.listeners.get(entity)
+    if listener is not None:
+        listener(obj_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending_invalidations(session):
+    for entity, obj_id in session.info.pop(_PENDING_KEY, ()):
+        _invalidate_local(entity, obj_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_invalidations(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def snapshot(obj):
+    """
+    Column values of a loaded object, or None if some were not loaded.
+    """
+    state = inspect(obj)
+    keys = [attr.key for attr in state.mapper.column_attrs]
+    if any(key in state.unloaded for key in keys):
+        return None
+    return {key: state.dict.get(key) for key in keys}
+
+
+def detached(model, values):
+    """
+    Rebuilds a detached instance from a snapshot, relationships unloaded.
+    """
+    obj = model.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(obj, key, value)
+    make_transient_to_detached(obj)
+    return obj
+
+
+def hydrate(model, values):
+    """
+    Rebuilds a persistent instance of the current session from a snapshot.
+    Relationships are left unloaded and load lazily on first access.
+    """
+    obj = detached(model, values)
+    db.session.add(obj)
+    return obj
@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+"""
+City place counts and the city name autocomplete index.
+
+Repositories call schedule() with the IDs of the cities a write touches:
+a city written, a place created, moved or deleted, the places of a deleted
+user. Just before the transaction commits, the place_count of those
+cities is recounted from places (read from ix_places_city_id_price_by_night),
+so bulk deletes and ON DELETE CASCADE leave exact counts too.
+
+CityIndex keeps the (name key, id) pairs of every city in a sorted array:
+the cities whose name starts with a prefix are one binary search away.
+The database repositories share one index per process. Once a transaction
+commits, the index applies that transaction's city changes. It is reloaded
+from the database when older than its TTL, which bounds how long cities
+written by other workers stay out of it.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Iterable, List, NamedTuple, Optional
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+from app import db
+from app.models.city import City
+from app.models.names import name_key
+from app.models.place import Place
+from app.persistence import cache as repository_cache
+
+_PENDING_KEY = 'cities_pending_recounts'
+_CHANGED_KEY = 'cities_index_changes'
+
+CHUNK_SIZE = 500
+
+
+class CityEntry(NamedTuple):
+    id: str
+    name: str
+    place_count: int
+
+
+class CityIndex:
+    """
+    Cities sorted by name key, for prefix lookups in O(log n + limit).
+    """
+    def __init__(self):
+        self._keys = []
+        self._cities = {}
+        self._lock = threading.Lock()
+        self.loaded_at = None
+
+    def expired(self, ttl: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > ttl
+
+    def expire(self):
+        """Makes the next lookup reload the index"""
+        self.loaded_at = None
+
+    def load(self, entries: Iterable[CityEntry]):
+        """Replaces the whole index"""
+        cities = {entry.id: (name_key(entry.name), CityEntry(*entry)) for entry in entries}
+        keys = sorted((key, city_id) for city_id, (key, _) in cities.items())
+        with self._lock:
+            self._cities, self._keys = cities, keys
+            self.loaded_at = time.monotonic()
+
+    def put(self, entry: CityEntry):
+        with self._lock:
+            self._discard(entry.id)
+            key = name_key(entry.name)
+            self._cities[entry.id] = (key, CityEntry(*entry))
+            insort(self._keys, (key, entry.id))
+
+    def remove(self, city_id: str):
+        with self._lock:
+            self._discard(city_id)
+
+    def _discard(self, city_id):
+        known = self._cities.pop(city_id, None)
+        if known is not None:
+            self._keys.pop(bisect_left(self._keys, (known[0], city_id)))
+
+    def complete(self, prefix: str, limit: int) -> List[CityEntry]:
+        """The first limit cities, by name, whose name starts with prefix (ignoring case)"""
+        key = name_key(prefix)
+        with self._lock:
+            keys = self._keys
+            matches = []
+            for index in range(bisect_left(keys, (key,)), len(keys)):
+                if len(matches) == limit or not keys[index][0].startswith(key):
+                    break
+                matches.append(self._cities[keys[index][1]][1])
+        return matches
+
+    def __len__(self):
+        return len(self._cities)
+
+
+# Index of the cities stored in the database, shared by this process
+index = CityIndex()
+
+
+def schedule(city_ids: Iterable[Optional[str]]):
+    """Recounts the places of these cities when the current transaction commits"""
+    db.session.info.setdefault(_PENDING_KEY, set()).update(
+        city_id for city_id in city_ids if city_id is not None)
+
+
+@event.listens_for(Session, 'before_commit')
+def _recount_pending(session):
+    city_ids = session.info.pop(_PENDING_KEY, None)
+    if not city_ids:
+        return
+    session.flush()
+    recount(session, city_ids)
+    rows = []
+    city_ids = list(city_ids)
+    for start in range(0, len(city_ids), CHUNK_SIZE):
+        rows += session.execute(select(City.id, City.name, City.place_count)
+                                .where(City.id.in_(city_ids[start:start + CHUNK_SIZE]))).all()
+    for city_id in city_ids:
+        repository_cache.invalidate(City.__tablename__, str(city_id))
+    session.info[_CHANGED_KEY] = (city_ids, rows)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_index_changes(session):
+    changes = session.info.pop(_CHANGED_KEY, None)
+    if changes is None or index.loaded_at is None:
+        return
+    city_ids, rows = changes
+    found = set()
+    for row in rows:
+        index.put(CityEntry(row.id, row.name, row.place_count))
+        found.add(row.id)
+    for city_id in city_ids:
+        if city_id not in found:
+            index.remove(city_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_CHANGED_KEY, None)
+
+
+def recount(conn, city_ids: Iterable[str]):
+    """
+    Sets the place_count of the given cities to their number of places.
+    conn is a connection or a session.
+    """
+    cities = City.__table__
+    places = Place.__table__
+    count = (select(func.count()).select_from(places)
+             .where(places.c.city_id == cities.c.id).scalar_subquery())
+    city_ids = list(city_ids)
+    for start in range(0, len(city_ids), CHUNK_SIZE):
+        conn.execute(update(cities).where(cities.c.id.in_(city_ids[start:start + CHUNK_SIZE]))
+                     .values(place_count=count))
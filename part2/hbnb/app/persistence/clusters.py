@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+"""
+Map marker clusters.
+
+The world is cut into a grid of 2**level columns of longitude by 2**level
+rows of latitude, for each level up to BITS. A place's geokey interleaves
+the bits of its column and row at the finest level, longitude first like
+a geohash, so the cell of a coarser level is a prefix of the key and its
+places are one run of the keys in order.
+
+The place snapshot (see app.persistence.columnar) keeps its rows in
+geokey order; ClusterIndex folds that order into the cells of a level
+(place count, coordinate sums, lowest price) in one pass and keeps them
+for as long as the snapshot's columns live. A map request then only
+looks up the cells its viewport covers: the response grows with the
+viewport, never with the catalog. The level is the map zoom plus
+LEVEL_OFFSET (four cells across a 256-pixel tile), lowered until the
+viewport covers at most MAX_CELLS cells; the first level tried is read
+off the viewport's width and height.
+
+Without a snapshot the database groups the places itself, on a prefix
+of their geohash column: a geohash interleaves the same bits, five to a
+character, so the characters holding a level's 2 * level bits group the
+places into cells of that level or up to 16 times finer. Only one row
+per group comes back (count, coordinate sums, lowest price), and
+grouped() folds the finer groups into cells.
+"""
+import math
+import threading
+import weakref
+from typing import List, NamedTuple
+import numpy as np
+from sqlalchemy import func, select
+from app.models.geo import BASE32, BoundingBox
+from app.models.place import Place
+
+BITS = 22
+LEVEL_OFFSET = 2
+MAX_ZOOM = BITS - LEVEL_OFFSET
+MAX_CELLS = 1024
+NO_KEY = -1
+
+
+class Cluster(NamedTuple):
+    """The places of one grid cell: their number, centroid and lowest price, and the cell's bounds"""
+    count: int
+    latitude: float
+    longitude: float
+    min_price: int
+    south: float
+    west: float
+    north: float
+    east: float
+
+
+class Level(NamedTuple):
+    """The non-empty cells of a level, by key, and their aggregates"""
+    keys: np.ndarray
+    counts: np.ndarray
+    latitude_sums: np.ndarray
+    longitude_sums: np.ndarray
+    min_prices: np.ndarray
+
+
+def _spread(values: np.ndarray) -> np.ndarray:
+    """Moves bit i of each value to bit 2i"""
+    values = values.astype(np.uint64)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def _columns(longitude, level: int) -> np.ndarray:
+    return np.clip(np.floor((np.asarray(longitude, dtype=float) + 180) / 360 * 2 ** level), 0, 2 ** level - 1)
+
+
+def _rows(latitude, level: int) -> np.ndarray:
+    return np.clip(np.floor((np.asarray(latitude, dtype=float) + 90) / 180 * 2 ** level), 0, 2 ** level - 1)
+
+
+def _keys(columns: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    return ((_spread(columns) << np.uint64(1)) | _spread(rows)).astype(np.int64)
+
+
+def geokeys(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """Geokey of each point, NO_KEY without coordinates"""
+    located = ~(np.isnan(latitude) | np.isnan(longitude))
+    keys = _keys(_columns(np.nan_to_num(longitude), BITS), _rows(np.nan_to_num(latitude), BITS))
+    return np.where(located, keys, NO_KEY)
+
+
+def level_for(zoom: int, bbox: BoundingBox) -> int:
+    """
+    The level of a zoom, lowered until bbox covers at most MAX_CELLS cells.
+    Starts at the finest level where bbox's area is at most MAX_CELLS cells
+    (sqrt(MAX_CELLS) cells to a side of a square viewport): no finer one
+    fits, and the cells on the edges can only cost a few steps down.
+    """
+    level = min(zoom + LEVEL_OFFSET, BITS)
+    area = bbox.width * bbox.height
+    if area > 0:
+        level = min(level, max(0, math.floor(math.log2(MAX_CELLS * 360 * 180 / area) / 2)))
+    while level > 0 and _cell_count(bbox, level) > MAX_CELLS:
+        level -= 1
+    return level
+
+
+def _cell_count(bbox: BoundingBox, level: int) -> int:
+    """How many cells of a level bbox covers, counted without listing them"""
+    columns = sum(int(_columns(east, level) - _columns(west, level)) + 1 for west, east in bbox.spans())
+    rows = int(_rows(bbox.north, level) - _rows(bbox.south, level)) + 1
+    return min(columns, 2 ** level) * rows
+
+
+def viewport(bbox: BoundingBox, level: int):
+    """The columns and rows of the cells of a level bbox covers"""
+    columns = []
+    for west, east in bbox.spans():
+        columns.append(np.arange(_columns(west, level), _columns(east, level) + 1))
+    rows = np.arange(_rows(bbox.south, level), _rows(bbox.north, level) + 1)
+    return np.unique(np.concatenate(columns)), rows
+
+
+def cover(bbox: BoundingBox, level: int) -> BoundingBox:
+    """The box of the cells of a level bbox covers"""
+    width, height = 360 / 2 ** level, 180 / 2 ** level
+    columns, rows = viewport(bbox, level)
+    south, north = rows[0] * height - 90, min(90.0, (rows[-1] + 1) * height - 90)
+    if len(columns) == 2 ** level:
+        return BoundingBox(south, -180.0, north, 180.0)
+    spans = [(_columns(west, level), _columns(east, level)) for west, east in bbox.spans()]
+    return BoundingBox(south, spans[0][0] * width - 180, north, min(180.0, (spans[-1][1] + 1) * width - 180))
+
+
+def aggregate(keys: np.ndarray, latitude: np.ndarray, longitude: np.ndarray, price: np.ndarray,
+              level: int) -> Level:
+    """The cells of a level of places given in geokey order, keys of NO_KEY left out"""
+    start = np.searchsorted(keys, 0)
+    cells = keys[start:] >> (2 * (BITS - level))
+    if not len(cells):
+        return _empty_level()
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(cells)) + 1))
+    return Level(cells[starts], np.diff(np.append(starts, len(cells))),
+                 np.add.reduceat(latitude[start:], starts), np.add.reduceat(longitude[start:], starts),
+                 np.minimum.reduceat(price[start:], starts))
+
+
+def _empty_level() -> Level:
+    empty = np.empty(0)
+    return Level(empty.astype(np.int64), empty.astype(np.int64), empty, empty, empty.astype(np.int64))
+
+
+def grouped(session, criteria, level: int) -> Level:
+    """
+    The cells of a level of the places matching criteria, grouped by the
+    database on a prefix of their geohash.
+    """
+    length = math.ceil(2 * level / 5)
+    prefix = func.substr(Place.geohash, 1, length)
+    rows = session.execute(
+        select(prefix, func.count(), func.sum(Place.latitude), func.sum(Place.longitude),
+               func.min(Place.price_by_night))
+        .where(Place.geohash.is_not(None), *criteria)
+        .group_by(prefix)
+    ).all()
+    if not rows:
+        return _empty_level()
+    # The cell's key is the prefix's leading 2 * level bits
+    digits = {char: value for value, char in enumerate(BASE32)}
+    keys = np.array([_prefix_bits(row[0], digits) >> (5 * length - 2 * level) for row in rows], dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    values = np.array([tuple(row[1:]) for row in rows], dtype=float)[order]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    return Level(keys[starts], np.add.reduceat(values[:, 0], starts).astype(np.int64),
+                 np.add.reduceat(values[:, 1], starts), np.add.reduceat(values[:, 2], starts),
+                 np.minimum.reduceat(values[:, 3], starts).astype(np.int64))
+
+
+def _prefix_bits(prefix: str, digits) -> int:
+    value = 0
+    for char in prefix:
+        value = value << 5 | digits[char]
+    return value
+
+
+class ClusterIndex:
+    """The levels aggregated so far of each live PlaceColumns"""
+    def __init__(self):
+        self._levels = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def level(self, columns, level: int) -> Level:
+        with self._lock:
+            levels = self._levels.setdefault(columns, {})
+            if level not in levels:
+                order, keys = columns.orders['geokey']
+                levels[level] = aggregate(keys, columns.latitude[order], columns.longitude[order],
+                                          columns.price_by_night[order], level)
+            return levels[level]
+
+
+# Aggregates of the place snapshots of this process
+index = ClusterIndex()
+
+
+def in_viewport(columns, bbox: BoundingBox, zoom: int) -> List[Cluster]:
+    """The non-empty cells bbox covers at a map zoom, by column then row"""
+    level = level_for(zoom, bbox)
+    return cells_in(index.level(columns, level), bbox, level)
+
+
+def cells_in(aggregates: Level, bbox: BoundingBox, level: int) -> List[Cluster]:
+    """The non-empty cells of a level bbox covers, by column then row"""
+    cell_columns, cell_rows = viewport(bbox, level)
+    grid_columns, grid_rows = np.repeat(cell_columns, len(cell_rows)), np.tile(cell_rows, len(cell_columns))
+    wanted = _keys(grid_columns, grid_rows)
+    at = np.minimum(np.searchsorted(aggregates.keys, wanted), max(len(aggregates.keys) - 1, 0))
+    found = aggregates.keys[at] == wanted if len(aggregates.keys) else np.zeros(len(wanted), dtype=bool)
+    width, height = 360 / 2 ** level, 180 / 2 ** level
+    result = []
+    for cell, column, row in zip(at[found], grid_columns[found], grid_rows[found]):
+        count = int(aggregates.counts[cell])
+        result.append(Cluster(count, float(aggregates.latitude_sums[cell] / count),
+                              float(aggregates.longitude_sums[cell] / count), int(aggregates.min_prices[cell]),
+                              float(row * height - 90), float(column * width - 180),
+                              float((row + 1) * height - 90), float((column + 1) * width - 180)))
+    return result
@@ -0,0 +1,523 @@
+#!/usr/bin/python3
+"""
+Columnar snapshot of the place catalog.
+
+PlaceColumns keeps the fields place searches filter and sort on in
+parallel NumPy arrays, one element per place: price, capacity, rooms,
+coordinates, amenity bitset (see app.persistence.amenity_bits), city,
+average rating and creation time. A search is then a few vectorized
+comparisons over the arrays, and its page a partial sort of the matches,
+without a round trip to the database. A grid cell derived from the
+coordinates (CELL_DEGREES wide) groups the places near each other, and
+the rows of a city or a cell are one range of its sort order (see
+rows_of()). The geokey order (see app.persistence.clusters) is the one
+the map clusters are folded from.
+
+Rows are kept ordered by place ID. Ties of a sort order are broken by ID
+like the SQL (attribute, id) orders, so a row's position breaks them, and
+a cursor's ID is found with a binary search.
+
+The database repositories share one ColumnSnapshot per process.
+Repositories call schedule() with the places a write touches, including
+the places of written reviews (their rating, read from the aggregates
+app.persistence.ratings keeps on the place); just before the transaction
+commits their rows are read again, and once it commits the snapshot
+swaps in a copy of the arrays with those rows replaced. Readers keep
+using the arrays they started with.
+
+The same transaction logs the written places in the cache invalidation
+table (see app.persistence.cache), which every worker polls: the places
+other workers wrote are read again by a background thread, one refresh
+at a time, as is the whole snapshot once older than its TTL. Until its
+first load, or while amenity bits were given or freed since, the
+snapshot serves nothing and searches go to the database.
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from flask import current_app
+from sqlalchemy import LargeBinary, event, select, type_coerce
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app import db
+from app.models.amenity import Amenity
+from app.models.place import Place
+from app.persistence import amenity_bits, clusters
+from app.persistence import cache as repository_cache
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = 'columns_pending_places'
+_CHANGED_KEY = 'columns_changed_places'
+
+CHUNK_SIZE = 500
+# Entity of the invalidations logged for the snapshot; past
+# MAX_LOGGED_PLACES places, one transaction logs a whole reload instead
+ENTITY = 'place_columns'
+MAX_LOGGED_PLACES = 100
+EPOCH = datetime(1970, 1, 1)
+
+# Array of each field; created_at holds microseconds since the epoch,
+# city a code of city_id (-1 for none), rating NaN for places without reviews
+FIELDS = {
+    'created_at': np.int64,
+    'price_by_night': np.int64,
+    'max_guest': np.int32,
+    'number_rooms': np.int32,
+    'latitude': np.float64,
+    'longitude': np.float64,
+    'amenity_bits': np.int64,
+    'city': np.int32,
+    'rating': np.float64,
+}
+NO_CITY = -1
+# Derived array: the grid cell of the coordinates, -1 for none
+CELL_DEGREES = 0.5
+CELL_COLUMNS = int(360 / CELL_DEGREES)
+CELL_ROWS = int(180 / CELL_DEGREES)
+NO_CELL = -1
+# Attributes kept sorted: those of the place sort orders, the city and
+# cell groups, then the geokey of the map clusters
+SORTED = ('created_at', 'price_by_night', 'city', 'cell', 'geokey')
+
+
+def id_bytes(value) -> bytes:
+    """The 16 bytes of a UUID, as the driver or the ORM returns it"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+    return uuid.UUID(str(value)).bytes
+
+
+def id_string(raw) -> str:
+    # NumPy drops the trailing NUL bytes of 'S' values
+    return str(uuid.UUID(bytes=bytes(raw).ljust(16, b'\0')))
+
+
+def to_micros(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def cells(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """Grid cell of each point: row (from the south pole) * CELL_COLUMNS + column (from -180)"""
+    located = ~(np.isnan(latitude) | np.isnan(longitude))
+    row = np.clip(np.floor((np.nan_to_num(latitude) + 90) / CELL_DEGREES), 0, CELL_ROWS - 1)
+    column = np.floor((np.nan_to_num(longitude) + 180) / CELL_DEGREES) % CELL_COLUMNS
+    return np.where(located, row * CELL_COLUMNS + column, NO_CELL).astype(np.int64)
+
+
+def cell_of(latitude: Optional[float], longitude: Optional[float]) -> int:
+    """The grid cell of one point, NO_CELL without coordinates"""
+    if latitude is None or longitude is None:
+        return NO_CELL
+    return int(cells(np.array([latitude], dtype=float), np.array([longitude], dtype=float))[0])
+
+
+def supports(search) -> bool:
+    """Whether the snapshot holds every field a PlaceSearch reads"""
+    return not search.words and search.city_name is None
+
+
+def rows_statement():
+    """Rows of the snapshot, IDs read as raw bytes"""
+    return select(type_coerce(Place.id, LargeBinary), Place.created_at, Place.price_by_night, Place.max_guest,
+                  Place.number_rooms, Place.latitude, Place.longitude, Place.amenity_bits,
+                  type_coerce(Place.city_id, LargeBinary), Place.average_rating)
+
+
+def read_rows(conn, place_ids: Optional[Iterable[str]] = None) -> List[tuple]:
+    """The rows of the given places that exist, or of every place"""
+    if place_ids is None:
+        return conn.execute(rows_statement()).all()
+    place_ids = list(place_ids)
+    rows = []
+    for start in range(0, len(place_ids), CHUNK_SIZE):
+        rows += conn.execute(rows_statement().where(Place.id.in_(place_ids[start:start + CHUNK_SIZE]))).all()
+    return rows
+
+
+def read_bits(conn) -> Dict[int, str]:
+    """The amenity IDs of the bits given, by bit"""
+    return dict(conn.execute(select(Amenity.bit, Amenity.id).where(Amenity.bit.is_not(None))).all())
+
+
+def place_row(place) -> tuple:
+    """The row rows_statement() reads for a loaded place"""
+    return (place.id, place.created_at, place.price_by_night, place.max_guest, place.number_rooms,
+            place.latitude, place.longitude, place.amenity_bits, place.city_id, place.average_rating)
+
+
+class PlaceColumns:
+    """
+    Arrays of FIELDS, cell and geokey, plus ids (16-byte place IDs, sorted). cities maps
+    the raw city IDs to their code. orders holds, for each attribute of
+    SORTED, the rows in (attribute, id) order and their values in that
+    order. Never modified once built: writes build a new one with merged().
+    """
+    def __init__(self, ids: np.ndarray, arrays: Dict[str, np.ndarray], cities: Dict[bytes, int],
+                 orders: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None):
+        self.ids = ids
+        self.arrays = arrays
+        self.cities = cities
+        if orders is None:
+            # Rows are in ID order, which a stable sort keeps among ties
+            orders = {}
+            for name in SORTED:
+                order = np.argsort(arrays[name], kind='stable')
+                orders[name] = (order, arrays[name][order])
+        self.orders = orders
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['arrays'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    @classmethod
+    def from_rows(cls, rows: List[tuple], cities: Optional[Dict[bytes, int]] = None) -> 'PlaceColumns':
+        """Columns of rows read by rows_statement(), in any order"""
+        cities = dict(cities or {})
+        columns = list(zip(*rows)) if rows else [()] * 10
+        ids = np.array([id_bytes(value) for value in columns[0]], dtype='S16')
+        codes = []
+        for value in columns[8]:
+            if value is None:
+                codes.append(NO_CITY)
+            else:
+                codes.append(cities.setdefault(id_bytes(value), len(cities)))
+        values = [[to_micros(value) for value in columns[1]], *columns[2:8], codes, columns[9]]
+        arrays = {}
+        for (name, dtype), column in zip(FIELDS.items(), values):
+            if dtype is np.float64:
+                arrays[name] = np.array([np.nan if value is None else float(value) for value in column], dtype)
+            else:
+                arrays[name] = np.array([value or 0 for value in column], dtype)
+        arrays['cell'] = cells(arrays['latitude'], arrays['longitude'])
+        arrays['geokey'] = clusters.geokeys(arrays['latitude'], arrays['longitude'])
+        order = np.argsort(ids, kind='stable')
+        return cls(ids[order], {name: array[order] for name, array in arrays.items()}, cities)
+
+    def positions(self, raw_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Where raw_ids are or would be inserted, and which of them are present"""
+        positions = np.searchsorted(self.ids, raw_ids)
+        present = positions < len(self.ids)
+        present[present] = self.ids[positions[present]] == raw_ids[present]
+        return positions, present
+
+    def merged(self, rows: List[tuple], removed_ids: Iterable[str]) -> 'PlaceColumns':
+        """A copy with these rows put in and the places of removed_ids taken out"""
+        changed = PlaceColumns.from_rows(rows, self.cities)
+        removed = set(np.array([id_bytes(place_id) for place_id in removed_ids], dtype='S16').tolist())
+        positions, present = self.positions(changed.ids)
+        if present.all() and removed <= set(self.ids[positions].tolist()) and all(
+                np.array_equal(self.arrays[name][positions], changed.arrays[name]) for name in SORTED):
+            # Updates that keep their place in the sort orders: no row moves
+            arrays = {}
+            for name, array in self.arrays.items():
+                arrays[name] = array.copy()
+                arrays[name][positions] = changed.arrays[name]
+            return PlaceColumns(self.ids, arrays, changed.cities, self.orders)
+        dropped = np.array(sorted(removed | set(changed.ids.tolist())), dtype='S16')
+        positions, present = self.positions(dropped)
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[positions[present]] = False
+        ids = self.ids[keep]
+        at = np.searchsorted(ids, changed.ids)
+        arrays = {name: np.insert(array[keep], at, changed.arrays[name]) for name, array in self.arrays.items()}
+        # A kept row moves back past the removed rows and forward past the
+        # rows inserted before it; the inserted ones land at at + i
+        kept = np.arange(len(ids))
+        moved = np.full(len(self.ids), -1)
+        moved[keep] = kept + np.searchsorted(at, kept, 'right')
+        added = at + np.arange(len(at))
+        orders = {}
+        for name, (order, values) in self.orders.items():
+            still = keep[order]
+            order, values = moved[order[still]], values[still]
+            new_values = arrays[name][added]
+            sorted_by = np.lexsort((added, new_values))
+            new_rows, new_values = added[sorted_by], new_values[sorted_by]
+            first = np.searchsorted(values, new_values, 'left')
+            last = np.searchsorted(values, new_values, 'right')
+            into = [start + np.searchsorted(order[start:stop], row)
+                    for start, stop, row in zip(first, last, new_rows)]
+            orders[name] = (np.insert(order, into, new_rows), np.insert(values, into, new_values))
+        return PlaceColumns(np.insert(ids, at, changed.ids), arrays, changed.cities, orders)
+
+    def rows_of(self, name: str, value) -> np.ndarray:
+        """Positions of the rows whose attribute of SORTED equals value, in ID order"""
+        order, values = self.orders[name]
+        return order[np.searchsorted(values, value, 'left'):np.searchsorted(values, value, 'right')]
+
+    def matches(self, search, bits: Dict[str, Optional[int]], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Mask of the rows matching a PlaceSearch the snapshot supports, of
+        every row or of the given ones. bits maps the amenity IDs to their
+        bit, and only amenities with a bit can be filtered on here.
+        """
+        size = len(self.ids) if rows is None else len(rows)
+
+        def field(name):
+            return self.arrays[name] if rows is None else self.arrays[name][rows]
+
+        mask = np.ones(size, dtype=bool)
+        if search.city_id is not None:
+            code = self._city_code(search.city_id)
+            if code is None:
+                return np.zeros(size, dtype=bool)
+            mask &= field('city') == code
+        if search.min_price is not None:
+            mask &= field('price_by_night') >= search.min_price
+        if search.max_price is not None:
+            mask &= field('price_by_night') <= search.max_price
+        if search.min_guests is not None:
+            mask &= field('max_guest') >= search.min_guests
+        if search.min_rooms is not None:
+            mask &= field('number_rooms') >= search.min_rooms
+        if search.amenity_ids:
+            required = amenity_bits.split(search.amenity_ids, bits)
+            if required is None:
+                return np.zeros(size, dtype=bool)
+            required_mask = required[0]
+            mask &= (field('amenity_bits') & required_mask) == required_mask
+        return mask
+
+    def _city_code(self, city_id) -> Optional[int]:
+        try:
+            return self.cities.get(id_bytes(city_id))
+        except ValueError:
+            return None
+
+    def matching(self, search, bits: Dict[str, Optional[int]]) -> np.ndarray:
+        """Positions of the rows matching a PlaceSearch, the city's rows first narrowing them"""
+        if search.city_id is None:
+            return np.flatnonzero(self.matches(search, bits))
+        code = self._city_code(search.city_id)
+        rows = self.rows_of('city', code) if code is not None else np.empty(0, dtype=np.intp)
+        return rows[self.matches(search, bits, rows)]
+
+    def top(self, search, bits: Dict[str, Optional[int]], sort, count: int,
+            after: Optional[Tuple] = None) -> np.ndarray:
+        """
+        Positions of the first count rows matching a PlaceSearch in a
+        SortKey's order, after the (value, id) key of a cursor.
+        """
+        order, values = self.orders[sort.attribute]
+        start, stop = 0, len(order)
+        # Filters on the sorted attribute bound the range of the order
+        if sort.attribute == 'price_by_night':
+            if search.min_price is not None:
+                start = np.searchsorted(values, search.min_price, 'left')
+            if search.max_price is not None:
+                stop = np.searchsorted(values, search.max_price, 'right')
+        if after is not None:
+            value, obj_id = after
+            value = to_micros(value) if isinstance(value, datetime) else value
+            first, last = np.searchsorted(values, value, 'left'), np.searchsorted(values, value, 'right')
+            # Ties are in ID order, that is in row order
+            raw = np.bytes_(id_bytes(obj_id))
+            if sort.descending:
+                stop = min(stop, first + np.searchsorted(order[first:last], np.searchsorted(self.ids, raw, 'left')))
+            else:
+                start = max(start, first + np.searchsorted(order[first:last],
+                                                           np.searchsorted(self.ids, raw, 'right')))
+        # Walk the order in growing chunks until count rows match. Past a
+        # 64th of it the filters are selective: sort only the matches left
+        found, taken, step, budget = [], 0, max(count, 64), len(order) // 64
+        while start < stop and taken < count:
+            if budget <= 0:
+                found.append(self._sorted_matches(search, bits, sort, start, stop)[:count - taken])
+                break
+            if sort.descending:
+                rows = order[max(stop - step, start):stop][::-1]
+                stop = max(stop - step, start)
+            else:
+                rows = order[start:min(start + step, stop)]
+                start = min(start + step, stop)
+            budget -= len(rows)
+            rows = rows[self.matches(search, bits, rows)][:count - taken]
+            found.append(rows)
+            taken += len(rows)
+            step *= 2
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+    def _sorted_matches(self, search, bits, sort, start: int, stop: int) -> np.ndarray:
+        """The rows matching a PlaceSearch between start and stop of the sort order, in that order"""
+        order, values = self.orders[sort.attribute]
+        rows = self.matching(search, bits)
+        keys = self.arrays[sort.attribute][rows]
+        inside = np.ones(len(rows), dtype=bool)
+        # (value, row) keys at or after start's, before stop's
+        if start < len(order):
+            inside &= (keys > values[start]) | ((keys == values[start]) & (rows >= order[start]))
+        if stop < len(order):
+            inside &= (keys < values[stop]) | ((keys == values[stop]) & (rows < order[stop]))
+        rows, keys = rows[inside], keys[inside]
+        ranked = np.lexsort((rows, keys))
+        return rows[ranked[::-1] if sort.descending else ranked]
+
+    def key(self, row: int, sort) -> SimpleNamespace:
+        """What sort.encode() reads of a row"""
+        value = self.arrays[sort.attribute][row]
+        value = from_micros(value) if sort.attribute == 'created_at' else value.item()
+        return SimpleNamespace(**{'id': id_string(self.ids[row]), sort.attribute: value})
+
+
+class ColumnSnapshot:
+    """
+    The PlaceColumns of every place. bits is the amenity bit map of the
+    last load: the bitsets are stale once an amenity bit is given or freed.
+    stale holds the places other workers wrote since, refreshed by the
+    next refresh; reload makes it read every place again.
+    """
+    def __init__(self):
+        self._columns = PlaceColumns.from_rows([])
+        self._lock = threading.Lock()
+        # Serializes the writers, which build the next columns unlocked
+        self._write_lock = threading.Lock()
+        self.bits = None
+        self.loaded_at = None
+        self.stale = set()
+        self.reload = False
+        # The thread refreshing the snapshot, if any
+        self._refresher = None
+
+    def expired(self, ttl: float, bits: Dict[int, str]) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > ttl or bits != self.bits
+
+    def expire(self):
+        """Makes the next lookup reload the snapshot, serving nothing until then"""
+        with self._lock:
+            self.loaded_at = None
+
+    def invalidate(self, place_id: Optional[str] = None):
+        """Refreshes a place another worker wrote, or every place, on the next lookup"""
+        with self._lock:
+            if place_id is None:
+                self.reload = True
+            else:
+                self.stale.add(place_id)
+
+    def load(self, columns: PlaceColumns, bits: Dict[int, str]):
+        with self._write_lock, self._lock:
+            self._columns, self.bits = columns, dict(bits)
+            self.loaded_at = time.monotonic()
+
+    def apply(self, rows: List[tuple], removed_ids: Iterable[str]):
+        with self._write_lock:
+            columns = self._columns.merged(rows, removed_ids)
+            with self._lock:
+                self._columns = columns
+
+    def columns(self) -> PlaceColumns:
+        with self._lock:
+            return self._columns
+
+    def current(self, ttl: float, bits: Dict[int, str]) -> Optional[PlaceColumns]:
+        """
+        The columns, None before the first load or while the amenity bits
+        changed since. Starts a refresh in the background when one is due
+        and none is running; the caller never waits for it.
+        """
+        with self._lock:
+            usable = self.loaded_at is not None and bits == self.bits
+            if self._refresher is None:
+                if self.reload or self.expired(ttl, bits):
+                    place_ids, self.reload, self.stale = None, False, set()
+                elif self.stale:
+                    place_ids, self.stale = self.stale, set()
+                else:
+                    return self._columns
+                self._refresher = threading.Thread(target=self._refresh, daemon=True, name='place-columns',
+                                                   args=(current_app._get_current_object(), place_ids))
+                self._refresher.start()
+            return self._columns if usable else None
+
+    def wait(self, timeout: Optional[float] = None):
+        """Waits for the running refresh, if any"""
+        refresher = self._refresher
+        if refresher is not None:
+            refresher.join(timeout)
+
+    def _refresh(self, app, place_ids: Optional[set]):
+        # Reads every place when place_ids is None, on a connection of its own
+        try:
+            with app.app_context(), db.engine.connect() as conn:
+                if place_ids is None:
+                    bits = read_bits(conn)
+                    self.load(PlaceColumns.from_rows(read_rows(conn)), bits)
+                else:
+                    self.apply(read_rows(conn, place_ids), place_ids)
+        except SQLAlchemyError as e:
+            logger.warning("Place columns refresh failed, retrying on the next lookup: %s", e)
+            with self._lock:
+                if place_ids is None:
+                    self.reload = True
+                else:
+                    self.stale |= place_ids
+        finally:
+            with self._lock:
+                self._refresher = None
+
+
+# Snapshot of the places stored in the database, shared by this process
+snapshot = ColumnSnapshot()
+
+
+def schedule(place_ids: Iterable[Optional[str]]):
+    """Refreshes the rows of these places when the current transaction commits"""
+    db.session.info.setdefault(_PENDING_KEY, set()).update(
+        place_id for place_id in place_ids if place_id is not None)
+
+
+@event.listens_for(Session, 'before_commit')
+def _read_pending(session):
+    place_ids = session.info.pop(_PENDING_KEY, None)
+    if not place_ids:
+        return
+    # For the snapshots of the other workers (a no-op unless subscribed)
+    for place_id in place_ids if len(place_ids) <= MAX_LOGGED_PLACES else [None]:
+        repository_cache.invalidate(ENTITY, place_id)
+    if snapshot.loaded_at is None:
+        return
+    session.flush()
+    session.info[_CHANGED_KEY] = (read_rows(session, place_ids), place_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop(_CHANGED_KEY, None)
+    if changes is not None and snapshot.loaded_at is not None:
+        snapshot.apply(*changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_CHANGED_KEY, None)
+
+
+def configure_place_columns(app, place_repository):
+    """
+    Serves the searches of a database place repository from the snapshot
+    when PLACE_COLUMNS is set, following the writes of other workers
+    through the cache invalidation log.
+    """
+    snapshot.expire()
+    place_repository.columns = snapshot if app.config.get('PLACE_COLUMNS') else None
+    place_repository.columns_ttl = app.config.get('PLACE_COLUMNS_TTL', 60.0)
+    if place_repository.columns is not None:
+        repository_cache.subscribe(ENTITY, snapshot.invalidate)
@@ -0,0 +1,271 @@
+#!/usr/bin/python3
+"""
+Facet counts of places: how many places have each amenity, are in each
+city, fall in each price bucket and each guest capacity band.
+
+Counts over a filtered set come from one grouped pass over it: GROUP BY
+city_id, with a conditional sum per price bucket, guest band and amenity
+bit (see app.persistence.amenity_bits), so the amenities need no join and
+the result has one row per city. Amenities without a bit are counted on
+place_amenity.
+
+Every place also has a FacetKey: its amenity bitset, its city and the
+indexes of its price bucket and guest band. FacetCounts folds keys, and
+the in-memory storage counts its places that way.
+
+Price buckets and guest bands are named after the search filter that
+selects them: a bucket holds the places priced above the previous
+bucket's max_price and up to its own, a band the places hosting from its
+min_guests to the next band's. Summing the buckets up to a max_price
+gives the number of places the max_price filter keeps.
+
+The counts over every place are cached per process in a GlobalFacets and
+kept up to date as differences. Repositories call schedule() with the
+places a write touches before writing them: the first time a place is
+scheduled in a transaction its key is read, and just before the
+transaction commits it is read again. Once it commits, the cache removes
+the keys from before and adds the keys from after. The cache is reloaded
+when older than its TTL, which bounds how long writes of other workers
+stay out of it, or when amenity bits were given or freed.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import Session
+from app import db
+from app.models.place import Place
+
+_PENDING_KEY = 'facets_pending_places'
+_CHANGED_KEY = 'facets_changed_places'
+
+CHUNK_SIZE = 500
+
+# Upper bounds of the price buckets, inclusive; the last bucket has none
+PRICE_BUCKETS = (50, 100, 200, 500)
+# Lower bounds of the guest capacity bands, inclusive
+GUEST_BANDS = (1, 3, 5, 7)
+
+
+class FacetKey(NamedTuple):
+    amenity_bits: int
+    city_id: Optional[str]
+    price_bucket: int
+    guest_band: int
+
+
+class Facets(NamedTuple):
+    """
+    Facet counts of a set of places. amenities and cities map IDs to
+    their number of places; prices and guests hold one count per bucket
+    of PRICE_BUCKETS and band of GUEST_BANDS.
+    """
+    total: int
+    amenities: Dict[str, int]
+    cities: Dict[str, int]
+    prices: List[int]
+    guests: List[int]
+
+
+def price_bucket(price) -> int:
+    return bisect_left(PRICE_BUCKETS, price or 0)
+
+
+def guest_band(guests) -> int:
+    return max(bisect_right(GUEST_BANDS, guests or 0) - 1, 0)
+
+
+def key_of(place) -> FacetKey:
+    """The facet key of a loaded place"""
+    return FacetKey(place.amenity_bits or 0, place.city_id, price_bucket(place.price_by_night),
+                    guest_band(place.max_guest))
+
+
+def _price_bucket_column():
+    return case(*[(Place.price_by_night <= bound, index) for index, bound in enumerate(PRICE_BUCKETS)],
+                else_=len(PRICE_BUCKETS))
+
+
+def _guest_band_column():
+    return case(*[(Place.max_guest >= bound, index) for index, bound in reversed(list(enumerate(GUEST_BANDS)))
+                  if index], else_=0)
+
+
+def key_columns():
+    """SQL expressions of the FacetKey fields, for Place rows"""
+    return [Place.amenity_bits, Place.city_id, _price_bucket_column().label('price_bucket'),
+            _guest_band_column().label('guest_band')]
+
+
+def grouped_counts(conn, criteria, bits: Iterable[int]) -> 'FacetCounts':
+    """
+    The counts of the places matching criteria, amenities by the given
+    bits, in one pass grouped by city.
+    """
+    bits = sorted(bits)
+    price, guests = _price_bucket_column(), _guest_band_column()
+
+    def places_where(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    columns = ([Place.city_id, func.count()]
+               + [places_where(price == index) for index in range(len(PRICE_BUCKETS) + 1)]
+               + [places_where(guests == index) for index in range(len(GUEST_BANDS))]
+               + [func.sum(Place.amenity_bits.op('>>')(bit).op('&')(1)) for bit in bits])
+    counts = FacetCounts()
+    prices, bands = len(PRICE_BUCKETS) + 1, len(GUEST_BANDS)
+    for row in conn.execute(select(*columns).where(*criteria).group_by(Place.city_id)):
+        city_id, total, sums = row[0], row[1], [int(value or 0) for value in row[2:]]
+        counts.total += total
+        if city_id is not None:
+            counts.cities[city_id] += total
+        for index in range(prices):
+            counts.prices[index] += sums[index]
+        for index in range(bands):
+            counts.guests[index] += sums[prices + index]
+        for bit, count in zip(bits, sums[prices + bands:]):
+            counts.bits[bit] += count
+    return counts
+
+
+class FacetCounts:
+    """
+    Counters folded from (FacetKey, number of places) pairs. Amenities are
+    counted by bit until facets() maps the bits to amenity IDs.
+    """
+    def __init__(self):
+        self.total = 0
+        self.bits = Counter()
+        self.cities = Counter()
+        self.prices = [0] * (len(PRICE_BUCKETS) + 1)
+        self.guests = [0] * len(GUEST_BANDS)
+
+    def add(self, key: FacetKey, count: int = 1):
+        """Counts count places of this key; a negative count removes them"""
+        self.total += count
+        bits = key.amenity_bits or 0
+        while bits:
+            lowest = bits & -bits
+            self.bits[lowest.bit_length() - 1] += count
+            bits ^= lowest
+        if key.city_id is not None:
+            self.cities[key.city_id] += count
+        self.prices[key.price_bucket] += count
+        self.guests[key.guest_band] += count
+
+    def copy(self) -> 'FacetCounts':
+        counts = FacetCounts()
+        counts.total = self.total
+        counts.bits = Counter(self.bits)
+        counts.cities = Counter(self.cities)
+        counts.prices = list(self.prices)
+        counts.guests = list(self.guests)
+        return counts
+
+    def facets(self, bits: Dict[int, str], unbitted: Dict[str, int]) -> Facets:
+        """
+        The counts as Facets. bits maps the amenity bits in use to their
+        amenity; unbitted holds the counts of the amenities without a bit.
+        """
+        amenities = {bits[bit]: count for bit, count in self.bits.items() if bit in bits and count > 0}
+        amenities.update((amenity_id, count) for amenity_id, count in unbitted.items() if count > 0)
+        return Facets(self.total, amenities,
+                      {city_id: count for city_id, count in self.cities.items() if count > 0},
+                      list(self.prices), list(self.guests))
+
+
+def fold(keys: Iterable[Tuple[FacetKey, int]]) -> FacetCounts:
+    counts = FacetCounts()
+    for key, count in keys:
+        counts.add(key, count)
+    return counts
+
+
+class GlobalFacets:
+    """
+    The facet counts of every place. bits is the amenity bit map of the
+    last load: the counts are stale once an amenity bit is given or freed.
+    """
+    def __init__(self):
+        self._counts = FacetCounts()
+        self._lock = threading.Lock()
+        self.bits = None
+        self.loaded_at = None
+
+    def expired(self, ttl: float, bits: Dict[int, str]) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > ttl or bits != self.bits
+
+    def expire(self):
+        """Makes the next lookup reload the counts"""
+        self.loaded_at = None
+
+    def load(self, counts: 'FacetCounts', bits: Dict[int, str]):
+        with self._lock:
+            self._counts, self.bits = counts, dict(bits)
+            self.loaded_at = time.monotonic()
+
+    def apply(self, removed: Iterable[FacetKey], added: Iterable[FacetKey]):
+        """Moves the counts of written places from their old keys to their new ones"""
+        with self._lock:
+            for key in removed:
+                self._counts.add(key, -1)
+            for key in added:
+                self._counts.add(key)
+
+    def counts(self) -> 'FacetCounts':
+        with self._lock:
+            return self._counts.copy()
+
+
+# Facet counts of the places stored in the database, shared by this process
+index = GlobalFacets()
+
+
+def schedule(place_ids: Iterable[str]):
+    """
+    Applies the changes to these places to the cached counts when the
+    current transaction commits. Call it before writing the places.
+    """
+    pending = db.session.info.setdefault(_PENDING_KEY, {})
+    new_ids = [place_id for place_id in place_ids if place_id not in pending]
+    if not new_ids:
+        return
+    with db.session.no_autoflush:
+        before = dict(read_keys(db.session, new_ids))
+    for place_id in new_ids:
+        pending[place_id] = before.get(place_id)
+
+
+def read_keys(conn, place_ids: Iterable[str]) -> List[Tuple[str, FacetKey]]:
+    """(place ID, key) pairs of the given places that exist"""
+    place_ids = list(place_ids)
+    rows = []
+    for start in range(0, len(place_ids), CHUNK_SIZE):
+        rows += conn.execute(select(Place.id, *key_columns())
+                             .where(Place.id.in_(place_ids[start:start + CHUNK_SIZE]))).all()
+    return [(row[0], FacetKey(*row[1:])) for row in rows]
+
+
+@event.listens_for(Session, 'before_commit')
+def _read_pending(session):
+    before = session.info.pop(_PENDING_KEY, None)
+    if not before:
+        return
+    session.flush()
+    after = [key for _, key in read_keys(session, before)]
+    session.info[_CHANGED_KEY] = ([key for key in before.values() if key is not None], after)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop(_CHANGED_KEY, None)
+    if changes is not None and index.loaded_at is not None:
+        index.apply(*changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_CHANGED_KEY, None)
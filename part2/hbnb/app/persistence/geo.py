@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+"""
+Geographic place searches.
+
+A GeoSearch selects the places within a radius of a point or inside a
+bounding box, nearest first. Its criteria() narrow the candidates with the
+geohash index (see migration v0006) and the box; hits() then computes the
+exact great-circle distance of each candidate from its coordinates alone,
+so only the places of the requested page are ever loaded.
+"""
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import and_, or_
+from app.models.geo import BoundingBox, haversine_km, next_prefix
+from app.models.place import Place
+
+MAX_RADIUS_KM = 1000
+# Widest and tallest bounding box, in degrees: about as far as MAX_RADIUS_KM
+# reaches, so no search ranks more than a region's places
+MAX_BBOX_DEGREES = 20
+
+
+class GeoHit(NamedTuple):
+    """A place of a geographic search, before it is loaded"""
+    id: str
+    distance_km: float
+
+
+class Located:
+    """A loaded place with its distance from the origin of a GeoSearch"""
+    def __init__(self, place, distance_km: float):
+        self.place = place
+        self.distance_km = distance_km
+
+    def __getattr__(self, name):
+        return getattr(self.place, name)
+
+
+class GeoSearch:
+    """
+    The places inside bbox, and within radius_km of origin when a radius is
+    given, sorted by distance from origin (the center of the box otherwise).
+    Use around() or within() rather than the constructor.
+    """
+    def __init__(self, bbox: BoundingBox, radius_km: Optional[float] = None,
+                 origin: Optional[Tuple[float, float]] = None):
+        self.bbox = bbox
+        self.radius_km = radius_km
+        self.origin = origin if origin is not None else bbox.center
+
+    @classmethod
+    def around(cls, latitude: float, longitude: float, radius_km: float) -> 'GeoSearch':
+        """Places within radius_km of a point. Raises ValueError on bad input."""
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValueError(f"radius_km must be greater than 0 and at most {MAX_RADIUS_KM}.")
+        return cls(BoundingBox.around(latitude, longitude, radius_km), radius_km, (latitude, longitude))
+
+    @classmethod
+    def within(cls, south: float, west: float, north: float, east: float) -> 'GeoSearch':
+        """Places inside a bounding box. Raises ValueError on bad input."""
+        bbox = BoundingBox(south, west, north, east)
+        if bbox.width > MAX_BBOX_DEGREES or bbox.height > MAX_BBOX_DEGREES:
+            raise ValueError(f"The box can span at most {MAX_BBOX_DEGREES} degrees of latitude and of longitude; "
+                             f"use /places/clusters for wider views.")
+        return cls(bbox)
+
+    def criteria(self):
+        """
+        SQL predicates on Place selecting a superset of the results: the
+        geohash cells covering the box, as index ranges, then the box.
+        """
+        ranges = []
+        for prefix in self.bbox.geohash_cells():
+            if ranges and ranges[-1][1] == prefix:
+                # Consecutive cells make one range
+                ranges[-1][1] = next_prefix(prefix)
+            else:
+                ranges.append([prefix, next_prefix(prefix)])
+        return [
+            or_(*[and_(Place.geohash >= lower, Place.geohash < upper) if upper is not None
+                  else Place.geohash >= lower for lower, upper in ranges]),
+            Place.latitude.between(self.bbox.south, self.bbox.north),
+            or_(*[Place.longitude.between(west, east) for west, east in self.bbox.spans()]),
+        ]
+
+    def distance(self, latitude: Optional[float], longitude: Optional[float]) -> Optional[float]:
+        """Distance in km of a point from the origin, None if it is not a result"""
+        if not self.bbox.contains(latitude, longitude):
+            return None
+        distance = haversine_km(self.origin[0], self.origin[1], latitude, longitude)
+        if self.radius_km is not None and distance > self.radius_km:
+            return None
+        return distance
+
+    def hits(self, points: Iterable[Tuple[str, float, float]]) -> List[GeoHit]:
+        """The results among (id, latitude, longitude) candidates, nearest first"""
+        hits = []
+        for obj_id, latitude, longitude in points:
+            distance = self.distance(latitude, longitude)
+            if distance is not None:
+                hits.append(GeoHit(obj_id, distance))
+        hits.sort(key=lambda hit: (hit.distance_km, hit.id))
+        return hits
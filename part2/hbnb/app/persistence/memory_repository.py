@@ -0,0 +1,698 @@
+#!/usr/bin/python3
+"""
+In-memory storage, selected with USE_DATABASE=False.
+
+Objects live in a dict keyed by ID. Each repository also maintains the
+secondary indexes its lookups need (email -> user, user_id -> places,
+place_id -> reviews, name -> amenity, name key -> city), so every lookup
+is a dict access.
+A sorted list of (created_at, id) keys serves keyset pages with a binary
+search, as sorted (name key, id) lists serve user name searches. Writes
+take a per-repository lock and apply immediately: there is no
+transaction to roll back.
+
+With MEMORY_SNAPSHOT_PATH set, the data is loaded from that JSON file at
+startup and written back to it when the process exits.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import DateTime
+from sqlalchemy.orm import configure_mappers
+from app.persistence.repository import (
+    BULK_CHUNK_SIZE, DEFAULT_PAGE_SIZE, DISTANCE_ORDER, RELEVANCE_ORDER, BulkResult, Page, Repository,
+    clamp_page_size, decode_cursor
+)
+from app.persistence.geo import GeoSearch, Located
+from app.persistence import amenity_bits, clusters, columnar, facets, ratings, similarity, text_search
+from app.persistence.cities import CityEntry, CityIndex
+from app.models.user import User
+from app.models.place import Place, RATING_COLUMNS
+from app.models.review import Review
+from app.models.amenity import Amenity
+from app.models.city import City
+from app.models.names import name_key
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+_snapshot_paths = set()
+
+
+class InMemoryRepository(Repository):
+    """
+    Dict-backed storage for one model.
+    unique_indexes are enforced like unique constraints; indexes map a
+    value to every object carrying it; sorted_indexes keep sorted
+    (value, id) keys for range scans.
+    """
+    unique_indexes = ()
+    indexes = ()
+    sorted_indexes = ()
+
+    def __init__(self, model):
+        self.model = model
+        self._objects = {}
+        self._sort_keys = []
+        self._indexed = {}
+        self._unique = {attr: {} for attr in self.unique_indexes}
+        self._groups = {attr: {} for attr in self.indexes}
+        self._sorted = {attr: [] for attr in self.sorted_indexes}
+        self._lock = threading.RLock()
+
+    # Index maintenance
+
+    def _index_values(self, obj):
+        return {attr: getattr(obj, attr) for attr in self.unique_indexes + self.indexes + self.sorted_indexes}
+
+    def _check_unique(self, obj_id, values):
+        for attr in self.unique_indexes:
+            owner = self._unique[attr].get(values[attr])
+            if owner is not None and owner != obj_id:
+                raise ValueError(
+                    f"Integrity Error: duplicate {self.model.__tablename__}.{attr} '{values[attr]}'")
+
+    def _link(self, obj):
+        values = self._index_values(obj)
+        for attr in self.unique_indexes:
+            self._unique[attr][values[attr]] = obj.id
+        for attr in self.indexes:
+            self._groups[attr].setdefault(values[attr], {})[obj.id] = obj
+        for attr in self.sorted_indexes:
+            if values[attr] is not None:
+                insort(self._sorted[attr], (values[attr], obj.id))
+        self._indexed[obj.id] = values
+
+    def _unlink(self, obj_id):
+        values = self._indexed.pop(obj_id)
+        for attr in self.unique_indexes:
+            self._unique[attr].pop(values[attr], None)
+        for attr in self.indexes:
+            group = self._groups[attr].get(values[attr])
+            if group is not None:
+                group.pop(obj_id, None)
+                if not group:
+                    del self._groups[attr][values[attr]]
+        for attr in self.sorted_indexes:
+            if values[attr] is not None:
+                keys = self._sorted[attr]
+                keys.pop(bisect_left(keys, (values[attr], obj_id)))
+
+    def _store(self, obj):
+        self._objects[obj.id] = obj
+        insort(self._sort_keys, (obj.created_at, obj.id))
+        self._link(obj)
+
+    def _lookup(self, attr, value):
+        """Objects whose indexed attr equals value"""
+        if attr in self._unique:
+            obj_id = self._unique[attr].get(value)
+            return [self._objects[obj_id]] if obj_id is not None else []
+        return list(self._groups[attr].get(value, {}).values())
+
+    # Hooks
+
+    def _prepare(self, obj):
+        """Fills in what a read returns besides the columns"""
+        return obj
+
+    def _on_add(self, obj):
+        """Resolves relationships of a newly stored object"""
+
+    def _on_delete(self, obj):
+        """Drops what depends on a deleted object"""
+
+    # Repository interface
+
+    def add(self, obj):
+        if not obj.id or not obj.created_at:
+            raise ValueError(f"{self.model.__name__} must have an id and created_at")
+        with self._lock:
+            if obj.id in self._objects:
+                raise ValueError(
+                    f"Integrity Error: duplicate {self.model.__tablename__}.id '{obj.id}'")
+            self._check_unique(obj.id, self._index_values(obj))
+            self._store(obj)
+            self._on_add(obj)
+        return obj
+
+    def get(self, obj_id):
+        obj = self._objects.get(obj_id)
+        return self._prepare(obj) if obj is not None else None
+
+    def get_many(self, obj_ids):
+        """Fetch several objects by ID"""
+        return [self._prepare(self._objects[obj_id]) for obj_id in obj_ids if obj_id in self._objects]
+
+    def get_all(self):
+        return [self._prepare(obj) for obj in list(self._objects.values())]
+
+    def get_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+        """Keyset pagination ordered by (created_at, id), as SQLAlchemyRepository"""
+        limit = clamp_page_size(limit)
+        with self._lock:
+            start = bisect_right(self._sort_keys, decode_cursor(cursor)) if cursor else 0
+            keys = self._sort_keys[start:start + limit + 1]
+            rows = [self._prepare(self._objects[obj_id]) for _, obj_id in keys]
+            total = len(self._objects) if include_total else None
+        return Page.from_rows(rows, limit, total)
+
+    def get_page_projection(self, fields, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+        """Objects are already in memory: a projection is a plain page"""
+        return self.get_page(limit, cursor, include_total)
+
+    def update(self, obj_id, data):
+        with self._lock:
+            obj = self._objects.get(obj_id)
+            if obj is None:
+                return None
+            changes = {key: value for key, value in data.items() if hasattr(obj, key) and key != 'id'}
+            values = dict(self._indexed[obj_id])
+            values.update({key: value for key, value in changes.items() if key in values})
+            try:
+                self._check_unique(obj_id, values)
+            except ValueError:
+                raise ValueError("Update failed: Integrity Error")
+            self._unlink(obj_id)
+            for key, value in changes.items():
+                setattr(obj, key, value)
+            obj.updated_at = datetime.utcnow()
+            self._link(obj)
+        return self._prepare(obj)
+
+    def delete(self, obj_id):
+        with self._lock:
+            obj = self._objects.pop(obj_id, None)
+            if obj is None:
+                return False
+            self._sort_keys.pop(bisect_right(self._sort_keys, (obj.created_at, obj_id)) - 1)
+            self._unlink(obj_id)
+        self._on_delete(obj)
+        return True
+
+    def delete_many(self, obj_ids):
+        """Delete several objects by ID; returns how many existed"""
+        with self._lock:
+            return sum(1 for obj_id in list(obj_ids) if self.delete(obj_id))
+
+    def get_by_attribute(self, attr_name, attr_value):
+        if attr_name in self._unique or attr_name in self._groups:
+            matches = self._lookup(attr_name, attr_value)
+        else:
+            matches = [obj for obj in list(self._objects.values()) if getattr(obj, attr_name, None) == attr_value]
+        return self._prepare(matches[0]) if matches else None
+
+    # Bulk writes, reported like SQLAlchemyRepository's
+
+    def add_many(self, objs, chunk_size=BULK_CHUNK_SIZE):
+        result = BulkResult()
+        with self._lock:
+            for index, obj in enumerate(objs):
+                try:
+                    self.add(obj)
+                    result.add_created(index, obj.id)
+                except ValueError as e:
+                    result.add_error(index, str(e))
+        return result
+
+    def upsert_many(self, rows, chunk_size=BULK_CHUNK_SIZE):
+        result = BulkResult()
+        with self._lock:
+            for index, row in enumerate(rows):
+                try:
+                    if row.get('id') in self._objects:
+                        obj = self.update(row['id'], row)
+                    else:
+                        obj = self.add(self.model(**row))
+                    result.add_created(index, obj.id)
+                except (ValueError, TypeError) as e:
+                    result.add_error(index, str(e))
+        return result
+
+    # Snapshots
+
+    def dump(self):
+        """Rows of every object, JSON-serializable"""
+        with self._lock:
+            objs = list(self._objects.values())
+        return [self._dump(obj) for obj in objs]
+
+    def _dump(self, obj):
+        row = {}
+        for column in self.model.__table__.columns:
+            value = getattr(obj, column.key)
+            row[column.key] = value.isoformat() if isinstance(value, datetime) else value
+        return row
+
+    def restore(self, rows):
+        """Stores objects rebuilt from dump() rows, without calling __init__"""
+        datetimes = {column.key for column in self.model.__table__.columns if isinstance(column.type, DateTime)}
+        with self._lock:
+            for row in rows:
+                obj = self.model.__mapper__.class_manager.new_instance()
+                for key, value in row.items():
+                    if key in datetimes and value is not None:
+                        value = datetime.fromisoformat(value)
+                    setattr(obj, key, value)
+                self._store(obj)
+
+    def relink(self, rows):
+        """Restores relationships once every repository is loaded"""
+        for row in rows:
+            self._on_add(self._objects[row['id']])
+
+
+class InMemoryUserRepository(InMemoryRepository):
+    unique_indexes = ('email',)
+    sorted_indexes = ('first_name_key', 'last_name_key')
+
+    def __init__(self):
+        super().__init__(User)
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        return self.get_by_attribute('email', email)
+
+    def search(self, search, fields=None, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+        """UserRepository.search, scanning the range of a sorted name index"""
+        limit = clamp_page_size(limit)
+        attribute, key = search.keys()[0]
+        lower, upper = search.bounds(key)
+        with self._lock:
+            keys = self._sorted[attribute]
+            start = bisect_left(keys, (lower,))
+            end = bisect_left(keys, (upper,)) if upper is not None else len(keys)
+            total = None
+            if include_total:
+                total = sum(1 for _, obj_id in keys[start:end] if search.matches(self._objects[obj_id]))
+            if cursor:
+                start = max(start, bisect_right(keys, search.sort.decode_key(cursor)))
+            users = []
+            for index in range(start, end):
+                user = self._objects[keys[index][1]]
+                if search.matches(user):
+                    users.append(self._prepare(user))
+                    if len(users) > limit:
+                        break
+        return search.sort.page(users, limit, total)
+
+
+class InMemoryPlaceRepository(InMemoryRepository):
+    """
+    Places carry their owner and amenities, like the ones PlaceRepository
+    loads, and rating aggregates the review repository keeps in step.
+    Every write recounts the places of the cities it touches. A TextIndex
+    holds the text search document of every place, rebuilt whenever the
+    place or one of its reviews changes. Places are also indexed by the
+    grid cell of their coordinates (see app.persistence.columnar).
+    """
+    indexes = ('user_id', 'city_id', 'cell')
+
+    def __init__(self, user_repository, review_repository, amenity_repository, city_repository):
+        super().__init__(Place)
+        self.user_repository = user_repository
+        self.review_repository = review_repository
+        self.amenity_repository = amenity_repository
+        self.city_repository = city_repository
+        city_repository.place_repository = self
+        review_repository.place_repository = self
+        self._facets = facets.GlobalFacets()
+        self._text = text_search.TextIndex()
+
+    def _index_values(self, place):
+        return {'user_id': place.user_id, 'city_id': place.city_id,
+                'cell': columnar.cell_of(place.latitude, place.longitude)}
+
+    def _on_add(self, place):
+        if place.user is None:
+            place.user = self.user_repository.get(place.user_id)
+        self._recount(place.city_id)
+        self._facets.apply([], [facets.key_of(place)])
+        self.reindex(place.id)
+
+    def _on_delete(self, place):
+        self._facets.apply([facets.key_of(place)], [])
+        self.reindex(place.id)
+        # Deleting a place also deletes its reviews
+        for review in self.review_repository.get_by_place(place.id):
+            self.review_repository.delete(review.id)
+        place.user = None
+        place.amenities = []
+        self._recount(place.city_id)
+
+    def update(self, place_id, data):
+        # Rating aggregates only follow the reviews
+        data = {key: value for key, value in data.items() if key not in RATING_COLUMNS}
+        with self._lock:
+            place = self._objects.get(place_id)
+            if place is None:
+                return None
+            city_id, key, text = place.city_id, facets.key_of(place), self._text_of(place)
+            place = super().update(place_id, data)
+            self._facets.apply([key], [facets.key_of(place)])
+            if place.city_id != city_id:
+                self._recount(city_id)
+                self._recount(place.city_id)
+            if self._text_of(place) != text:
+                self.reindex(place_id)
+        return place
+
+    @staticmethod
+    def _text_of(place):
+        return place.name, place.description, place.city_name
+
+    def reindex(self, place_id: str):
+        """Rebuilds the text search document of a place (drops it if the place is gone)"""
+        with self._lock:
+            place = self._objects.get(place_id)
+            if place is None:
+                self._text.remove(place_id)
+            else:
+                self._text.put(place_id, text_search.document_of(
+                    place, self.review_repository.get_by_place(place_id)))
+
+    def _recount(self, city_id):
+        if city_id is not None:
+            self.city_repository.set_place_count(city_id, self.count_by_city(city_id))
+
+    def count_by_city(self, city_id: str) -> int:
+        """Number of places in a city"""
+        return len(self._groups['city_id'].get(city_id, ()))
+
+    def clear_city(self, city_id: str):
+        """Leaves the places of a deleted city without one, as ON DELETE SET NULL"""
+        with self._lock:
+            for place in self._lookup('city_id', city_id):
+                self._unlink(place.id)
+                place.city_id = None
+                self._link(place)
+
+    def _dump(self, place):
+        row = super()._dump(place)
+        row['amenity_ids'] = [amenity.id for amenity in place.amenities]
+        return row
+
+    def restore(self, rows):
+        # Relinking the reviews tallies the rating aggregates again
+        super().restore([dict({key: value for key, value in row.items() if key != 'amenity_ids'},
+                              **dict.fromkeys(RATING_COLUMNS, 0)) for row in rows])
+
+    def relink(self, rows):
+        super().relink(rows)
+        for row in rows:
+            self._objects[row['id']].amenities = self.amenity_repository.get_many(row.get('amenity_ids', []))
+
+    def search(self, search, fields=None, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+        """PlaceRepository.search, filtering and sorting in memory"""
+        limit = clamp_page_size(limit)
+        sort = search.sort
+        last = sort.decode_key(cursor) if cursor else None
+        places, hits = self._matching(search)
+        if hits is not None and sort is RELEVANCE_ORDER:
+            kept = {place.id: place for place in places}
+            page = sort.slice(hits, limit, cursor, len(hits) if include_total else None)
+            page.items = [self._prepare(kept[hit.id]) for hit in page.items]
+            return page
+        total = len(places) if include_total else None
+        if last is not None:
+            places = [place for place in places
+                      if (sort.key(place) < last if sort.descending else sort.key(place) > last)]
+        places.sort(key=sort.key, reverse=sort.descending)
+        return sort.page([self._prepare(place) for place in places[:limit + 1]], limit, total)
+
+    def _matching(self, search):
+        """
+        The places matching a PlaceSearch and, with a text query, their
+        ranked hits; the places are then in rank order.
+        """
+        bits = {amenity.id: amenity.bit for amenity in self.amenity_repository.get_many(search.amenity_ids)}
+        with self._lock:
+            if not search.words:
+                return [place for place in self._objects.values() if search.matches(place, bits)], None
+            # Ranked over every place, so word frequencies match the database index
+            hits = [hit for hit in self._text.rank(search.words)
+                    if search.matches(self._objects[hit.id], bits)]
+            return [self._objects[hit.id] for hit in hits], hits
+
+    def facets(self, search=None) -> facets.Facets:
+        """PlaceRepository.facets, folding the keys of the places in memory"""
+        bits = {amenity.bit: amenity.id for amenity in self.amenity_repository.get_all() if amenity.bit is not None}
+        if search is None:
+            with self._lock:
+                places = list(self._objects.values())
+                if self._facets.expired(float('inf'), bits):
+                    self._facets.load(facets.fold((facets.key_of(place), 1) for place in places), bits)
+                counts = self._facets.counts()
+        else:
+            places = self._matching(search)[0]
+            counts = facets.fold((facets.key_of(place), 1) for place in places)
+        unbitted = Counter(amenity.id for place in places for amenity in place.amenities if amenity.bit is None)
+        return counts.facets(bits, unbitted)
+
+    def within_radius(self, latitude, longitude, radius_km, fields=None, limit=DEFAULT_PAGE_SIZE,
+                      cursor=None, include_total=False):
+        """PlaceRepository.within_radius, scanning the coordinates in memory"""
+        return self._geo_page(GeoSearch.around(latitude, longitude, radius_km), limit, cursor, include_total)
+
+    def within_bbox(self, south, west, north, east, fields=None, limit=DEFAULT_PAGE_SIZE,
+                    cursor=None, include_total=False):
+        """PlaceRepository.within_bbox, scanning the coordinates in memory"""
+        return self._geo_page(GeoSearch.within(south, west, north, east), limit, cursor, include_total)
+
+    def _geo_page(self, search, limit, cursor, include_total):
+        with self._lock:
+            places = dict(self._objects)
+        hits = search.hits((place.id, place.latitude, place.longitude) for place in places.values())
+        page = DISTANCE_ORDER.slice(hits, limit, cursor, len(hits) if include_total else None)
+        page.items = [Located(self._prepare(places[hit.id]), hit.distance_km) for hit in page.items]
+        return page
+
+    def similar(self, place_id, limit=similarity.DEFAULT_LIMIT, fields=None):
+        """PlaceRepository.similar, on the columns of the place's neighborhood in memory"""
+        with self._lock:
+            place = self._objects.get(place_id)
+            if place is None:
+                return None
+            nearby = {place.id: place}
+            if place.city_id is not None:
+                nearby.update((other.id, other) for other in self._lookup('city_id', place.city_id))
+            for cell in similarity.neighbor_cells(self._indexed[place.id]['cell']):
+                nearby.update((other.id, other) for other in self._lookup('cell', cell))
+        rows = [columnar.place_row(other) for other in nearby.values()]
+        matches = similarity.most_similar(columnar.PlaceColumns.from_rows(rows), place_id, clamp_page_size(limit))
+        return [similarity.Similar(self._prepare(nearby[match.id]), match.similarity, match.distance_km)
+                for match in matches]
+
+    def clusters(self, bbox, zoom):
+        """PlaceRepository.clusters, folding the places in memory"""
+        cover = clusters.cover(bbox, clusters.level_for(zoom, bbox))
+        with self._lock:
+            rows = [columnar.place_row(place) for place in self._objects.values()
+                    if cover.contains(place.latitude, place.longitude)]
+        return clusters.in_viewport(columnar.PlaceColumns.from_rows(rows), bbox, zoom)
+
+    def get_by_city(self, city_id: str) -> List[Place]:
+        """Get all places in a specific city"""
+        return [self._prepare(place) for place in self._lookup('city_id', city_id)]
+
+    def get_by_owner(self, user_id: str) -> List[Place]:
+        """Get all places owned by a specific user"""
+        return [self._prepare(place) for place in self._lookup('user_id', user_id)]
+
+
+class InMemoryReviewRepository(InMemoryRepository):
+    """
+    Every write adds its deltas to the rating aggregates of the places it
+    touches (see app.persistence.ratings) and rebuilds their text search
+    documents.
+    """
+    indexes = ('place_id', 'user_id')
+    # Set by the InMemoryPlaceRepository the places live in
+    place_repository = None
+
+    def __init__(self):
+        super().__init__(Review)
+
+    def _tally(self, place_id, rating, step):
+        if self.place_repository is None:
+            return
+        with self.place_repository._lock:
+            place = self.place_repository._objects.get(place_id)
+            if place is not None:
+                ratings.tally(place, rating, step)
+
+    def _reindex(self, place_ids):
+        if self.place_repository is not None:
+            for place_id in set(place_ids):
+                self.place_repository.reindex(place_id)
+
+    def _on_add(self, review):
+        self._tally(review.place_id, review.rating, 1)
+        self._reindex([review.place_id])
+
+    def _on_delete(self, review):
+        self._tally(review.place_id, review.rating, -1)
+        self._reindex([review.place_id])
+
+    def relink(self, rows):
+        # The places, relinked first, indexed the text of their reviews
+        for row in rows:
+            review = self._objects[row['id']]
+            self._tally(review.place_id, review.rating, 1)
+
+    def update(self, review_id, data):
+        with self._lock:
+            review = self._objects.get(review_id)
+            if review is None:
+                return None
+            place_id, rating, text = review.place_id, review.rating, review.text
+            review = super().update(review_id, data)
+            if (review.place_id, review.rating) != (place_id, rating):
+                self._tally(place_id, rating, -1)
+                self._tally(review.place_id, review.rating, 1)
+            if (review.place_id, review.text) != (place_id, text):
+                self._reindex([place_id, review.place_id])
+        return review
+
+    def get_by_place(self, place_id: str) -> List[Review]:
+        """Get all reviews for a specific place"""
+        return self._lookup('place_id', place_id)
+
+    def get_by_user(self, user_id: str) -> List[Review]:
+        """Get all reviews written by a specific user"""
+        return self._lookup('user_id', user_id)
+
+
+class InMemoryAmenityRepository(InMemoryRepository):
+    indexes = ('name',)
+
+    def __init__(self):
+        super().__init__(Amenity)
+
+    def get_by_name(self, name: str) -> Optional[Amenity]:
+        return self.get_by_attribute('name', name)
+
+    def get_by_names(self, names: List[str]) -> List[Amenity]:
+        """Fetch the amenities matching any of the given names"""
+        return [amenity for name in set(names) for amenity in self._lookup('name', name)]
+
+    def _on_add(self, amenity):
+        # Take a free bit, as the flush does for AmenityRepository
+        if amenity.bit is None:
+            free = amenity_bits.free_bits(other.bit for other in self._objects.values() if other.bit is not None)
+            if free:
+                amenity.bit = free[0]
+                for place in amenity.places:
+                    place.amenity_bits = (place.amenity_bits or 0) | (1 << amenity.bit)
+
+    def _on_delete(self, amenity):
+        # Unlinking clears the amenity's bit from its places
+        for place in list(amenity.places):
+            place.amenities.remove(amenity)
+
+
+class InMemoryCityRepository(InMemoryRepository):
+    """
+    Cities, with the autocomplete index of CityRepository kept up to date
+    on every write. place_repository is set by InMemoryPlaceRepository.
+    """
+    unique_indexes = ('name_key',)
+
+    def __init__(self):
+        super().__init__(City)
+        self.index = CityIndex()
+        self.place_repository = None
+
+    def get_by_name(self, name: str) -> Optional[City]:
+        return self.get_by_attribute('name_key', name_key(name))
+
+    def get_or_create(self, name: str) -> City:
+        try:
+            return self.get_by_name(name) or self.add(City(name=name))
+        except ValueError:
+            # Another request added the name in the meantime
+            return self.get_by_name(name)
+
+    def get_by_names(self, names: List[str]) -> List[City]:
+        """Fetch the cities matching any of the given names, ignoring case"""
+        return [city for key in {name_key(name) for name in names} for city in self._lookup('name_key', key)]
+
+    def autocomplete(self, prefix: str, limit: int) -> List[CityEntry]:
+        return self.index.complete(prefix, limit)
+
+    def set_place_count(self, city_id: str, place_count: int):
+        with self._lock:
+            city = self._objects.get(city_id)
+            if city is not None:
+                city.place_count = place_count
+                self.index.put(CityEntry(city.id, city.name, place_count))
+
+    def _on_add(self, city):
+        self.index.put(CityEntry(city.id, city.name, city.place_count or 0))
+
+    def update(self, city_id, data):
+        if 'name' in data:
+            # Checked for uniqueness before the name sets it
+            data = dict(data, name_key=name_key(data['name']))
+        city = super().update(city_id, data)
+        if city is not None:
+            self._on_add(city)
+        return city
+
+    def _on_delete(self, city):
+        self.index.remove(city.id)
+        if self.place_repository is not None:
+            self.place_repository.clear_city(city.id)
+
+
+def save_snapshot(path: str, repositories: List[InMemoryRepository]):
+    """
+    Writes every repository to a JSON file. The file is replaced
+    atomically, so a crash mid-write leaves the previous snapshot.
+    """
+    data = {
+        'version': SNAPSHOT_VERSION,
+        'tables': {repo.model.__tablename__: repo.dump() for repo in repositories},
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str, repositories: List[InMemoryRepository]):
+    """
+    Loads a file written by save_snapshot into empty repositories.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {data.get('version')!r} in {path}")
+    tables: Dict[str, List[Dict[str, Any]]] = data['tables']
+    # Instances are built without __init__, which would configure them
+    configure_mappers()
+    for repo in repositories:
+        repo.restore(tables.get(repo.model.__tablename__, []))
+    for repo in repositories:
+        repo.relink(tables.get(repo.model.__tablename__, []))
+
+
+def configure_memory_snapshot(app, repositories):
+    """
+    Loads MEMORY_SNAPSHOT_PATH, if it exists, and saves back to it at exit.
+    """
+    path = app.config.get('MEMORY_SNAPSHOT_PATH')
+    if not path:
+        return
+    if os.path.exists(path) and not any(repo._objects for repo in repositories):
+        load_snapshot(path, repositories)
+        logger.info("Loaded in-memory snapshot %s", path)
+    if path not in _snapshot_paths:
+        _snapshot_paths.add(path)
+        atexit.register(save_snapshot, path, repositories)
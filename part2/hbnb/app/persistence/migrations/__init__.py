@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+"""
+Versioned schema migrations.
+
+Each module of this package named vNNNN_<name>.py is one migration. Its
+docstring describes it and its upgrade(conn) function brings the schema
+from version NNNN - 1 to NNNN without dropping data. Applied versions are
+recorded in the schema_migrations table, so upgrade() only runs what is
+missing and can be re-run safely.
+
+Run them with: python migrate.py upgrade
+"""
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect, select
+
+_MODULE_RE = re.compile(r'^v(\d{4})_\w+$')
+
+_version_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _version_metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String(255), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+class Migration:
+    """
+    One schema version: a number, a description and an upgrade function.
+    """
+    def __init__(self, version, description, upgrade):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+
+def load_migrations():
+    """
+    Returns every migration of this package, ordered by version.
+    """
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_RE.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f'{__name__}.{module_info.name}')
+        description = (module.__doc__ or module_info.name).strip().splitlines()[0]
+        migrations.append(Migration(int(match.group(1)), description, module.upgrade))
+    migrations.sort(key=lambda migration: migration.version)
+    for expected, migration in enumerate(migrations, 1):
+        if migration.version != expected:
+            raise RuntimeError(f"Migration versions must be contiguous: missing v{expected:04d}.")
+    return migrations
+
+
+def applied_versions(engine):
+    """
+    Versions already applied to the database.
+    """
+    if not inspect(engine).has_table(schema_migrations.name):
+        return set()
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [migration for migration in load_migrations() if migration.version not in applied]
+
+
+def upgrade(engine, target=None):
+    """
+    Applies pending migrations up to target (default: latest), each in its
+    own transaction together with its schema_migrations row.
+    Returns the migrations that were applied.
+    """
+    _version_metadata.create_all(engine, checkfirst=True)
+    applied = []
+    for migration in pending_migrations(engine):
+        if target is not None and migration.version > target:
+            break
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=datetime.utcnow(),
+            ))
+        applied.append(migration)
+    return applied
+
+
+def verify(engine, metadata):
+    """
+    Compares the database with the models' metadata.
+    Returns a list of human-readable differences (empty when they match):
+    pending migrations, and missing tables, columns and indexes.
+    """
+    problems = [f"Migration v{m.version:04d} ({m.description}) is not applied"
+                for m in pending_migrations(engine)]
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            problems.append(f"Missing table '{table.name}'")
+            continue
+
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                problems.append(f"Missing column '{table.name}.{column.name}'")
+
+        indexes = {index['name']: tuple(index['column_names']) for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            expected = tuple(column.name for column in index.columns)
+            if index.name not in indexes:
+                problems.append(f"Missing index '{index.name}' on {table.name}({', '.join(expected)})")
+            elif indexes[index.name] != expected:
+                problems.append(f"Index '{index.name}' covers {indexes[index.name]}, expected {expected}")
+    return problems
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+"""
+Baseline schema: users, places, reviews, amenities, place_amenity.
+
+Tables are created only if missing, so databases built from
+db/hbnb_schema.sql or db.create_all() are adopted as they are.
+"""
+from datetime import datetime
+from sqlalchemy import (MetaData, Table, Column, String, Integer, Float, Boolean,
+                        DateTime, ForeignKey)
+
+metadata = MetaData()
+
+
+def _timestamps():
+    return [
+        Column('created_at', DateTime, default=datetime.utcnow),
+        Column('updated_at', DateTime, default=datetime.utcnow),
+    ]
+
+
+Table(
+    'users', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('email', String(120), nullable=False, unique=True),
+    Column('password', String(128), nullable=False),
+    Column('first_name', String(50), nullable=False),
+    Column('last_name', String(50), nullable=False),
+    Column('is_admin', Boolean),
+    *_timestamps()
+)
+
+Table(
+    'amenities', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('name', String(128), nullable=False),
+    *_timestamps()
+)
+
+Table(
+    'places', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('user_id', String(36), ForeignKey('users.id'), nullable=False),
+    Column('name', String(128), nullable=False),
+    Column('description', String(1024)),
+    Column('address', String(255)),
+    Column('city_name', String(128)),
+    Column('number_rooms', Integer, nullable=False),
+    Column('number_bathrooms', Integer, nullable=False),
+    Column('max_guest', Integer, nullable=False),
+    Column('price_by_night', Integer, nullable=False),
+    Column('latitude', Float),
+    Column('longitude', Float),
+    *_timestamps()
+)
+
+Table(
+    'reviews', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('text', String(1024), nullable=False),
+    Column('rating', Integer, nullable=False),
+    Column('place_id', String(36), ForeignKey('places.id'), nullable=False),
+    Column('user_id', String(36), ForeignKey('users.id'), nullable=False),
+    *_timestamps()
+)
+
+Table(
+    'place_amenity', metadata,
+    Column('place_id', String(36), ForeignKey('places.id'), primary_key=True),
+    Column('amenity_id', String(36), ForeignKey('amenities.id'), primary_key=True),
+)
+
+Table(
+    'cache_invalidations', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('entity', String(64), nullable=False),
+    Column('obj_id', String(36)),
+    Column('created_at', DateTime, nullable=False, index=True),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
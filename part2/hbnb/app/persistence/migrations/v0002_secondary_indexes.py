@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+"""
+Secondary indexes for foreign-key lookups, filters and keyset pagination.
+"""
+from sqlalchemy import MetaData, Table, Index
+
+INDEXES = {
+    'reviews': [
+        ('ix_reviews_place_id_created_at', ['place_id', 'created_at']),
+        ('ix_reviews_user_id', ['user_id']),
+        ('ix_reviews_created_at_id', ['created_at', 'id']),
+    ],
+    'places': [
+        ('ix_places_user_id', ['user_id']),
+        ('ix_places_city_name_price_by_night', ['city_name', 'price_by_night']),
+        ('ix_places_created_at_id', ['created_at', 'id']),
+    ],
+    'amenities': [
+        ('ix_amenities_name', ['name']),
+        ('ix_amenities_created_at_id', ['created_at', 'id']),
+    ],
+    'users': [
+        ('ix_users_created_at_id', ['created_at', 'id']),
+    ],
+}
+
+
+def upgrade(conn):
+    metadata = MetaData()
+    for table_name, indexes in INDEXES.items():
+        table = Table(table_name, metadata, autoload_with=conn)
+        for name, columns in indexes:
+            Index(name, *[table.c[column] for column in columns]).create(conn, checkfirst=True)
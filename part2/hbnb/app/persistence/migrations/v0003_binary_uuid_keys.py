@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+"""
+Store IDs and foreign keys as 16-byte UUIDs instead of CHAR(36).
+
+Every table keyed by a UUID is rebuilt: a copy with BinaryUUID columns
+is created as <name>_v3, rows are copied over in chunks, the old table is
+dropped and the copy renamed. Foreign keys are declared between the
+copies and follow the renames; their ON DELETE rules and the unique
+constraints of the old tables are carried over. Indexes are created
+last, once the old ones are gone with their tables. Databases whose keys
+are already binary (e.g. created by db.create_all()) are left as they are.
+
+MySQL commits each DDL statement on its own: back the database up first.
+"""
+import uuid
+from datetime import datetime
+from sqlalchemy import (MetaData, Table, Column, String, Integer, Float, Boolean, DateTime,
+                        ForeignKey, UniqueConstraint, Index, inspect, select)
+from sqlalchemy.types import CHAR, String as StringType
+from app.models.types import BinaryUUID
+from app.persistence.migrations.v0002_secondary_indexes import INDEXES
+
+SUFFIX = '_v3'
+CHUNK_SIZE = 1000
+
+# Parents first
+TABLES = ['users', 'amenities', 'places', 'reviews', 'place_amenity']
+
+# UUID columns of each table
+UUID_COLUMNS = {
+    'users': ['id'],
+    'amenities': ['id'],
+    'places': ['id', 'user_id'],
+    'reviews': ['id', 'place_id', 'user_id'],
+    'place_amenity': ['place_id', 'amenity_id'],
+}
+
+
+def _timestamps():
+    return [
+        Column('created_at', DateTime, default=datetime.utcnow),
+        Column('updated_at', DateTime, default=datetime.utcnow),
+    ]
+
+
+def _target_tables(conn):
+    inspector = inspect(conn)
+
+    def reference(table_name, column, parent):
+        ondelete = next((fk['options'].get('ondelete') for fk in inspector.get_foreign_keys(table_name)
+                         if fk['constrained_columns'] == [column]), None)
+        return ForeignKey(parent + SUFFIX + '.id', ondelete=ondelete)
+
+    metadata = MetaData()
+    Table(
+        'users' + SUFFIX, metadata,
+        Column('id', BinaryUUID, primary_key=True),
+        Column('email', String(120), nullable=False),
+        Column('password', String(128), nullable=False),
+        Column('first_name', String(50), nullable=False),
+        Column('last_name', String(50), nullable=False),
+        Column('is_admin', Boolean),
+        *_timestamps(),
+        UniqueConstraint('email'),
+    )
+    Table(
+        'amenities' + SUFFIX, metadata,
+        Column('id', BinaryUUID, primary_key=True),
+        Column('name', String(128), nullable=False),
+        *_timestamps()
+    )
+    Table(
+        'places' + SUFFIX, metadata,
+        Column('id', BinaryUUID, primary_key=True),
+        Column('user_id', BinaryUUID, reference('places', 'user_id', 'users'), nullable=False),
+        Column('name', String(128), nullable=False),
+        Column('description', String(1024)),
+        Column('address', String(255)),
+        Column('city_name', String(128)),
+        Column('number_rooms', Integer, nullable=False),
+        Column('number_bathrooms', Integer, nullable=False),
+        Column('max_guest', Integer, nullable=False),
+        Column('price_by_night', Integer, nullable=False),
+        Column('latitude', Float),
+        Column('longitude', Float),
+        *_timestamps()
+    )
+    Table(
+        'reviews' + SUFFIX, metadata,
+        Column('id', BinaryUUID, primary_key=True),
+        Column('text', String(1024), nullable=False),
+        Column('rating', Integer, nullable=False),
+        Column('place_id', BinaryUUID, reference('reviews', 'place_id', 'places'), nullable=False),
+        Column('user_id', BinaryUUID, reference('reviews', 'user_id', 'users'), nullable=False),
+        *_timestamps()
+    )
+    Table(
+        'place_amenity' + SUFFIX, metadata,
+        Column('place_id', BinaryUUID, reference('place_amenity', 'place_id', 'places'), primary_key=True),
+        Column('amenity_id', BinaryUUID, reference('place_amenity', 'amenity_id', 'amenities'), primary_key=True),
+    )
+    for name in TABLES:
+        table = metadata.tables[name + SUFFIX]
+        declared = {tuple(sorted(c.name for c in constraint.columns))
+                    for constraint in table.constraints if isinstance(constraint, UniqueConstraint)}
+        for constraint in inspector.get_unique_constraints(name):
+            if tuple(sorted(constraint['column_names'])) not in declared:
+                table.append_constraint(UniqueConstraint(*constraint['column_names']))
+    return metadata
+
+
+def _has_text_keys(conn):
+    inspector = inspect(conn)
+    if not inspector.has_table('users'):
+        return False
+    id_type = next(column['type'] for column in inspector.get_columns('users') if column['name'] == 'id')
+    return isinstance(id_type, (CHAR, StringType))
+
+
+def _copy(conn, name, target):
+    source = Table(name, MetaData(), autoload_with=conn)
+    columns = [column.name for column in target.columns if column.name in source.c]
+    result = conn.execute(select(*[source.c[column] for column in columns]))
+    while True:
+        rows = [dict(row._mapping) for row in result.fetchmany(CHUNK_SIZE)]
+        if not rows:
+            break
+        for row in rows:
+            for column in UUID_COLUMNS[name]:
+                try:
+                    uuid.UUID(str(row[column]))
+                except ValueError:
+                    raise ValueError(f"{name}.{column} holds {row[column]!r}, which is not a UUID")
+        conn.execute(target.insert(), rows)
+
+
+def upgrade(conn):
+    if not _has_text_keys(conn):
+        return
+    metadata = _target_tables(conn)
+    metadata.create_all(conn)
+    for name in TABLES:
+        _copy(conn, name, metadata.tables[name + SUFFIX])
+    for name in reversed(TABLES):
+        Table(name, MetaData(), autoload_with=conn).drop(conn)
+    for name in TABLES:
+        conn.exec_driver_sql(f"ALTER TABLE {name}{SUFFIX} RENAME TO {name}")
+
+    renamed = MetaData()
+    for table_name, indexes in INDEXES.items():
+        table = Table(table_name, renamed, autoload_with=conn)
+        for index_name, columns in indexes:
+            Index(index_name, *[table.c[column] for column in columns]).create(conn, checkfirst=True)
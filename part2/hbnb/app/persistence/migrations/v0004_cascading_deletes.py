@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+"""
+Declare ON DELETE CASCADE on every foreign key, so the database deletes
+the reviews and amenity links of a deleted place (and the places and
+reviews of a deleted user) without the ORM loading them.
+
+PostgreSQL and MySQL drop each foreign key and add it back. SQLite cannot
+alter a constraint: as in v0003, the tables holding foreign keys are
+rebuilt as <name>_v4 copies referencing each other, filled, and renamed
+once the originals are dropped.
+"""
+from sqlalchemy import (MetaData, Table, Column, ForeignKeyConstraint, UniqueConstraint, Index,
+                        inspect, select)
+from sqlalchemy.schema import AddConstraint, DropConstraint
+
+SUFFIX = '_v4'
+CHUNK_SIZE = 1000
+
+# Tables holding foreign keys, parents first
+TABLES = ['places', 'reviews', 'place_amenity']
+
+
+def _cascades(constraint):
+    return (constraint.ondelete or '').upper() == 'CASCADE'
+
+
+def _alter_constraints(conn, tables):
+    for table in tables.values():
+        for constraint in list(table.foreign_key_constraints):
+            if _cascades(constraint):
+                continue
+            replacement = ForeignKeyConstraint(
+                [column.name for column in constraint.columns],
+                [element.target_fullname for element in constraint.elements],
+                name=constraint.name,
+                ondelete='CASCADE',
+            )
+            conn.execute(DropConstraint(constraint))
+            table.append_constraint(replacement)
+            conn.execute(AddConstraint(replacement))
+
+
+def _copy_definition(table, copies):
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+               server_default=column.server_default.arg if column.server_default is not None else None)
+        for column in table.columns
+    ]
+    constraints = []
+    for constraint in table.foreign_key_constraints:
+        # Copies reference the copies of rebuilt tables, the originals of the others
+        referred = copies.tables.get(constraint.referred_table.name + SUFFIX)
+        constraints.append(ForeignKeyConstraint(
+            [column.name for column in constraint.columns],
+            [referred.c[element.column.name] if referred is not None else element.column
+             for element in constraint.elements],
+            ondelete='CASCADE',
+        ))
+    constraints += [UniqueConstraint(*[column.name for column in constraint.columns])
+                    for constraint in table.constraints if isinstance(constraint, UniqueConstraint)]
+    return Table(table.name + SUFFIX, copies, *columns, *constraints)
+
+
+def _rebuild(conn, tables):
+    inspector = inspect(conn)
+    indexes = {name: inspector.get_indexes(name) for name in TABLES}
+    copies = MetaData()
+    for name in TABLES:
+        _copy_definition(tables[name], copies)
+    copies.create_all(conn)
+
+    for name in TABLES:
+        source, target = tables[name], copies.tables[name + SUFFIX]
+        result = conn.execute(select(*source.columns))
+        while True:
+            rows = [dict(row._mapping) for row in result.fetchmany(CHUNK_SIZE)]
+            if not rows:
+                break
+            conn.execute(target.insert(), rows)
+    # Children first: nothing references a table when it is dropped
+    for name in reversed(TABLES):
+        tables[name].drop(conn)
+    for name in TABLES:
+        conn.exec_driver_sql(f"ALTER TABLE {name}{SUFFIX} RENAME TO {name}")
+
+    renamed = MetaData()
+    for name in TABLES:
+        table = Table(name, renamed, autoload_with=conn)
+        for index in indexes[name]:
+            Index(index['name'], *[table.c[column] for column in index['column_names']],
+                  unique=index['unique']).create(conn, checkfirst=True)
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    if not all(inspector.has_table(name) for name in TABLES):
+        return
+    metadata = MetaData()
+    tables = {name: Table(name, metadata, autoload_with=conn) for name in TABLES}
+    if all(_cascades(constraint) for table in tables.values() for constraint in table.foreign_key_constraints):
+        return
+    if conn.dialect.name == 'sqlite':
+        _rebuild(conn, tables)
+    else:
+        _alter_constraints(conn, tables)
@@ -0,0 +1,22 @@
+#!/usr/bin/python3
+"""
+Indexes for place search: price order and amenity filters.
+"""
+from sqlalchemy import MetaData, Table, Index
+
+INDEXES = {
+    'places': [
+        ('ix_places_price_by_night_id', ['price_by_night', 'id']),
+    ],
+    'place_amenity': [
+        ('ix_place_amenity_amenity_id_place_id', ['amenity_id', 'place_id']),
+    ],
+}
+
+
+def upgrade(conn):
+    metadata = MetaData()
+    for table_name, indexes in INDEXES.items():
+        table = Table(table_name, metadata, autoload_with=conn)
+        for name, columns in indexes:
+            Index(name, *[table.c[column] for column in columns]).create(conn, checkfirst=True)
@@ -0,0 +1,27 @@
+#!/usr/bin/python3
+"""
+Add places.geohash, the geohash of a place's coordinates, and index it for
+radius and bounding box searches. Existing places are backfilled.
+"""
+from sqlalchemy import MetaData, Table, Index, bindparam, inspect, select
+from app.models.geo import encode_geohash
+
+CHUNK_SIZE = 1000
+
+
+def upgrade(conn):
+    if 'geohash' not in {column['name'] for column in inspect(conn).get_columns('places')}:
+        conn.exec_driver_sql("ALTER TABLE places ADD COLUMN geohash VARCHAR(12)")
+
+    places = Table('places', MetaData(), autoload_with=conn)
+    rows = conn.execute(
+        select(places.c.id, places.c.latitude, places.c.longitude)
+        .where(places.c.geohash.is_(None), places.c.latitude.is_not(None), places.c.longitude.is_not(None))
+    ).all()
+    update = (places.update().where(places.c.id == bindparam('place_id'))
+              .values(geohash=bindparam('place_geohash')))
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(update, [{'place_id': row.id, 'place_geohash': encode_geohash(row.latitude, row.longitude)}
+                              for row in rows[start:start + CHUNK_SIZE]])
+
+    Index('ix_places_geohash', places.c.geohash).create(conn, checkfirst=True)
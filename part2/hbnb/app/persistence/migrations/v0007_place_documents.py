@@ -0,0 +1,19 @@
+#!/usr/bin/python3
+"""
+Add place_documents and its full-text index, then index every place.
+The index is an FTS5 table on SQLite, a FULLTEXT index on MySQL and a GIN
+index on PostgreSQL (see app.models.place_document).
+"""
+from sqlalchemy import inspect, select
+from app.models.place import Place
+from app.models.place_document import place_documents
+from app.persistence.text_search import CHUNK_SIZE, reindex
+
+
+def upgrade(conn):
+    if inspect(conn).has_table(place_documents.name):
+        return
+    place_documents.create(conn)
+    place_ids = conn.execute(select(Place.__table__.c.id)).scalars().all()
+    for start in range(0, len(place_ids), CHUNK_SIZE):
+        reindex(conn, place_ids[start:start + CHUNK_SIZE])
@@ -0,0 +1,21 @@
+#!/usr/bin/python3
+"""
+Add amenities.bit and places.amenity_bits, the amenity bitsets of places.
+The oldest amenities get a bit each and every place gets the bits of the
+amenities it is linked to (see app.persistence.amenity_bits).
+"""
+from sqlalchemy import MetaData, Table, Index, inspect, select
+from app.models.amenity import Amenity
+from app.persistence.amenity_bits import assign
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    if 'bit' not in {column['name'] for column in inspector.get_columns('amenities')}:
+        conn.exec_driver_sql("ALTER TABLE amenities ADD COLUMN bit SMALLINT")
+    if 'amenity_bits' not in {column['name'] for column in inspector.get_columns('places')}:
+        conn.exec_driver_sql("ALTER TABLE places ADD COLUMN amenity_bits BIGINT NOT NULL DEFAULT 0")
+
+    amenities = Table('amenities', MetaData(), autoload_with=conn)
+    Index('ix_amenities_bit', amenities.c.bit, unique=True).create(conn, checkfirst=True)
+    assign(conn, conn.execute(select(Amenity.id)).scalars().all())
@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+"""
+Add users.first_name_key and users.last_name_key, the case-folded names,
+and index them with the id for name searches. Existing users are backfilled.
+"""
+from sqlalchemy import MetaData, Table, Index, bindparam, inspect, select
+from app.models.names import name_key
+
+CHUNK_SIZE = 1000
+
+
+def upgrade(conn):
+    existing = {column['name'] for column in inspect(conn).get_columns('users')}
+    for column in ('first_name_key', 'last_name_key'):
+        if column not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE users ADD COLUMN {column} VARCHAR(150)")
+
+    users = Table('users', MetaData(), autoload_with=conn)
+    rows = conn.execute(
+        select(users.c.id, users.c.first_name, users.c.last_name)
+        .where(users.c.first_name_key.is_(None) | users.c.last_name_key.is_(None))
+    ).all()
+    update = (users.update().where(users.c.id == bindparam('user_id'))
+              .values(first_name_key=bindparam('first_key'), last_name_key=bindparam('last_key')))
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(update, [{'user_id': row.id, 'first_key': name_key(row.first_name),
+                               'last_key': name_key(row.last_name)}
+                              for row in rows[start:start + CHUNK_SIZE]])
+
+    Index('ix_users_first_name_key_id', users.c.first_name_key, users.c.id).create(conn, checkfirst=True)
+    Index('ix_users_last_name_key_id', users.c.last_name_key, users.c.id).create(conn, checkfirst=True)
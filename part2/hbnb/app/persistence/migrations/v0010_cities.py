@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""
+Add cities and places.city_id, a foreign key set to NULL when the city is
+deleted. Existing places get the city of their city_name: one city per
+case-folded name, named like the oldest place spelling it that way.
+"""
+from datetime import datetime
+from sqlalchemy import MetaData, Table, ForeignKeyConstraint, Index, bindparam, func, inspect, select
+from sqlalchemy.schema import AddConstraint
+from app.models.city import City
+from app.models.identifiers import new_id
+from app.models.names import name_key
+from app.models.place import Place
+from app.models.types import BinaryUUID
+from app.persistence.cities import CHUNK_SIZE, recount
+
+
+def _add_city_id(conn):
+    column_type = BinaryUUID().compile(dialect=conn.dialect)
+    if conn.dialect.name == 'sqlite':
+        # SQLite cannot add a constraint to a table, only a column declaring one
+        conn.exec_driver_sql(f"ALTER TABLE places ADD COLUMN city_id {column_type} "
+                             "REFERENCES cities (id) ON DELETE SET NULL")
+        return
+    conn.exec_driver_sql(f"ALTER TABLE places ADD COLUMN city_id {column_type}")
+    places = Table('places', MetaData(), autoload_with=conn)
+    Table('cities', places.metadata, autoload_with=conn)
+    constraint = ForeignKeyConstraint(['city_id'], ['cities.id'], name='fk_places_city_id', ondelete='SET NULL')
+    places.append_constraint(constraint)
+    conn.execute(AddConstraint(constraint))
+
+
+def upgrade(conn):
+    City.__table__.create(conn, checkfirst=True)
+    if 'city_id' not in {column['name'] for column in inspect(conn).get_columns('places')}:
+        _add_city_id(conn)
+    reflected = Table('places', MetaData(), autoload_with=conn)
+    Index('ix_places_city_id_price_by_night', reflected.c.city_id, reflected.c.price_by_night).create(
+        conn, checkfirst=True)
+
+    # Statements go through the model tables, whose ID columns bind UUID strings
+    places, cities = Place.__table__, City.__table__
+    spellings = {}
+    for name, _ in conn.execute(select(places.c.city_name, func.min(places.c.created_at).label('first'))
+                                .where(places.c.city_id.is_(None), places.c.city_name.isnot(None))
+                                .group_by(places.c.city_name).order_by('first')):
+        if name_key(name):
+            spellings.setdefault(name_key(name), []).append(name)
+
+    city_ids = {}
+    keys = list(spellings)
+    for start in range(0, len(keys), CHUNK_SIZE):
+        city_ids.update(conn.execute(select(cities.c.name_key, cities.c.id)
+                                     .where(cities.c.name_key.in_(keys[start:start + CHUNK_SIZE]))).all())
+    now = datetime.utcnow()
+    new_cities = [{'id': new_id(), 'name': names[0].strip(), 'name_key': key, 'place_count': 0,
+                   'created_at': now, 'updated_at': now}
+                  for key, names in spellings.items() if key not in city_ids]
+    for start in range(0, len(new_cities), CHUNK_SIZE):
+        conn.execute(cities.insert(), new_cities[start:start + CHUNK_SIZE])
+    city_ids.update((city['name_key'], city['id']) for city in new_cities)
+
+    assign = (places.update()
+              .where(places.c.city_name == bindparam('spelling'), places.c.city_id.is_(None))
+              .values(city_id=bindparam('city')))
+    rows = [{'spelling': name, 'city': city_ids[key]} for key, names in spellings.items() for name in names]
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(assign, rows[start:start + CHUNK_SIZE])
+    recount(conn, city_ids.values())
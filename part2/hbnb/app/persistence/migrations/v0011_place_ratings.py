@@ -0,0 +1,17 @@
+#!/usr/bin/python3
+"""
+Add the rating aggregates of places: review_count, rating_sum and
+rating_1 .. rating_5, then count them from the existing reviews (see
+app.persistence.ratings).
+"""
+from sqlalchemy import inspect
+from app.models.place import RATING_COLUMNS
+from app.persistence.ratings import rebuild
+
+
+def upgrade(conn):
+    existing = {column['name'] for column in inspect(conn).get_columns('places')}
+    for name in RATING_COLUMNS:
+        if name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE places ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0")
+    rebuild(conn)
@@ -0,0 +1,183 @@
+#!/usr/bin/python3
+"""
+Connection pool instrumentation.
+
+Engines built from a pool profile (config.ENGINE_PROFILES) use
+InstrumentedQueuePool, which records checkouts, the time spent waiting for
+a connection (a histogram, in milliseconds), overflow usage, timeouts and
+invalidations; the asyncio engines of the coroutine routes use
+InstrumentedAsyncQueuePool. pool_stats() reports them for the primary and
+every replica.
+"""
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app import db
+
+# Upper bounds, in milliseconds, of the checkout wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolMetrics:
+    """
+    Thread-safe counters of one connection pool.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.peak_overflow = 0
+        self.wait_count = 0
+        self.wait_sum_ms = 0.0
+        self.wait_max_ms = 0.0
+        self._buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record_checkout(self, seconds, overflow):
+        with self._lock:
+            self.checkouts += 1
+            self.peak_overflow = max(self.peak_overflow, overflow)
+            self._observe_wait(seconds * 1000)
+
+    def record_timeout(self, seconds):
+        with self._lock:
+            self.timeouts += 1
+            self._observe_wait(seconds * 1000)
+
+    def _observe_wait(self, ms):
+        self.wait_count += 1
+        self.wait_sum_ms += ms
+        self.wait_max_ms = max(self.wait_max_ms, ms)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if ms <= bound:
+                self._buckets[i] += 1
+                return
+        self._buckets[-1] += 1
+
+    def on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def on_soft_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.soft_invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(WAIT_BUCKETS_MS + (None,), self._buckets):
+                cumulative += count
+                buckets.append({'le_ms': bound, 'count': cumulative})
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'soft_invalidations': self.soft_invalidations,
+                'peak_overflow': self.peak_overflow,
+                'checkout_wait': {
+                    'count': self.wait_count,
+                    'sum_ms': self.wait_sum_ms,
+                    'max_ms': self.wait_max_ms,
+                    'buckets': buckets,
+                },
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool timing every checkout. The wait includes opening a new
+    connection when the pool has to grow.
+    """
+    # Log as the QueuePool it extends (echo_pool governs it), not under
+    # the app logger, which debug mode sets to DEBUG
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.QueuePool'
+
+    def __init__(self, *args, **kw):
+        recreated = '_dispatch' in kw
+        super().__init__(*args, **kw)
+        self.metrics = PoolMetrics()
+        if not recreated:
+            # recreate() copies the listeners over to the new pool, together
+            # with this metrics object (see below)
+            event.listen(self, 'connect', self.metrics.on_connect)
+            event.listen(self, 'invalidate', self.metrics.on_invalidate)
+            event.listen(self, 'soft_invalidate', self.metrics.on_soft_invalidate)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - start)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start, max(self.overflow(), 0))
+        return conn
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """
+    InstrumentedQueuePool for asyncio engines.
+    """
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.AsyncAdaptedQueuePool'
+
+
+def _instrumented(options):
+    if 'max_overflow' in options and 'poolclass' not in options:
+        return dict(options, poolclass=InstrumentedQueuePool)
+    return options
+
+
+def instrument_engine_options(app):
+    """
+    Makes engines configured with a queue pool profile, the primary's and
+    the replicas', use InstrumentedQueuePool. Must run before db.init_app(app).
+    """
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS')
+    if options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _instrumented(options)
+    binds = app.config.get('SQLALCHEMY_BINDS')
+    if binds:
+        app.config['SQLALCHEMY_BINDS'] = {
+            key: _instrumented(value) if isinstance(value, dict) else value
+            for key, value in binds.items()
+        }
+
+
+def pool_stats(async_engines=None):
+    """
+    Current state and counters of every engine's pool, by bind
+    ('primary' for the default engine), then of the asyncio engines
+    given, by name.
+    """
+    engines = {key or 'primary': engine for key, engine in db.engines.items()}
+    engines.update(async_engines or {})
+    stats = {}
+    for key, engine in engines.items():
+        pool = engine.pool
+        values = {'pool_class': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            values.update({
+                'pool_size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+            })
+        if isinstance(pool, InstrumentedQueuePool):
+            values.update(pool.metrics.stats())
+        stats[key] = values
+    return stats
@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+"""
+Column projections for list endpoints.
+
+A projection selects only the columns a response model reads and returns
+plain dicts, skipping ORM object construction and the identity map. It is
+described by a fields mapping, {attribute: None} for a column (or a SQL
+expression such as a place's average rating) and {attribute: {...}} for a
+relationship, whose columns are projected the same way:
+- a many-to-one relationship is joined into the main query;
+- a collection is loaded by one extra query for the whole page.
+Anything else is left out of the rows.
+"""
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import RelationshipDirection, aliased
+
+
+def _columns(model, fields, always=()):
+    table = model.__table__
+    keys = set(always) | {key for key in fields if key in table.c}
+    return [table.c[key] for key in table.c.keys() if key in keys]
+
+
+class Projection:
+    """
+    The statements and row mapping of one projection of model.
+    expressions maps attribute names to SQL expressions correlated to model.
+    """
+    def __init__(self, model, fields: Dict[str, Any], expressions: Optional[Dict[str, Any]] = None):
+        self.model = model
+        self.fields = fields
+        self.expressions = {key: expr for key, expr in (expressions or {}).items() if key in fields}
+        relationships = inspect(model).relationships
+        self.references = {}
+        self.collections = {}
+        for key, nested in fields.items():
+            if key not in relationships or not isinstance(nested, dict):
+                continue
+            prop = relationships[key]
+            if prop.direction is RelationshipDirection.MANYTOONE:
+                self.references[key] = (prop, nested)
+            else:
+                self.collections[key] = (prop, nested)
+
+    def statement(self, extra=()):
+        """
+        SELECT of the model's columns (always including id, created_at and
+        the extra ones, e.g. the pagination key), joined references and
+        expressions.
+        """
+        columns = _columns(self.model, self.fields, always=('id', 'created_at') + tuple(extra))
+        columns += [expr.label(key) for key, expr in self.expressions.items()]
+        joins = []
+        for key, (prop, nested) in self.references.items():
+            target = aliased(prop.mapper.class_)
+            (local, remote), = prop.local_remote_pairs
+            joins.append((target, getattr(target, remote.key) == local))
+            columns += [getattr(target, column.key).label(f"{key}__{column.key}")
+                        for column in _columns(prop.mapper.class_, nested)]
+        stmt = select(*columns)
+        for target, onclause in joins:
+            stmt = stmt.outerjoin(target, onclause)
+        return stmt
+
+    def collection_statements(self, ids: List[Any]):
+        """
+        (attribute, SELECT) pairs loading every collection of the given
+        rows; each selected row carries its owner's ID as _owner_id.
+        """
+        statements = []
+        for key, (prop, nested) in self.collections.items():
+            target = prop.mapper.class_.__table__
+            columns = _columns(prop.mapper.class_, nested)
+            if prop.secondary is not None:
+                (_, owner_column), = prop.synchronize_pairs
+                (target_column, secondary_column), = prop.secondary_synchronize_pairs
+                stmt = (select(owner_column.label('_owner_id'), *columns)
+                        .join(target, target_column == secondary_column)
+                        .where(owner_column.in_(ids)))
+            else:
+                (_, owner_column), = prop.synchronize_pairs
+                stmt = select(owner_column.label('_owner_id'), *columns).where(owner_column.in_(ids))
+            statements.append((key, stmt))
+        return statements
+
+    def to_dicts(self, rows, collections: Dict[str, List[Any]]):
+        """
+        Turns the main rows into dicts, nesting references and collections.
+        """
+        grouped = {}
+        for key, collection_rows in collections.items():
+            by_owner = defaultdict(list)
+            for row in collection_rows:
+                item = dict(row._mapping)
+                by_owner[item.pop('_owner_id')].append(item)
+            grouped[key] = by_owner
+
+        items = []
+        for row in rows:
+            item = {}
+            references = defaultdict(dict)
+            for name, value in row._mapping.items():
+                key, sep, column = name.partition('__')
+                if sep and key in self.references:
+                    references[key][column] = value
+                else:
+                    item[name] = value
+            for key in self.references:
+                # An outer join without a match selects only NULLs
+                values = references.get(key, {})
+                item[key] = values if any(value is not None for value in values.values()) else None
+            for key, by_owner in grouped.items():
+                item[key] = by_owner.get(item['id'], [])
+            items.append(item)
+        return items
@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+"""
+Rating aggregates of places.
+
+Place.review_count, rating_sum and rating_1 .. rating_5 (how many reviews
+gave each number of stars) follow the reviews in the transaction that
+writes them:
+- a review the ORM inserts, updates or deletes adds its deltas to its
+  place's row with one UPDATE on the flush's connection, so reviews of
+  one place written concurrently never lose each other's counts;
+- writes the ORM does not see (bulk upserts and deletes of reviews, the
+  reviews of a deleted user) schedule() their places instead: just before
+  the transaction commits, rebuild() recounts them from their reviews
+  (read from ix_reviews_place_id_created_at).
+rebuild() also reconciles every place in bulk (see reconcile_ratings.py).
+It locks the rows of the places it recounts before reading their reviews:
+a concurrent review write, whose delta UPDATE holds the same row lock,
+either commits before the count sees it or waits for the rebuild's
+transaction to end, so its delta is never overwritten.
+"""
+from typing import Dict, Iterable, Optional
+from sqlalchemy import bindparam, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from app import db
+from app.models.place import Place, RATING_COLUMNS, STAR_COLUMNS
+from app.models.review import Review
+from app.persistence import cache as repository_cache
+
+_PENDING_KEY = 'ratings_pending_places'
+_TOUCHED_KEY = 'ratings_touched_places'
+
+CHUNK_SIZE = 500
+
+
+def deltas(rating: int, step: int) -> Dict[str, int]:
+    """What adding (step 1) or removing (step -1) a review of rating changes"""
+    changes = {'review_count': step, 'rating_sum': step * rating}
+    if 1 <= rating <= len(STAR_COLUMNS):
+        changes[STAR_COLUMNS[rating - 1]] = step
+    return changes
+
+
+def tally(place, rating: int, step: int):
+    """Applies deltas() to a place held in memory"""
+    for name, delta in deltas(rating, step).items():
+        setattr(place, name, (getattr(place, name) or 0) + delta)
+
+
+def _add(connection, place_id, rating, step):
+    places = Place.__table__
+    connection.execute(update(places).where(places.c.id == place_id)
+                       .values({name: places.c[name] + delta for name, delta in deltas(rating, step).items()}))
+
+
+def _touched(review, place_ids: Iterable[str]):
+    Session.object_session(review).info.setdefault(_TOUCHED_KEY, set()).update(place_ids)
+
+
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, review):
+    _add(connection, review.place_id, review.rating, 1)
+    _touched(review, [review.place_id])
+
+
+@event.listens_for(Review, 'after_update')
+def _review_updated(mapper, connection, review):
+    state = inspect(review)
+    place, rating = state.attrs.place_id.history, state.attrs.rating.history
+    if not place.has_changes() and not rating.has_changes():
+        return
+    if (place.has_changes() and not place.deleted) or (rating.has_changes() and not rating.deleted):
+        # Set without having been loaded: the old value is unknown
+        schedule([review.place_id], Session.object_session(review))
+        return
+    old_place = place.deleted[0] if place.deleted else review.place_id
+    old_rating = rating.deleted[0] if rating.deleted else review.rating
+    _add(connection, old_place, old_rating, -1)
+    _add(connection, review.place_id, review.rating, 1)
+    _touched(review, {old_place, review.place_id})
+
+
+@event.listens_for(Review, 'after_delete')
+def _review_deleted(mapper, connection, review):
+    state = inspect(review)
+    place, rating = state.attrs.place_id.history, state.attrs.rating.history
+    # The row as stored, whatever was changed on the object since
+    place_id = place.deleted[0] if place.deleted else review.place_id
+    _add(connection, place_id, rating.deleted[0] if rating.deleted else review.rating, -1)
+    _touched(review, [place_id])
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_touched(session, flush_context):
+    # The places of this session hold the aggregates they were loaded with
+    for place_id in session.info.pop(_TOUCHED_KEY, ()):
+        place = session.identity_map.get(identity_key(Place, place_id))
+        if place is not None:
+            session.expire(place, RATING_COLUMNS)
+
+
+def schedule(place_ids: Iterable[Optional[str]], session: Optional[Session] = None):
+    """Recounts the rating aggregates of these places when the current transaction commits"""
+    session = session if session is not None else db.session
+    session.info.setdefault(_PENDING_KEY, set()).update(
+        place_id for place_id in place_ids if place_id is not None)
+
+
+# Before any other hook reads the places
+@event.listens_for(Session, 'before_commit', insert=True)
+def _recount_pending(session):
+    place_ids = session.info.pop(_PENDING_KEY, None)
+    if not place_ids:
+        return
+    session.flush()
+    rebuild(session, place_ids)
+    for place_id in place_ids:
+        place = session.identity_map.get(identity_key(Place, place_id))
+        if place is not None:
+            session.expire(place, RATING_COLUMNS)
+        repository_cache.invalidate(Place.__tablename__, str(place_id))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_TOUCHED_KEY, None)
+
+
+def rebuild(conn, place_ids: Optional[Iterable[str]] = None) -> int:
+    """
+    Recounts the rating aggregates of the given places, or of every place,
+    from their reviews, CHUNK_SIZE places at a time: a locking read of
+    their rows (in ID order, so concurrent rebuilds never deadlock), one
+    grouped read of their reviews and one batched UPDATE of those whose
+    aggregates were off. Returns how many were. conn is a connection or
+    a session; the locks last until its transaction ends, so jobs going
+    over many places commit after each chunk (see place_id_chunks()).
+    """
+    places, reviews = Place.__table__, Review.__table__
+    counts = [func.count(), func.coalesce(func.sum(reviews.c.rating), 0)]
+    counts += [func.count(reviews.c.id).filter(reviews.c.rating == stars)
+               for stars in range(1, len(STAR_COLUMNS) + 1)]
+    fix = (update(places).where(places.c.id == bindparam('place_id'))
+           .values({name: bindparam(name) for name in RATING_COLUMNS}))
+    fixed = 0
+    if place_ids is None:
+        chunks = place_id_chunks(conn)
+    else:
+        place_ids = sorted(place_ids)
+        chunks = (place_ids[start:start + CHUNK_SIZE] for start in range(0, len(place_ids), CHUNK_SIZE))
+    for chunk in chunks:
+        stored = conn.execute(select(places.c.id, *[places.c[name] for name in RATING_COLUMNS])
+                              .where(places.c.id.in_(chunk)).order_by(places.c.id).with_for_update()).all()
+        actual = {row[0]: tuple(row[1:]) for row in conn.execute(
+            select(reviews.c.place_id, *counts).where(reviews.c.place_id.in_(chunk)).group_by(reviews.c.place_id))}
+        stale = []
+        for row in stored:
+            values = actual.get(row[0], (0,) * len(RATING_COLUMNS))
+            if tuple(row[1:]) != values:
+                stale.append({'place_id': row[0], **dict(zip(RATING_COLUMNS, values))})
+        if stale:
+            conn.execute(fix, stale)
+        fixed += len(stale)
+    return fixed
+
+
+def place_id_chunks(conn):
+    """Every place ID, CHUNK_SIZE at a time, in keyset order"""
+    places = Place.__table__
+    last = None
+    while True:
+        stmt = select(places.c.id).order_by(places.c.id).limit(CHUNK_SIZE)
+        if last is not None:
+            stmt = stmt.where(places.c.id > last)
+        chunk = conn.execute(stmt).scalars().all()
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
@@ -3,16 +3,211 @@
 Repository pattern implementation
 """
 from abc import ABC, abstractmethod
-from typing import Type, List, Optional, Any, Dict
+from typing import Type, List, Optional, Any, Dict, Tuple
+import base64
+import binascii
+import json
 import uuid
+from datetime import datetime
+from sqlalchemy import and_, or_, bindparam, func, select, delete, inspect, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.exc import IntegrityError
 from app import db
+from app.persistence.unit_of_work import in_unit_of_work
+from app.persistence import cache as repository_cache
+from app.persistence.projection import Projection
+from app.persistence.geo import GeoSearch, Located
+from app.persistence import amenity_bits, cities, clusters, columnar, facets, ratings, similarity, text_search
+from app.models.geo import encode_geohash
 
 # Import all models
 from app.models.user import User
-from app.models.place import Place
+from app.models.names import name_key
+from app.models.place import Place, place_amenity, RATING_COLUMNS
 from app.models.review import Review
 from app.models.amenity import Amenity
+from app.models.city import City
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+BULK_CHUNK_SIZE = 500
+# session.info key of the cities of the places an upsert is writing
+_UPSERTED_CITIES_KEY = 'places_upserted_cities'
+
+
+def encode_cursor(created_at: datetime, obj_id: str) -> str:
+    """
+    Encodes the (created_at, id) sort key of the last row of a page
+    into an opaque, URL-safe cursor string.
+    """
+    raw = f"{created_at.isoformat()}|{obj_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Decodes a cursor produced by encode_cursor.
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        created_at, obj_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), obj_id
+    except (ValueError, UnicodeError, binascii.Error):
+        raise ValueError("Invalid pagination cursor.")
+
+
+def canonical_id(obj_id: Any) -> Optional[str]:
+    """The canonical string of a UUID key, as the database returns it; None if it is not one"""
+    try:
+        return str(obj_id if isinstance(obj_id, uuid.UUID) else uuid.UUID(str(obj_id)))
+    except ValueError:
+        return None
+
+
+def clamp_page_size(limit: int) -> int:
+    """Bounds a requested page size to [1, MAX_PAGE_SIZE]"""
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def after_cursor(model, cursor: str):
+    """
+    Range predicate selecting the rows that sort after a cursor on
+    (created_at, id), so a deep page costs the same index seek as the first.
+    """
+    created_at, obj_id = decode_cursor(cursor)
+    return or_(
+        model.created_at > created_at,
+        and_(model.created_at == created_at, model.id > obj_id)
+    )
+
+
+class SortKey:
+    """
+    A keyset sort order on (attribute, id), ascending or descending.
+    The default, creation order, uses the cursors of encode_cursor; named
+    orders tag their cursors with their name, so a cursor issued for one
+    order is rejected by another. parse turns a cursor value back into the
+    attribute's type.
+    """
+    def __init__(self, name: Optional[str] = None, attribute: str = 'created_at', descending: bool = False,
+                 parse=datetime.fromisoformat):
+        self.name = name
+        self.attribute = attribute
+        self.descending = descending
+        self.parse = parse
+
+    def order_by(self, model):
+        columns = [getattr(model, self.attribute), model.id]
+        return [column.desc() for column in columns] if self.descending else columns
+
+    def after(self, model, cursor: str):
+        """Range predicate selecting the rows that sort after cursor"""
+        if self.name is None:
+            return after_cursor(model, cursor)
+        value, obj_id = self.decode(cursor)
+        column = getattr(model, self.attribute)
+        if self.descending:
+            return or_(column < value, and_(column == value, model.id < obj_id))
+        return or_(column > value, and_(column == value, model.id > obj_id))
+
+    def key(self, obj) -> Tuple[Any, str]:
+        return getattr(obj, self.attribute), obj.id
+
+    def decode_key(self, cursor: str) -> Tuple[Any, str]:
+        """The (attribute, id) key of the row a cursor was issued after"""
+        return decode_cursor(cursor) if self.name is None else self.decode(cursor)
+
+    def encode(self, obj) -> str:
+        value, obj_id = self.key(obj)
+        if self.name is None:
+            return encode_cursor(value, obj_id)
+        value = value.isoformat() if isinstance(value, datetime) else value
+        raw = json.dumps([self.name, value, obj_id]).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode(self, cursor: str) -> Tuple[Any, str]:
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            name, value, obj_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if name != self.name:
+                raise ValueError
+            return self.parse(value), obj_id
+        except (ValueError, TypeError, UnicodeError, binascii.Error):
+            raise ValueError("Invalid pagination cursor.")
+
+    def page(self, rows: List[Any], limit: int, total: Optional[int] = None) -> 'Page':
+        """Page.from_rows, with this order's cursor"""
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode(rows[-1])
+        return Page(rows, next_cursor, total)
+
+    def slice(self, rows: List[Any], limit: int, cursor: Optional[str] = None,
+              total: Optional[int] = None) -> 'Page':
+        """The page after cursor of rows already sorted in this order"""
+        limit = clamp_page_size(limit)
+        start = 0
+        if cursor:
+            last = self.decode_key(cursor)
+            start = next((index for index, row in enumerate(rows)
+                          if (self.key(row) < last if self.descending else self.key(row) > last)), len(rows))
+        return self.page(rows[start:start + limit + 1], limit, total)
+
+
+# Order of the plain list endpoints
+CREATION_ORDER = SortKey()
+# Order of geographic searches: nearest first
+DISTANCE_ORDER = SortKey('distance', 'distance_km', parse=float)
+# Order of full-text searches: most relevant (lowest rank) first
+RELEVANCE_ORDER = SortKey('relevance', 'relevance', parse=float)
+
+
+class Page:
+    """
+    A single page of results from a keyset-paginated query.
+    next_cursor is None on the last page; total is only set when requested.
+    """
+    def __init__(self, items: List[Any], next_cursor: Optional[str] = None, total: Optional[int] = None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.total = total
+
+    @classmethod
+    def from_rows(cls, rows: List[Any], limit: int, total: Optional[int] = None) -> 'Page':
+        """
+        Builds a page from up to limit + 1 rows; the extra row only tells
+        that another page follows.
+        """
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return cls(rows, next_cursor, total)
+
+
+class BulkResult:
+    """
+    Outcome of a bulk write.
+    created holds {'index', 'id'} for every stored row and errors holds
+    {'index', 'error'} for every rejected one, indexed by input position.
+    """
+    def __init__(self):
+        self.created = []
+        self.errors = []
+
+    def add_created(self, index: int, obj_id: Any):
+        self.created.append({'index': index, 'id': obj_id})
+
+    def add_error(self, index: int, message: str):
+        self.errors.append({'index': index, 'error': message})
+
 
 class Repository(ABC):
     """
@@ -30,6 +225,11 @@ class Repository(ABC):
     def get_all(self) -> List[Any]:
         pass
 
+    @abstractmethod
+    def get_page(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                 include_total: bool = False) -> Page:
+        pass
+
     @abstractmethod
     def update(self, obj_id: Any, data: Dict[str, Any]) -> Optional[Any]:
         pass
@@ -47,12 +247,24 @@ class SQLAlchemyRepository(Repository):
     """
     Database storage using SQLAlchemy.
     This provides generic CRUD for any model.
+    get() reads through self.cache when one is configured
+    (see app.persistence.cache).
     """
+    # Entities whose cached objects go stale when objects of this one are deleted
+    dependent_entities = ()
+
     def __init__(self, model: Type[db.Model]):
         self.model = model
+        self.cache = None
 
     def add(self, obj):
         db.session.add(obj)
+        self._written([obj])
+        # A new ID has nothing cached; only dependent entries need dropping
+        for entity, obj_id in self._related_invalidations(obj):
+            repository_cache.invalidate(entity, obj_id)
+        if in_unit_of_work():
+            return obj
         try:
             db.session.commit()
             db.session.refresh(obj)
@@ -65,17 +277,311 @@ class SQLAlchemyRepository(Repository):
             raise e
 
     def get(self, obj_id):
-        return db.session.get(self.model, obj_id)
+        if self.cache is None:
+            return db.session.get(self.model, obj_id)
+        return self._cached_get(obj_id)
+
+    def _cached_get(self, obj_id, options=None):
+        """
+        Serves get() from the cache, falling back to the database.
+        Objects already in the session are returned as they are, and nothing
+        read inside an uncommitted write is cached. Entries are keyed by the
+        canonical ID, the one writes invalidate; IDs that are not UUIDs
+        are never cached.
+        """
+        key = canonical_id(obj_id)
+        if key is None or db.session.identity_map.get(identity_key(self.model, key)) is not None:
+            return db.session.get(self.model, obj_id, options=options)
+
+        repository_cache.sync_caches()
+        found, obj = self.cache_lookup(key)
+        if found:
+            if obj is not None:
+                self._on_cache_hit(obj)
+            return obj
+
+        obj = db.session.get(self.model, obj_id, options=options)
+        self.cache_store(key, obj)
+        return obj
+
+    def cache_lookup(self, key):
+        """
+        Returns (found, obj) for a canonical ID, from the session or the
+        cache, without touching the database. A cached negative lookup is
+        (True, None). Relationships of a cached object load lazily.
+        """
+        obj = db.session.identity_map.get(identity_key(self.model, key))
+        if obj is not None:
+            return True, obj
+        found, values = self.cache.get(key)
+        if not found or values is None:
+            return found, None
+        return True, repository_cache.hydrate(self.model, values)
+
+    def cache_store(self, key, obj):
+        """
+        Caches what a read of a canonical ID found (None: nothing), unless
+        it was read inside an uncommitted write.
+        """
+        if in_unit_of_work() or db.session.new or db.session.dirty or db.session.deleted:
+            return
+        if obj is None:
+            self.cache.set_missing(key)
+        else:
+            values = repository_cache.snapshot(obj)
+            if values is not None:
+                self.cache.set(key, values)
+
+    def _on_cache_hit(self, obj):
+        """Hook to fill in relationships of an object rebuilt from the cache"""
+        pass
+
+    def _invalidate(self, obj):
+        """
+        Drops obj, and whatever caches its change makes stale, from the
+        repository caches once the current transaction commits.
+        """
+        repository_cache.invalidate(self.model.__tablename__, str(obj.id))
+        for entity, obj_id in self._related_invalidations(obj):
+            repository_cache.invalidate(entity, obj_id)
+
+    def _related_invalidations(self, obj):
+        """(entity, id) pairs to invalidate along with obj; id None means all"""
+        return []
+
+    def _written(self, objs):
+        """Hook called with the objects a write adds, updates or deletes, before it commits"""
+
+    def _written_ids(self, obj_ids):
+        """Like _written, for rows written by ID"""
+
+    def _writing_ids(self, obj_ids):
+        """Hook called with the IDs upsert_many is about to write"""
+
+    def _deleting_ids(self, obj_ids):
+        """Hook called with the IDs delete_many is about to delete"""
+        self._written_ids(obj_ids)
+
+    def get_many(self, obj_ids):
+        """Fetch several objects by ID in a single query"""
+        if not obj_ids:
+            return []
+        return self.model.query.filter(self.model.id.in_(list(obj_ids))).all()
 
     def get_all(self):
         return self.model.query.all()
 
+    def get_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+        return self._paginate(self.model.query, limit, cursor, include_total)
+
+    def get_page_projection(self, fields, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+        """
+        Like get_page, but selects only the columns fields names (see
+        app.persistence.projection) and returns dicts instead of objects.
+        """
+        return self._projected_page(fields, limit, cursor, include_total)
+
+    def _projected_page(self, fields, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False,
+                        criteria=(), sort=CREATION_ORDER):
+        """
+        A page of the rows matching every criterion, in sort order, as
+        dicts of fields.
+        """
+        projection = Projection(self.model, fields, self._projected_expressions())
+        limit = clamp_page_size(limit)
+        total = None
+        if include_total:
+            total = db.session.scalar(select(func.count()).select_from(self.model).where(*criteria))
+
+        stmt = projection.statement(extra=(sort.attribute,)).where(*criteria)
+        if cursor:
+            stmt = stmt.where(sort.after(self.model, cursor))
+        rows = db.session.execute(stmt.order_by(*sort.order_by(self.model)).limit(limit + 1)).all()
+        page = sort.page(rows, limit, total)
+
+        collections = {}
+        if page.items:
+            for key, collection_stmt in projection.collection_statements([row.id for row in page.items]):
+                collections[key] = db.session.execute(collection_stmt).all()
+        page.items = projection.to_dicts(page.items, collections)
+        return page
+
+    def _projected_expressions(self):
+        """SQL expressions projections can select besides columns, by attribute"""
+        return {}
+
+    def _paginate(self, query, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False, sort=CREATION_ORDER):
+        """
+        Keyset pagination ordered by sort, (created_at, id) by default.
+        The cursor is turned into a range predicate on the sort key, so
+        fetching a deep page costs the same index seek as the first one.
+        """
+        limit = clamp_page_size(limit)
+        total = query.order_by(None).count() if include_total else None
+
+        if cursor:
+            query = query.filter(sort.after(self.model, cursor))
+
+        # Fetch one extra row to know whether another page follows
+        rows = query.order_by(*sort.order_by(self.model)).limit(limit + 1).all()
+        return sort.page(rows, limit, total)
+
+    def add_many(self, objs, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Insert many objects, committing once per chunk.
+        IDs are generated client-side, so the session batches each
+        chunk into executemany/multi-row INSERTs without refreshing rows.
+        A chunk that violates a constraint is retried row by row so that
+        only the offending rows are reported in the result.
+        Inside a unit of work chunks are only flushed, and a constraint
+        violation aborts the whole unit instead.
+        """
+        result = BulkResult()
+        for start in range(0, len(objs), chunk_size):
+            chunk = list(enumerate(objs[start:start + chunk_size], start))
+            ids = [obj.id for _, obj in chunk]
+            db.session.add_all([obj for _, obj in chunk])
+            self._written([obj for _, obj in chunk])
+            if in_unit_of_work():
+                db.session.flush()
+                for (index, _), obj_id in zip(chunk, ids):
+                    result.add_created(index, obj_id)
+                continue
+            try:
+                db.session.commit()
+                for (index, _), obj_id in zip(chunk, ids):
+                    result.add_created(index, obj_id)
+            except IntegrityError:
+                db.session.rollback()
+                self._add_one_by_one(chunk, result)
+        return result
+
+    def _add_one_by_one(self, chunk, result):
+        for index, obj in chunk:
+            obj_id = obj.id
+            db.session.add(obj)
+            self._written([obj])
+            try:
+                db.session.commit()
+                result.add_created(index, obj_id)
+            except IntegrityError as e:
+                db.session.rollback()
+                result.add_error(index, f"Integrity Error: {str(e.orig)}")
+
+    def upsert_many(self, rows, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Insert or update many rows (dicts of column values) keyed on the
+        primary key, using the dialect's native upsert statement.
+        Rows without an 'id' are inserted with a new one.
+        """
+        result = BulkResult()
+        table = self.model.__table__
+        now = datetime.utcnow()
+        prepared = []
+        for index, row in enumerate(rows):
+            unknown = [key for key in row if key not in table.c]
+            if unknown:
+                result.add_error(index, f"Unknown field(s): {', '.join(sorted(unknown))}")
+                continue
+            values = dict(row)
+            values.setdefault('id', self.model.new_id())
+            values.setdefault('created_at', now)
+            values['updated_at'] = now
+            self._derive_columns(values)
+            prepared.append((index, values))
+
+        # executemany needs every row in a statement to share the same keys
+        groups = {}
+        for index, values in prepared:
+            groups.setdefault(tuple(sorted(values)), []).append((index, values))
+
+        for keys, group in groups.items():
+            for start in range(0, len(group), chunk_size):
+                chunk = group[start:start + chunk_size]
+                # Rows may overwrite cached objects: drop the whole entity
+                repository_cache.invalidate(self.model.__tablename__)
+                if in_unit_of_work():
+                    self._writing_ids([values['id'] for _, values in chunk])
+                    self._upsert(keys, [values for _, values in chunk])
+                    self._written_ids([values['id'] for _, values in chunk])
+                    for index, values in chunk:
+                        result.add_created(index, values['id'])
+                    continue
+                try:
+                    self._writing_ids([values['id'] for _, values in chunk])
+                    self._upsert(keys, [values for _, values in chunk])
+                    self._written_ids([values['id'] for _, values in chunk])
+                    db.session.commit()
+                    for index, values in chunk:
+                        result.add_created(index, values['id'])
+                except IntegrityError:
+                    db.session.rollback()
+                    for index, values in chunk:
+                        try:
+                            repository_cache.invalidate(self.model.__tablename__)
+                            self._writing_ids([values['id']])
+                            self._upsert(keys, [values])
+                            self._written_ids([values['id']])
+                            db.session.commit()
+                            result.add_created(index, values['id'])
+                        except IntegrityError as e:
+                            db.session.rollback()
+                            result.add_error(index, f"Integrity Error: {str(e.orig)}")
+        return result
+
+    def _derive_columns(self, values):
+        """Fills in columns computed from others in a row about to be upserted"""
+
+    def _upsert(self, keys, rows):
+        """
+        Writes rows sharing keys with the dialect's native upsert. Other
+        dialects look up which IDs exist, then insert the new rows and
+        update the others, in the same transaction.
+        """
+        stmt = self._upsert_statement(keys)
+        if stmt is not None:
+            db.session.execute(stmt, rows)
+            return
+        table = self.model.__table__
+        existing = set(db.session.scalars(select(table.c.id).where(table.c.id.in_([row['id'] for row in rows]))))
+        inserts = [row for row in rows if canonical_id(row['id']) not in existing]
+        updates = [row for row in rows if canonical_id(row['id']) in existing]
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+        update_keys = [key for key in keys if key not in ('id', 'created_at')]
+        if updates and update_keys:
+            stmt = (update(table).where(table.c.id == bindparam('_id'))
+                    .values({key: bindparam(f'_{key}') for key in update_keys}))
+            db.session.execute(stmt, [{'_id': row['id'], **{f'_{key}': row[key] for key in update_keys}}
+                                      for row in updates])
+
+    def _upsert_statement(self, keys):
+        """The dialect's native upsert of rows sharing keys, None without one"""
+        table = self.model.__table__
+        update_keys = [key for key in keys if key not in ('id', 'created_at')]
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('mysql', 'mariadb'):
+            stmt = mysql.insert(table)
+            return stmt.on_duplicate_key_update({key: stmt.inserted[key] for key in update_keys})
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            stmt = insert(table)
+            return stmt.on_conflict_do_update(
+                index_elements=[table.c.id],
+                set_={key: stmt.excluded[key] for key in update_keys}
+            )
+        return None
+
     def update(self, obj_id, data):
         obj = self.get(obj_id)
         if obj:
             for key, value in data.items():
                 if hasattr(obj, key) and key != 'id':
                     setattr(obj, key, value)
+            self._invalidate(obj)
+            self._written([obj])
+            if in_unit_of_work():
+                return obj
             try:
                 db.session.commit()
                 db.session.refresh(obj)
@@ -87,15 +593,45 @@ class SQLAlchemyRepository(Repository):
 
     def delete(self, obj_id):
         obj = self.get(obj_id)
-        if obj:
-            try:
-                db.session.delete(obj)
+        return self._delete(obj) if obj else False
+
+    def _delete(self, obj):
+        """Deletes a loaded object"""
+        self._invalidate(obj)
+        self._written([obj])
+        if in_unit_of_work():
+            db.session.delete(obj)
+            return True
+        try:
+            db.session.delete(obj)
+            db.session.commit()
+            return True
+        except Exception:
+            db.session.rollback()
+            return False
+
+    def delete_many(self, obj_ids):
+        """
+        Delete every object whose ID is in obj_ids with a single DELETE
+        statement. Rows referencing them are removed by the database
+        (ON DELETE CASCADE), without being loaded.
+        Returns the number of objects deleted.
+        """
+        obj_ids = list(obj_ids)
+        if not obj_ids:
+            return 0
+        try:
+            self._deleting_ids(obj_ids)
+            deleted = db.session.execute(delete(self.model).where(self.model.id.in_(obj_ids))).rowcount
+            if deleted:
+                for entity in (self.model.__tablename__,) + self.dependent_entities:
+                    repository_cache.invalidate(entity)
+            if not in_unit_of_work():
                 db.session.commit()
-                return True
-            except Exception:
-                db.session.rollback()
-                return False
-        return False
+            return deleted
+        except IntegrityError as e:
+            db.session.rollback()
+            raise ValueError(f"Integrity Error: {str(e.orig)}")
 
     def get_by_attribute(self, attr_name, attr_value):
         kwargs = {attr_name: attr_value}
@@ -115,14 +651,337 @@ class UserRepository(SQLAlchemyRepository):
     def get_by_email(self, email: str) -> Optional[User]:
         return self.get_by_attribute('email', email)
 
+    def search(self, search, fields=None, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+        """
+        One page of the users matching a UserSearch (see
+        app.persistence.search), read in order from a (name key, id) index.
+        With fields, the page holds dicts of only those fields.
+        """
+        if fields is not None:
+            return self._projected_page(fields, limit, cursor, include_total, search.criteria(), search.sort)
+        return self._paginate(self.model.query.filter(*search.criteria()), limit, cursor, include_total,
+                              search.sort)
+
+    def delete(self, obj_id):
+        self._deleting_ids([obj_id])
+        return super().delete(obj_id)
+
+    def _deleting_ids(self, user_ids):
+        # The database deletes the users' places: recount their cities and
+        # drop them from the facet counts and the snapshot, where the
+        # places the users reviewed lose their ratings
+        places = db.session.execute(select(Place.id, Place.city_id).where(Place.user_id.in_(user_ids))).all()
+        cities.schedule({place.city_id for place in places})
+        facets.schedule(place.id for place in places)
+        columnar.schedule(place.id for place in places)
+        reviewed = set(db.session.scalars(select(Review.place_id).where(Review.user_id.in_(user_ids))))
+        ratings.schedule(reviewed)
+        columnar.schedule(reviewed)
+
+    def _derive_columns(self, values):
+        for name in ('first_name', 'last_name'):
+            if name in values:
+                values[f'{name}_key'] = name_key(values[name])
+
 
 class PlaceRepository(SQLAlchemyRepository):
     """
     Repository for Place entities.
     Inherits Create, Read, Update, Delete from SQLAlchemyRepository.
+    Reads eager-load everything place_details_model marshals, so a page of
+    places costs a fixed number of queries regardless of its size.
     """
-    def __init__(self):
+    dependent_entities = ('reviews',)
+    facets_ttl = 60.0
+    # Snapshot the searches are served from (see app.persistence.columnar),
+    # set by configure_place_columns; None sends them all to the database
+    columns = None
+    columns_ttl = 60.0
+
+    def __init__(self, user_repository=None):
         super().__init__(Place)
+        self.user_repository = user_repository
+
+    @staticmethod
+    def _loader_options():
+        """Loader options for the owner and amenities of a place"""
+        return [
+            joinedload(Place.user),
+            selectinload(Place.amenities),
+        ]
+
+    def _projected_expressions(self):
+        return {'average_rating': Place.average_rating}
+
+    def get(self, obj_id):
+        if self.cache is None:
+            return db.session.get(self.model, obj_id, options=self._loader_options())
+        return self._cached_get(obj_id, self._loader_options())
+
+    def _on_cache_hit(self, place):
+        # Resolve the owner through the (cached) user repository
+        if self.user_repository is not None:
+            owner = self.user_repository.get(place.user_id)
+            if owner is not None:
+                set_committed_value(place, 'user', owner)
+
+    def delete(self, obj_id):
+        place = self.get(obj_id)
+        if place is None:
+            return False
+        # Deleting a place also deletes its reviews
+        repository_cache.invalidate('reviews')
+        cities.schedule([place.city_id])
+        return self._delete(place)
+
+    def get_all(self):
+        return self.model.query.options(*self._loader_options()).all()
+
+    def get_page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+        query = self.model.query.options(*self._loader_options())
+        return self._paginate(query, limit, cursor, include_total)
+
+    def search(self, search, fields=None, limit=DEFAULT_PAGE_SIZE, cursor=None, include_total=False):
+        """
+        One page of the places matching a PlaceSearch (see
+        app.persistence.search), in its sort order.
+        With fields, the page holds dicts of only those fields.
+        """
+        if search.sort is RELEVANCE_ORDER:
+            return self._ranked_page(search, fields, limit, cursor, include_total)
+        if self.columns is not None and columnar.supports(search):
+            page = self._columnar_page(search, fields, limit, cursor, include_total)
+            if page is not None:
+                return page
+        if fields is not None:
+            return self._projected_page(fields, limit, cursor, include_total, search.criteria(), search.sort)
+        query = self.model.query.options(*self._loader_options()).filter(*search.criteria())
+        return self._paginate(query, limit, cursor, include_total, search.sort)
+
+    def _columnar_page(self, search, fields, limit, cursor, include_total):
+        # Filter and sort the snapshot, then load only the page; None when
+        # the snapshot cannot serve or an amenity filter needs place_amenity
+        bits = columnar.read_bits(db.session)
+        amenity_ids = {amenity_id: bit for bit, amenity_id in bits.items()}
+        if any(amenity_id not in amenity_ids for amenity_id in search.amenity_ids):
+            return None
+        columns = self._current_columns(bits)
+        if columns is None:
+            return None
+        limit = clamp_page_size(limit)
+        total = len(columns.matching(search, amenity_ids)) if include_total else None
+        rows = columns.top(search, amenity_ids, search.sort, limit + 1,
+                           search.sort.decode_key(cursor) if cursor else None)
+        page = search.sort.page([columns.key(row, search.sort) for row in rows], limit, total)
+        # Writes of other workers reach the snapshot a sync interval later:
+        # only places still matching the filters are returned
+        place_ids = [key.id for key in page.items]
+        if place_ids:
+            matching = set(db.session.scalars(select(Place.id).where(Place.id.in_(place_ids), *search.criteria())))
+            place_ids = [place_id for place_id in place_ids if place_id in matching]
+        page.items = list(self._load_in_order(place_ids, fields).values())
+        return page
+
+    def _current_columns(self, bits=None):
+        """
+        The snapshot's columns after applying the invalidations of other
+        workers; None while it cannot serve (see ColumnSnapshot.current)
+        """
+        repository_cache.sync_caches()
+        if bits is None:
+            bits = columnar.read_bits(db.session)
+        return self.columns.current(self.columns_ttl, bits)
+
+    def refresh_columns(self):
+        """Brings the snapshot up to date now, waiting for its refresh (to warm it up)"""
+        self.columns.wait()
+        self._current_columns()
+        self.columns.wait()
+
+    def _ranked_page(self, search, fields, limit, cursor, include_total):
+        # Keyset pagination on (rank, id) over the full-text matches, then
+        # load only the page
+        limit = clamp_page_size(limit)
+        dialect = db.session.get_bind().dialect.name
+        matches = text_search.matches(search.words, dialect).subquery('matches')
+        ranked = (select(Place.id, matches.c.rank.label('relevance'))
+                  .join(matches, matches.c.place_id == Place.id)
+                  .where(*search.criteria(text=False)))
+        total = db.session.scalar(select(func.count()).select_from(ranked.subquery())) if include_total else None
+        if cursor:
+            relevance, obj_id = RELEVANCE_ORDER.decode(cursor)
+            ranked = ranked.where(or_(matches.c.rank > relevance,
+                                      and_(matches.c.rank == relevance, Place.id > obj_id)))
+        rows = db.session.execute(ranked.order_by(matches.c.rank, Place.id).limit(limit + 1)).all()
+        page = RELEVANCE_ORDER.page(rows, limit, total)
+        page.items = list(self._load_in_order([row.id for row in page.items], fields).values())
+        return page
+
+    def within_radius(self, latitude, longitude, radius_km, fields=None, limit=DEFAULT_PAGE_SIZE,
+                      cursor=None, include_total=False):
+        """
+        One page of the places within radius_km of a point, nearest first,
+        each with its distance_km (see app.persistence.geo).
+        """
+        return self._geo_page(GeoSearch.around(latitude, longitude, radius_km),
+                              fields, limit, cursor, include_total)
+
+    def within_bbox(self, south, west, north, east, fields=None, limit=DEFAULT_PAGE_SIZE,
+                    cursor=None, include_total=False):
+        """
+        One page of the places inside a bounding box, nearest to its center
+        first, each with its distance_km.
+        """
+        return self._geo_page(GeoSearch.within(south, west, north, east),
+                              fields, limit, cursor, include_total)
+
+    def _geo_page(self, search, fields, limit, cursor, include_total):
+        # Rank the candidates on their coordinates, then load only the page
+        points = db.session.execute(
+            select(Place.id, Place.latitude, Place.longitude).where(*search.criteria())
+        ).all()
+        hits = search.hits(points)
+        page = DISTANCE_ORDER.slice(hits, limit, cursor, len(hits) if include_total else None)
+        items = self._load_in_order([hit.id for hit in page.items], fields)
+        page.items = [dict(items[hit.id], distance_km=hit.distance_km) if fields is not None
+                      else Located(items[hit.id], hit.distance_km)
+                      for hit in page.items if hit.id in items]
+        return page
+
+    def similar(self, place_id, limit=similarity.DEFAULT_LIMIT, fields=None):
+        """
+        The places most like a place, best first, each with its similarity
+        and distance_km (see app.persistence.similarity); None when the
+        place does not exist. Scored on the snapshot when there is one,
+        else on the rows of the place's neighborhood.
+        """
+        limit = clamp_page_size(limit)
+        matches = None
+        columns = self._current_columns() if self.columns is not None else None
+        if columns is not None:
+            matches = similarity.most_similar(columns, place_id, limit)
+        if matches is None:
+            # No snapshot, or it has not seen the place yet
+            columns = self._neighborhood_columns(place_id)
+            if columns is None:
+                return None
+            matches = similarity.most_similar(columns, place_id, limit)
+        items = self._load_in_order([match.id for match in matches], fields)
+        return [dict(items[match.id], similarity=match.similarity, distance_km=match.distance_km)
+                if fields is not None else similarity.Similar(items[match.id], match.similarity, match.distance_km)
+                for match in matches if match.id in items]
+
+    @staticmethod
+    def _neighborhood_columns(place_id):
+        """Columns of a place and of the places of its city and cells, read with their indexes"""
+        place = db.session.execute(
+            select(Place.city_id, Place.latitude, Place.longitude).where(Place.id == place_id)
+        ).first()
+        if place is None:
+            return None
+        criteria = [Place.id == place_id]
+        if place.city_id is not None:
+            criteria.append(Place.city_id == place.city_id)
+        if place.latitude is not None and place.longitude is not None:
+            box = similarity.neighborhood(place.latitude, place.longitude)
+            criteria.append(and_(*GeoSearch(box).criteria()))
+        rows = db.session.execute(columnar.rows_statement().where(or_(*criteria))).all()
+        return columnar.PlaceColumns.from_rows(rows)
+
+    def clusters(self, bbox, zoom):
+        """
+        The map clusters of the places in a BoundingBox at a map zoom (see
+        app.persistence.clusters): folded from the snapshot when there is
+        one, else grouped by the database on the places' geohash.
+        """
+        columns = self._current_columns() if self.columns is not None else None
+        if columns is not None:
+            return clusters.in_viewport(columns, bbox, zoom)
+        level = clusters.level_for(zoom, bbox)
+        cover = clusters.cover(bbox, level)
+        return clusters.cells_in(clusters.grouped(db.session, GeoSearch(cover).criteria(), level), bbox, level)
+
+    def _load_in_order(self, place_ids, fields=None):
+        """
+        {id: place} for the given IDs, in their order: dicts of fields, or
+        objects with everything the detail model marshals.
+        """
+        if not place_ids:
+            return {}
+        if fields is not None:
+            projection = Projection(self.model, fields, self._projected_expressions())
+            rows = db.session.execute(projection.statement().where(Place.id.in_(place_ids))).all()
+            collections = {key: db.session.execute(stmt).all()
+                           for key, stmt in projection.collection_statements(place_ids)}
+            loaded = {item['id']: item for item in projection.to_dicts(rows, collections)}
+        else:
+            places = self.model.query.options(*self._loader_options()).filter(Place.id.in_(place_ids)).all()
+            loaded = {place.id: place for place in places}
+        return {obj_id: loaded[obj_id] for obj_id in place_ids if obj_id in loaded}
+
+    def facets(self, search=None) -> facets.Facets:
+        """
+        Facet counts of the places matching a PlaceSearch, in one grouped
+        pass, or of every place from the cache (see app.persistence.facets).
+        """
+        bits = dict(db.session.execute(select(Amenity.bit, Amenity.id).where(Amenity.bit.is_not(None))).all())
+        criteria = search.criteria() if search is not None else []
+        if search is None:
+            if facets.index.expired(self.facets_ttl, bits):
+                facets.index.load(facets.grouped_counts(db.session, criteria, bits), bits)
+            counts = facets.index.counts()
+        else:
+            counts = facets.grouped_counts(db.session, criteria, bits)
+        # Amenities past the last bit, counted on the (amenity_id, place_id) index
+        unbitted = (select(place_amenity.c.amenity_id, func.count())
+                    .join(Amenity, Amenity.id == place_amenity.c.amenity_id)
+                    .where(Amenity.bit.is_(None)).group_by(place_amenity.c.amenity_id))
+        if criteria:
+            unbitted = unbitted.where(place_amenity.c.place_id.in_(select(Place.id).where(*criteria)))
+        return counts.facets(bits, dict(db.session.execute(unbitted).all()))
+
+    def _written(self, places):
+        text_search.schedule(place.id for place in places)
+        facets.schedule(place.id for place in places)
+        columnar.schedule(place.id for place in places)
+        # Rating aggregates only follow the reviews: recount any set by hand
+        ratings.schedule(place.id for place in places if inspect(place).persistent and any(
+            inspect(place).attrs[name].history.has_changes() for name in RATING_COLUMNS))
+        # Only new places and moves change the place counts: the cities a
+        # place is in, and was in before a move (deletes go through delete)
+        cities.schedule(city_id for place in places if not inspect(place).persistent
+                        or inspect(place).attrs.city_id.history.has_changes()
+                        for city_id in (place.city_id, *inspect(place).attrs.city_id.history.deleted))
+
+    def _writing_ids(self, place_ids):
+        facets.schedule(place_ids)
+        # Compared with the cities after the upsert, which may insert or move places
+        db.session.info[_UPSERTED_CITIES_KEY] = self._cities_of(place_ids)
+
+    def _written_ids(self, place_ids):
+        text_search.schedule(place_ids)
+        facets.schedule(place_ids)
+        columnar.schedule(place_ids)
+        before = db.session.info.pop(_UPSERTED_CITIES_KEY, {})
+        after = self._cities_of(place_ids)
+        cities.schedule(city_id for place_id in after if before.get(place_id) != after[place_id]
+                        for city_id in (before.get(place_id), after[place_id]))
+        # Upserted rows may carry rating aggregates of their own
+        ratings.schedule(place_ids)
+
+    def _deleting_ids(self, place_ids):
+        cities.schedule(self._cities_of(place_ids).values())
+        super()._deleting_ids(place_ids)
+
+    @staticmethod
+    def _cities_of(place_ids):
+        """The city_id of each of these places, by place ID"""
+        return {canonical_id(place_id): city_id for place_id, city_id in db.session.execute(
+            select(Place.id, Place.city_id).where(Place.id.in_(list(place_ids)))).all()}
+
+    def _derive_columns(self, values):
+        if values.get('latitude') is not None and values.get('longitude') is not None:
+            values['geohash'] = encode_geohash(values['latitude'], values['longitude'])
 
     def get_by_city(self, city_id: str) -> List[Place]:
         """Get all places in a specific city"""
@@ -138,9 +997,38 @@ class ReviewRepository(SQLAlchemyRepository):
     Repository for Review entities.
     Inherits Create, Read, Update, Delete from SQLAlchemyRepository.
     """
+    # The cached places carry their rating aggregates
+    dependent_entities = ('places',)
+
     def __init__(self):
         super().__init__(Review)
 
+    def _related_invalidations(self, obj):
+        # The cached place carries its rating aggregates, and so does the
+        # one a review moves away from
+        place_ids = {obj.place_id, *inspect(obj).attrs.place_id.history.deleted}
+        return [('places', str(place_id)) for place_id in place_ids]
+
+    def _written(self, reviews):
+        # Review text is part of its place's search document, its rating
+        # of the place's average (kept by app.persistence.ratings as the
+        # ORM writes the review)
+        place_ids = {place_id for review in reviews
+                     for place_id in (review.place_id, *inspect(review).attrs.place_id.history.deleted)}
+        text_search.schedule(place_ids)
+        columnar.schedule(place_ids)
+
+    def _writing_ids(self, review_ids):
+        # Upserts may move reviews away from these places
+        self._written_ids(review_ids)
+
+    def _written_ids(self, review_ids):
+        # Rows written by ID bypass the ORM: recount their places
+        place_ids = set(db.session.scalars(select(Review.place_id).where(Review.id.in_(list(review_ids)))))
+        text_search.schedule(place_ids)
+        columnar.schedule(place_ids)
+        ratings.schedule(place_ids)
+
     def get_by_place(self, place_id: str) -> List[Review]:
         """Get all reviews for a specific place"""
         return self.model.query.filter_by(place_id=place_id).all()
@@ -154,10 +1042,111 @@ class AmenityRepository(SQLAlchemyRepository):
     """
     Repository for Amenity entities.
     Inherits Create, Read, Update, Delete from SQLAlchemyRepository.
+    Keeps the amenity bits of places in step (see app.persistence.amenity_bits).
     """
+    # The cached places carry the bits of their amenities
+    dependent_entities = ('places',)
+
     def __init__(self):
         super().__init__(Amenity)
 
+    def _written_ids(self, amenity_ids):
+        # Upserted amenities have no bit yet
+        amenity_bits.schedule(amenity_ids, db.session)
+
+    def _deleting_ids(self, amenity_ids):
+        amenity_bits.clear(db.session, db.session.scalars(
+            select(Amenity.bit).where(Amenity.id.in_(amenity_ids), Amenity.bit.is_not(None))))
+
+    def delete(self, obj_id):
+        amenity = self.get(obj_id)
+        if amenity is not None and amenity.bit is not None:
+            amenity_bits.clear(db.session, [amenity.bit])
+            repository_cache.invalidate('places')
+        return super().delete(obj_id)
+
     def get_by_name(self, name: str) -> Optional[Amenity]:
         """Get amenity by name (useful to check duplicates)"""
         return self.get_by_attribute('name', name)
+
+    def get_by_names(self, names: List[str]) -> List[Amenity]:
+        """Get all amenities whose name is in the given list"""
+        if not names:
+            return []
+        return self.model.query.filter(self.model.name.in_(list(names))).all()
+
+
+class CityRepository(SQLAlchemyRepository):
+    """
+    Repository for City entities.
+    Inherits Create, Read, Update, Delete from SQLAlchemyRepository.
+    Name prefixes are looked up in an in-process index (see
+    app.persistence.cities), reloaded once older than index_ttl seconds.
+    """
+    # Deleting a city clears the city_id of its places
+    dependent_entities = ('places',)
+    index_ttl = 60.0
+
+    def __init__(self):
+        super().__init__(City)
+        self.index = cities.index
+
+    def _written(self, written):
+        cities.schedule(city.id for city in written)
+
+    def _written_ids(self, city_ids):
+        cities.schedule(city_ids)
+
+    def delete(self, obj_id):
+        self._deleting_ids([obj_id])
+        return super().delete(obj_id)
+
+    def _deleting_ids(self, city_ids):
+        # The database clears the city of their places
+        cities.schedule(city_ids)
+        place_ids = db.session.scalars(select(Place.id).where(Place.city_id.in_(city_ids))).all()
+        facets.schedule(place_ids)
+        columnar.schedule(place_ids)
+
+    def _derive_columns(self, values):
+        if 'name' in values:
+            values['name_key'] = name_key(values['name'])
+
+    def get_by_name(self, name: str) -> Optional[City]:
+        """Get the city of a name, ignoring case"""
+        return self.get_by_attribute('name_key', name_key(name))
+
+    def get_or_create(self, name: str) -> City:
+        """
+        Get the city of a name, ignoring case, created if new. The row is
+        inserted in a savepoint: when a concurrent transaction created the
+        same name first, only the savepoint is rolled back and its city is
+        read instead.
+        """
+        city = self.get_by_name(name)
+        if city is not None:
+            return city
+        now = datetime.utcnow()
+        values = {'id': self.model.new_id(), 'name': name, 'place_count': 0, 'created_at': now, 'updated_at': now}
+        self._derive_columns(values)
+        connection = db.session.connection()
+        try:
+            with connection.begin_nested():
+                connection.execute(self.model.__table__.insert(), values)
+            self._written_ids([values['id']])
+        except IntegrityError:
+            pass
+        if not in_unit_of_work():
+            db.session.commit()
+        return self.get_by_name(name)
+
+    def get_by_names(self, names: List[str]) -> List[City]:
+        """Get the cities of any of the given names, ignoring case"""
+        keys = list({name_key(name) for name in names})
+        return self.model.query.filter(self.model.name_key.in_(keys)).all() if keys else []
+
+    def autocomplete(self, prefix: str, limit: int) -> List[cities.CityEntry]:
+        """The first limit cities, by name, whose name starts with prefix (ignoring case)"""
+        if self.index.expired(self.index_ttl):
+            self.index.load(db.session.execute(select(City.id, City.name, City.place_count)).all())
+        return self.index.complete(prefix, limit)
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+"""
+Place and user search filters and sort orders.
+
+A PlaceSearch holds the filters of one search. criteria() compiles them to
+SQL predicates on indexed columns (see migration v0005); matches() applies
+the same filters to a place in memory. Results are keyset-paginated on
+(sort attribute, id), like the list endpoints on (created_at, id).
+
+A text query (q) keeps the places whose name, description, city or reviews
+contain every word of it (see app.persistence.text_search); they are then
+sorted by relevance unless another sort is requested.
+
+A UserSearch finds users by the exact start or whole of their first and/or
+last name, ignoring case, through the indexed name keys of User.
+"""
+from typing import List, Optional, Tuple
+from sqlalchemy import false, func, select
+from app import db
+from app.models.amenity import Amenity
+from app.models.place import Place, place_amenity
+from app.models.place_document import place_documents
+from app.models.user import User
+from app.models.names import name_key
+from app.persistence import amenity_bits, text_search
+from app.persistence.repository import RELEVANCE_ORDER, SortKey
+
+PLACE_SORTS = {sort.name: sort for sort in (
+    SortKey('created_at'),
+    SortKey('-created_at', descending=True),
+    SortKey('price', 'price_by_night', parse=float),
+    SortKey('-price', 'price_by_night', descending=True, parse=float),
+    RELEVANCE_ORDER,
+)}
+DEFAULT_PLACE_SORT = 'created_at'
+
+# Orders of user name searches, on the name the search filters by
+FIRST_NAME_ORDER = SortKey('first_name', 'first_name_key', parse=str)
+LAST_NAME_ORDER = SortKey('last_name', 'last_name_key', parse=str)
+
+
+class PlaceSearch:
+    """
+    Filters of a place search; every filter left to None matches all places.
+    amenity_ids lists amenities a place must all have; q is a text query.
+    Raises ValueError on inconsistent filters or an unknown sort.
+    """
+    def __init__(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                 city_name: Optional[str] = None, city_id: Optional[str] = None,
+                 min_guests: Optional[int] = None,
+                 min_rooms: Optional[int] = None, amenity_ids: Optional[List[str]] = None,
+                 sort: Optional[str] = None, q: Optional[str] = None):
+        for name, value in (('min_price', min_price), ('max_price', max_price),
+                            ('min_guests', min_guests), ('min_rooms', min_rooms)):
+            if value is not None and value < 0:
+                raise ValueError(f"{name} cannot be negative.")
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise ValueError("min_price cannot be greater than max_price.")
+        if sort is not None and sort not in PLACE_SORTS:
+            raise ValueError(f"Unknown sort '{sort}'. Use one of: {', '.join(PLACE_SORTS)}.")
+        words = text_search.terms(q) if q is not None else None
+        if words is not None and not words:
+            raise ValueError("q must contain at least one word.")
+        if sort == RELEVANCE_ORDER.name and not words:
+            raise ValueError("Sorting by relevance needs a text query (q).")
+
+        self.min_price = min_price
+        self.max_price = max_price
+        self.city_name = city_name
+        self.city_id = city_id
+        self.min_guests = min_guests
+        self.min_rooms = min_rooms
+        self.amenity_ids = list(dict.fromkeys(amenity_ids or []))
+        self.words = words
+        self.sort = PLACE_SORTS[sort or (RELEVANCE_ORDER.name if words else DEFAULT_PLACE_SORT)]
+
+    def criteria(self, text=True):
+        """SQL predicates on Place; text=False leaves out the text query"""
+        criteria = []
+        if text and self.words:
+            dialect = db.session.get_bind().dialect.name
+            matches = text_search.matches(self.words, dialect).with_only_columns(place_documents.c.place_id)
+            criteria.append(Place.id.in_(matches))
+        if self.city_name is not None:
+            criteria.append(Place.city_name == self.city_name)
+        if self.city_id is not None:
+            criteria.append(Place.city_id == self.city_id)
+        if self.min_price is not None:
+            criteria.append(Place.price_by_night >= self.min_price)
+        if self.max_price is not None:
+            criteria.append(Place.price_by_night <= self.max_price)
+        if self.min_guests is not None:
+            criteria.append(Place.max_guest >= self.min_guests)
+        if self.min_rooms is not None:
+            criteria.append(Place.number_rooms >= self.min_rooms)
+        if self.amenity_ids:
+            bits = dict(db.session.execute(
+                select(Amenity.id, Amenity.bit).where(Amenity.id.in_(self.amenity_ids))).all())
+            criteria += self._amenity_criteria(bits)
+        return criteria
+
+    def _amenity_criteria(self, bits):
+        required = amenity_bits.split(self.amenity_ids, bits)
+        if required is None:
+            return [false()]
+        required_mask, without_bit = required
+        criteria = []
+        if required_mask:
+            # Every requested bit set: one AND per place, no join
+            criteria.append(Place.amenity_bits.op('&')(required_mask) == required_mask)
+        if without_bit:
+            # Amenities past the last bit, read from the (amenity_id, place_id) index
+            criteria.append(Place.id.in_(
+                select(place_amenity.c.place_id)
+                .where(place_amenity.c.amenity_id.in_(without_bit))
+                .group_by(place_amenity.c.place_id)
+                .having(func.count() == len(without_bit))
+            ))
+        return criteria
+
+    def matches(self, place, bits=None) -> bool:
+        """
+        The same filters but the text query, applied to a loaded place;
+        bits maps the requested amenity IDs to their Amenity.bit.
+        """
+        if self.city_name is not None and place.city_name != self.city_name:
+            return False
+        if self.city_id is not None and place.city_id != self.city_id:
+            return False
+        if self.min_price is not None and place.price_by_night < self.min_price:
+            return False
+        if self.max_price is not None and place.price_by_night > self.max_price:
+            return False
+        if self.min_guests is not None and place.max_guest < self.min_guests:
+            return False
+        if self.min_rooms is not None and place.number_rooms < self.min_rooms:
+            return False
+        if self.amenity_ids:
+            required = amenity_bits.split(self.amenity_ids, bits or {})
+            if required is None:
+                return False
+            required_mask, without_bit = required
+            if (place.amenity_bits or 0) & required_mask != required_mask:
+                return False
+            return set(without_bit) <= {amenity.id for amenity in place.amenities}
+        return True
+
+
+def prefix_end(prefix: str) -> Optional[str]:
+    """
+    The smallest string greater than every string starting with prefix,
+    or None when there is none.
+    """
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class UserSearch:
+    """
+    Filters of a user name search: the first and/or last name a user must
+    have, or with prefix=True start with, ignoring case. Results are sorted
+    by the first name when it is searched, by the last name otherwise.
+    Raises ValueError when no name is given.
+    """
+    def __init__(self, first_name: Optional[str] = None, last_name: Optional[str] = None,
+                 prefix: bool = False):
+        self.first_name = name_key(first_name) or None
+        self.last_name = name_key(last_name) or None
+        if self.first_name is None and self.last_name is None:
+            raise ValueError("Provide a non-empty first_name or last_name.")
+        self.prefix = prefix
+        self.sort = FIRST_NAME_ORDER if self.first_name is not None else LAST_NAME_ORDER
+
+    def keys(self):
+        """(name key attribute, searched key) pairs, the sorted one first"""
+        keys = [('first_name_key', self.first_name), ('last_name_key', self.last_name)]
+        return [(attribute, key) for attribute, key in keys if key is not None]
+
+    def bounds(self, key: str) -> Tuple[str, Optional[str]]:
+        """The range [lower, upper) of the name keys matching key"""
+        return key, (prefix_end(key) if self.prefix else key + '\0')
+
+    def criteria(self):
+        """SQL predicates on User, ranges on the (name key, id) indexes"""
+        criteria = []
+        for attribute, key in self.keys():
+            column = getattr(User, attribute)
+            if not self.prefix:
+                criteria.append(column == key)
+                continue
+            lower, upper = self.bounds(key)
+            criteria.append(column >= lower)
+            if upper is not None:
+                criteria.append(column < upper)
+        return criteria
+
+    def matches(self, user) -> bool:
+        """The same filters, applied to a loaded user"""
+        for attribute, key in self.keys():
+            value = getattr(user, attribute)
+            if value is None or not (value.startswith(key) if self.prefix else value == key):
+                return False
+        return True
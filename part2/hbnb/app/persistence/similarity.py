@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+"""
+Places similar to a given one.
+
+A PlaceColumns (see app.persistence.columnar) is the feature matrix: each
+feature of every candidate is scored between 0 and 1 at once, as arrays,
+and the scores are combined with WEIGHTS:
+- price: the lower of the two prices over the higher one;
+- capacity: 1 / (1 + the difference in guests);
+- amenities: Jaccard index of the amenity bitsets (amenities past the
+  last bit are not compared), 1 when neither place has any;
+- proximity: exp(-distance / DISTANCE_SCALE_KM), 0 without coordinates;
+- rating: the candidate's average rating out of 5, NEUTRAL_RATING for
+  places without reviews.
+
+The candidates are the places of the same city and of the 3x3 grid cells
+around the place (columnar.CELL_DEGREES wide), found as ranges of the
+city and cell orders: a lookup costs the size of that neighborhood, not
+of the catalog. neighborhood() is the box holding those cells, for the
+backends that select the candidates themselves.
+"""
+from typing import List, NamedTuple, Optional
+import numpy as np
+from app.models.geo import EARTH_RADIUS_KM, BoundingBox
+from app.persistence import columnar
+
+FEATURES = ('price', 'capacity', 'amenities', 'proximity', 'rating')
+WEIGHTS = np.array([0.25, 0.15, 0.25, 0.25, 0.10])
+DISTANCE_SCALE_KM = 25.0
+NEUTRAL_RATING = 3.0
+DEFAULT_LIMIT = 10
+
+
+class Match(NamedTuple):
+    """A similar place, before it is loaded"""
+    id: str
+    similarity: float
+    distance_km: Optional[float]
+
+
+class Similar:
+    """A loaded place with its similarity to a place and its distance from it"""
+    def __init__(self, place, similarity: float, distance_km: Optional[float]):
+        self.place = place
+        self.similarity = similarity
+        self.distance_km = distance_km
+
+    def __getattr__(self, name):
+        return getattr(self.place, name)
+
+
+def neighbor_cells(cell: int) -> List[int]:
+    """A cell and the cells around it, across the antimeridian"""
+    if cell == columnar.NO_CELL:
+        return []
+    row, column = divmod(cell, columnar.CELL_COLUMNS)
+    return sorted({other_row * columnar.CELL_COLUMNS + (column + d_column) % columnar.CELL_COLUMNS
+                   for other_row in range(max(row - 1, 0), min(row + 2, columnar.CELL_ROWS))
+                   for d_column in (-1, 0, 1)})
+
+
+def neighborhood(latitude: float, longitude: float) -> BoundingBox:
+    """The box holding the cells around a point"""
+    row, column = divmod(columnar.cell_of(latitude, longitude), columnar.CELL_COLUMNS)
+    south = max(-90.0, (row - 1) * columnar.CELL_DEGREES - 90)
+    north = min(90.0, (row + 2) * columnar.CELL_DEGREES - 90)
+    west = ((column - 1) * columnar.CELL_DEGREES) % 360 - 180
+    east = ((column + 2) * columnar.CELL_DEGREES) % 360 - 180
+    return BoundingBox(south, west, north, east)
+
+
+def candidates(columns: 'columnar.PlaceColumns', row: int) -> np.ndarray:
+    """Positions of the places of row's city and cells, row left out"""
+    groups = [columns.rows_of('cell', cell) for cell in neighbor_cells(int(columns.cell[row]))]
+    if columns.city[row] != columnar.NO_CITY:
+        groups.append(columns.rows_of('city', columns.city[row]))
+    rows = np.unique(np.concatenate(groups)) if groups else np.empty(0, dtype=np.intp)
+    return rows[rows != row]
+
+
+def distances_km(columns: 'columnar.PlaceColumns', row: int, rows: np.ndarray) -> np.ndarray:
+    """Great-circle distances from row to rows, NaN without coordinates"""
+    phi1, lambda1 = np.radians(columns.latitude[row]), np.radians(columns.longitude[row])
+    phi2, lambda2 = np.radians(columns.latitude[rows]), np.radians(columns.longitude[rows])
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin((lambda2 - lambda1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def features(columns: 'columnar.PlaceColumns', row: int, rows: np.ndarray) -> np.ndarray:
+    """The (len(rows), len(FEATURES)) scores of rows against row"""
+    prices = columns.price_by_night[rows].astype(float)
+    price = float(columns.price_by_night[row])
+    higher = np.maximum(prices, price)
+    price_score = np.divide(np.minimum(prices, price), higher, out=np.ones(len(rows)), where=higher > 0)
+
+    capacity_score = 1 / (1 + np.abs(columns.max_guest[rows] - columns.max_guest[row]))
+
+    bits, own = columns.amenity_bits[rows], columns.amenity_bits[row]
+    union = np.bitwise_count(bits | own).astype(float)
+    amenity_score = np.divide(np.bitwise_count(bits & own), union, out=np.ones(len(rows)), where=union > 0)
+
+    distances = distances_km(columns, row, rows)
+    proximity_score = np.nan_to_num(np.exp(-distances / DISTANCE_SCALE_KM), nan=0.0)
+
+    rating_score = np.nan_to_num(columns.rating[rows], nan=NEUTRAL_RATING) / 5
+    return np.column_stack([price_score, capacity_score, amenity_score, proximity_score, rating_score])
+
+
+def most_similar(columns: 'columnar.PlaceColumns', place_id: str, count: int) -> Optional[List[Match]]:
+    """
+    The count candidates scoring highest against a place, best first (ties
+    by ID); None when the place is not in the columns.
+    """
+    raw = np.array([columnar.id_bytes(place_id)], dtype='S16')
+    positions, present = columns.positions(raw)
+    if not present[0]:
+        return None
+    row = int(positions[0])
+    rows = candidates(columns, row)
+    scores = features(columns, row, rows) @ WEIGHTS
+    if len(rows) > count:
+        # Only the best count are sorted; the count-th score's ties are all kept
+        threshold = np.partition(scores, len(rows) - count)[len(rows) - count]
+        kept = scores >= threshold
+        rows, scores = rows[kept], scores[kept]
+    ranked = np.lexsort((rows, -scores))[:count]
+    rows, scores = rows[ranked], scores[ranked]
+    distances = distances_km(columns, row, rows)
+    return [Match(columnar.id_string(columns.ids[other]), float(score),
+                  None if np.isnan(distance) else float(distance))
+            for other, score, distance in zip(rows, scores, distances)]
@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+"""
+Full-text search over places and their reviews.
+
+Repositories call schedule() with the IDs of the places whose text changed
+(a place written, or one of its reviews). Just before the transaction
+commits, the documents of those places are rebuilt in place_documents
+(see app.models.place_document), so the index is updated incrementally and
+atomically with the change itself.
+
+matches() selects the places matching every word of a query with their
+rank, lower ranks being more relevant: FTS5's bm25() on SQLite, the negated
+MATCH ... AGAINST relevance on MySQL and the negated ts_rank() on
+PostgreSQL. Other databases have no index to use: there, matches() scans
+place_documents for the words and ranks by the weights of the columns
+holding them.
+
+A TextIndex applies the same rules as SQLite to documents in memory,
+keeping an inverted index (word -> documents) up to date as they change.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple
+from sqlalchemy import case, delete, event, func, literal_column, or_, select, sql
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session
+from app import db
+from app.models.place import Place
+from app.models.review import Review
+from app.models.place_document import PG_DOCUMENT_VECTOR, TEXT_COLUMNS, place_documents
+
+_PENDING_KEY = 'text_search_pending_places'
+
+CHUNK_SIZE = 500
+# Relative weight of a match in each column of a document
+WEIGHTS = {'name': 10.0, 'description': 2.0, 'city_name': 5.0, 'reviews': 1.0}
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def terms(query: str) -> List[str]:
+    """The distinct lowercase words of a query, in order"""
+    return list(dict.fromkeys(word.lower() for word in _WORD_RE.findall(query or '')))
+
+
+def schedule(place_ids: Iterable[str]):
+    """Rebuilds the documents of these places when the current transaction commits"""
+    db.session.info.setdefault(_PENDING_KEY, set()).update(place_ids)
+
+
+@event.listens_for(Session, 'before_commit')
+def _reindex_pending(session):
+    place_ids = session.info.pop(_PENDING_KEY, None)
+    if place_ids:
+        session.flush()
+        reindex(session, place_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def reindex(conn, place_ids: Iterable[str]):
+    """
+    Replaces the documents of the given places by their current text;
+    places that no longer exist lose their document. conn is a connection
+    or a session.
+    """
+    place_ids = list(place_ids)
+    for start in range(0, len(place_ids), CHUNK_SIZE):
+        chunk = place_ids[start:start + CHUNK_SIZE]
+        conn.execute(delete(place_documents).where(place_documents.c.place_id.in_(chunk)))
+        reviews = {}
+        for place_id, review_text in conn.execute(
+                select(Review.place_id, Review.text).where(Review.place_id.in_(chunk))
+                .order_by(Review.place_id, Review.created_at)):
+            reviews.setdefault(place_id, []).append(review_text or '')
+        documents = [
+            {'place_id': row.id, 'name': row.name, 'description': row.description,
+             'city_name': row.city_name, 'reviews': '\n'.join(reviews.get(row.id, []))}
+            for row in conn.execute(select(Place.id, Place.name, Place.description, Place.city_name)
+                                    .where(Place.id.in_(chunk)))
+        ]
+        if documents:
+            conn.execute(place_documents.insert(), documents)
+
+
+def matches(words: List[str], dialect: str):
+    """
+    SELECT of (place_id, rank) for the places whose document contains every
+    word; lower ranks are more relevant.
+    """
+    if dialect == 'sqlite':
+        fts = sql.table('place_documents_fts', sql.column('rowid'))
+        quoted = ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+        name = literal_column(fts.name)
+        rank = func.bm25(name, *[literal_column(repr(WEIGHTS[column])) for column in TEXT_COLUMNS])
+        return (select(place_documents.c.place_id, rank.label('rank'))
+                .select_from(fts.join(place_documents, place_documents.c.id == fts.c.rowid))
+                .where(name.op('MATCH')(quoted)))
+    if dialect == 'mysql':
+        relevance = mysql.match(*[place_documents.c[column] for column in TEXT_COLUMNS],
+                                against=' '.join('+' + word for word in words)).in_boolean_mode()
+        return select(place_documents.c.place_id, (-relevance).label('rank')).where(relevance)
+    if dialect == 'postgresql':
+        vector = literal_column(PG_DOCUMENT_VECTOR)
+        query = func.to_tsquery('simple', ' & '.join(words))
+        return (select(place_documents.c.place_id, (-func.ts_rank(vector, query)).label('rank'))
+                .where(vector.op('@@')(query)))
+    return _scan(words)
+
+
+def _scan(words: List[str]):
+    """matches() without a full-text index: a substring scan of the documents"""
+    def contains(column, word):
+        pattern = '%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return func.lower(place_documents.c[column]).like(pattern, escape='\\')
+    rank = -sum(case((contains(column, word), WEIGHTS[column]), else_=0.0)
+                for word in words for column in TEXT_COLUMNS)
+    return (select(place_documents.c.place_id, rank.label('rank'))
+            .where(*[or_(*[contains(column, word) for column in TEXT_COLUMNS]) for word in words]))
+
+
+class TextHit(NamedTuple):
+    """A place matching a text search, before it is loaded"""
+    id: str
+    relevance: float
+
+
+class TextIndex:
+    """
+    Inverted index of documents ({column: text}) held in memory: the word
+    counts of each column of each document, and the IDs of the documents
+    holding each word, so a search only visits the documents holding every
+    word of the query. Not thread-safe: callers hold their own lock.
+    """
+    def __init__(self):
+        self._documents = {}
+        self._postings = {}
+        # Words in each column of all documents, for the average lengths
+        self._words = dict.fromkeys(TEXT_COLUMNS, 0)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def put(self, doc_id: str, columns: Dict[str, str]):
+        """Adds a document, or replaces its text"""
+        self.remove(doc_id)
+        document = {column: Counter(terms(columns.get(column) or '')) for column in TEXT_COLUMNS}
+        self._documents[doc_id] = document
+        for column, counts in document.items():
+            self._words[column] += sum(counts.values())
+            for word in counts:
+                self._postings.setdefault(word, set()).add(doc_id)
+
+    def remove(self, doc_id: str):
+        document = self._documents.pop(doc_id, None)
+        if document is None:
+            return
+        for column, counts in document.items():
+            self._words[column] -= sum(counts.values())
+            for word in counts:
+                postings = self._postings.get(word)
+                if postings is not None:
+                    postings.discard(doc_id)
+                    if not postings:
+                        del self._postings[word]
+
+    def rank(self, words: List[str]) -> List[TextHit]:
+        """
+        The documents containing every word, ranked by a weighted BM25
+        score negated like the database ranks, most relevant first.
+        """
+        postings = [self._postings.get(word, set()) for word in words]
+        if not postings or not all(postings):
+            return []
+        count = len(self._documents)
+        lengths = {column: total / count for column, total in self._words.items()}
+        idf = {word: math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5)) for word, ids in zip(words, postings)}
+        hits = []
+        for doc_id in set.intersection(*postings):
+            document = self._documents[doc_id]
+            score = 0.0
+            for word in words:
+                for column in TEXT_COLUMNS:
+                    occurrences = document[column][word]
+                    if occurrences:
+                        norm = 1 - 0.75 + 0.75 * sum(document[column].values()) / (lengths[column] or 1)
+                        score += WEIGHTS[column] * idf[word] * occurrences * 2.2 / (occurrences + 1.2 * norm)
+            hits.append(TextHit(doc_id, -score))
+        hits.sort(key=lambda hit: (hit.relevance, hit.id))
+        return hits
+
+
+def document_of(place: Place, reviews: Iterable[Review]) -> Dict[str, str]:
+    """The document of a loaded place and its reviews"""
+    return {'name': place.name, 'description': place.description, 'city_name': place.city_name,
+            'reviews': '\n'.join(review.text or '' for review in reviews)}
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""
+Unit of work: groups several repository writes into a single transaction.
+
+Outside a unit of work every repository write commits on its own. Inside
+one, repositories only stage their changes in the session; they are
+flushed together and committed exactly once when the block exits, or
+rolled back if it raises.
+
+    with unit_of_work():
+        place = facade.create_place(data)
+        place.add_amenity(amenity)
+"""
+from contextlib import contextmanager
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+_DEPTH_KEY = 'unit_of_work_depth'
+
+
+def in_unit_of_work():
+    """
+    Returns True when the current session is inside a unit of work.
+    """
+    return db.session.info.get(_DEPTH_KEY, 0) > 0
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Runs the block in one transaction.
+    Nested blocks join the outermost one, which alone commits or rolls back.
+    Can also be used as a decorator: @unit_of_work()
+    """
+    session = db.session
+    depth = session.info.get(_DEPTH_KEY, 0)
+    session.info[_DEPTH_KEY] = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            session.commit()
+    except IntegrityError as e:
+        if depth == 0:
+            session.rollback()
+            raise ValueError(f"Integrity Error: {str(e.orig)}")
+        raise
+    except Exception:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        session.info[_DEPTH_KEY] = depth
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+"""
+Routes database reads to replicas and writes to the primary.
+
+Replicas are the SQLALCHEMY_BINDS whose key starts with 'replica_' (see
+config.replica_binds). A session reads from one replica until it writes
+anything; from then on every statement, reads included, goes to the
+primary for the rest of the session, i.e. of the request, so a request
+always reads its own writes.
+
+GET/HEAD/OPTIONS requests run their transactions as READ ONLY.
+"""
+import random
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+_WROTE_KEY = 'routing_wrote'
+_REPLICA_KEY = 'routing_replica'
+_READ_ONLY_KEY = 'routing_read_only'
+
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session sending plain SELECTs to a replica.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            replica = self._replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if self._flushing or self.info.get(_WROTE_KEY):
+            return False
+        if clause is not None and not isinstance(clause, Select):
+            # INSERT/UPDATE/DELETE executed directly (e.g. bulk upserts)
+            self.info[_WROTE_KEY] = True
+            return False
+        return True
+
+    def _replica(self):
+        if _REPLICA_KEY not in self.info:
+            replicas = [engine for key, engine in self._db.engines.items()
+                        if isinstance(key, str) and key.startswith(REPLICA_BIND_PREFIX)]
+            self.info[_REPLICA_KEY] = random.choice(replicas) if replicas else None
+        return self.info[_REPLICA_KEY]
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _stick_to_primary(session, flush_context, instances):
+    session.info[_WROTE_KEY] = True
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _begin_read_only(session, transaction, connection):
+    if session.info.get(_READ_ONLY_KEY) and connection.dialect.name in ('mysql', 'postgresql'):
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+
+
+def init_app(app, db):
+    """
+    Marks the session of safe (read-only) requests.
+    """
+    @app.before_request
+    def _read_only_transactions():
+        if request.method in READ_ONLY_METHODS:
+            db.session.info[_READ_ONLY_KEY] = True
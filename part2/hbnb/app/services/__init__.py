@@ -3,5 +3,7 @@
 Initializes the services package.
 """
 from app.services.facade import HBnBFacade
+from app.services.async_facade import AsyncHBnBFacade
 
-facade = HBnBFacade()
\ No newline at end of file
+facade = HBnBFacade()
+async_facade = AsyncHBnBFacade(facade)
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+"""
+Coroutine versions of the facade's read methods, for async routes.
+They fall back to the synchronous facade, on a thread of their own, when
+the app has no asyncio engine (see app.persistence.async_repository).
+"""
+import asyncio
+from app.persistence import (
+    async_user_repository,
+    async_place_repository,
+    async_review_repository,
+    async_amenity_repository,
+)
+from app.persistence.async_repository import async_engine
+
+
+class AsyncHBnBFacade:
+    """
+    Read side of HBnBFacade, awaiting the async repositories.
+    """
+    def __init__(self, facade):
+        self.facade = facade
+        self.user_repo = async_user_repository
+        self.place_repo = async_place_repository
+        self.review_repo = async_review_repository
+        self.amenity_repo = async_amenity_repository
+
+    async def get_user(self, user_id):
+        """Get user by ID"""
+        if async_engine() is None:
+            return await asyncio.to_thread(self.facade.get_user, user_id)
+        return await self.user_repo.get(user_id)
+
+    async def get_amenity(self, amenity_id):
+        """Get amenity by ID"""
+        if async_engine() is None:
+            return await asyncio.to_thread(self.facade.get_amenity, amenity_id)
+        return await self.amenity_repo.get(amenity_id)
+
+    async def get_place(self, place_id):
+        """Get place by ID"""
+        if async_engine() is None:
+            return await asyncio.to_thread(self.facade.get_place, place_id)
+        return await self.place_repo.get(place_id)
+
+    async def get_places_page(self, limit, cursor=None, include_total=False, fields=None):
+        """Get one page of places, ordered by creation date (dicts of fields when given)"""
+        if async_engine() is None:
+            return await asyncio.to_thread(self.facade.get_places_page, limit, cursor, include_total, fields)
+        if fields is not None:
+            return await self.place_repo.get_page_projection(fields, limit, cursor, include_total)
+        return await self.place_repo.get_page(limit, cursor, include_total)
+
+    async def get_review(self, review_id):
+        """Get review by ID"""
+        if async_engine() is None:
+            return await asyncio.to_thread(self.facade.get_review, review_id)
+        return await self.review_repo.get(review_id)
+
+    async def get_place_with_reviews(self, place_id):
+        """
+        Get a place and its reviews as (place, reviews), running both
+        queries concurrently. place is None if it does not exist.
+        """
+        if async_engine() is None:
+            place = await asyncio.to_thread(self.facade.get_place, place_id)
+            return place, await asyncio.to_thread(self.facade.get_reviews_by_place, place_id) if place else []
+        place, reviews = await asyncio.gather(
+            self.place_repo.get(place_id),
+            self.review_repo.get_by_place(place_id),
+        )
+        return place, reviews if place else []
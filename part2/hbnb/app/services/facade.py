@@ -7,12 +7,22 @@ from app.models.user import User
 from app.models.amenity import Amenity
 from app.models.place import Place
 from app.models.review import Review
+from app.models.names import name_key
 from app.persistence import (
     user_repository,
     place_repository,
     review_repository,
-    amenity_repository
+    amenity_repository,
+    city_repository
 )
+from app.persistence.repository import BulkResult, BULK_CHUNK_SIZE
+from app.persistence.search import PlaceSearch, UserSearch
+from app.persistence.facets import GUEST_BANDS, PRICE_BUCKETS
+from app.models.geo import BoundingBox
+from app.persistence.unit_of_work import unit_of_work
+from app.persistence.cache import cache_stats
+from app.persistence.pool import pool_stats
+from app.persistence.async_repository import async_engines
 
 class HBnBFacade:
     """
@@ -29,9 +39,21 @@ class HBnBFacade:
         self.place_repo = place_repository
         self.review_repo = review_repository
         self.amenity_repo = amenity_repository
+        self.city_repo = city_repository
+
+    # METRICS
+
+    def get_cache_stats(self):
+        """Hit/miss counters of the repository caches"""
+        return cache_stats()
+
+    def get_pool_stats(self):
+        """Connection pool state and counters, by bind"""
+        return pool_stats(async_engines())
 
     # USER METHODS
 
+    @unit_of_work()
     def create_user(self, user_data):
         """Creates a new user"""
         if not user_data.get('email') or not user_data.get('password'):
@@ -52,27 +74,35 @@ class HBnBFacade:
         """Get user by Email"""
         return self.user_repo.get_by_email(email)
     
-    def find_users_by_name(self, first_name):
+    def search_users(self, filters, limit, cursor=None, include_total=False, fields=None):
         """
-        Searches users by first name (case-insensitive).
+        Get one page of the users matching filters (the arguments of
+        UserSearch): first and/or last name, whole or prefix, ignoring case.
+        With fields, the page holds dicts of only those fields.
         """
-        all_users = self.user_repo.get_all()
-        results = []
-        for user in all_users:
-            if user.first_name and user.first_name.lower() == first_name.lower():
-                results.append(user)
-        return results
+        search = UserSearch(**filters)
+        return self.user_repo.search(search, fields, limit, cursor, include_total)
 
     def get_all_users(self):
         """Get all users"""
         return self.user_repo.get_all()
 
+    def get_users_page(self, limit, cursor=None, include_total=False, fields=None):
+        """
+        Get one page of users ordered by creation time.
+        With fields, the page holds dicts of only those fields.
+        """
+        if fields is not None:
+            return self.user_repo.get_page_projection(fields, limit, cursor, include_total)
+        return self.user_repo.get_page(limit, cursor, include_total)
+
     def update_user(self, user_id, data):
         """Update user data"""
         return self.user_repo.update(user_id, data)
 
     # AMENITY METHODS
 
+    @unit_of_work()
     def create_amenity(self, amenity_data):
         """Create a new amenity"""
         name = amenity_data.get("name")
@@ -105,18 +135,147 @@ class HBnBFacade:
         """Get all amenities"""
         return self.amenity_repo.get_all()
 
+    def get_amenities_page(self, limit, cursor=None, include_total=False):
+        """Get one page of amenities ordered by creation time"""
+        return self.amenity_repo.get_page(limit, cursor, include_total)
+
     def update_amenity(self, amenity_id, amenity_data):
         """Update amenity"""
         return self.amenity_repo.update(amenity_id, amenity_data)
 
+    def create_amenities(self, amenities_data, upsert=False):
+        """
+        Create (or, with upsert, create-or-rename by ID) many amenities.
+        Names are validated like create_amenity; invalid rows are reported
+        in the result instead of aborting the whole batch.
+        """
+        result = BulkResult()
+        names = [(data.get('name') or '').strip() for data in amenities_data]
+        existing = {a.name: a.id for a in self.amenity_repo.get_by_names([n for n in names if n])}
+
+        rows, positions, seen = [], [], set()
+        for index, (data, name) in enumerate(zip(amenities_data, names)):
+            if not name:
+                result.add_error(index, "Name is required")
+                continue
+            amenity_id = data.get('id') if upsert else None
+            if name in seen or (name in existing and existing[name] != amenity_id):
+                result.add_error(index, f"Amenity '{name}' already exists.")
+                continue
+            seen.add(name)
+            positions.append(index)
+            if upsert:
+                row = {'name': name}
+                if amenity_id:
+                    row['id'] = amenity_id
+                rows.append(row)
+            else:
+                rows.append(Amenity(name=name))
+
+        stored = self.amenity_repo.upsert_many(rows) if upsert else self.amenity_repo.add_many(rows)
+        return self._merge_bulk_result(result, stored, positions)
+
+    # CITY METHODS
+
+    def get_city(self, city_id):
+        """Get city by ID"""
+        return self.city_repo.get(city_id)
+
+    def get_cities_page(self, limit, cursor=None, include_total=False):
+        """Get one page of cities ordered by creation time"""
+        return self.city_repo.get_page(limit, cursor, include_total)
+
+    def autocomplete_cities(self, prefix, limit):
+        """
+        The first limit cities, by name, whose name starts with prefix
+        (ignoring case), as dicts of their id, name and place_count.
+        """
+        if not prefix or not prefix.strip():
+            raise ValueError("prefix cannot be empty.")
+        return [entry._asdict() for entry in self.city_repo.autocomplete(prefix, limit)]
+
+    def _get_or_create_city(self, name):
+        """The city of a name, ignoring case, created if new"""
+        return self.city_repo.get_or_create(name)
+
+    def _assign_city(self, place_data, cities=None):
+        """
+        Sets the city_id of place data: the city of city_id when given (its
+        name becoming city_name), else the city named city_name, created if
+        new. cities optionally maps name keys to already loaded cities.
+        """
+        city_id = place_data.get('city_id')
+        if city_id:
+            city = self.city_repo.get(city_id)
+            if city is None:
+                raise ValueError(f"City with ID '{city_id}' not found.")
+            place_data['city_name'] = city.name
+        else:
+            name = (place_data.get('city_name') or '').strip()
+            city = None
+            if name:
+                city = (cities or {}).get(name_key(name)) or self._get_or_create_city(name)
+        place_data['city_id'] = city.id if city is not None else None
+        return place_data
+
     # PLACE METHODS
 
+    @unit_of_work()
     def create_place(self, place_data):
-        """Create a new place"""
+        """Create a new place, with its amenities, in one transaction"""
         user_id = place_data.get('user_id')
         if not user_id or not self.user_repo.get(user_id):
             raise ValueError(f"Owner with ID '{user_id}' not found.")
-        
+
+        new_place = self._build_place(self._assign_city(place_data))
+        self.place_repo.add(new_place)
+        return new_place
+
+    def create_places(self, places_data, user_id):
+        """
+        Create many places for one owner in chunked bulk inserts.
+        Each row goes through the same validation as create_place; rows
+        that fail are reported in the result and the rest are stored.
+        """
+        if not user_id or not self.user_repo.get(user_id):
+            raise ValueError(f"Owner with ID '{user_id}' not found.")
+
+        amenity_ids = {am_id for data in places_data for am_id in data.get('amenity_ids') or []}
+        amenities = {a.id: a for a in self.amenity_repo.get_many(amenity_ids)}
+        # Each new city is created once, before the places in it
+        names = {(data.get('city_name') or '').strip() for data in places_data if not data.get('city_id')}
+        cities = {city.name_key: city for city in self.city_repo.get_by_names([n for n in names if n])}
+        for name in names:
+            if name and name_key(name) not in cities:
+                cities[name_key(name)] = self._get_or_create_city(name)
+
+        result = BulkResult()
+        # Places are built one chunk at a time: linking a place to an amenity
+        # also links it from the amenity side, and every place linked that
+        # way must already be in the session when the chunk is committed.
+        for start in range(0, len(places_data), BULK_CHUNK_SIZE):
+            places, positions = [], []
+            for index, data in enumerate(places_data[start:start + BULK_CHUNK_SIZE], start):
+                missing = [am_id for am_id in data.get('amenity_ids') or [] if am_id not in amenities]
+                if missing:
+                    result.add_error(index, f"Amenity with ID '{missing[0]}' not found.")
+                    continue
+                try:
+                    place_data = self._assign_city(dict(data, user_id=user_id), cities)
+                    places.append(self._build_place(place_data, amenities))
+                    positions.append(index)
+                except (ValueError, TypeError) as e:
+                    result.add_error(index, str(e))
+
+            stored = self.place_repo.add_many(places)
+            self._merge_bulk_result(result, stored, positions)
+        return result
+
+    def _build_place(self, place_data, amenities=None):
+        """
+        Validates place data and returns an unsaved Place.
+        amenities optionally maps amenity IDs to already loaded Amenity objects.
+        """
         if 'price' in place_data:
              place_data['price_by_night'] = place_data.pop('price')
 
@@ -134,13 +293,23 @@ class HBnBFacade:
         
         if amenity_ids:
             for am_id in amenity_ids:
-                amenity = self.amenity_repo.get(am_id)
+                amenity = amenities.get(am_id) if amenities is not None else self.amenity_repo.get(am_id)
                 if amenity:
                     new_place.amenities.append(amenity)
 
-        self.place_repo.add(new_place)
         return new_place
 
+    @staticmethod
+    def _merge_bulk_result(result, stored, positions):
+        """Maps a repository BulkResult back onto the caller's row indexes"""
+        for item in stored.created:
+            result.add_created(positions[item['index']], item['id'])
+        for item in stored.errors:
+            result.add_error(positions[item['index']], item['error'])
+        result.created.sort(key=lambda item: item['index'])
+        result.errors.sort(key=lambda item: item['index'])
+        return result
+
     def get_place(self, place_id):
         """Get place by ID"""
         return self.place_repo.get(place_id)
@@ -149,10 +318,81 @@ class HBnBFacade:
         """Get all places"""
         return self.place_repo.get_all()
 
+    def get_places_page(self, limit, cursor=None, include_total=False, fields=None):
+        """
+        Get one page of places ordered by creation time.
+        With fields, the page holds dicts of only those fields.
+        """
+        if fields is not None:
+            return self.place_repo.get_page_projection(fields, limit, cursor, include_total)
+        return self.place_repo.get_page(limit, cursor, include_total)
+
+    def search_places(self, filters, limit, cursor=None, include_total=False, fields=None):
+        """
+        Get one page of the places matching filters (the arguments of
+        PlaceSearch, including sort), in the requested order.
+        With fields, the page holds dicts of only those fields.
+        """
+        search = PlaceSearch(**filters)
+        return self.place_repo.search(search, fields, limit, cursor, include_total)
+
+    def get_place_facets(self, filters):
+        """
+        Facet counts of the places matching filters (the arguments of
+        PlaceSearch), or of every place when no filter is set: the places
+        per amenity, per city, per price bucket and per guest capacity band.
+        """
+        search = PlaceSearch(**filters) if any(value not in (None, []) for value in filters.values()) else None
+        facets = self.place_repo.facets(search)
+        amenities = {amenity.id: amenity.name for amenity in self.amenity_repo.get_many(list(facets.amenities))}
+        cities = {city.id: city.name for city in self.city_repo.get_many(list(facets.cities))}
+        return {
+            'total': facets.total,
+            'amenities': sorted(({'id': amenity_id, 'name': amenities[amenity_id], 'count': count}
+                                 for amenity_id, count in facets.amenities.items() if amenity_id in amenities),
+                                key=lambda item: (-item['count'], item['name'])),
+            'cities': sorted(({'id': city_id, 'name': cities[city_id], 'count': count}
+                              for city_id, count in facets.cities.items() if city_id in cities),
+                             key=lambda item: (-item['count'], item['name'])),
+            'prices': [{'max_price': bound, 'count': count}
+                       for bound, count in zip(PRICE_BUCKETS + (None,), facets.prices)],
+            'guests': [{'min_guests': bound, 'count': count} for bound, count in zip(GUEST_BANDS, facets.guests)],
+        }
+
+    def get_places_nearby(self, latitude, longitude, radius_km, limit, cursor=None, include_total=False,
+                          fields=None):
+        """Get one page of the places within radius_km of a point, nearest first"""
+        return self.place_repo.within_radius(latitude, longitude, radius_km, fields, limit, cursor,
+                                             include_total)
+
+    def get_places_in_bbox(self, south, west, north, east, limit, cursor=None, include_total=False,
+                           fields=None):
+        """Get one page of the places inside a bounding box, nearest to its center first"""
+        return self.place_repo.within_bbox(south, west, north, east, fields, limit, cursor, include_total)
+
+    def get_place_clusters(self, south, west, north, east, zoom):
+        """
+        Get the map clusters of the places inside a bounding box at a map
+        zoom: the count, centroid and lowest price of each grid cell the box
+        covers that holds places. Raises ValueError on a bad box.
+        """
+        places = self.place_repo.clusters(BoundingBox(south, west, north, east), zoom)
+        return {'total': sum(cluster.count for cluster in places),
+                'clusters': [cluster._asdict() for cluster in places]}
+
+    def get_similar_places(self, place_id, limit, fields=None):
+        """
+        Get the places most like a place (price, capacity, amenities,
+        location, rating), best first; None if the place does not exist
+        """
+        return self.place_repo.similar(place_id, limit, fields)
+
     def update_place(self, place_id, update_data):
         """Update place"""
         if 'price' in update_data:
             update_data['price_by_night'] = update_data.pop('price')
+        if update_data.get('city_id') or 'city_name' in update_data:
+            self._assign_city(update_data)
             
         return self.place_repo.update(place_id, update_data)
     
@@ -160,8 +400,13 @@ class HBnBFacade:
         """Delete place"""
         return self.place_repo.delete(place_id)
 
+    def delete_places(self, place_ids):
+        """Delete many places (and their reviews) at once; returns the count deleted"""
+        return self.place_repo.delete_many(place_ids)
+
     # REVIEW METHODS
 
+    @unit_of_work()
     def create_review(self, review_data):
         """Create a new review"""
         user_id = review_data.get('user_id')
@@ -215,6 +460,15 @@ class HBnBFacade:
         """Get all reviews"""
         return self.review_repo.get_all()
 
+    def get_reviews_page(self, limit, cursor=None, include_total=False, fields=None):
+        """
+        Get one page of reviews ordered by creation time.
+        With fields, the page holds dicts of only those fields.
+        """
+        if fields is not None:
+            return self.review_repo.get_page_projection(fields, limit, cursor, include_total)
+        return self.review_repo.get_page(limit, cursor, include_total)
+
     def update_review(self, review_id, update_data):
         """Update review"""
         return self.review_repo.update(review_id, update_data)
@@ -222,3 +476,7 @@ class HBnBFacade:
     def delete_review(self, review_id):
         """Delete review"""
         return self.review_repo.delete(review_id)
+
+    def delete_reviews(self, review_ids):
+        """Delete many reviews at once; returns the count deleted"""
+        return self.review_repo.delete_many(review_ids)
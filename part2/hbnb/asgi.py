@@ -0,0 +1,11 @@
+#!/usr/bin/python3
+"""
+ASGI entry point, e.g.: uvicorn asgi:app --workers 4
+The coroutine place routes run on the server's event loop, everything
+else on the Flask app of run.py.
+"""
+from run import app as flask_app
+from app.api.v1.asynchronous import AsyncRoutes
+from app.api.v1.places import async_routes as place_routes
+
+app = AsyncRoutes(flask_app, {'/api/v1/places': place_routes})
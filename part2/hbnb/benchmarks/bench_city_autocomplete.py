@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+"""
+Benchmark: city name autocomplete.
+
+Loads N cities into the cities table of a SQLite file, then times the
+first suggestions for random prefixes three ways and checks they agree:
+- python scan: every city loaded and its name key compared in Python;
+- name key range: the range of ix_cities_name_key starting with the
+  prefix, read in order by SQL;
+- index: CityIndex.complete on the in-memory sorted array (what
+  GET /api/v1/cities/autocomplete serves).
+
+    python benchmarks/bench_city_autocomplete.py [--cities N] [--queries N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select
+from app.models.city import City
+from app.models.identifiers import new_id
+from app.models.names import name_key
+from app.persistence.cities import CHUNK_SIZE, CityEntry, CityIndex
+from app.persistence.search import prefix_end
+
+SUGGESTIONS = 10
+SYLLABLES = ['an', 'ber', 'ca', 'do', 'el', 'fur', 'go', 'ham', 'is', 'ju', 'ka', 'lon', 'mar', 'no', 'os',
+             'pa', 'qui', 'ro', 'san', 'to', 'ur', 'vil', 'wes', 'york', 'za']
+
+
+def generate(count, rng):
+    now = datetime.utcnow()
+    seen = set()
+    while len(seen) < count:
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))).capitalize()
+        if name_key(name) not in seen:
+            seen.add(name_key(name))
+            yield {'id': new_id(), 'name': name, 'name_key': name_key(name), 'place_count': rng.randint(0, 500),
+                   'created_at': now, 'updated_at': now}
+
+
+def python_scan(conn, index, prefix):
+    cities = conn.execute(select(City.id, City.name, City.name_key)).all()
+    return [city.id for city in sorted((city for city in cities if city.name_key.startswith(prefix)),
+                                       key=lambda city: (city.name_key, city.id))[:SUGGESTIONS]]
+
+
+def key_range(conn, index, prefix):
+    end = prefix_end(prefix)
+    stmt = select(City.id).where(City.name_key >= prefix)
+    if end is not None:
+        stmt = stmt.where(City.name_key < end)
+    return conn.execute(stmt.order_by(City.name_key).limit(SUGGESTIONS)).scalars().all()
+
+
+def in_memory(conn, index, prefix):
+    return [entry.id for entry in index.complete(prefix, SUGGESTIONS)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cities', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    rows = list(generate(args.cities, rng))
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'cities.db')}")
+        City.__table__.create(engine)
+        with engine.begin() as conn:
+            for start in range(0, len(rows), CHUNK_SIZE):
+                conn.execute(City.__table__.insert(), rows[start:start + CHUNK_SIZE])
+        index = CityIndex()
+        started = time.perf_counter()
+        index.load(CityEntry(row['id'], row['name'], row['place_count']) for row in rows)
+        print(f"indexed {len(index)} cities in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        prefixes = {length: [name_key(rng.choice(rows)['name'])[:length] for _ in range(args.queries)]
+                    for length in (1, 3, 5)}
+        strategies = {'python scan': python_scan, 'name key range': key_range, 'index': in_memory}
+        with engine.connect() as conn:
+            print(f"{'prefix':>8}{'python scan ms':>16}{'name key range ms':>19}{'index ms':>10}")
+            for length, queries in prefixes.items():
+                timings = {}
+                for prefix in queries:
+                    answers = []
+                    for name, strategy in strategies.items():
+                        if name == 'python scan' and len(timings.get(name, ())) >= 5:
+                            continue
+                        began = time.perf_counter()
+                        answers.append(strategy(conn, index, prefix))
+                        timings.setdefault(name, []).append((time.perf_counter() - began) * 1000)
+                    assert all(answer == answers[0] for answer in answers), "strategies disagree"
+                average = {name: sum(times) / len(times) for name, times in timings.items()}
+                print(f"{length:>8}{average['python scan']:>16.1f}{average['name key range']:>19.3f}"
+                      f"{average['index']:>10.4f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
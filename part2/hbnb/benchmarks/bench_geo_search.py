@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+"""
+Benchmark: radius searches over places.
+
+Loads N places, clustered around cities, into the places table of a SQLite
+file, then times the radius search three ways and checks they agree:
+- full scan: every place's coordinates, filtered by haversine in Python;
+- latitude band: the bounding box, read from an index on latitude;
+- geohash: GeoSearch.criteria(), the geohash ranges covering the box read
+  from ix_places_geohash, then the box (what PlaceRepository runs).
+
+    python benchmarks/bench_geo_search.py [--places N] [--queries N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Index, create_engine, select
+from app.models.geo import encode_geohash
+from app.models.identifiers import new_id
+from app.models.place import Place
+from app.models.user import User
+from app.persistence.geo import GeoSearch
+
+CHUNK_SIZE = 10000
+OWNER_ID = new_id()
+
+
+def generate(count, rng):
+    """Places around 200 random cities, 10% scattered anywhere"""
+    cities = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(200)]
+    now = datetime.utcnow()
+    for _ in range(count):
+        if rng.random() < 0.1:
+            latitude, longitude = rng.uniform(-80, 80), rng.uniform(-180, 180)
+        else:
+            city_lat, city_lon = rng.choice(cities)
+            latitude = max(-90.0, min(90.0, rng.gauss(city_lat, 0.3)))
+            longitude = (rng.gauss(city_lon, 0.4) + 180) % 360 - 180
+        yield {'id': new_id(), 'user_id': OWNER_ID, 'name': 'place', 'number_rooms': 1,
+               'number_bathrooms': 1, 'max_guest': 2, 'price_by_night': 100,
+               'latitude': latitude, 'longitude': longitude,
+               'geohash': encode_geohash(latitude, longitude), 'created_at': now, 'updated_at': now}
+
+
+def load(engine, count, rng, samples):
+    """Creates and fills the tables; returns the coordinates of samples places"""
+    User.__table__.create(engine)
+    Place.__table__.create(engine)
+    latitude_index = Index('ix_bench_places_latitude', Place.__table__.c.latitude)
+    latitude_index.create(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{'id': OWNER_ID, 'first_name': 'A', 'last_name': 'B',
+                                                'email': 'owner@example.com', 'password': 'x', 'is_admin': False}])
+        chunk, origins = [], []
+        for index, row in enumerate(generate(count, rng)):
+            if index % max(1, count // samples) == 0 and len(origins) < samples:
+                origins.append((row['latitude'], row['longitude']))
+            chunk.append(row)
+            if len(chunk) == CHUNK_SIZE:
+                conn.execute(Place.__table__.insert(), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(Place.__table__.insert(), chunk)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return origins
+
+
+def strategies(search):
+    columns = select(Place.id, Place.latitude, Place.longitude)
+    return {
+        'full scan': columns,
+        'latitude band': columns.where(*search.criteria()[1:]).with_hint(
+            Place, 'INDEXED BY ix_bench_places_latitude', 'sqlite'),
+        'geohash': columns.where(*search.criteria()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'geo.db')}")
+        started = time.perf_counter()
+        origins = load(engine, args.places, rng, args.queries)
+        print(f"loaded {args.places} places in {time.perf_counter() - started:.1f} s")
+
+        with engine.connect() as conn:
+            print(f"{'radius':>8}{'results':>10}{'candidates':>12}"
+                  f"{'full scan ms':>14}{'lat band ms':>13}{'geohash ms':>12}")
+            for radius_km in (1, 5, 25, 100):
+                timings = {}
+                results = candidates = 0
+                for latitude, longitude in origins:
+                    search = GeoSearch.around(latitude, longitude, radius_km)
+                    answers = []
+                    for name, stmt in strategies(search).items():
+                        if name == 'full scan' and len(timings.get(name, ())) >= 3:
+                            continue
+                        began = time.perf_counter()
+                        rows = conn.execute(stmt).all()
+                        hits = search.hits(rows)
+                        timings.setdefault(name, []).append((time.perf_counter() - began) * 1000)
+                        answers.append(hits)
+                        if name == 'geohash':
+                            candidates += len(rows)
+                            results += len(hits)
+                    assert all(answer == answers[0] for answer in answers), "strategies disagree"
+                average = {name: sum(times) / len(times) for name, times in timings.items()}
+                print(f"{radius_km:>6} km{results / len(origins):>10.0f}{candidates / len(origins):>12.0f}"
+                      f"{average['full scan']:>14.1f}{average['latitude band']:>13.2f}{average['geohash']:>12.2f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+"""
+Benchmark: map marker clusters.
+
+Loads N places into a SQLite file, around the centers of N / 200 cities
+(one of them Paris), then times the clusters of a few map viewports:
+- all places: reading the coordinates and price of every place, what a
+  map without server-side clustering needs;
+- SQL: grouping the places of the cells the viewport covers on a prefix
+  of their geohash in the database (what PlaceRepository.clusters runs
+  without the snapshot);
+- first: folding the level from the snapshot's geokey order, what the
+  first request at a level pays after the snapshot changed;
+- cached: looking up the viewport's cells in the folded level.
+SQL and the snapshot must agree (centroids up to rounding: the sums add
+up in a different order).
+
+    python benchmarks/bench_place_clusters.py [--places N [N ...]] [--runs N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select
+from app.models.city import City
+from app.models.geo import BoundingBox, encode_geohash
+from app.models.identifiers import new_id
+from app.models.place import Place
+from app.models.review import Review
+from app.models.user import User
+from app.persistence import clusters, columnar
+from app.persistence.geo import GeoSearch
+
+CHUNK_SIZE = 10000
+PLACES_PER_CITY = 200
+OWNER_ID = new_id()
+PARIS = (48.85, 2.35)
+
+
+def load(engine, count, rng):
+    for table in (User.__table__, City.__table__, Place.__table__, Review.__table__):
+        table.create(engine)
+    now = datetime.utcnow()
+    centers = [PARIS] + [(rng.uniform(-60, 60), rng.uniform(-170, 170)) for _ in range(count // PLACES_PER_CITY)]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{'id': OWNER_ID, 'first_name': 'A', 'last_name': 'B',
+                                                'email': 'owner@example.com', 'password': 'x', 'is_admin': False}])
+        places = []
+        for index in range(count):
+            center = centers[index % len(centers)]
+            latitude, longitude = center[0] + rng.gauss(0, 0.05), center[1] + rng.gauss(0, 0.05)
+            created_at = now - timedelta(seconds=count - index)
+            places.append({'id': new_id(), 'user_id': OWNER_ID, 'name': 'place', 'number_rooms': 1,
+                           'number_bathrooms': 1, 'max_guest': 2, 'price_by_night': int(rng.lognormvariate(4.5, 0.8)),
+                           'latitude': latitude, 'longitude': longitude,
+                           'geohash': encode_geohash(latitude, longitude), 'amenity_bits': 0,
+                           'created_at': created_at, 'updated_at': created_at})
+            if len(places) == CHUNK_SIZE or index == count - 1:
+                conn.execute(Place.__table__.insert(), places)
+                places = []
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def all_places(conn, bbox, zoom):
+    return conn.execute(select(Place.id, Place.latitude, Place.longitude, Place.price_by_night)).all()
+
+
+def sql_clusters(conn, bbox, zoom):
+    level = clusters.level_for(zoom, bbox)
+    cover = clusters.cover(bbox, level)
+    return clusters.cells_in(clusters.grouped(conn, GeoSearch(cover).criteria(), level), bbox, level)
+
+
+def first_clusters(columns, bbox, zoom):
+    clusters.index = clusters.ClusterIndex()
+    return clusters.in_viewport(columns, bbox, zoom)
+
+
+def agree(answer, expected):
+    return len(answer) == len(expected) and all(
+        a._replace(latitude=0, longitude=0) == b._replace(latitude=0, longitude=0)
+        and abs(a.latitude - b.latitude) < 1e-9 and abs(a.longitude - b.longitude) < 1e-9
+        for a, b in zip(answer, expected))
+
+
+def timed(runs, function, *args):
+    began = time.perf_counter()
+    for _ in range(runs):
+        result = function(*args)
+    return result, (time.perf_counter() - began) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    for count in args.places:
+        rng = random.Random(42)
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'places.db')}")
+            load(engine, count, rng)
+            latitude, longitude = PARIS
+            viewports = {
+                'world, zoom 2': (BoundingBox(-85, -180, 85, 180), 2),
+                'continent, zoom 5': (BoundingBox(latitude - 10, longitude - 20, latitude + 10, longitude + 20), 5),
+                'city, zoom 12': (BoundingBox(latitude - 0.06, longitude - 0.12, latitude + 0.06, longitude + 0.12),
+                                  12),
+            }
+            with engine.connect() as conn:
+                columns = columnar.PlaceColumns.from_rows(columnar.read_rows(conn))
+                print(f"{count} places")
+                print(f"{'viewport':>20}{'clusters':>10}{'all places ms':>15}{'SQL ms':>10}"
+                      f"{'first ms':>10}{'cached ms':>11}")
+                for label, (bbox, zoom) in viewports.items():
+                    _, all_ms = timed(args.runs, all_places, conn, bbox, zoom)
+                    expected, sql_ms = timed(args.runs, sql_clusters, conn, bbox, zoom)
+                    _, first_ms = timed(args.runs, first_clusters, columns, bbox, zoom)
+                    answer, cached_ms = timed(args.runs, clusters.in_viewport, columns, bbox, zoom)
+                    assert agree(answer, expected), "strategies disagree"
+                    print(f"{label:>20}{len(answer):>10}{all_ms:>15.1f}{sql_ms:>10.1f}"
+                          f"{first_ms:>10.1f}{cached_ms:>11.3f}")
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
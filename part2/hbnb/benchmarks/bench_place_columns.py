@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""
+Benchmark: place searches on the columnar snapshot.
+
+Loads N places (and a review for one place in four) into a SQLite file,
+then times the first page of IDs of a few searches two ways and checks
+they agree:
+- SQL: the filters and keyset order of PlaceSearch, run by the database
+  (what PlaceRepository.search runs without the snapshot);
+- columns: PlaceColumns.top() on the NumPy arrays, walking the sort
+  order kept for the page's order (what it runs with PLACE_COLUMNS set).
+Both then load the same page of places, which is left out. Also times
+loading the snapshot and swapping in one updated or inserted row.
+
+    python benchmarks/bench_place_columns.py [--places N [N ...]] [--runs N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select
+from app.models.amenity import Amenity
+from app.models.city import City
+from app.models.identifiers import new_id
+from app.models.place import Place
+from app.models.review import Review
+from app.models.user import User
+from app.persistence import amenity_bits, columnar, ratings
+from app.persistence.search import PlaceSearch
+
+CHUNK_SIZE = 10000
+PAGE_SIZE = 20
+AMENITIES = 20
+CITIES = 500
+OWNER_ID = new_id()
+
+
+def load(engine, count, rng):
+    for table in (User.__table__, City.__table__, Amenity.__table__, Place.__table__, Review.__table__):
+        table.create(engine)
+    now = datetime.utcnow()
+    amenity_ids = [new_id() for _ in range(AMENITIES)]
+    city_ids = [new_id() for _ in range(CITIES)]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{'id': OWNER_ID, 'first_name': 'A', 'last_name': 'B',
+                                                'email': 'owner@example.com', 'password': 'x', 'is_admin': False}])
+        conn.execute(Amenity.__table__.insert(), [{'id': amenity_id, 'name': f'amenity {bit}', 'bit': bit,
+                                                   'created_at': now, 'updated_at': now}
+                                                  for bit, amenity_id in enumerate(amenity_ids)])
+        conn.execute(City.__table__.insert(), [{'id': city_id, 'name': f'city {index}', 'name_key': f'city {index}',
+                                                'place_count': 0, 'created_at': now, 'updated_at': now}
+                                               for index, city_id in enumerate(city_ids)])
+        places, reviews = [], []
+        for index in range(count):
+            place_id = new_id()
+            created_at = now - timedelta(seconds=count - index)
+            places.append({'id': place_id, 'user_id': OWNER_ID, 'name': 'place',
+                           'number_rooms': rng.randint(1, 5), 'number_bathrooms': 1,
+                           'max_guest': rng.randint(1, 10), 'price_by_night': int(rng.lognormvariate(4.5, 0.8)),
+                           'latitude': rng.uniform(-60, 60), 'longitude': rng.uniform(-180, 180),
+                           'city_id': rng.choice(city_ids),
+                           'amenity_bits': amenity_bits.mask(rng.sample(range(AMENITIES), rng.randint(0, 6))),
+                           'created_at': created_at, 'updated_at': created_at})
+            if index % 4 == 0:
+                reviews.append({'id': new_id(), 'user_id': OWNER_ID, 'place_id': place_id, 'text': 'ok',
+                                'rating': rng.randint(1, 5), 'created_at': now, 'updated_at': now})
+            if len(places) == CHUNK_SIZE or index == count - 1:
+                conn.execute(Place.__table__.insert(), places)
+                if reviews:
+                    conn.execute(Review.__table__.insert(), reviews)
+                places, reviews = [], []
+        ratings.rebuild(conn)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return amenity_ids, city_ids
+
+
+def sql_page(conn, search, bits):
+    # PlaceSearch.criteria() reads the amenity bits from the app's session
+    required = amenity_bits.mask(bits[amenity_id] for amenity_id in search.amenity_ids)
+    criteria = PlaceSearch(min_price=search.min_price, max_price=search.max_price, city_id=search.city_id,
+                           min_guests=search.min_guests, min_rooms=search.min_rooms).criteria()
+    if required:
+        criteria.append(Place.amenity_bits.op('&')(required) == required)
+    stmt = select(Place.id).where(*criteria).order_by(*search.sort.order_by(Place)).limit(PAGE_SIZE)
+    return conn.execute(stmt).scalars().all()
+
+
+def columns_page(columns, search, bits):
+    rows = columns.top(search, bits, search.sort, PAGE_SIZE)
+    return [columnar.id_string(columns.ids[row]) for row in rows]
+
+
+def timed(runs, function, *args):
+    began = time.perf_counter()
+    for _ in range(runs):
+        result = function(*args)
+    return result, (time.perf_counter() - began) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for count in args.places:
+        rng = random.Random(42)
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'places.db')}")
+            started = time.perf_counter()
+            amenity_ids, city_ids = load(engine, count, rng)
+            print(f"loaded {count} places in {time.perf_counter() - started:.1f} s")
+            bits = {amenity_id: bit for bit, amenity_id in enumerate(amenity_ids)}
+            with engine.connect() as conn:
+                columns, load_ms = timed(1, lambda: columnar.PlaceColumns.from_rows(columnar.read_rows(conn)))
+                print(f"snapshot loaded in {load_ms:.0f} ms")
+                updated = columnar.read_rows(conn, [columnar.id_string(columns.ids[count // 2])])
+                created = [(uuid.uuid4().bytes,) + tuple(updated[0][1:])]
+                _, update_ms = timed(args.runs, columns.merged, updated, [])
+                _, insert_ms = timed(args.runs, columns.merged, created, [])
+                print(f"one write swapped in: {update_ms:.1f} ms for an update, {insert_ms:.1f} ms for an insert")
+
+                searches = {
+                    'newest': PlaceSearch(sort='-created_at'),
+                    '50-150, cheapest': PlaceSearch(min_price=50, max_price=150, sort='price'),
+                    '4+ guests, 2 amenities': PlaceSearch(min_guests=4, amenity_ids=amenity_ids[:2],
+                                                          sort='-price'),
+                    'city, 6+ guests, 3 amenities': PlaceSearch(city_id=city_ids[7], min_guests=6,
+                                                                amenity_ids=amenity_ids[:3]),
+                    'city, cheapest': PlaceSearch(city_id=city_ids[7], sort='price'),
+                    '3+ rooms, oldest': PlaceSearch(min_rooms=3),
+                }
+                print(f"{'search':>30}{'SQL ms':>10}{'columns ms':>12}")
+                for label, search in searches.items():
+                    expected, sql_ms = timed(args.runs, sql_page, conn, search, bits)
+                    answer, columns_ms = timed(args.runs, columns_page, columns, search, bits)
+                    assert answer == expected, "strategies disagree"
+                    print(f"{label:>30}{sql_ms:>10.2f}{columns_ms:>12.3f}")
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+"""
+Benchmark: facet counts of places.
+
+Loads N places with cities, prices, capacities and amenities into a SQLite
+file, then computes the facets of every place and of a filtered search
+three ways and checks they agree:
+- per facet: one GROUP BY per facet, amenities counted by joining
+  place_amenity;
+- grouped pass: one GROUP BY city_id summing every other facet
+  (what PlaceRepository.facets runs for a search);
+- cache: the counts of a loaded GlobalFacets (what it serves without
+  filters).
+
+    python benchmarks/bench_place_facets.py [--places N] [--runs N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select
+from app.models.amenity import Amenity
+from app.models.city import City
+from app.models.identifiers import new_id
+from app.models.place import Place, place_amenity
+from app.models.user import User
+from app.persistence import facets
+from app.persistence.search import PlaceSearch
+
+CHUNK_SIZE = 10000
+AMENITIES = 20
+CITIES = 500
+OWNER_ID = new_id()
+
+
+def load(engine, count, rng):
+    for table in (User.__table__, City.__table__, Amenity.__table__, Place.__table__, place_amenity):
+        table.create(engine)
+    now = datetime.utcnow()
+    amenity_ids = [new_id() for _ in range(AMENITIES)]
+    city_ids = [new_id() for _ in range(CITIES)]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{'id': OWNER_ID, 'first_name': 'A', 'last_name': 'B',
+                                                'email': 'owner@example.com', 'password': 'x', 'is_admin': False}])
+        conn.execute(Amenity.__table__.insert(), [{'id': amenity_id, 'name': f'amenity {bit}', 'bit': bit,
+                                                   'created_at': now, 'updated_at': now}
+                                                  for bit, amenity_id in enumerate(amenity_ids)])
+        conn.execute(City.__table__.insert(), [{'id': city_id, 'name': f'city {index}', 'name_key': f'city {index}',
+                                                'place_count': 0, 'created_at': now, 'updated_at': now}
+                                               for index, city_id in enumerate(city_ids)])
+        places, links = [], []
+        for index in range(count):
+            place_id = new_id()
+            bits = rng.sample(range(AMENITIES), rng.randint(0, 6))
+            places.append({'id': place_id, 'user_id': OWNER_ID, 'name': 'place', 'number_rooms': 1,
+                           'number_bathrooms': 1, 'max_guest': rng.randint(1, 10),
+                           'price_by_night': int(rng.lognormvariate(4.5, 0.8)),
+                           'city_id': rng.choice(city_ids), 'amenity_bits': sum(1 << bit for bit in bits),
+                           'created_at': now, 'updated_at': now})
+            links += [{'place_id': place_id, 'amenity_id': amenity_ids[bit]} for bit in bits]
+            if len(places) == CHUNK_SIZE or index == count - 1:
+                conn.execute(Place.__table__.insert(), places)
+                conn.execute(place_amenity.insert(), links)
+                places, links = [], []
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def bit_map(conn):
+    return dict(conn.execute(select(Amenity.bit, Amenity.id)).all())
+
+
+def per_facet(conn, criteria):
+    key = facets.key_columns()
+    filtered = select(Place.id).where(*criteria)
+    cities = dict(conn.execute(select(Place.city_id, func.count()).where(*criteria).group_by(Place.city_id)).all())
+    prices = dict(conn.execute(select(key[2], func.count()).where(*criteria).group_by(key[2])).all())
+    guests = dict(conn.execute(select(key[3], func.count()).where(*criteria).group_by(key[3])).all())
+    amenities = dict(conn.execute(select(place_amenity.c.amenity_id, func.count())
+                                  .where(place_amenity.c.place_id.in_(filtered))
+                                  .group_by(place_amenity.c.amenity_id)).all())
+    total = conn.execute(select(func.count()).select_from(Place).where(*criteria)).scalar()
+    return facets.Facets(total, {amenity_id: count for amenity_id, count in amenities.items() if count},
+                         {city_id: count for city_id, count in cities.items() if city_id is not None},
+                         [prices.get(index, 0) for index in range(len(facets.PRICE_BUCKETS) + 1)],
+                         [guests.get(index, 0) for index in range(len(facets.GUEST_BANDS))])
+
+
+def grouped_pass(conn, criteria):
+    bits = bit_map(conn)
+    return facets.grouped_counts(conn, criteria, bits).facets(bits, {})
+
+
+def timed(runs, function, *args):
+    began = time.perf_counter()
+    for _ in range(runs):
+        result = function(*args)
+    return result, (time.perf_counter() - began) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, default=200_000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'places.db')}")
+        started = time.perf_counter()
+        load(engine, args.places, rng)
+        print(f"loaded {args.places} places in {time.perf_counter() - started:.1f} s")
+        with engine.connect() as conn:
+            index = facets.GlobalFacets()
+            _, load_ms = timed(1, lambda: index.load(facets.grouped_counts(conn, [], bit_map(conn)), bit_map(conn)))
+            print(f"cache loaded in {load_ms:.0f} ms")
+            searches = {'every place': [], 'price <= 100, 4+ guests': PlaceSearch(max_price=100, min_guests=4)}
+            print(f"{'facets of':>24}{'per facet ms':>14}{'grouped pass ms':>17}{'cache ms':>10}")
+            for label, search in searches.items():
+                criteria = search.criteria() if search else []
+                expected, per_facet_ms = timed(args.runs, per_facet, conn, criteria)
+                grouped, grouped_ms = timed(args.runs, grouped_pass, conn, criteria)
+                assert grouped == expected, "strategies disagree"
+                cache_ms = ''
+                if not criteria:
+                    cached, elapsed = timed(args.runs, lambda: index.counts().facets(bit_map(conn), {}))
+                    assert cached == expected, "cache disagrees"
+                    cache_ms = f"{elapsed:.3f}"
+                print(f"{label:>24}{per_facet_ms:>14.1f}{grouped_ms:>17.1f}{cache_ms:>10}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
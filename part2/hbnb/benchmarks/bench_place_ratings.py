@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+"""
+Benchmark: rating aggregates of places.
+
+Loads N places into a SQLite file, each with up to 2 * REVIEWS reviews,
+then reads the ratings of listing pages two ways and checks they agree:
+- subqueries: counting, summing and bucketing each place's reviews with
+  correlated subqueries, what a page cost when the ratings were computed
+  on read;
+- columns: reading the aggregates app.persistence.ratings keeps on the
+  place row.
+Pages are the first page in creation order, and the best rated places
+(which the subqueries can only find by aggregating every review). Also
+times ratings.rebuild() over every place, the reconciliation job.
+
+    python benchmarks/bench_place_ratings.py [--places N [N ...]] [--runs N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import case, create_engine, func, select
+from app.models.city import City
+from app.models.identifiers import new_id
+from app.models.place import Place, STAR_COLUMNS
+from app.models.review import Review
+from app.models.user import User
+from app.persistence import ratings
+
+CHUNK_SIZE = 10000
+PAGE_SIZE = 20
+REVIEWS = 10
+
+
+def load(engine, count, rng):
+    for table in (User.__table__, City.__table__, Place.__table__, Review.__table__):
+        table.create(engine)
+    now = datetime.utcnow()
+    user_ids = [new_id() for _ in range(2 * REVIEWS)]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{'id': user_id, 'first_name': 'A', 'last_name': 'B',
+                                                'email': f'user{index}@example.com', 'password': 'x',
+                                                'is_admin': False} for index, user_id in enumerate(user_ids)])
+        places, reviews = [], []
+        for index in range(count):
+            place_id = new_id()
+            created_at = now - timedelta(seconds=count - index)
+            places.append({'id': place_id, 'user_id': user_ids[0], 'name': 'place', 'number_rooms': 1,
+                           'number_bathrooms': 1, 'max_guest': 2, 'price_by_night': 100, 'amenity_bits': 0,
+                           'created_at': created_at, 'updated_at': created_at})
+            for user_id in rng.sample(user_ids, rng.randint(0, 2 * REVIEWS)):
+                reviews.append({'id': new_id(), 'user_id': user_id, 'place_id': place_id, 'text': 'ok',
+                                'rating': rng.randint(1, 5), 'created_at': now, 'updated_at': now})
+            if len(places) == CHUNK_SIZE or index == count - 1:
+                conn.execute(Place.__table__.insert(), places)
+                conn.execute(Review.__table__.insert(), reviews)
+                places, reviews = [], []
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def computed():
+    """The aggregates of each place, counted from its reviews"""
+    def of_reviews(expression):
+        return select(expression).where(Review.place_id == Place.id).correlate(Place).scalar_subquery()
+    count, total = of_reviews(func.count(Review.id)), of_reviews(func.coalesce(func.sum(Review.rating), 0))
+    stars = [of_reviews(func.count(Review.id).filter(Review.rating == rating))
+             for rating in range(1, len(STAR_COLUMNS) + 1)]
+    return [count, total, *stars, case((count > 0, total * 1.0 / count), else_=None)]
+
+
+def stored():
+    return [Place.review_count, Place.rating_sum, *[getattr(Place, name) for name in STAR_COLUMNS],
+            Place.average_rating]
+
+
+def first_page(conn, aggregates):
+    return conn.execute(select(Place.id, *aggregates).order_by(Place.created_at, Place.id).limit(PAGE_SIZE)).all()
+
+
+def best_rated(conn, aggregates):
+    average = aggregates[-1]
+    return conn.execute(select(Place.id, *aggregates).order_by(average.desc(), Place.id).limit(PAGE_SIZE)).all()
+
+
+def timed(runs, function, *args):
+    began = time.perf_counter()
+    for _ in range(runs):
+        result = function(*args)
+    return result, (time.perf_counter() - began) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'places':>10}{'reviews':>10}{'page':>12}{'subqueries ms':>15}{'columns ms':>12}{'rebuild ms':>12}")
+    for count in args.places:
+        rng = random.Random(42)
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'places.db')}")
+            load(engine, count, rng)
+            with engine.begin() as conn:
+                began = time.perf_counter()
+                assert ratings.rebuild(conn) > 0
+                rebuild_ms = (time.perf_counter() - began) * 1000
+                reviews = conn.scalar(select(func.count(Review.id)))
+            with engine.connect() as conn:
+                for label, page in (('first', first_page), ('best rated', best_rated)):
+                    expected, subqueries_ms = timed(args.runs, page, conn, computed())
+                    answer, columns_ms = timed(args.runs, page, conn, stored())
+                    assert answer == expected, "strategies disagree"
+                    print(f"{count:>10}{reviews:>10}{label:>12}{subqueries_ms:>15.2f}{columns_ms:>12.2f}"
+                          f"{rebuild_ms:>12.0f}")
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+"""
+Benchmark: similar place recommendations.
+
+Loads N places into a SQLite file, in N / PLACES_PER_CITY cities whose
+places lie around the city's center (and a review for one place in four),
+then times the recommendations of a few places three ways:
+- full scan: scoring every place of the snapshot, what a recommender
+  without candidate pruning costs;
+- neighborhood: similarity.most_similar() on the snapshot, scoring the
+  places of the city and of the grid cells around the place (what
+  PlaceRepository.similar runs with PLACE_COLUMNS set);
+- SQL: reading the same neighborhood through the city and geohash
+  indexes, then scoring it (what it runs without the snapshot).
+The last two must agree. Loading the recommended places is left out.
+
+    python benchmarks/bench_place_similar.py [--places N [N ...]] [--runs N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import and_, create_engine, or_, select
+from app.models.amenity import Amenity
+from app.models.city import City
+from app.models.geo import encode_geohash
+from app.models.identifiers import new_id
+from app.models.place import Place
+from app.models.review import Review
+from app.models.user import User
+from app.persistence import amenity_bits, columnar, ratings, similarity
+from app.persistence.geo import GeoSearch
+
+CHUNK_SIZE = 10000
+AMENITIES = 20
+PLACES_PER_CITY = 200
+SAMPLES = 20
+OWNER_ID = new_id()
+
+
+def load(engine, count, rng):
+    for table in (User.__table__, City.__table__, Amenity.__table__, Place.__table__, Review.__table__):
+        table.create(engine)
+    now = datetime.utcnow()
+    centers = {new_id(): (rng.uniform(-60, 60), rng.uniform(-180, 180))
+               for _ in range(max(1, count // PLACES_PER_CITY))}
+    city_ids = list(centers)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{'id': OWNER_ID, 'first_name': 'A', 'last_name': 'B',
+                                                'email': 'owner@example.com', 'password': 'x', 'is_admin': False}])
+        conn.execute(Amenity.__table__.insert(), [{'id': new_id(), 'name': f'amenity {bit}', 'bit': bit,
+                                                   'created_at': now, 'updated_at': now}
+                                                  for bit in range(AMENITIES)])
+        conn.execute(City.__table__.insert(), [{'id': city_id, 'name': f'city {index}', 'name_key': f'city {index}',
+                                                'place_count': 0, 'created_at': now, 'updated_at': now}
+                                               for index, city_id in enumerate(city_ids)])
+        places, reviews = [], []
+        for index in range(count):
+            place_id, city_id = new_id(), rng.choice(city_ids)
+            latitude = centers[city_id][0] + rng.uniform(-0.2, 0.2)
+            longitude = centers[city_id][1] + rng.uniform(-0.2, 0.2)
+            created_at = now - timedelta(seconds=count - index)
+            places.append({'id': place_id, 'user_id': OWNER_ID, 'name': 'place',
+                           'number_rooms': rng.randint(1, 5), 'number_bathrooms': 1,
+                           'max_guest': rng.randint(1, 10), 'price_by_night': int(rng.lognormvariate(4.5, 0.8)),
+                           'latitude': latitude, 'longitude': longitude,
+                           'geohash': encode_geohash(latitude, longitude), 'city_id': city_id,
+                           'amenity_bits': amenity_bits.mask(rng.sample(range(AMENITIES), rng.randint(0, 6))),
+                           'created_at': created_at, 'updated_at': created_at})
+            if index % 4 == 0:
+                reviews.append({'id': new_id(), 'user_id': OWNER_ID, 'place_id': place_id, 'text': 'ok',
+                                'rating': rng.randint(1, 5), 'created_at': now, 'updated_at': now})
+            if len(places) == CHUNK_SIZE or index == count - 1:
+                conn.execute(Place.__table__.insert(), places)
+                if reviews:
+                    conn.execute(Review.__table__.insert(), reviews)
+                places, reviews = [], []
+        ratings.rebuild(conn)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def full_scan(columns, place_id):
+    row = int(columns.positions(np.array([columnar.id_bytes(place_id)], dtype='S16'))[0][0])
+    rows = np.flatnonzero(np.arange(len(columns)) != row)
+    scores = similarity.features(columns, row, rows) @ similarity.WEIGHTS
+    return rows[np.argsort(-scores, kind='stable')[:similarity.DEFAULT_LIMIT]]
+
+
+def neighborhood(columns, place_id):
+    return [match.id for match in similarity.most_similar(columns, place_id, similarity.DEFAULT_LIMIT)]
+
+
+def sql_neighborhood(conn, place_id):
+    # PlaceRepository._neighborhood_columns reads through the app's session
+    place = conn.execute(select(Place.city_id, Place.latitude, Place.longitude).where(Place.id == place_id)).first()
+    box = similarity.neighborhood(place.latitude, place.longitude)
+    rows = conn.execute(columnar.rows_statement().where(or_(
+        Place.id == place_id, Place.city_id == place.city_id, and_(*GeoSearch(box).criteria())))).all()
+    return neighborhood(columnar.PlaceColumns.from_rows(rows), place_id)
+
+
+def timed(runs, function, columns_or_conn, place_ids):
+    began = time.perf_counter()
+    for _ in range(runs):
+        results = [function(columns_or_conn, place_id) for place_id in place_ids]
+    return results, (time.perf_counter() - began) * 1000 / runs / len(place_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'places':>10}{'candidates':>12}{'full scan ms':>14}{'neighborhood ms':>17}{'SQL ms':>10}")
+    for count in args.places:
+        rng = random.Random(42)
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'places.db')}")
+            load(engine, count, rng)
+            with engine.connect() as conn:
+                columns = columnar.PlaceColumns.from_rows(columnar.read_rows(conn))
+                place_ids = [columnar.id_string(columns.ids[row]) for row in rng.sample(range(count), SAMPLES)]
+                candidates = np.mean([len(similarity.candidates(columns, int(columns.positions(
+                    np.array([columnar.id_bytes(place_id)], dtype='S16'))[0][0]))) for place_id in place_ids])
+                _, scan_ms = timed(args.runs, full_scan, columns, place_ids)
+                expected, neighborhood_ms = timed(args.runs, neighborhood, columns, place_ids)
+                answer, sql_ms = timed(args.runs, sql_neighborhood, conn, place_ids)
+                assert answer == expected, "strategies disagree"
+                print(f"{count:>10}{candidates:>12.0f}{scan_ms:>14.2f}{neighborhood_ms:>17.3f}{sql_ms:>10.2f}")
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
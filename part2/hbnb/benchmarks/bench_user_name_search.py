@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+"""
+Benchmark: user name searches.
+
+Loads N users with names in mixed case into the users table of a SQLite
+file, then times the first page of a name search three ways and checks
+they agree:
+- python scan: every user loaded and compared lowercased in Python (what
+  find_users_by_name did);
+- lower() scan: lower(first_name) compared in SQL, which no index serves;
+- name key: UserSearch.criteria() on the case-folded name keys, read in
+  order from ix_users_first_name_key_id / ix_users_last_name_key_id (what
+  UserRepository.search runs).
+
+    python benchmarks/bench_user_name_search.py [--users N] [--queries N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select
+from app.models.identifiers import new_id
+from app.models.user import User
+from app.models.names import name_key
+from app.persistence.search import UserSearch
+
+CHUNK_SIZE = 10000
+PAGE_SIZE = 20
+SYLLABLES = ['an', 'ba', 'cel', 'da', 'el', 'fa', 'gi', 'ha', 'is', 'jo', 'ka', 'li', 'ma', 'na', 'ol',
+             'pe', 'ra', 'sa', 'ti', 'ul', 'va', 'yo', 'ze', 'mi']
+
+
+def names(rng, count, max_syllables):
+    """count distinct names of two to max_syllables syllables"""
+    result = set()
+    while len(result) < count:
+        result.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, max_syllables))).capitalize())
+    return sorted(result)
+
+
+def vary_case(name, rng):
+    roll = rng.random()
+    return name.upper() if roll < 0.05 else name.lower() if roll < 0.1 else name
+
+
+def generate(count, rng, first_names, last_names):
+    now = datetime.utcnow()
+    for index in range(count):
+        first_name = vary_case(rng.choice(first_names), rng)
+        last_name = vary_case(rng.choice(last_names), rng)
+        yield {'id': new_id(), 'first_name': first_name, 'last_name': last_name,
+               'first_name_key': name_key(first_name), 'last_name_key': name_key(last_name),
+               'email': f'user{index}@example.com', 'password': 'x', 'is_admin': False,
+               'created_at': now, 'updated_at': now}
+
+
+def load(engine, count, rng, first_names, last_names):
+    User.__table__.create(engine)
+    with engine.begin() as conn:
+        chunk = []
+        for row in generate(count, rng, first_names, last_names):
+            chunk.append(row)
+            if len(chunk) == CHUNK_SIZE:
+                conn.execute(User.__table__.insert(), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(User.__table__.insert(), chunk)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def python_scan(conn, search):
+    users = conn.execute(select(User.id, User.first_name, User.last_name)).all()
+    keyed = [SimpleNamespace(id=user.id, first_name_key=name_key(user.first_name),
+                             last_name_key=name_key(user.last_name)) for user in users]
+    hits = sorted((search.sort.key(user) for user in keyed if search.matches(user)))
+    return [user_id for _, user_id in hits[:PAGE_SIZE]]
+
+
+def lower_scan(conn, search):
+    columns = {'first_name_key': func.lower(User.first_name), 'last_name_key': func.lower(User.last_name)}
+    stmt = select(User.id)
+    for attribute, key in search.keys():
+        column = columns[attribute]
+        stmt = stmt.where(column.like(key + '%') if search.prefix else column == key)
+    stmt = stmt.order_by(columns[search.sort.attribute], User.id).limit(PAGE_SIZE)
+    return conn.execute(stmt).scalars().all()
+
+
+def name_key_search(conn, search):
+    stmt = (select(User.id).where(*search.criteria())
+            .order_by(*search.sort.order_by(User)).limit(PAGE_SIZE))
+    return conn.execute(stmt).scalars().all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    first_names, last_names = names(rng, 5000, 3), names(rng, 20000, 4)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'users.db')}")
+        started = time.perf_counter()
+        load(engine, args.users, rng, first_names, last_names)
+        print(f"loaded {args.users} users in {time.perf_counter() - started:.1f} s")
+
+        searches = {
+            'first name': [UserSearch(first_name=rng.choice(first_names).upper()) for _ in range(args.queries)],
+            'last name': [UserSearch(last_name=rng.choice(last_names).lower()) for _ in range(args.queries)],
+            'both names': [UserSearch(first_name=rng.choice(first_names), last_name=rng.choice(last_names))
+                           for _ in range(args.queries)],
+            'prefix': [UserSearch(first_name=rng.choice(first_names)[:3], prefix=True)
+                       for _ in range(args.queries)],
+        }
+        strategies = {'python scan': python_scan, 'lower() scan': lower_scan, 'name key': name_key_search}
+        with engine.connect() as conn:
+            print(f"{'search':>12}{'python scan ms':>16}{'lower() scan ms':>17}{'name key ms':>13}")
+            for label, queries in searches.items():
+                timings = {}
+                for search in queries:
+                    answers = []
+                    for name, strategy in strategies.items():
+                        if name == 'python scan' and len(timings.get(name, ())) >= 3:
+                            continue
+                        began = time.perf_counter()
+                        answers.append(strategy(conn, search))
+                        timings.setdefault(name, []).append((time.perf_counter() - began) * 1000)
+                    assert all(answer == answers[0] for answer in answers), "strategies disagree"
+                average = {name: sum(times) / len(times) for name, times in timings.items()}
+                print(f"{label:>12}{average['python scan']:>16.1f}{average['lower() scan']:>17.1f}"
+                      f"{average['name key']:>13.3f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+"""
+Benchmark: CHAR(36) vs 16-byte UUID keys.
+
+Builds the same users/places/reviews/amenities/place_amenity data twice in
+SQLite files, once keyed by String(36) and once by BinaryUUID, then reports
+the on-disk size of every table and index (from the dbstat virtual table)
+and the time of the joins the API runs most.
+
+    python benchmarks/bench_uuid_keys.py [--users N] [--places N] [--reviews N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import (MetaData, Table, Column, String, Integer, DateTime, ForeignKey, Index,
+                        create_engine, func, select, text)
+from app.models.types import BinaryUUID
+
+
+def build_metadata(key_type):
+    metadata = MetaData()
+    Table('users', metadata,
+          Column('id', key_type, primary_key=True),
+          Column('email', String(120), nullable=False, unique=True),
+          Column('created_at', DateTime))
+    Table('amenities', metadata,
+          Column('id', key_type, primary_key=True),
+          Column('name', String(128), nullable=False),
+          Column('created_at', DateTime))
+    places = Table('places', metadata,
+                   Column('id', key_type, primary_key=True),
+                   Column('user_id', key_type, ForeignKey('users.id'), nullable=False),
+                   Column('name', String(128), nullable=False),
+                   Column('price_by_night', Integer, nullable=False),
+                   Column('created_at', DateTime))
+    reviews = Table('reviews', metadata,
+                    Column('id', key_type, primary_key=True),
+                    Column('place_id', key_type, ForeignKey('places.id'), nullable=False),
+                    Column('user_id', key_type, ForeignKey('users.id'), nullable=False),
+                    Column('rating', Integer, nullable=False),
+                    Column('created_at', DateTime))
+    Table('place_amenity', metadata,
+          Column('place_id', key_type, ForeignKey('places.id'), primary_key=True),
+          Column('amenity_id', key_type, ForeignKey('amenities.id'), primary_key=True))
+    Index('ix_places_user_id', places.c.user_id)
+    Index('ix_places_created_at_id', places.c.created_at, places.c.id)
+    Index('ix_reviews_place_id_created_at', reviews.c.place_id, reviews.c.created_at)
+    Index('ix_reviews_user_id', reviews.c.user_id)
+    return metadata
+
+
+def generate(args):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+
+    def rows(count, **columns):
+        return [dict({'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                      'created_at': start + timedelta(seconds=i)},
+                     **{key: make(i) for key, make in columns.items()})
+                for i in range(count)]
+
+    users = rows(args.users, email=lambda i: f"user{i}@example.com")
+    amenities = rows(args.amenities, name=lambda i: f"amenity {i}")
+    places = rows(args.places, user_id=lambda i: rng.choice(users)['id'],
+                  name=lambda i: f"place {i}", price_by_night=lambda i: rng.randint(10, 500))
+    reviews = rows(args.reviews, place_id=lambda i: rng.choice(places)['id'],
+                   user_id=lambda i: rng.choice(users)['id'], rating=lambda i: rng.randint(1, 5))
+    links = {(place['id'], amenity['id'])
+             for place in places for amenity in rng.sample(amenities, min(3, len(amenities)))}
+    place_amenity = [{'place_id': p, 'amenity_id': a} for p, a in sorted(links)]
+    return [('users', users), ('amenities', amenities), ('places', places),
+            ('reviews', reviews), ('place_amenity', place_amenity)]
+
+
+def load(path, key_type, data):
+    engine = create_engine(f"sqlite:///{path}")
+    metadata = build_metadata(key_type)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name, rows in data:
+            conn.execute(metadata.tables[name].insert(), rows)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return engine, metadata
+
+
+def sizes(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).all())
+
+
+def timed(engine, statement, repeat):
+    with engine.connect() as conn:
+        conn.execute(statement).all()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(statement).all()
+        return (time.perf_counter() - started) / repeat * 1000
+
+
+def queries(metadata, sample_place, sample_user):
+    users, places, reviews = metadata.tables['users'], metadata.tables['places'], metadata.tables['reviews']
+    place_amenity, amenities = metadata.tables['place_amenity'], metadata.tables['amenities']
+    return {
+        'reviews of a place, with authors': (
+            select(reviews.c.id, users.c.email)
+            .join(users, users.c.id == reviews.c.user_id)
+            .where(reviews.c.place_id == sample_place), 200),
+        'places of a user, with amenities': (
+            select(places.c.id, amenities.c.name)
+            .join(place_amenity, place_amenity.c.place_id == places.c.id)
+            .join(amenities, amenities.c.id == place_amenity.c.amenity_id)
+            .where(places.c.user_id == sample_user), 200),
+        'review count of every place': (
+            select(places.c.id, func.count(reviews.c.id))
+            .join(reviews, reviews.c.place_id == places.c.id)
+            .group_by(places.c.id), 5),
+        'reviews x places x users': (
+            select(func.count())
+            .select_from(reviews.join(places, places.c.id == reviews.c.place_id)
+                         .join(users, users.c.id == places.c.user_id)), 5),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--amenities', type=int, default=50)
+    parser.add_argument('--places', type=int, default=20000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    args = parser.parse_args()
+
+    data = generate(args)
+    sample_place = data[2][1][len(data[2][1]) // 2]['id']
+    sample_user = data[0][1][len(data[0][1]) // 2]['id']
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, key_type in (('CHAR(36)', String(36)), ('BINARY(16)', BinaryUUID)):
+            engine, metadata = load(os.path.join(tmp, f"{len(results)}.db"), key_type, data)
+            results[label] = (sizes(engine), {name: timed(engine, stmt, repeat) for name, (stmt, repeat)
+                                              in queries(metadata, sample_place, sample_user).items()})
+            engine.dispose()
+
+    (text_label, (text_sizes, text_times)), (binary_label, (binary_sizes, binary_times)) = results.items()
+    print(f"{'table / index (KiB)':<48}{text_label:>12}{binary_label:>12}{'ratio':>8}")
+    for name in sorted(text_sizes):
+        if name.startswith('sqlite_') and 'autoindex' not in name:
+            continue
+        before, after = text_sizes[name] / 1024, binary_sizes.get(name, 0) / 1024
+        print(f"{name:<48}{before:>12.0f}{after:>12.0f}{after / before:>8.2f}")
+    total_before, total_after = sum(text_sizes.values()) / 1024, sum(binary_sizes.values()) / 1024
+    print(f"{'total':<48}{total_before:>12.0f}{total_after:>12.0f}{total_after / total_before:>8.2f}")
+    print()
+    print(f"{'query (ms)':<48}{text_label:>12}{binary_label:>12}{'ratio':>8}")
+    for name, before in text_times.items():
+        after = binary_times[name]
+        print(f"{name:<48}{before:>12.2f}{after:>12.2f}{after / before:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@
 
 INSERT INTO users (id, email, first_name, last_name, password, is_admin)
 VALUES (
-    '36c9050e-ddd3-4c3b-9731-9f487208bbc1',
+    UUID_TO_BIN('36c9050e-ddd3-4c3b-9731-9f487208bbc1'),
     'admin@hbnb.io',
     'Admin',
     'HBnB',
@@ -15,6 +15,6 @@ VALUES (
  -- 2. Insert Amenities --
 
  INSERT INTO amenities (id, name) VALUES 
-('583f7c46-d5e4-41d3-921c-81f72740a631', 'WiFi'),
-('21b3f9be-3898-4c80-9969-d419d45d9471', 'Swimming Pool'),
-('7a5241e1-1647-4c46-862d-0453d865c342', 'Air Conditioning');
+(UUID_TO_BIN('583f7c46-d5e4-41d3-921c-81f72740a631'), 'WiFi'),
+(UUID_TO_BIN('21b3f9be-3898-4c80-9969-d419d45d9471'), 'Swimming Pool'),
+(UUID_TO_BIN('7a5241e1-1647-4c46-862d-0453d865c342'), 'Air Conditioning');
@@ -1,30 +1,54 @@
+-- Creates the schema from scratch. THIS DROPS ALL DATA.
+-- To upgrade an existing database in place, run: python migrate.py upgrade
+-- IDs are stored as 16-byte UUIDs: write them with UUID_TO_BIN('...'), read them with BIN_TO_UUID(id).
+
 -- Disable foreign key checks to allow dropping tables in any order
 SET FOREIGN_KEY_CHECKS = 0;
 
 -- Drop existing tables to ensure a clean slate
+DROP TABLE IF EXISTS place_documents;
 DROP TABLE IF EXISTS place_amenity;
 DROP TABLE IF EXISTS reviews;
 DROP TABLE IF EXISTS places;
+DROP TABLE IF EXISTS cities;
 DROP TABLE IF EXISTS amenities;
 DROP TABLE IF EXISTS users;
+DROP TABLE IF EXISTS cache_invalidations;
 
 SET FOREIGN_KEY_CHECKS = 1;
 
 -- 1. USER TABLE --
 CREATE TABLE users (
-    id CHAR(36) PRIMARY KEY,
+    id BINARY(16) PRIMARY KEY,
     first_name VARCHAR(255) NOT NULL,
     last_name VARCHAR(255) NOT NULL,
     email VARCHAR(255) UNIQUE NOT NULL,
     password VARCHAR(255) NOT NULL,
     is_admin BOOLEAN DEFAULT FALSE,
+    first_name_key VARCHAR(255),
+    last_name_key VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_users_created_at_id (created_at, id),
+    INDEX ix_users_first_name_key_id (first_name_key, id),
+    INDEX ix_users_last_name_key_id (last_name_key, id)
+);
+
+-- 2. CITY TABLE --
+CREATE TABLE cities (
+    id BINARY(16) PRIMARY KEY,
+    name VARCHAR(128) NOT NULL,
+    name_key VARCHAR(384) NOT NULL,
+    place_count INT NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE INDEX ix_cities_name_key (name_key),
+    INDEX ix_cities_created_at_id (created_at, id)
 );
 
--- 2. PLACE TABLE --
+-- 3. PLACE TABLE --
 CREATE TABLE places (
-    id CHAR(36) PRIMARY KEY,
+    id BINARY(16) PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
     description TEXT,
     address VARCHAR(255),
@@ -35,39 +59,85 @@ CREATE TABLE places (
     price_by_night INT DEFAULT 0,
     latitude FLOAT,
     longitude FLOAT,
-    user_id CHAR(36) NOT NULL,
+    geohash VARCHAR(12),
+    amenity_bits BIGINT NOT NULL DEFAULT 0,
+    review_count INT NOT NULL DEFAULT 0,
+    rating_sum INT NOT NULL DEFAULT 0,
+    rating_1 INT NOT NULL DEFAULT 0,
+    rating_2 INT NOT NULL DEFAULT 0,
+    rating_3 INT NOT NULL DEFAULT 0,
+    rating_4 INT NOT NULL DEFAULT 0,
+    rating_5 INT NOT NULL DEFAULT 0,
+    city_id BINARY(16),
+    user_id BINARY(16) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT fk_place_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    CONSTRAINT fk_place_city FOREIGN KEY (city_id) REFERENCES cities(id) ON DELETE SET NULL,
+    CONSTRAINT fk_place_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX ix_places_user_id (user_id),
+    INDEX ix_places_city_name_price_by_night (city_name, price_by_night),
+    INDEX ix_places_city_id_price_by_night (city_id, price_by_night),
+    INDEX ix_places_created_at_id (created_at, id),
+    INDEX ix_places_price_by_night_id (price_by_night, id),
+    INDEX ix_places_geohash (geohash)
 );
 
--- 3. REVIEW TABLE --
+-- 4. REVIEW TABLE --
 CREATE TABLE reviews (
-    id CHAR(36) PRIMARY KEY,
+    id BINARY(16) PRIMARY KEY,
     text TEXT NOT NULL,
     rating INT NOT NULL CHECK (rating >= 1 AND rating <= 5),
-    user_id CHAR(36) NOT NULL,
-    place_id CHAR(36) NOT NULL,
+    user_id BINARY(16) NOT NULL,
+    place_id BINARY(16) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     CONSTRAINT fk_review_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     CONSTRAINT fk_review_place FOREIGN KEY (place_id) REFERENCES places(id) ON DELETE CASCADE,
-    CONSTRAINT unique_review_per_user UNIQUE (user_id, place_id)
+    CONSTRAINT unique_review_per_user UNIQUE (user_id, place_id),
+    INDEX ix_reviews_place_id_created_at (place_id, created_at),
+    INDEX ix_reviews_user_id (user_id),
+    INDEX ix_reviews_created_at_id (created_at, id)
 );
 
--- 4. AMENITY TABLE --
+-- 5. AMENITY TABLE --
 CREATE TABLE amenities (
-    id CHAR(36) PRIMARY KEY,
+    id BINARY(16) PRIMARY KEY,
     name VARCHAR(255) UNIQUE NOT NULL,
+    bit SMALLINT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_amenities_name (name),
+    INDEX ix_amenities_created_at_id (created_at, id),
+    UNIQUE INDEX ix_amenities_bit (bit)
 );
 
--- 5. PLACE_AMENITY TABLE (Many-to-Many) --
+-- 6. PLACE_AMENITY TABLE (Many-to-Many) --
 CREATE TABLE place_amenity (
-    place_id CHAR(36) NOT NULL,
-    amenity_id CHAR(36) NOT NULL,
+    place_id BINARY(16) NOT NULL,
+    amenity_id BINARY(16) NOT NULL,
     PRIMARY KEY (place_id, amenity_id),
+    INDEX ix_place_amenity_amenity_id_place_id (amenity_id, place_id),
     CONSTRAINT fk_pa_place FOREIGN KEY (place_id) REFERENCES places(id) ON DELETE CASCADE,
     CONSTRAINT fk_pa_amenity FOREIGN KEY (amenity_id) REFERENCES amenities(id) ON DELETE CASCADE
 );
+
+-- 7. CACHE_INVALIDATIONS TABLE (repository cache sync between workers) --
+CREATE TABLE cache_invalidations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    entity VARCHAR(64) NOT NULL,
+    obj_id CHAR(36),
+    created_at DATETIME NOT NULL,
+    INDEX ix_cache_invalidations_created_at (created_at)
+);
+
+-- 8. PLACE_DOCUMENTS TABLE (full-text search over places and their reviews) --
+CREATE TABLE place_documents (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    place_id BINARY(16) NOT NULL UNIQUE,
+    name VARCHAR(128),
+    description TEXT,
+    city_name VARCHAR(128),
+    reviews TEXT,
+    FULLTEXT INDEX ix_place_documents_fulltext (name, description, city_name, reviews),
+    CONSTRAINT fk_pd_place FOREIGN KEY (place_id) REFERENCES places(id) ON DELETE CASCADE
+);
@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+"""
+Schema migration tool.
+
+    python migrate.py status    # list applied and pending migrations
+    python migrate.py upgrade   # apply pending migrations (optionally: upgrade <version>)
+    python migrate.py verify    # check that the database matches the models
+"""
+import os
+import sys
+from app import create_app, db
+from app.persistence import migrations
+
+config_name = os.getenv('FLASK_CONFIG') or 'config.DevelopmentConfig'
+app = create_app(config_name)
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'status'
+    with app.app_context():
+        engine = db.engine
+        if command == 'status':
+            applied = migrations.applied_versions(engine)
+            for migration in migrations.load_migrations():
+                state = 'applied' if migration.version in applied else 'pending'
+                print(f"v{migration.version:04d} [{state}] {migration.description}")
+        elif command == 'upgrade':
+            target = int(argv[2]) if len(argv) > 2 else None
+            applied = migrations.upgrade(engine, target)
+            for migration in applied:
+                print(f"Applied v{migration.version:04d}: {migration.description}")
+            if not applied:
+                print("Database is up to date.")
+        elif command == 'verify':
+            problems = migrations.verify(engine, db.metadata)
+            for problem in problems:
+                print(problem)
+            if problems:
+                return 1
+            print("Database matches the models.")
+        else:
+            print(__doc__)
+            return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
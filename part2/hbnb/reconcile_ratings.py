@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+"""
+Recounts the rating aggregates of every place from its reviews (see
+app.persistence.ratings), correcting any that drifted, e.g. after reviews
+were written straight to the database. Each chunk of places is
+recounted and committed in a transaction of its own, so the rows it
+locks are released as soon as it is done.
+
+    python reconcile_ratings.py
+"""
+import os
+import sys
+from app import create_app, db
+from app.persistence import ratings
+
+config_name = os.getenv('FLASK_CONFIG') or 'config.DevelopmentConfig'
+app = create_app(config_name)
+
+
+def main():
+    with app.app_context():
+        fixed = 0
+        for place_ids in ratings.place_id_chunks(db.session):
+            fixed += ratings.rebuild(db.session, place_ids)
+            db.session.commit()
+        print(f"Corrected the rating aggregates of {fixed} place(s).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+"""
+The repositories the storage tests run their checks against: those of
+the database, then the in-memory ones.
+"""
+from app.models.user import User
+from app.models.place import Place
+from app.persistence import cities, columnar, facets
+from app.persistence.repository import (
+    UserRepository, PlaceRepository, ReviewRepository, AmenityRepository, CityRepository
+)
+from app.persistence.memory_repository import (
+    InMemoryUserRepository, InMemoryPlaceRepository, InMemoryReviewRepository, InMemoryAmenityRepository,
+    InMemoryCityRepository
+)
+
+
+class Backend:
+    """
+    The repositories of one storage, and owner, a user to own the places
+    a test adds. columns is a PlaceRepository reading the place snapshot
+    (None in memory).
+    """
+    def __init__(self, users, places, reviews, amenities, cities, columns=None):
+        self.users = users
+        self.places = places
+        self.reviews = reviews
+        self.amenities = amenities
+        self.cities = cities
+        self.columns = columns
+        self.owner = users.add(User(first_name="Ann", last_name="Lee", email="ann@example.com", password="pass"))
+
+    def add_place(self, name="Stay", city=None, **attributes):
+        """Adds a place of the owner, in city when given"""
+        if city is not None:
+            attributes.update(city_name=city.name, city_id=city.id)
+        attributes.setdefault('price_by_night', 100)
+        return self.places.add(Place(name=name, user_id=self.owner.id, **attributes))
+
+
+def backends():
+    """
+    A Backend of the database and one in memory. Call it in an app
+    context, once db.create_all() made the tables.
+    """
+    # The process-wide caches may hold the data of another test database
+    columnar.snapshot.expire()
+    facets.index.expire()
+    cities.index.expire()
+
+    users = UserRepository()
+    in_columns = PlaceRepository(users)
+    in_columns.columns = columnar.snapshot
+    memory_users, memory_reviews = InMemoryUserRepository(), InMemoryReviewRepository()
+    memory_amenities, memory_cities = InMemoryAmenityRepository(), InMemoryCityRepository()
+    return [
+        Backend(users, PlaceRepository(users), ReviewRepository(), AmenityRepository(), CityRepository(),
+                in_columns),
+        Backend(memory_users,
+                InMemoryPlaceRepository(memory_users, memory_reviews, memory_amenities, memory_cities),
+                memory_reviews, memory_amenities, memory_cities),
+    ]
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.persistence import amenity_bits
+from app.persistence.repository import AmenityRepository
+from app.persistence.search import PlaceSearch
+from storage_backends import backends
+
+
+def with_amenities(places, *amenities):
+    """Names of the places having every one of the amenities"""
+    search = PlaceSearch(amenity_ids=[amenity.id for amenity in amenities])
+    return {place.name for place in places.search(search, limit=50).items}
+
+
+def test_amenity_bits():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for backend in backends():
+            places, amenities = backend.places, backend.amenities
+            wifi, pool, sauna = (amenities.add(Amenity(name=name)) for name in ("Wifi", "Pool", "Sauna"))
+            assert sorted(amenity.bit for amenity in (wifi, pool, sauna)) == [0, 1, 2]
+            loft = backend.add_place("Loft", price_by_night=80, amenities=[wifi, pool])
+            backend.add_place("Cabin", price_by_night=60, amenities=[wifi, sauna])
+            backend.add_place("Studio", price_by_night=40, amenities=[])
+            assert places.get(loft.id).amenity_bits == (1 << wifi.bit) | (1 << pool.bit)
+
+            assert with_amenities(places, wifi) == {"Loft", "Cabin"}
+            assert with_amenities(places, wifi, pool) == {"Loft"}
+            assert with_amenities(places, pool, sauna) == set()
+
+            # Deleting an amenity clears its bit from its places, and frees it
+            freed = pool.bit
+            amenities.delete(pool.id)
+            assert places.get(loft.id).amenity_bits == 1 << wifi.bit
+            spa = amenities.add(Amenity(name="Spa"))
+            assert spa.bit == freed
+            assert with_amenities(places, spa) == set() and with_amenities(places, wifi) == {"Loft", "Cabin"}
+
+        # A bit another transaction took in the meantime is assigned again
+        original = amenity_bits.free_bits
+        attempts = []
+
+        def stale(used):
+            attempts.append(used)
+            return original([] if len(attempts) == 1 else used)
+        amenity_bits.free_bits = stale
+        try:
+            gym = AmenityRepository().add(Amenity(name="Gym"))
+        finally:
+            amenity_bits.free_bits = original
+        taken = {amenity.bit for amenity in AmenityRepository().get_all() if amenity.id != gym.id}
+        assert len(attempts) == 2 and gym.bit is not None and gym.bit not in taken
+    print("Amenity bits test passed!")
+
+test_amenity_bits()
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+import asyncio
+import json
+import os
+import tempfile
+from app import create_app, db
+from app.api.v1.asynchronous import AsyncRoutes
+from app.api.v1.places import async_routes
+from app.models.user import User
+from app.models.place import Place
+from app.models.amenity import Amenity
+from app.persistence import user_repository, place_repository, amenity_repository
+from app.persistence.async_repository import async_engine
+from app.services import facade
+from config import TestingConfig, engine_options
+
+
+async def request(app, path, query=''):
+    """Sends a GET request to an ASGI app, returns (status, JSON body)"""
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'root_path': '', 'query_string': query.encode(),
+             'headers': [], 'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80)}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+    await app(scope, receive, send)
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return messages[0]['status'], json.loads(body)
+
+
+async def shutdown(app):
+    """Runs the ASGI lifespan shutdown"""
+    events = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+    sent = []
+
+    async def receive():
+        return next(events)
+
+    async def send(message):
+        sent.append(message['type'])
+    await app({'type': 'lifespan'}, receive, send)
+    return sent
+
+
+def test_async_routes():
+    with tempfile.TemporaryDirectory() as tmp:
+        # A file database, which the asyncio engine can share
+        class AsyncTestingConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'hbnb.db')}"
+            SQLALCHEMY_ENGINE_OPTIONS = engine_options('small')
+            REPOSITORY_CACHE_SIZE = 16
+
+        flask_app = create_app(AsyncTestingConfig)
+        with flask_app.app_context():
+            db.create_all()
+            assert async_engine() is not None
+            owner = user_repository.add(User(first_name="Ann", last_name="Lee", email="ann@example.com",
+                                             password="pass"))
+            guest = user_repository.add(User(first_name="Bob", last_name="Ray", email="bob@example.com",
+                                             password="pass"))
+            wifi = amenity_repository.add(Amenity(name="Wifi"))
+            loft = place_repository.add(Place(name="Loft", user_id=owner.id, price_by_night=80))
+            cabin = place_repository.add(Place(name="Cabin", user_id=owner.id, price_by_night=60))
+            loft.amenities.append(wifi)
+            db.session.commit()
+            facade.create_review({'text': "Nice", 'rating': 4, 'user_id': guest.id, 'place_id': loft.id})
+            loft_id, cabin_id = loft.id, cabin.id
+            db.session.remove()
+
+        app = AsyncRoutes(flask_app, {'/api/v1/places': async_routes})
+        assert app.native
+
+        # The coroutine routes never open a db.session
+        sessions = []
+        create_session = db.session.registry.createfunc
+        db.session.registry.createfunc = lambda: sessions.append(1) or create_session()
+
+        async def scenario():
+            status, first = await request(app, '/api/v1/places/', 'limit=1&include_total=true')
+            assert status == 200 and first['total'] == 2 and [item['name'] for item in first['items']] == ["Loft"]
+            status, second = await request(app, '/api/v1/places/', f"limit=1&cursor={first['next_cursor']}")
+            assert [item['name'] for item in second['items']] == ["Cabin"] and second['next_cursor'] is None
+            assert (await request(app, '/api/v1/places/', 'limit=0'))[0] == 400
+
+            status, detail = await request(app, f'/api/v1/places/{loft_id}')
+            assert status == 200 and detail['name'] == "Loft" and detail['owner']['email'] == "ann@example.com"
+            # The second read is rebuilt from the repository cache, owner and amenities included
+            status, cached = await request(app, f'/api/v1/places/{loft_id.upper()}')
+            assert status == 200 and cached == detail and [a['name'] for a in cached['amenities']] == ["Wifi"]
+            assert place_repository.cache.hits == 1
+            status, body = await request(app, '/api/v1/places/00000000-0000-4000-8000-000000000000')
+            assert status == 404 and 'not found' in body['message']
+            assert (await request(app, '/api/v1/places/not-a-uuid'))[0] == 400
+
+            status, reviews = await request(app, f'/api/v1/places/{loft_id}/reviews')
+            assert status == 200 and [review['text'] for review in reviews] == ["Nice"]
+            assert await request(app, f'/api/v1/places/{cabin_id}/reviews') == (200, [])
+            assert sessions == []
+
+            # Concurrent requests share the loop and its pooled connections
+            results = await asyncio.gather(*[request(app, f'/api/v1/places/{place_id}/reviews')
+                                             for place_id in [loft_id, cabin_id] * 16])
+            assert {status for status, _ in results} == {200}
+            with flask_app.app_context():
+                stats = facade.get_pool_stats()['async_primary']
+            assert stats['pool_class'] == 'InstrumentedAsyncQueuePool'
+            assert stats['checkouts'] > stats['connects']
+
+            # Other routes are served by Flask, on a thread
+            status, amenities = await request(app, f'/api/v1/places/{loft_id}/amenities')
+            assert status == 200 and [a['name'] for a in amenities] == ["Wifi"]
+            assert sessions
+
+            assert await shutdown(app) == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            db.session.registry.createfunc = create_session
+        with flask_app.app_context():
+            db.engine.dispose()
+
+    # Without an asyncio engine, Flask serves the coroutine routes' URLs
+    app = AsyncRoutes(create_app(TestingConfig), {'/api/v1/places': async_routes})
+    assert not app.native
+    assert asyncio.run(request(app, '/api/v1/places/not-a-uuid'))[0] == 400
+    print("Async routes test passed!")
+
+test_async_routes()
@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.persistence.repository import AmenityRepository
+
+
+class SelectThenWrite(AmenityRepository):
+    """Upserts like a dialect without a native upsert statement"""
+    def _upsert_statement(self, keys):
+        return None
+
+
+def test_bulk_upsert():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for amenities in (AmenityRepository(), SelectThenWrite()):
+            created = amenities.upsert_many([{'name': 'Wifi'}, {'name': 'Pool'}])
+            assert not created.errors and len(created.created) == 2
+            wifi_id, pool_id = (item['id'] for item in created.created)
+
+            # Existing IDs, in any spelling, are updated; new ones inserted
+            updated = amenities.upsert_many([{'id': wifi_id.upper(), 'name': 'WiFi'}, {'name': 'Bar'}])
+            assert not updated.errors
+            assert amenities.get(wifi_id).name == 'WiFi' and amenities.get(pool_id).name == 'Pool'
+            assert sorted(amenity.name for amenity in amenities.get_all()) == ['Bar', 'Pool', 'WiFi']
+
+            rejected = amenities.upsert_many([{'name': 'Sauna', 'colour': 'red'}])
+            assert rejected.errors[0]['index'] == 0 and not rejected.created
+            amenities.delete_many([amenity.id for amenity in amenities.get_all()])
+        db.drop_all()
+    print("Bulk upsert test passed!")
+
+test_bulk_upsert()
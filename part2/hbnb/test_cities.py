@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.city import City
+from app.persistence import cities as city_counts
+from storage_backends import backends
+
+
+def suggestions(cities, prefix):
+    return [(entry.name, entry.place_count) for entry in cities.autocomplete(prefix, 10)]
+
+
+def test_city_counts_and_autocomplete():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        database, memory = backends()
+        for backend in (database, memory):
+            places, cities = backend.places, backend.cities
+            paris, parma = cities.add(City(name="Paris")), cities.add(City(name="Parma"))
+            stays = [backend.add_place(f"Stay {i}", paris) for i in range(3)]
+            assert suggestions(cities, "PAR") == [("Paris", 3), ("Parma", 0)]
+
+            places.update(stays[0].id, {'city_id': parma.id})
+            places.delete(stays[1].id)
+            assert suggestions(cities, "par") == [("Paris", 1), ("Parma", 1)]
+            assert cities.get_by_name("paris").place_count == 1
+            assert [place.name for place in places.get_by_city(parma.id)] == ["Stay 0"]
+
+            cities.delete(parma.id)
+            assert suggestions(cities, "pa") == [("Paris", 1)]
+            assert places.get(stays[0].id).city_id is None
+
+            # A name created by another request in the meantime is read back
+            lookups = []
+
+            def raced(name, lookup=cities.get_by_name):
+                lookups.append(name)
+                return None if len(lookups) == 1 else lookup(name)
+            cities.get_by_name = raced
+            try:
+                assert cities.get_or_create("PARIS").id == paris.id
+            finally:
+                del cities.get_by_name
+            assert cities.get_or_create("Nice").name == "Nice"
+            assert suggestions(cities, "") == [("Nice", 0), ("Paris", 1)]
+
+        # Writes leaving every place in its city recount none
+        recounted = []
+        original = city_counts.recount
+
+        def recount(session, city_ids):
+            recounted.append(set(city_ids))
+            return original(session, city_ids)
+        city_counts.recount = recount
+        try:
+            places, cities = database.places, database.cities
+            paris = cities.get_by_name("Paris")
+            stay = places.get_by_city(paris.id)[0]
+            places.update(stay.id, {'name': "Renamed"})
+            row = {'id': stay.id, 'name': "Renamed", 'user_id': stay.user_id, 'price_by_night': 50}
+            assert not places.upsert_many([dict(row, city_id=paris.id)]).errors
+            assert recounted == []
+            nice = cities.get_by_name("Nice")
+            assert not places.upsert_many([dict(row, city_id=nice.id)]).errors
+            assert recounted == [{paris.id, nice.id}]
+        finally:
+            city_counts.recount = original
+        assert suggestions(cities, "") == [("Nice", 1), ("Paris", 0)]
+    print("City test passed!")
+
+test_city_counts_and_autocomplete()
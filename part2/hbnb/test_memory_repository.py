@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+import os
+import tempfile
+from app import create_app
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.models.amenity import Amenity
+from app.persistence.memory_repository import (
+    InMemoryUserRepository, InMemoryPlaceRepository, InMemoryReviewRepository, InMemoryAmenityRepository,
+    InMemoryCityRepository, save_snapshot, load_snapshot
+)
+
+
+def make_repositories():
+    users = InMemoryUserRepository()
+    reviews = InMemoryReviewRepository()
+    amenities = InMemoryAmenityRepository()
+    places = InMemoryPlaceRepository(users, reviews, amenities, InMemoryCityRepository())
+    return users, places, reviews, amenities
+
+
+def test_memory_repository_indexes():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        users, places, reviews, amenities = make_repositories()
+        owner = users.add(User(first_name="Alice", last_name="Smith", email="alice@example.com", password="pass"))
+        wifi = amenities.add(Amenity(name="WiFi"))
+        loft = Place(name="Loft", user_id=owner.id, price_by_night=80)
+        loft.amenities.append(wifi)
+        places.add(loft)
+        reviews.add(Review(text="Great", rating=5, user_id=owner.id, place_id=loft.id))
+
+        assert users.get_by_email("alice@example.com") is owner
+        assert places.get_by_owner(owner.id) == [loft]
+        assert places.get(loft.id).user is owner
+        assert places.get(loft.id).review_count == 1
+        assert amenities.get_by_name("WiFi") is wifi
+
+        try:
+            users.add(User(first_name="Bob", last_name="Smith", email="alice@example.com", password="pass"))
+            assert False, "duplicate email accepted"
+        except ValueError:
+            pass
+
+        users.update(owner.id, {'email': "alice@example.org"})
+        assert users.get_by_email("alice@example.com") is None
+        assert users.get_by_email("alice@example.org") is owner
+
+        for i in range(4):
+            places.add(Place(name=f"Place {i}", user_id=owner.id, price_by_night=50))
+        first = places.get_page(limit=3, include_total=True)
+        second = places.get_page(limit=3, cursor=first.next_cursor)
+        assert first.total == 5 and len(first.items) == 3
+        assert len(second.items) == 2 and second.next_cursor is None
+
+        assert places.delete(loft.id)
+        assert reviews.get_by_place(loft.id) == []
+        assert len(places.get_by_owner(owner.id)) == 4
+
+        path = os.path.join(tempfile.mkdtemp(), "snapshot.json")
+        save_snapshot(path, [users, places, reviews, amenities])
+        restored = make_repositories()
+        load_snapshot(path, list(restored))
+        assert restored[0].get_by_email("alice@example.org").verify_password("pass")
+        assert [p.name for p in restored[1].get_page(limit=10).items] == [p.name for p in places.get_page(limit=10).items]
+        assert restored[1].get_by_owner(owner.id)[0].user.id == owner.id
+    print("In-memory repository test passed!")
+
+test_memory_repository_indexes()
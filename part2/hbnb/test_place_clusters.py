@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.geo import BoundingBox
+from app.persistence import clusters
+from storage_backends import backends
+
+PARIS = BoundingBox(48.0, 2.0, 49.5, 3.0)
+WORLD = BoundingBox(-90, -180, 90, 180)
+
+
+def test_place_clusters():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for backend in backends():
+            places, other = backend.places, backend.columns
+            louvre = backend.add_place(price_by_night=120, latitude=48.855, longitude=2.345)
+            backend.add_place(price_by_night=80, latitude=48.858, longitude=2.347)
+            backend.add_place(price_by_night=200, latitude=48.80, longitude=2.90)
+            backend.add_place(price_by_night=60, latitude=-33.87, longitude=151.21)
+            backend.add_place(price_by_night=90)
+
+            # The whole world at zoom 0: a 4x4 grid
+            world = places.clusters(WORLD, 0)
+            assert [(cluster.count, cluster.min_price) for cluster in world] == [(3, 80), (1, 60)]
+            assert abs(world[0].latitude - (48.855 + 48.858 + 48.80) / 3) < 1e-9
+            assert (world[0].south, world[0].west, world[0].north, world[0].east) == (45.0, 0.0, 90.0, 90.0)
+
+            # Closer in, the places around the Louvre leave the one out of town
+            paris = places.clusters(PARIS, 9)
+            assert sorted((cluster.count, cluster.min_price) for cluster in paris) == [(1, 200), (2, 80)]
+            assert places.clusters(BoundingBox(10, 10, 20, 20), 5) == []
+
+            if other is not None:
+                # Without the snapshot the database groups the places on their geohash
+                cells = clusters.grouped(db.session, [], 1)
+                assert cells.keys.tolist() == [2, 3] and cells.counts.tolist() == [1, 3]
+                assert cells.min_prices.tolist() == [60, 80]
+                # The snapshot folds the same clusters as the database
+                other.refresh_columns()
+                assert other.clusters(WORLD, 0) == world and other.clusters(PARIS, 9) == paris
+                places.update(louvre.id, {'latitude': -33.86, 'longitude': 151.20})
+                assert [(cluster.count, cluster.min_price) for cluster in other.clusters(WORLD, 0)] == \
+                       [(2, 80), (2, 60)]
+
+        client = app.test_client()
+        response = client.get('/api/v1/places/clusters?bbox=-90,-180,90,180&zoom=0')
+        assert response.status_code == 200 and response.json['total'] == 4
+        first = response.json['clusters'][0]
+        assert first['count'] == 2 and first['min_price'] == 80
+        assert abs(first['latitude'] - (48.858 + 48.80) / 2) < 1e-9
+        assert (first['south'], first['west'], first['north'], first['east']) == (45.0, 0.0, 90.0, 90.0)
+        assert client.get('/api/v1/places/clusters?bbox=1,2,3&zoom=0').status_code == 400
+        assert client.get('/api/v1/places/clusters?bbox=10,0,0,0&zoom=0').status_code == 400
+        assert client.get('/api/v1/places/clusters?bbox=-90,-180,90,180&zoom=99').status_code == 400
+    print("Place clusters test passed!")
+
+test_place_clusters()
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+import numpy as np
+from sqlalchemy import update
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.models.amenity import Amenity
+from app.models.city import City
+from app.persistence import columnar
+from app.persistence.cache import CacheInvalidation
+from app.persistence.repository import (
+    UserRepository, PlaceRepository, ReviewRepository, AmenityRepository, CityRepository
+)
+from app.persistence.search import PlaceSearch
+from config import TestingConfig
+
+SEARCHES = [{}, {'sort': '-price'}, {'min_price': 50, 'max_price': 150, 'sort': 'price'},
+            {'min_guests': 3, 'min_rooms': 2, 'sort': '-created_at'}]
+
+
+def place_ids(places, **filters):
+    """Every page of a search, as place IDs, and its total"""
+    search = PlaceSearch(**filters)
+    page = places.search(search, limit=3, include_total=True)
+    ids, total = [], page.total
+    while True:
+        ids += [place.id for place in page.items]
+        if page.next_cursor is None:
+            return ids, total
+        page = places.search(search, limit=3, cursor=page.next_cursor)
+
+
+class ColumnsTestingConfig(TestingConfig):
+    PLACE_COLUMNS = True
+    # Every lookup polls the invalidations of the other workers
+    REPOSITORY_CACHE_SYNC_INTERVAL = 0
+
+
+def test_place_columns():
+    app = create_app(ColumnsTestingConfig)
+    with app.app_context():
+        db.create_all()
+        users, reviews, amenities, cities = UserRepository(), ReviewRepository(), AmenityRepository(), CityRepository()
+        in_sql, in_columns = PlaceRepository(users), PlaceRepository(users)
+        in_columns.columns = columnar.snapshot
+
+        owner = users.add(User(first_name="Ann", last_name="Lee", email="ann@example.com", password="pass"))
+        wifi = amenities.add(Amenity(name="Wifi"))
+        paris = cities.add(City(name="Paris"))
+        stays = [in_sql.add(Place(name=f"Stay {index}", user_id=owner.id, price_by_night=price,
+                                  max_guest=index % 4 + 1, number_rooms=index % 3 + 1, city_name="Paris",
+                                  city_id=paris.id if index % 2 else None, amenities=[wifi] if index < 4 else []))
+                 for index, price in enumerate([40, 150, 50, 100, 100, 300, 75, 150])]
+        searches = SEARCHES + [{'city_id': paris.id, 'sort': 'price'}, {'amenity_ids': [wifi.id], 'min_guests': 2}]
+
+        def check():
+            in_columns.refresh_columns()
+            for filters in searches:
+                assert place_ids(in_columns, **filters) == place_ids(in_sql, **filters), filters
+
+        check()
+        assert place_ids(in_columns, sort='price')[0][:2] == [stays[0].id, stays[2].id]
+
+        # Writes reach the snapshot once committed
+        in_sql.update(stays[0].id, {'price_by_night': 500})
+        in_sql.delete(stays[1].id)
+        stays.append(in_sql.add(Place(name="Stay 8", user_id=owner.id, price_by_night=10, city_id=paris.id)))
+        reviews.add(Review(text="Great", rating=5, user_id=owner.id, place_id=stays[2].id))
+        check()
+        assert place_ids(in_columns, sort='price')[0][0] == stays[-1].id
+        columns = columnar.snapshot.columns()
+        assert len(columns) == 8 and columns.rating[~np.isnan(columns.rating)].tolist() == [5.0]
+
+        cities.delete(paris.id)
+        check()
+
+        # Another worker's write: the page drops the place before the snapshot sees it
+        db.session.execute(update(Place).where(Place.id == stays[3].id).values(price_by_night=900))
+        db.session.commit()
+        assert stays[3].id not in place_ids(in_columns, max_price=200)[0]
+        assert columnar.snapshot.columns().price_by_night.max() == 500
+        # then its logged invalidation refreshes the place's row
+        db.session.add(CacheInvalidation(entity=columnar.ENTITY, obj_id=stays[3].id))
+        db.session.commit()
+        check()
+        assert columnar.snapshot.columns().price_by_night.max() == 900
+    print("Place columns test passed!")
+
+test_place_columns()
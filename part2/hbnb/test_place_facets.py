@@ -0,0 +1,40 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.models.city import City
+from app.persistence.search import PlaceSearch
+from storage_backends import backends
+
+
+def test_place_facets():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for backend in backends():
+            places = backend.places
+            wifi, pool = backend.amenities.add(Amenity(name="Wifi")), backend.amenities.add(Amenity(name="Pool"))
+            paris, rome = backend.cities.add(City(name="Paris")), backend.cities.add(City(name="Rome"))
+            stays = [backend.add_place(f"Stay {index}", paris if index % 2 else rome, price_by_night=price,
+                                       max_guest=index + 1, amenities=[wifi] + ([pool] if index < 2 else []))
+                     for index, price in enumerate([20, 50, 51, 150, 700])]
+
+            every = places.facets()
+            assert every.total == 5
+            assert every.amenities == {wifi.id: 5, pool.id: 2}
+            assert every.cities == {paris.id: 2, rome.id: 3}
+            assert every.prices == [2, 1, 1, 0, 1] and every.guests == [2, 2, 1, 0]
+
+            cheap = places.facets(PlaceSearch(max_price=100))
+            assert cheap.total == 3 and cheap.amenities == {wifi.id: 3, pool.id: 2}
+            assert cheap.prices == [2, 1, 0, 0, 0]
+
+            places.update(stays[4].id, {'price_by_night': 90, 'city_id': paris.id})
+            places.delete(stays[0].id)
+            every = places.facets()
+            assert every.total == 4 and every.amenities == {wifi.id: 4, pool.id: 1}
+            assert every.cities == {paris.id: 3, rome.id: 1}
+            assert every.prices == [1, 2, 1, 0, 0]
+            assert every == places.facets(PlaceSearch())
+    print("Place facets test passed!")
+
+test_place_facets()
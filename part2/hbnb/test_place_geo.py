@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+from app import create_app, db
+from storage_backends import backends
+
+POINTS = {
+    "Paris": (48.8566, 2.3522),
+    "Versailles": (48.8049, 2.1204),
+    "Orleans": (47.9030, 1.9093),
+    "London": (51.5074, -0.1278),
+    "Suva": (-17.0, 178.0),
+    "East": (-16.9, 179.8),
+    "West": (-17.1, -179.8),
+}
+
+
+def geo_names(search, limit):
+    """Every page of a geographic search, as (name, rounded distance_km) pairs"""
+    page = search(limit=limit, include_total=True)
+    names, total = [], page.total
+    while True:
+        names += [(place.name, round(place.distance_km)) for place in page.items]
+        if page.next_cursor is None:
+            assert len(names) == total
+            return names
+        page = search(limit=limit, cursor=page.next_cursor)
+
+
+def test_place_geo():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for backend in backends():
+            places = backend.places
+            for name, (latitude, longitude) in POINTS.items():
+                backend.add_place(name, latitude=latitude, longitude=longitude)
+
+            def nearby(**page):
+                return places.within_radius(48.8566, 2.3522, 150, **page)
+            expected = [("Paris", 0), ("Versailles", 18), ("Orleans", 111)]
+            for limit in (1, 2, 5):
+                assert geo_names(nearby, limit) == expected
+
+            # West of east: the box crosses the antimeridian, nearest its center (180) first
+            def across(**page):
+                return places.within_bbox(-18, 179, -16, -179, **page)
+            for limit in (1, 5):
+                assert [name for name, _ in geo_names(across, limit)] in (["East", "West"], ["West", "East"])
+            assert geo_names(lambda **page: places.within_bbox(-18, 177, -16, 178.5, **page), 5) == [("Suva", 27)]
+
+            for search in (lambda: places.within_radius(0, 0, 2000), lambda: places.within_bbox(-90, -180, 90, 180),
+                           lambda: places.within_bbox(40, 170, 50, -150), lambda: places.within_bbox(10, 0, 0, 5)):
+                try:
+                    search()
+                    assert False, "search accepted"
+                except ValueError:
+                    pass
+
+        client = app.test_client()
+        first = client.get('/api/v1/places/nearby?lat=48.8566&lon=2.3522&radius_km=150&limit=2&include_total=true').json
+        assert first['total'] == 3 and [item['name'] for item in first['items']] == ["Paris", "Versailles"]
+        assert first['items'][1]['distance_km'] > 0
+        rest = client.get(f"/api/v1/places/nearby?lat=48.8566&lon=2.3522&radius_km=150&limit=2"
+                          f"&cursor={first['next_cursor']}").json
+        assert [item['name'] for item in rest['items']] == ["Orleans"] and rest['next_cursor'] is None
+
+        first = client.get('/api/v1/places/bbox?south=-18&west=179&north=-16&east=-179&limit=1').json
+        rest = client.get(f"/api/v1/places/bbox?south=-18&west=179&north=-16&east=-179&limit=1"
+                          f"&cursor={first['next_cursor']}").json
+        assert {first['items'][0]['name'], rest['items'][0]['name']} == {"East", "West"}
+        assert rest['next_cursor'] is None
+
+        assert client.get('/api/v1/places/nearby?lat=0&lon=0&radius_km=5000').status_code == 400
+        assert client.get('/api/v1/places/bbox?south=-90&west=-180&north=90&east=180').status_code == 400
+        assert client.get('/api/v1/places/bbox?south=-18&west=179&north=-16&east=-179&cursor=bad').status_code == 400
+    print("Place geo search test passed!")
+
+test_place_geo()
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+from sqlalchemy import event
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.review import Review
+from app.models.amenity import Amenity
+
+
+def count_queries(client, url):
+    """
+    Returns the response of a GET request and the number of SQL statements it ran.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response, len(statements)
+
+
+def seed_places(count):
+    owner = User(first_name="Alice", last_name="Smith", email=f"alice{count}@example.com", password="pass")
+    reviewer = User(first_name="Bob", last_name="Jones", email=f"bob{count}@example.com", password="pass")
+    wifi = Amenity(name=f"WiFi {count}")
+    pool = Amenity(name=f"Pool {count}")
+    db.session.add_all([owner, reviewer, wifi, pool])
+    places = []
+    for i in range(count):
+        place = Place(name=f"Place {i}", user=owner, price_by_night=100, amenities=[wifi, pool])
+        place.reviews.append(Review(text="Nice", rating=5, user=reviewer))
+        places.append(place)
+    db.session.add_all(places)
+    db.session.commit()
+    db.session.expunge_all()
+    return places
+
+
+def test_place_queries_are_constant():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+
+        seed_places(3)
+        _, few = count_queries(client, '/api/v1/places/?limit=100')
+        seed_places(30)
+        response, many = count_queries(client, '/api/v1/places/?limit=100')
+
+        assert len(response.json['items']) == 33
+        assert response.json['items'][0]['owner']['first_name'] == "Alice"
+        assert len(response.json['items'][0]['amenities']) == 2
+        assert response.json['items'][0]['review_count'] == 1
+        assert few == many, f"{few} queries for 3 places, {many} for 33"
+
+        place_id = response.json['items'][-1]['id']
+        response, detail = count_queries(client, f'/api/v1/places/{place_id}')
+        assert response.json['review_count'] == 1
+        assert detail <= 2, f"{detail} queries for place details"
+        db.drop_all()
+    print("Place query count test passed!")
+
+test_place_queries_are_constant()
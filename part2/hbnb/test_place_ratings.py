@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+from sqlalchemy import update
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place, STAR_COLUMNS
+from app.models.review import Review
+from app.persistence import ratings
+from app.persistence.repository import UserRepository, PlaceRepository, ReviewRepository
+from storage_backends import backends
+
+
+def aggregates(place):
+    return place.review_count, place.rating_sum, [getattr(place, name) for name in STAR_COLUMNS]
+
+
+def test_place_ratings():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for backend in backends():
+            places, reviews = backend.places, backend.reviews
+            guests = [backend.users.add(User(first_name="Guest", last_name=str(index),
+                                             email=f"guest{index}@example.com", password="pass"))
+                      for index in range(1, 4)]
+            home = backend.add_place("Home")
+            other = backend.add_place("Other", price_by_night=80)
+            assert aggregates(places.get(home.id)) == (0, 0, [0, 0, 0, 0, 0])
+            assert places.get(home.id).average_rating is None
+
+            first, second, third = (reviews.add(Review(text="Stay", rating=rating, user_id=guest.id,
+                                                       place_id=home.id))
+                                    for rating, guest in zip((5, 3, 5), guests))
+            assert aggregates(places.get(home.id)) == (3, 13, [0, 0, 1, 0, 2])
+            assert abs(places.get(home.id).average_rating - 13 / 3) < 1e-9
+
+            # A new rating moves the review between stars, a new place between places
+            reviews.update(second.id, {'rating': 1})
+            reviews.update(third.id, {'place_id': other.id})
+            assert aggregates(places.get(home.id)) == (2, 6, [1, 0, 0, 0, 1])
+            assert aggregates(places.get(other.id)) == (1, 5, [0, 0, 0, 0, 1])
+
+            reviews.delete(first.id)
+            assert aggregates(places.get(home.id)) == (1, 1, [1, 0, 0, 0, 0])
+            # Bulk deletes bypass the ORM and recount instead
+            reviews.delete_many([second.id, third.id])
+            assert aggregates(places.get(home.id)) == (0, 0, [0, 0, 0, 0, 0])
+            assert aggregates(places.get(other.id)) == (0, 0, [0, 0, 0, 0, 0])
+
+        # Deleting a reviewer drops the reviews, and with them the ratings
+        users = UserRepository()
+        home, guest = PlaceRepository(users).get_all()[0], users.get_by_email("guest3@example.com")
+        ReviewRepository().add(Review(text="Stay", rating=4, user_id=guest.id, place_id=home.id))
+        assert aggregates(PlaceRepository(users).get(home.id))[0] == 1
+        users.delete(guest.id)
+        assert aggregates(PlaceRepository(users).get(home.id))[0] == 0
+
+        # The rebuild corrects aggregates that drifted from the reviews
+        ReviewRepository().add(Review(text="Stay", rating=2, user_id=home.user_id, place_id=home.id))
+        db.session.execute(update(Place).values(review_count=7, rating_sum=0, rating_2=0))
+        db.session.commit()
+        assert ratings.rebuild(db.session) == 2
+        db.session.commit()
+        db.session.expire_all()
+        assert aggregates(db.session.get(Place, home.id)) == (1, 2, [0, 1, 0, 0, 0])
+        assert ratings.rebuild(db.session) == 0
+        # as does the reconciliation job, committing one chunk at a time
+        db.session.execute(update(Place).values(review_count=7))
+        db.session.commit()
+        chunk_size, ratings.CHUNK_SIZE = ratings.CHUNK_SIZE, 1
+        try:
+            fixed = []
+            for place_ids in ratings.place_id_chunks(db.session):
+                fixed.append(ratings.rebuild(db.session, place_ids))
+                db.session.commit()
+        finally:
+            ratings.CHUNK_SIZE = chunk_size
+        assert len(fixed) == len(PlaceRepository(users).get_all()) and sum(fixed) == len(fixed)
+        db.session.expire_all()
+        assert aggregates(db.session.get(Place, home.id)) == (1, 2, [0, 1, 0, 0, 0])
+
+        client = app.test_client()
+        detail = client.get(f'/api/v1/places/{home.id}').json
+        assert (detail['review_count'], detail['rating_sum'], detail['average_rating'],
+                detail['rating_histogram']) == (1, 2, 2.0, [0, 1, 0, 0, 0])
+        listed = {item['id']: item for item in client.get('/api/v1/places/').json['items']}
+        assert listed[home.id]['rating_histogram'] == [0, 1, 0, 0, 0]
+        assert listed[home.id]['average_rating'] == 2.0
+        assert all(item['average_rating'] is None for item in listed.values() if item['id'] != home.id)
+    print("Place ratings test passed!")
+
+test_place_ratings()
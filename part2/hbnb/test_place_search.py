@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.amenity import Amenity
+from app.models.city import City
+from app.persistence.repository import UserRepository, PlaceRepository
+from app.persistence.search import PlaceSearch
+from storage_backends import backends
+
+PRICES = [50, 80, 80, 80, 120, 200]
+SORT_KEYS = {'created_at': 'created_at', 'price': 'price_by_night'}
+
+
+def search_names(places, limit=2, **filters):
+    """Every page of a search, as place names"""
+    search = PlaceSearch(**filters)
+    page = places.search(search, limit=limit, include_total=True)
+    names, total = [], page.total
+    while True:
+        names += [place.name for place in page.items]
+        if page.next_cursor is None:
+            assert len(names) == total
+            return names
+        page = places.search(search, limit=limit, cursor=page.next_cursor)
+
+
+def test_place_search():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for backend in backends():
+            places = backend.places
+            wifi, pool = backend.amenities.add(Amenity(name="Wifi")), backend.amenities.add(Amenity(name="Pool"))
+            paris, rome = backend.cities.add(City(name="Paris")), backend.cities.add(City(name="Rome"))
+            for index, price in enumerate(PRICES):
+                backend.add_place(f"Stay {index}", paris if index % 2 else rome, price_by_night=price,
+                                  max_guest=index + 1, number_rooms=1 + index // 2,
+                                  amenities=[wifi] + ([pool] if index < 3 else []))
+
+            def stays(*indexes):
+                return {f"Stay {index}" for index in indexes}
+
+            assert set(search_names(places, min_price=80)) == stays(1, 2, 3, 4, 5)
+            assert set(search_names(places, max_price=80)) == stays(0, 1, 2, 3)
+            assert set(search_names(places, min_price=80, max_price=80)) == stays(1, 2, 3)
+            assert set(search_names(places, city_name="Paris")) == stays(1, 3, 5)
+            assert set(search_names(places, city_id=rome.id)) == stays(0, 2, 4)
+            assert set(search_names(places, min_guests=4)) == stays(3, 4, 5)
+            assert set(search_names(places, min_rooms=2)) == stays(2, 3, 4, 5)
+            assert set(search_names(places, amenity_ids=[pool.id])) == stays(0, 1, 2)
+            assert set(search_names(places, amenity_ids=[wifi.id, pool.id], min_price=80)) == stays(1, 2)
+            assert search_names(places, city_name="Nice") == []
+
+            # Pages of one row apart, the ties on price included, add up to the whole order
+            every = places.get_all()
+            for sort in ('created_at', '-created_at', 'price', '-price'):
+                attribute = SORT_KEYS[sort.lstrip('-')]
+                expected = [place.name for place in sorted(
+                    every, key=lambda place: (getattr(place, attribute), place.id), reverse=sort.startswith('-'))]
+                for limit in (1, 2, 4):
+                    assert search_names(places, limit=limit, sort=sort) == expected, (sort, limit)
+
+            for filters in ({'min_price': 100, 'max_price': 50}, {'min_guests': -1}, {'sort': 'name'}):
+                try:
+                    PlaceSearch(**filters)
+                    assert False, f"{filters} accepted"
+                except ValueError:
+                    pass
+
+        client = app.test_client()
+        ties = sorted(place.id for place in PlaceRepository(UserRepository()).get_all() if place.price_by_night == 80)
+        first = client.get('/api/v1/places/search?sort=price&limit=2&min_price=60').json
+        assert [item['id'] for item in first['items']] == ties[:2]
+        cursor = first['next_cursor']
+        assert client.get(f'/api/v1/places/search?sort=price&limit=2&min_price=60&cursor={cursor}').status_code == 200
+        for tampered in (cursor[::-1], cursor[:-4], 'not-a-cursor'):
+            response = client.get(f'/api/v1/places/search?sort=price&limit=2&cursor={tampered}')
+            assert response.status_code == 400, tampered
+        # A cursor only pages the sort it was issued for
+        for sort in ('-price', 'created_at', '-created_at'):
+            response = client.get(f'/api/v1/places/search?sort={sort}&limit=2&cursor={cursor}')
+            assert response.status_code == 400, sort
+        created = client.get('/api/v1/places/search?limit=2').json['next_cursor']
+        assert client.get(f'/api/v1/places/search?sort=price&cursor={created}').status_code == 400
+        assert client.get('/api/v1/places/search?min_price=100&max_price=50').status_code == 400
+    print("Place search test passed!")
+
+test_place_search()
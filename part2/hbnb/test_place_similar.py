@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.review import Review
+from app.models.amenity import Amenity
+from app.models.city import City
+from storage_backends import backends
+
+
+def test_place_similar():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for backend in backends():
+            places, other = backend.places, backend.columns
+            wifi, pool, bar = (backend.amenities.add(Amenity(name=name)) for name in ("Wifi", "Pool", "Bar"))
+            paris, rome = backend.cities.add(City(name="Paris")), backend.cities.add(City(name="Rome"))
+            home = backend.add_place("Home", paris, max_guest=4, latitude=48.85, longitude=2.35, amenities=[wifi, pool])
+            twin = backend.add_place("Twin", paris, max_guest=4, latitude=48.86, longitude=2.35, amenities=[wifi, pool])
+            pricey = backend.add_place("Pricey", paris, price_by_night=400, max_guest=4, latitude=48.86,
+                                       longitude=2.36, amenities=[wifi, pool])
+            small = backend.add_place("Small", paris, max_guest=1, latitude=48.85, longitude=2.36, amenities=[bar])
+            # Same city, no coordinates; out of town, another city
+            unmapped = backend.add_place("Unmapped", paris, max_guest=4, amenities=[wifi, pool])
+            backend.add_place("Far", rome, max_guest=4, latitude=41.90, longitude=12.49, amenities=[wifi, pool])
+            backend.reviews.add(Review(text="Great", rating=5, user_id=backend.owner.id, place_id=pricey.id))
+
+            similar = places.similar(home.id)
+            assert [place.id for place in similar] == [twin.id, pricey.id, unmapped.id, small.id]
+            assert similar[0].similarity > similar[1].similarity > similar[2].similarity
+            assert 1.0 < similar[0].distance_km < 1.2 and similar[2].distance_km is None
+            assert [place.id for place in places.similar(home.id, limit=2)] == [twin.id, pricey.id]
+            assert places.similar(backend.owner.id) is None
+
+            if other is not None:
+                # The snapshot scores like the rows read from the database
+                other.refresh_columns()
+                assert [(place.id, place.similarity) for place in other.similar(home.id)] == \
+                       [(place.id, place.similarity) for place in similar]
+                projected = other.similar(home.id, fields={'id': None, 'name': None})
+                assert [item['name'] for item in projected] == ["Twin", "Pricey", "Unmapped", "Small"]
+
+            # A place moved away leaves the neighborhood
+            places.update(small.id, {'latitude': 41.9, 'longitude': 12.5, 'city_id': rome.id})
+            assert [place.id for place in places.similar(home.id)] == [twin.id, pricey.id, unmapped.id]
+            if other is not None:
+                assert [place.id for place in other.similar(home.id)] == [twin.id, pricey.id, unmapped.id]
+    print("Place similarity test passed!")
+
+test_place_similar()
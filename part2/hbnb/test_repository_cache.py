@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.persistence import cache as repository_cache
+from app.persistence.repository import UserRepository, PlaceRepository
+
+
+def test_repository_cache():
+    app = create_app("config.TestingConfig")
+    app.config['REPOSITORY_CACHE_SIZE'] = 16
+    with app.app_context():
+        db.create_all()
+        users = UserRepository()
+        places = PlaceRepository(users)
+        repository_cache.configure_repository_cache(app, [users, places])
+        owner = users.add(User(first_name="Ann", last_name="Lee", email="ann@example.com", password="pass"))
+        place = places.add(Place(name="Loft", user_id=owner.id, price_by_night=80))
+        db.session.expunge_all()
+
+        # Any spelling of an ID reads the one entry writes invalidate
+        assert places.get(place.id.upper()).price_by_night == 80
+        db.session.expunge_all()
+        assert places.get(place.id).price_by_night == 80
+        assert places.cache.stats()['size'] == 1 and places.cache.hits == 1
+        places.update(place.id, {'price_by_night': 95})
+        db.session.expunge_all()
+        assert places.get(place.id.upper()).price_by_night == 95
+
+        # IDs that are not UUIDs find nothing and are not cached
+        assert places.get("not-a-uuid") is None
+        assert places.cache.stats()['size'] == 1
+
+        assert places.delete(place.id.upper()) is True
+        db.session.expunge_all()
+        assert places.get(place.id) is None and places.delete(place.id) is False
+        repository_cache.configure_repository_cache(app, [])
+        db.drop_all()
+    print("Repository cache test passed!")
+
+test_repository_cache()
@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.user import User
+from app.models.review import Review
+from app.persistence import text_search
+from app.persistence.search import PlaceSearch
+from storage_backends import backends
+
+
+def found(places, q, **filters):
+    """Names of the places matching a text query, most relevant first"""
+    return [place.name for place in places.search(PlaceSearch(q=q, **filters), limit=50).items]
+
+
+def test_text_search():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for backend in backends():
+            places, reviews = backend.places, backend.reviews
+            guest = backend.users.add(User(first_name="Bob", last_name="Ray", email="bob@example.com",
+                                           password="pass"))
+            loft = backend.add_place("Sunny Loft", description="Quiet flat", city_name="Paris", price_by_night=90)
+            cabin = backend.add_place("Cabin", description="Wooden cabin by the lake", city_name="Annecy",
+                                      price_by_night=60)
+            backend.add_place("Studio", description="Small and sunny", city_name="Paris", price_by_night=40)
+
+            # A word in the name weighs more than one in the description
+            assert found(places, "sunny") == ["Sunny Loft", "Studio"]
+            assert found(places, "SUNNY paris") == ["Sunny Loft", "Studio"]
+            assert found(places, "sunny", max_price=50) == ["Studio"]
+            assert found(places, "sunny lake") == []
+
+            # Documents follow the places and their reviews as they are written
+            review = reviews.add(Review(text="Loved the lake view", rating=5, user_id=guest.id, place_id=loft.id))
+            assert found(places, "lake") == ["Cabin", "Sunny Loft"]
+            reviews.update(review.id, {'text': "Loved the garden"})
+            assert found(places, "lake") == ["Cabin"] and found(places, "garden") == ["Sunny Loft"]
+            places.update(cabin.id, {'name': "Chalet"})
+            assert found(places, "chalet") == ["Chalet"] and found(places, "cabin") == ["Chalet"]
+            reviews.delete(review.id)
+            assert found(places, "garden") == []
+            places.delete(cabin.id)
+            assert found(places, "chalet") == []
+
+        # Without a full-text index, a scan finds the same places, ranked by column weights
+        for words in (["sunny"], ["sunny", "paris"], ["paris"], ["nothing"]):
+            indexed = db.session.execute(text_search.matches(words, 'sqlite')).all()
+            scanned = db.session.execute(text_search.matches(words, 'generic')).all()
+            assert {row.place_id for row in scanned} == {row.place_id for row in indexed}
+        ranked = db.session.execute(text_search.matches(["sunny"], 'generic').order_by('rank')).all()
+        assert [row.rank for row in ranked] == [-10.0, -2.0]
+
+        client = app.test_client()
+        items = client.get('/api/v1/places/search?q=sunny').json['items']
+        assert [item['name'] for item in items] == ["Sunny Loft", "Studio"]
+        assert client.get('/api/v1/places/search?q=%20!').status_code == 400
+        assert client.get('/api/v1/places/search?sort=relevance').status_code == 400
+    print("Text search test passed!")
+
+test_text_search()
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.place import Place
+from app.models.identifiers import new_id
+from app.models.amenity import Amenity
+from app.persistence import unit_of_work, user_repository, place_repository, amenity_repository
+from app.services import facade
+
+
+def test_unit_of_work_commits_once():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        commits = []
+        event.listen(db.session, 'after_commit', lambda session: commits.append(session))
+
+        with unit_of_work():
+            owner = User(first_name="Alice", last_name="Smith", email="alice@example.com", password="pass")
+            user_repository.add(owner)
+            wifi = amenity_repository.add(Amenity(name="WiFi"))
+            place = facade.create_place({'name': "Loft", 'user_id': owner.id, 'price_by_night': 80})
+            place.add_amenity(wifi)
+
+        assert len(commits) == 1
+        assert place_repository.get(place.id).amenities[0].name == "WiFi"
+
+        try:
+            with unit_of_work():
+                amenity_repository.add(Amenity(name="Pool"))
+                raise RuntimeError("abort")
+        except RuntimeError:
+            pass
+        assert amenity_repository.get_by_name("Pool") is None
+        db.drop_all()
+    print("Unit of work test passed!")
+
+test_unit_of_work_commits_once()
+
+
+def test_commit_conflicts_are_bad_requests():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        guest = user_repository.add(User(first_name="Bob", last_name="Lee", email="bob@example.com", password="pass"))
+        home = place_repository.add(Place(name="Home", user_id=guest.id, price_by_night=50))
+        review = facade.create_review({'text': "Nice", 'rating': 4, 'user_id': guest.id, 'place_id': home.id})
+        headers = {'Authorization': f"Bearer {create_access_token(identity=guest.id)}"}
+
+        # Moving the review to a missing place only fails when the write commits
+        response = app.test_client().put(f'/api/v1/reviews/{review.id}', json={'place_id': new_id()},
+                                         headers=headers)
+        assert response.status_code == 400 and 'Integrity Error' in response.json['message']
+        assert facade.get_review(review.id).place_id == home.id
+        db.drop_all()
+    print("Commit conflict test passed!")
+
+test_commit_conflicts_are_bad_requests()
@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+from app import create_app, db
+from app.models.user import User
+from app.persistence.repository import UserRepository
+from app.persistence.memory_repository import InMemoryUserRepository
+from app.persistence.search import UserSearch
+
+PEOPLE = [("Anna", "Smith"), ("anna", "Jones"), ("ANNABEL", "Smith"), ("Ann", "Smythe"), ("Bob", "Smith"),
+          ("Émile", "Straße")]
+
+
+def search_names(users, **filters):
+    """Every page of a search, as (first_name, last_name) pairs"""
+    search = UserSearch(**filters)
+    page = users.search(search, limit=2, include_total=True)
+    names, total = [], page.total
+    while True:
+        names += [(user.first_name, user.last_name) for user in page.items]
+        if page.next_cursor is None:
+            return names, total
+        page = users.search(search, limit=2, cursor=page.next_cursor)
+
+
+def test_user_name_search():
+    app = create_app("config.TestingConfig")
+    with app.app_context():
+        db.create_all()
+        for users in (UserRepository(), InMemoryUserRepository()):
+            for index, (first_name, last_name) in enumerate(PEOPLE):
+                users.add(User(first_name=first_name, last_name=last_name,
+                               email=f"user{index}@example.com", password="pass"))
+
+            assert search_names(users, first_name="ANNA") == ([("Anna", "Smith"), ("anna", "Jones")], 2)
+            names, total = search_names(users, first_name="ann", prefix=True)
+            assert total == 4 and names[0] == ("Ann", "Smythe") and names[-1] == ("ANNABEL", "Smith")
+            assert search_names(users, first_name="an", last_name="sm", prefix=True)[0] == [
+                ("Ann", "Smythe"), ("Anna", "Smith"), ("ANNABEL", "Smith")]
+            assert search_names(users, last_name="strasse")[0] == [("Émile", "Straße")]
+
+            bob = users.get_by_email("user4@example.com")
+            users.update(bob.id, {'first_name': "Annie"})
+            assert ("Annie", "Smith") in search_names(users, first_name="ANN", prefix=True)[0]
+
+            try:
+                UserSearch(first_name="  ")
+                assert False, "blank name accepted"
+            except ValueError:
+                pass
+    print("User name search test passed!")
+
+test_user_name_search()
@@ -139,36 +139,43 @@ document.addEventListener('DOMContentLoaded', () => {
                     headers['Authorization'] = `Bearer ${token}`;
                 }
 
-                const response = await fetch(`${API_BASE_URL}/places/`, {
-                    method: 'GET',
-                    headers: headers
-                });
-
-                if (!response.ok) {
-                    throw new Error('Failed to fetch places');
-                }
+                // The server filters by price; follow next_cursor until the last page
+                const filter = Number.isFinite(maxPrice) ? `&max_price=${maxPrice}` : '';
+                const places = [];
+                let cursor = null;
+                do {
+                    const query = `?limit=100${filter}` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+                    const response = await fetch(`${API_BASE_URL}/places/search${query}`, {
+                        method: 'GET',
+                        headers: headers
+                    });
+
+                    if (!response.ok) {
+                        throw new Error('Failed to fetch places');
+                    }
 
-                const places = await response.json();
+                    const page = await response.json();
+                    places.push(...page.items);
+                    cursor = page.next_cursor;
+                } while (cursor);
                 
                 placesList.innerHTML = ''; 
 
                 places.forEach(place => {
                     const currentPrice = place.price || place.price_by_night;
 
-                    if (currentPrice <= maxPrice) {
-                        const placeCard = document.createElement('div');
-                        placeCard.className = 'place-card';
-                        
-                        placeCard.innerHTML = `
-                            <img src="https://placehold.co/600x400" alt="${place.name}">
-                            <div class="place-info">
-                                <h3>${place.name}</h3>
-                                <p class="price">$${currentPrice} per night</p>
-                                <button class="details-button" onclick="window.location.href='place.html?id=${place.id}'">View Details</button>
-                            </div>
-                        `;
-                        placesList.appendChild(placeCard);
-                    }
+                    const placeCard = document.createElement('div');
+                    placeCard.className = 'place-card';
+                    
+                    placeCard.innerHTML = `
+                        <img src="https://placehold.co/600x400" alt="${place.name}">
+                        <div class="place-info">
+                            <h3>${place.name}</h3>
+                            <p class="price">$${currentPrice} per night</p>
+                            <button class="details-button" onclick="window.location.href='place.html?id=${place.id}'">View Details</button>
+                        </div>
+                    `;
+                    placesList.appendChild(placeCard);
                 });
             } catch (error) {
                 console.error('Error loading places:', error);
@@ -177,22 +184,38 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         if (priceFilter) {
-            const prices = [10, 50, 100]; 
-            const allOption = document.createElement('option');
-            allOption.value = 'Infinity';
-            allOption.textContent = 'All';
-            priceFilter.appendChild(allOption);
-
-            prices.forEach(price => {
-                const option = document.createElement('option');
-                option.value = price;
-                option.textContent = `Under $${price}`;
-                priceFilter.appendChild(option);
-            });
+            async function loadPriceFilter() {
+                const allOption = document.createElement('option');
+                allOption.value = 'Infinity';
+                allOption.textContent = 'All';
+                priceFilter.appendChild(allOption);
+
+                // One option per price bucket, with the number of places it keeps
+                try {
+                    const response = await fetch(`${API_BASE_URL}/places/facets`);
+                    if (!response.ok) {
+                        throw new Error('Failed to fetch facets');
+                    }
+                    const facets = await response.json();
+                    allOption.textContent = `All (${facets.total})`;
+                    let count = 0;
+                    facets.prices.forEach(bucket => {
+                        count += bucket.count;
+                        if (bucket.max_price === null) return;
+                        const option = document.createElement('option');
+                        option.value = bucket.max_price;
+                        option.textContent = `Up to $${bucket.max_price} (${count})`;
+                        priceFilter.appendChild(option);
+                    });
+                } catch (error) {
+                    console.error('Error loading price filter:', error);
+                }
+            }
 
             priceFilter.addEventListener('change', (e) => {
                 loadPlaces(parseFloat(e.target.value));
             });
+            loadPriceFilter();
         }
 
         loadPlaces();